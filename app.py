@@ -10,7 +10,14 @@ from utils.places_gemini_api import search_campsites_places_gemini
 from utils.integrated_search import search_campsites_integrated, enhance_search_results
 from utils.query_analyzer import analyze_query
 from utils.search_evaluator import evaluate_search_results, generate_search_summary
-from utils.parallel_search import search_and_analyze
+from utils.parallel_search import (
+    search_and_analyze,
+    iter_search_and_analyze,
+    EVENT_RAW_RESULTS,
+    EVENT_RANKED_RESULTS,
+    EVENT_SUMMARY_CHUNK,
+    EVENT_COMPLETE,
+)
 from utils.web_search import search_related_articles as web_search_articles
 
 # ローカル環境変数の読み込み
@@ -19,6 +26,10 @@ load_dotenv()
 # デバッグモードの設定
 DEBUG = os.getenv("DEBUG", "true").lower() == "true"
 
+# 検索ジョブの新しいイベントを待つ間に、進捗表示エリアを書き換える間隔（秒）
+# 書き換えのたびに新しい入力の有無も確認されるため、入力への反応の遅れはこの間隔までになる
+SEARCH_PROGRESS_REFRESH_INTERVAL = float(os.getenv("SEARCH_PROGRESS_REFRESH_INTERVAL", "1.0"))
+
 
 # APIキーの確認と警告表示
 def check_api_keys():
@@ -42,9 +53,9 @@ def check_api_keys():
 # Gemini APIの初期化
 try:
     if "GEMINI_API_KEY" in os.environ and os.environ["GEMINI_API_KEY"]:
-        import google.generativeai as genai
+        from utils.gemini_client import configure_gemini
 
-        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+        configure_gemini(os.environ["GEMINI_API_KEY"])
         print("Gemini APIを初期化しました")
     else:
         print("Gemini APIキーが設定されていないため、初期化をスキップします")
@@ -59,9 +70,12 @@ GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY", "")
 GOOGLE_PLACE_API_KEY = os.environ.get("GOOGLE_PLACE_API_KEY", "")
 MAPBOX_TOKEN = os.environ.get("MAPBOX_TOKEN", "")
 
-from components.results_display import render_results
+from components.results_display import render_results, render_search_preview, render_streaming_summary
 from components.map_display import display_map
+from utils.progress_channel import open_progress_channel, get_progress_channel, close_progress_channel
+from utils.search_jobs import get_search_executor, JobRejectedError, FINISHED_STATUSES, JOB_CANCELLED
 import time
+import uuid
 import urllib.parse
 import asyncio
 import threading
@@ -198,9 +212,6 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-# スレッド間通信用のグローバル変数
-global_progress_queue = queue.Queue()
-
 # セッション状態の初期化
 if "messages" not in st.session_state:
     st.session_state.messages = [
@@ -234,12 +245,13 @@ if "featured" not in st.session_state:
 if "popular" not in st.session_state:
     st.session_state.popular = None
 
-# スレッド間通信用のキュー - この行は機能しないので、グローバル変数を使用
-if "progress_queue" not in st.session_state:
-    st.session_state.progress_queue = global_progress_queue  # 実際のキューオブジェクトを設定
+# 関連記事（検索ジョブで取得した記事を、取得したクエリと一緒に保存する）
+if "related_articles" not in st.session_state:
+    st.session_state.related_articles = None
 
-# グローバル変数を参照
-progress_queue = global_progress_queue
+# 進捗チャネルをセッションごとに分けるためのID
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 if "search_results" not in st.session_state:
     st.session_state.search_results = None
@@ -259,6 +271,13 @@ if "popular_campsites" not in st.session_state:
 if "last_query" not in st.session_state:
     st.session_state.last_query = None
 
+if "search_job_id" not in st.session_state:
+    st.session_state.search_job_id = None
+
+# 実行中の検索ジョブのプレビュー（取り込み済みのイベント数・キャンプ場・要約）
+if "search_preview" not in st.session_state:
+    st.session_state.search_preview = {}
+
 # サイドバー
 with st.sidebar:
     st.title("🏕️ 検索設定")
@@ -298,35 +317,37 @@ for message in st.session_state.messages:
             unsafe_allow_html=True,
         )
 
-# 検索進捗状況の表示
-if "search_in_progress" in st.session_state and st.session_state.search_in_progress:
-    # 進捗キューからメッセージを取得
-    try:
-        # キューにメッセージがあれば取得（ブロックしない）
-        if "progress_queue" in st.session_state and st.session_state.progress_queue is not None:
-            while not st.session_state.progress_queue.empty():
-                progress_message = st.session_state.progress_queue.get(block=False)
-                st.session_state.current_progress = progress_message
+def apply_progress_messages(progress_channel):
+    """
+    前回の取り込み以降に届いた進捗メッセージのうち最新のものをセッション状態に反映する関数
 
-                # デバッグ出力
-                if DEBUG:
-                    print(f"\n===== 進捗状況の更新 =====")
-                    print(f"current_progress = '{progress_message}'")
+    Args:
+        progress_channel (ProgressChannel): 検索ジョブの進捗チャネル（Noneの場合は何もしない）
 
-                # 最後のメッセージがアシスタントのものであれば更新
-                if len(st.session_state.messages) > 0 and st.session_state.messages[-1]["role"] == "assistant":
-                    # 最後のメッセージを更新
-                    st.session_state.messages[-1]["content"] = progress_message
-                    if DEBUG:
-                        print(f"最後のアシスタントメッセージを更新しました: '{progress_message}'")
-                else:
-                    # 新しいアシスタントメッセージを追加
-                    st.session_state.messages.append({"role": "assistant", "content": progress_message})
-                    if DEBUG:
-                        print(f"新しいアシスタントメッセージを追加しました: '{progress_message}'")
-    except queue.Empty:
-        pass
+    Returns:
+        str: 反映した進捗メッセージ（届いていない場合はNone）
+    """
+    progress_events = progress_channel.drain() if progress_channel is not None else []
+    if not progress_events:
+        return None
+
+    message = progress_events[-1]["message"]
+    st.session_state.current_progress = message
+
+    # 最後のアシスタントメッセージを進捗で更新
+    if st.session_state.messages and st.session_state.messages[-1]["role"] == "assistant":
+        st.session_state.messages[-1]["content"] = message
+    else:
+        st.session_state.messages.append({"role": "assistant", "content": message})
 
+    if DEBUG:
+        print(f"進捗状況を表示: '{message}'（未表示 {len(progress_events)}件）")
+
+    return message
+
+
+# 検索進捗状況の表示
+if "search_in_progress" in st.session_state and st.session_state.search_in_progress:
     # 検索結果が準備できているか確認
     if st.session_state.search_results is not None:
         # 検索結果を処理
@@ -337,6 +358,11 @@ if "search_in_progress" in st.session_state and st.session_state.search_in_progr
         st.session_state.summary = search_results.get("summary", "")
         st.session_state.featured = search_results.get("featured_campsites", [])
         st.session_state.popular = search_results.get("popular_campsites", [])
+        if "related_articles" in search_results:
+            st.session_state.related_articles = {
+                "query": st.session_state.get("search_query"),
+                "articles": search_results["related_articles"],
+            }
         st.session_state.search_executed = True
         st.session_state.search_in_progress = False
 
@@ -452,82 +478,22 @@ if "search_in_progress" in st.session_state and st.session_state.search_in_progr
             start_message = "🔎 キャンプ場を検索中です。少々お待ちください..."
             st.session_state.current_progress = start_message
 
-            # 検索を同期的に実行
+            # 検索をバックグラウンドのジョブとして登録（スクリプトの再実行とは独立して進む）
+            job_id = uuid.uuid4().hex
+            progress_channel = open_progress_channel(st.session_state.session_id, job_id)
             try:
-                # 進捗状況を報告する関数
-                def report_progress(message):
-                    try:
-                        # セッション状態ではなくグローバル変数のキューを使用
-                        global_progress_queue.put(message)
-                        st.session_state.current_progress = message
-                        if DEBUG:
-                            print(f"進捗状況をキューに追加: '{message}'")
-                    except Exception as e:
-                        if DEBUG:
-                            print(f"進捗報告エラー: {str(e)}")
-
-                # 検索モジュールの関数をオーバーライド
-                import utils.parallel_search
-
-                utils.parallel_search.report_progress = report_progress
-
-                # 初期進捗状況
-                report_progress("🔍 キャンプ場を検索中...")
-
-                # 検索を実行（同期的に）
-                with st.spinner("キャンプ場を検索しています..."):
-                    search_results = utils.parallel_search.search_and_analyze(query, preferences, facilities_required)
-
-                    # 検索結果をセッション状態に設定
-                    st.session_state.search_results = search_results
-                    st.session_state.campsites = search_results.get("results", [])
-                    st.session_state.summary = search_results.get("summary", "")
-                    st.session_state.featured = search_results.get("featured_campsites", [])
-                    st.session_state.popular = search_results.get("popular_campsites", [])
-                    st.session_state.search_executed = True
-                    st.session_state.search_in_progress = False
-
-                    # 完了メッセージ
-                    report_progress(
-                        f"✅ 検索が完了しました！{len(search_results.get('results', []))}件のキャンプ場が見つかりました。AIで分析しておすすめのキャンプ場をピックアップします！"
-                    )
-
-                    if DEBUG:
-                        print(f"検索完了: {len(st.session_state.campsites)}件のキャンプ場が見つかりました")
-                        print(f"特集キャンプ場: {len(st.session_state.featured)}件")
-                        print(f"人気キャンプ場: {len(st.session_state.popular)}件")
-
-                        # 写真URLと口コミ分析の確認
-                        if st.session_state.campsites:
-                            first_campsite = st.session_state.campsites[0]
-                            print(f"最初のキャンプ場: {first_campsite.get('name')}")
-                            print(f"写真URL: {first_campsite.get('photo_urls', [])[:1]}")
-                            print(f"メイン画像URL: {first_campsite.get('image_url', 'なし')}")
-                            print(f"AIおすすめ: {first_campsite.get('ai_recommendation', 'なし')[:50]}...")
-                            print(f"口コミ分析: {first_campsite.get('review_summary', 'なし')[:50]}...")
-
-                # 検索結果を表示するために画面を更新
-                st.rerun()
-
-            except Exception as e:
-                # エラーが発生した場合
-                print(f"検索処理エラー: {str(e)}")
-                import traceback
-
-                print(traceback.format_exc())
-
-                # エラーメッセージを報告
-                try:
-                    if "progress_queue" in st.session_state and st.session_state.progress_queue is not None:
-                        st.session_state.progress_queue.put(f"❌ 検索中にエラーが発生しました: {str(e)}")
-                        st.session_state.search_in_progress = False
-                        st.session_state.search_executed = False
-                except:
-                    pass
-
-                # エラーメッセージをチャットに表示
-                error_message = "検索中にエラーが発生しました。もう一度お試しください。"
-                st.session_state.messages.append({"role": "assistant", "content": error_message})
+                get_search_executor().submit(
+                    iter_search_and_analyze, query, preferences, facilities_required, progress_channel, job_id=job_id
+                )
+                st.session_state.search_job_id = job_id
+                st.session_state.search_executed = True
+                st.session_state.search_results = None
+            except JobRejectedError as e:
+                # 混み合っている場合は受け付けずにすぐ知らせる
+                close_progress_channel(st.session_state.session_id, job_id)
+                st.session_state.messages.append({"role": "assistant", "content": f"⚠️ {str(e)}"})
+                st.session_state.search_in_progress = False
+                st.session_state.search_executed = False
                 st.rerun()
 
         except Exception as e:
@@ -547,184 +513,97 @@ if "search_in_progress" in st.session_state and st.session_state.search_in_progr
             st.session_state.search_executed = False
             st.rerun()
 
-    # 自動更新（0.5秒ごと）
-    time.sleep(0.5)
-    st.rerun()
-
-    # 検索結果を表示（検索実行後）
-    if st.session_state.search_performed and st.session_state.campsites and st.session_state.show_results:
-        # 検索結果がある場合
-        if st.session_state.campsites:
-            # 検索結果のタブを作成
-            tab1, tab2, tab3 = st.tabs(["📋 検索結果", "🗺️ 地図", "📚 関連記事"])
-
-            with tab1:
-                # 検索結果の表示
-                display_search_results()
-
-            with tab2:
-                # 地図表示
-                display_map(st.session_state.campsites)
-
-            with tab3:
-                # 関連記事の表示
-                st.subheader("📚 関連記事・特集")
-                st.write("検索内容に関連する特集記事やまとめ記事です。参考にしてキャンプ計画を立ててみましょう。")
-
-                # 関連記事を取得
-                if "search_query" in st.session_state:
-                    query = st.session_state.search_query
-
-                    with st.spinner("関連記事を検索中..."):
-                        # 関連記事を検索
-                        related_articles = search_related_articles(query)
-
-                    # 関連記事を表示
-                    if related_articles:
-                        # 記事カードのスタイル
-                        st.markdown(
-                            """
-                        <style>
-                        .article-card {
-                            border: 1px solid #ddd;
-                            border-radius: 5px;
-                            padding: 10px;
-                            margin-bottom: 10px;
-                            background-color: #f9f9f9;
-                        }
-                        .article-title {
-                            font-size: 18px;
-                            font-weight: bold;
-                            margin-bottom: 5px;
-                        }
-                        .article-source {
-                            color: #666;
-                            font-size: 14px;
-                            margin-bottom: 10px;
-                        }
-                        .article-summary {
-                            margin-bottom: 10px;
-                        }
-                        </style>
-                        """,
-                            unsafe_allow_html=True,
-                        )
-
-                        for i, article in enumerate(related_articles):
-                            # Expanderのタイトルを短くして見やすくする
-                            title_display = article["title"]
-                            if len(title_display) > 60:
-                                title_display = title_display[:57] + "..."
-
-                            with st.expander(f"{title_display}", expanded=i == 0):
-                                # 記事タイトルを完全に表示（Expander内）
-                                st.markdown(f"### {article['title']}")
-                                st.markdown(f"**出典**: {article['source']}")
-
-                                # 要約を表示（テキストエリアで表示して見切れないようにする）
-                                st.markdown("**要約**:")
-                                # テキストエリアを使用して長いテキストを表示（高さを調整）
-                                summary_text = article["summary"]
-                                st.text_area("", summary_text, height=200, label_visibility="collapsed")
-
-                                # 公開日があれば表示
-                                if "published_date" in article:
-                                    try:
-                                        # 日付形式を整形
-                                        from datetime import datetime
-
-                                        date_obj = datetime.fromisoformat(
-                                            article["published_date"].replace("Z", "+00:00")
-                                        )
-                                        formatted_date = date_obj.strftime("%Y年%m月%d日")
-                                        st.markdown(f"**公開日**: {formatted_date}")
-                                    except:
-                                        pass
-
-                                # リンクボタン
-                                col1, col2 = st.columns(2)
-                                with col1:
-                                    st.markdown(f"[🔗 記事を読む]({article['url']})")
-                                with col2:
-                                    st.markdown(
-                                        f"[🔍 Googleで検索](https://www.google.com/search?q={urllib.parse.quote(article['title'])})"
-                                    )
-                    else:
-                        st.info(f"「{query}」に関連する記事が見つかりませんでした。")
-                else:
-                    st.warning("条件に合うキャンプ場が見つかりませんでした。検索条件を変更してお試しください。")
-
-    # 入力欄を最下層に固定表示するためのスタイル
-    st.markdown(
-        """
-        <style>
-        .fixed-input {
-            position: fixed;
-            bottom: 0;
-            left: 0;
-            right: 0;
-            padding: 1rem;
-            background-color: white;
-            box-shadow: 0px -2px 10px rgba(0, 0, 0, 0.1);
-            z-index: 1000;
-        }
-        .main .block-container {
-            padding-bottom: 5rem;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
-
-    # 空のスペースを追加して、固定入力欄の下に余白を作る
-    st.markdown("<div style='height: 3rem;'></div>", unsafe_allow_html=True)
+    # 検索ジョブの途中経過を表示（1回の実行ではジョブの現在の状態を1度だけ描画する）
+    # ジョブが完了していない場合は、スクリプトの最後で次のイベントが届くまで待ってから再実行する
+    if st.session_state.search_in_progress and st.session_state.search_executed:
+        job_id = st.session_state.get("search_job_id")
+        executor = get_search_executor()
 
-    # 固定入力欄のコンテナ
-    with st.container():
-        st.markdown("<div class='fixed-input'>", unsafe_allow_html=True)
-        # ユーザー入力
-        user_input = st.chat_input("キャンプ場について質問してください...")
-        st.markdown("</div>", unsafe_allow_html=True)
-
-        # ユーザーからの入力があった場合の処理
-        if user_input:
-            # デバッグ出力
+        if not job_id or executor.get_status(job_id) is None:
+            # ジョブが見つからない場合（サーバーの再起動など）は状態を戻す
             if DEBUG:
-                print(f"\n===== ユーザー入力: '{user_input}' =====")
-                print("検索処理を開始します...")
-
-            # ユーザーのメッセージをチャット履歴に追加
-            st.session_state.messages.append({"role": "user", "content": user_input})
+                print(f"検索ジョブが見つからないため、検索状態をリセットします: {job_id}")
+            st.session_state.search_in_progress = False
+            st.session_state.search_executed = False
+            st.session_state.search_job_id = None
+            st.session_state.current_progress = None
+            st.info("検索が中断されました。もう一度質問してください。")
+        else:
+            progress_channel = get_progress_channel(st.session_state.session_id, job_id)
+
+            # 前回の実行以降に届いた進捗メッセージのうち最新のものを反映する
+            apply_progress_messages(progress_channel)
+
+            # 前回の実行以降に届いたイベントをプレビューの状態に反映する
+            # （写真・口コミ分析のイベントはキャンプ場データを直接更新するので再描画するだけでよい）
+            preview = st.session_state.search_preview
+            if preview.get("job_id") != job_id:
+                preview = {"job_id": job_id, "cursor": 0, "campsites": [], "summary": ""}
+                st.session_state.search_preview = preview
+
+            events, status = executor.get_events(job_id, preview["cursor"])
+            preview["cursor"] += len(events)
+            preview["status"] = status
+            for event in events:
+                if event["type"] == EVENT_SUMMARY_CHUNK:
+                    preview["summary"] += event["text"]
+                elif event["type"] in (EVENT_RAW_RESULTS, EVENT_RANKED_RESULTS):
+                    preview["campsites"] = event["campsites"]
+
+            # 要約は届いた部分まで、キャンプ場は最新の順位で表示する
+            if preview["summary"]:
+                render_streaming_summary(preview["summary"], streaming=status not in FINISHED_STATUSES)
+            if preview["campsites"]:
+                render_search_preview(preview["campsites"])
+
+            if status in FINISHED_STATUSES:
+                # ジョブの結果を取得
+                result_event = executor.get_result(job_id)
+                search_results = None
+                if result_event and result_event.get("type") == EVENT_COMPLETE:
+                    search_results = result_event["result"]
+
+                st.session_state.search_job_id = None
+                close_progress_channel(st.session_state.session_id, job_id)
+
+                if status == JOB_CANCELLED or (search_results or {}).get("cancelled"):
+                    # 中止された検索の結果は表示しない
+                    if DEBUG:
+                        print(f"検索ジョブが中止されました: {job_id}")
+                    st.session_state.search_in_progress = False
+                    st.session_state.search_executed = False
+                    st.session_state.current_progress = None
+                    st.rerun()
 
-            # 検索開始メッセージを表示
-            start_message = "🔎 キャンプ場を検索中です。少々お待ちください..."
-            st.session_state.messages.append({"role": "assistant", "content": start_message})
+                if search_results is None:
+                    # エラーが発生した場合
+                    job_status = executor.get_status(job_id) or {}
+                    print(f"検索処理エラー: {job_status.get('error')}")
 
-            # 検索状態を設定
-            st.session_state.search_in_progress = True
-            st.session_state.search_executed = False
+                    st.session_state.current_progress = f"❌ 検索中にエラーが発生しました: {job_status.get('error')}"
+                    st.session_state.search_in_progress = False
+                    st.session_state.search_executed = False
 
-            # 検索クエリを保存
-            st.session_state.search_query = user_input
+                    # エラーメッセージをチャットに表示
+                    error_message = "検索中にエラーが発生しました。もう一度お試しください。"
+                    st.session_state.messages.append({"role": "assistant", "content": error_message})
+                    st.rerun()
 
-            # 進捗状況を明示的に設定
-            st.session_state.current_progress = "キャンプ場を検索しています..."
+                # 検索結果をセッション状態に設定（再実行後に結果として表示する）
+                st.session_state.search_results = search_results
 
-            # 進捗状況の初期化
-            st.session_state.current_progress = start_message
+                # 完了メッセージ
+                completion_message = f"✅ 検索が完了しました！{len(search_results.get('results', []))}件のキャンプ場が見つかりました。AIで分析しておすすめのキャンプ場をピックアップします！"
+                st.session_state.current_progress = completion_message
+                st.session_state.messages[-1]["content"] = completion_message
 
-            # 進捗キューをクリア
-            try:
-                while not global_progress_queue.empty():
-                    global_progress_queue.get()
-                if DEBUG:
-                    print("進捗キューをクリアしました")
-            except Exception as e:
                 if DEBUG:
-                    print(f"進捗キュークリアエラー: {str(e)}")
+                    print(f"検索完了: {len(search_results.get('results', []))}件のキャンプ場が見つかりました")
+                    print(f"特集キャンプ場: {len(search_results.get('featured_campsites', []))}件")
+                    print(f"人気キャンプ場: {len(search_results.get('popular_campsites', []))}件")
 
-            # 画面を更新して検索開始メッセージを表示
-            st.rerun()
+                # 検索結果を表示するために画面を更新
+                st.rerun()
 
 
 # キャンプ場カードを表示する関数
@@ -789,13 +668,25 @@ def display_campsite_card(campsite, index=None):
             print(f"キャンプ場データキー: {campsite.keys()}")
 
     with col2:
-        website_url = campsite.get("websiteUri", "") or campsite.get("website_url", "")
+        # Places APIにウェブサイトがない場合は、検索で見つけた公式サイトを使う
+        website_url = (
+            campsite.get("websiteUri", "")
+            or campsite.get("website_url", "")
+            or (campsite.get("official_site") or {}).get("link", "")
+        )
         if website_url:
             st.markdown(f"[🌐 公式サイト]({website_url})")
         elif DEBUG:
             st.write("公式サイトリンクなし")
             print(f"公式サイトリンクなし: {campsite.get('name')}")
 
+    # 口コミサイト
+    review_sites = campsite.get("review_sites", [])
+    if review_sites:
+        st.markdown("**📝 口コミサイト:**")
+        for review_site in review_sites:
+            st.markdown(f"- [{review_site.get('title') or review_site.get('displayLink', '')}]({review_site.get('link', '')})")
+
     # AIのおすすめポイント
     ai_recommendation = campsite.get("ai_recommendation", "")
     if ai_recommendation:
@@ -951,12 +842,13 @@ def execute_search():
     st.success(f"検索が完了しました！{len(st.session_state.campsites)}件のキャンプ場が見つかりました。")
 
 
-def search_related_articles(query):
+def search_related_articles(query, enhance_summaries=True):
     """
     検索クエリに関連する記事を検索する関数
 
     Args:
         query (str): 検索クエリ
+        enhance_summaries (bool, optional): 要約を改善するかどうか
 
     Returns:
         list: 関連記事のリスト
@@ -966,7 +858,7 @@ def search_related_articles(query):
             print(f"関連記事検索: クエリ='{query}'")
 
         # web_search.pyの関数を使用して関連記事を検索
-        results = web_search_articles(query, max_results=5, enhance_summaries=True)
+        results = web_search_articles(query, max_results=5, enhance_summaries=enhance_summaries)
         return results
 
     except Exception as e:
@@ -975,6 +867,94 @@ def search_related_articles(query):
         return []
 
 
+def display_related_articles(query):
+    """
+    関連記事を表示する関数
+    検索ジョブで取得した関連記事を表示する。保存されていない場合だけ一度検索してセッション状態に保存し、
+    画面の再実行では検索や要約の改善を行わない
+
+    Args:
+        query (str): 検索クエリ
+    """
+    stored = st.session_state.get("related_articles")
+    if not stored or stored.get("query") != query:
+        with st.spinner("関連記事を検索中..."):
+            # 検索ジョブの結果に関連記事がない場合だけ検索する（要約は改善せず検索結果の抜粋を使う）
+            stored = {"query": query, "articles": search_related_articles(query, enhance_summaries=False)}
+        st.session_state.related_articles = stored
+
+    related_articles = stored["articles"]
+
+    if not related_articles:
+        st.info(f"「{query}」に関連する記事が見つかりませんでした。")
+        return
+
+    # 記事カードのスタイル
+    st.markdown(
+        """
+    <style>
+    .article-card {
+        border: 1px solid #ddd;
+        border-radius: 5px;
+        padding: 10px;
+        margin-bottom: 10px;
+        background-color: #f9f9f9;
+    }
+    .article-title {
+        font-size: 18px;
+        font-weight: bold;
+        margin-bottom: 5px;
+    }
+    .article-source {
+        color: #666;
+        font-size: 14px;
+        margin-bottom: 10px;
+    }
+    .article-summary {
+        margin-bottom: 10px;
+    }
+    </style>
+    """,
+        unsafe_allow_html=True,
+    )
+
+    for i, article in enumerate(related_articles):
+        # Expanderのタイトルを短くして見やすくする
+        title_display = article["title"]
+        if len(title_display) > 60:
+            title_display = title_display[:57] + "..."
+
+        with st.expander(f"{title_display}", expanded=i == 0):
+            # 記事タイトルを完全に表示（Expander内）
+            st.markdown(f"### {article['title']}")
+            st.markdown(f"**出典**: {article['source']}")
+
+            # 要約を表示（テキストエリアで表示して見切れないようにする）
+            st.markdown("**要約**:")
+            st.text_area("", article["summary"], height=200, label_visibility="collapsed")
+
+            # 公開日があれば表示
+            if "published_date" in article:
+                try:
+                    # 日付形式を整形
+                    from datetime import datetime
+
+                    date_obj = datetime.fromisoformat(article["published_date"].replace("Z", "+00:00"))
+                    formatted_date = date_obj.strftime("%Y年%m月%d日")
+                    st.markdown(f"**公開日**: {formatted_date}")
+                except:
+                    pass
+
+            # リンクボタン
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown(f"[🔗 記事を読む]({article['url']})")
+            with col2:
+                st.markdown(
+                    f"[🔍 Googleで検索](https://www.google.com/search?q={urllib.parse.quote(article['title'])})"
+                )
+
+
 def display_search_results():
     """検索結果を表示する関数"""
     # 検索が実行されていない場合は何も表示しない
@@ -1035,121 +1015,83 @@ def display_search_results():
 
         # 関連記事を取得
         if "search_query" in st.session_state:
-            query = st.session_state.search_query
+            display_related_articles(st.session_state.search_query)
+        else:
+            st.info("検索クエリがありません。キャンプ場を検索すると、関連記事が表示されます。")
 
-            with st.spinner("関連記事を検索中..."):
-                # 関連記事を検索
-                related_articles = search_related_articles(query)
 
-            # 関連記事を表示
-            if related_articles:
-                # 記事カードのスタイル
-                st.markdown(
-                    """
-                <style>
-                .article-card {
-                    border: 1px solid #ddd;
-                    border-radius: 5px;
-                    padding: 10px;
-                    margin-bottom: 10px;
-                    background-color: #f9f9f9;
-                }
-                .article-title {
-                    font-size: 18px;
-                    font-weight: bold;
-                    margin-bottom: 5px;
-                }
-                .article-source {
-                    color: #666;
-                    font-size: 14px;
-                    margin-bottom: 10px;
-                }
-                .article-summary {
-                    margin-bottom: 10px;
-                }
-                </style>
-                """,
-                    unsafe_allow_html=True,
-                )
+def cancel_running_search():
+    """
+    実行中の検索ジョブを中止する関数（新しい入力が送信されたときに、スクリプトの再実行より前に呼ばれる）
+    検索中の状態も戻し、再実行で古いジョブの途中経過や結果を表示しないようにする
+    """
+    job_id = st.session_state.get("search_job_id")
+    if not job_id:
+        return
 
-                for i, article in enumerate(related_articles):
-                    # Expanderのタイトルを短くして見やすくする
-                    title_display = article["title"]
-                    if len(title_display) > 60:
-                        title_display = title_display[:57] + "..."
-
-                    with st.expander(f"{title_display}", expanded=i == 0):
-                        # 記事タイトルを完全に表示（Expander内）
-                        st.markdown(f"### {article['title']}")
-                        st.markdown(f"**出典**: {article['source']}")
-
-                        # 要約を表示（テキストエリアで表示して見切れないようにする）
-                        st.markdown("**要約**:")
-                        # テキストエリアを使用して長いテキストを表示（高さを調整）
-                        summary_text = article["summary"]
-                        st.text_area("", summary_text, height=200, label_visibility="collapsed")
-
-                        # 公開日があれば表示
-                        if "published_date" in article:
-                            try:
-                                # 日付形式を整形
-                                from datetime import datetime
-
-                                date_obj = datetime.fromisoformat(article["published_date"].replace("Z", "+00:00"))
-                                formatted_date = date_obj.strftime("%Y年%m月%d日")
-                                st.markdown(f"**公開日**: {formatted_date}")
-                            except:
-                                pass
-
-                        # リンクボタン
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.markdown(f"[🔗 記事を読む]({article['url']})")
-                        with col2:
-                            st.markdown(
-                                f"[🔍 Googleで検索](https://www.google.com/search?q={urllib.parse.quote(article['title'])})"
-                            )
-            else:
-                st.info(f"「{query}」に関連する記事が見つかりませんでした。")
-        else:
-            st.info("検索クエリがありません。キャンプ場を検索すると、関連記事が表示されます。")
+    get_search_executor().cancel(job_id)
+    close_progress_channel(st.session_state.session_id, job_id)
+
+    st.session_state.search_job_id = None
+    st.session_state.search_in_progress = False
+    st.session_state.search_executed = False
+    st.session_state.current_progress = None
+
+    if DEBUG:
+        print(f"新しい入力のため検索ジョブを中止しました: {job_id}")
+
+
+def wait_for_search_updates(job_id, progress_placeholder):
+    """
+    実行中の検索ジョブに新しいイベントが届くか、ジョブの状態が変わるまで待ち、画面を再実行する関数
+    待っている間に届いた進捗メッセージは、画面全体ではなく進捗表示エリアだけを書き換えて表示する
+    （書き換えのたびに新しい入力の有無も確認され、入力があればその入力による再実行が優先される）
+
+    Args:
+        job_id (str): 検索ジョブID
+        progress_placeholder: 進捗表示エリア（st.empty()）
+    """
+    # このジョブの状態をまだ描画していない場合は、すぐに再実行して描画する
+    preview = st.session_state.search_preview
+    if preview.get("job_id") != job_id:
+        preview = {"cursor": 0, "status": None}
+
+    progress_channel = get_progress_channel(st.session_state.session_id, job_id)
+
+    def refresh_progress():
+        apply_progress_messages(progress_channel)
+        if st.session_state.current_progress:
+            progress_placeholder.info(st.session_state.current_progress)
+
+    events, status = get_search_executor().wait_for_update(
+        job_id,
+        preview["cursor"],
+        preview.get("status"),
+        timeout=SEARCH_PROGRESS_REFRESH_INTERVAL,
+        on_idle=refresh_progress,
+    )
+
+    if DEBUG:
+        print(f"検索ジョブの更新: 新しいイベント {len(events)}件 / 状態 {status}")
+
+    st.rerun()
 
 
 # メイン関数
 def main():
-    """メイン関数"""
+    """
+    メイン関数
+
+    Returns:
+        進捗表示エリア（st.empty()。検索中に進捗メッセージだけを書き換えるために使う）
+    """
     st.title("🏕️ CampCompanion")
     st.subheader("理想のキャンプ場を見つける旅へ")
 
-    # 現在の進捗状況があれば表示
-    try:
-        # グローバル変数からキューを取得
-        # キューにメッセージがあれば取得（ブロックしない）
-        while not global_progress_queue.empty():
-            try:
-                progress_message = global_progress_queue.get(block=False)
-                st.session_state.current_progress = progress_message
-                if DEBUG:
-                    print(f"進捗状況を更新: current_progress = '{progress_message}'")
-            except Exception as e:
-                if DEBUG:
-                    print(f"キュー処理エラー: {str(e)}")
-                break
-    except Exception as e:
-        if DEBUG:
-            print(f"キュー処理エラー: {str(e)}")
-
-    # 進捗状況を表示
+    # 進捗状況を表示（検索中に届いた進捗メッセージはこの領域だけを書き換える）
+    progress_placeholder = st.empty()
     if "current_progress" in st.session_state and st.session_state.current_progress:
-        progress_message = st.session_state.current_progress
-        if progress_message:
-            if "search_in_progress" in st.session_state and st.session_state.search_in_progress:
-                with st.spinner(progress_message):
-                    # 検索中はスピナーを表示し続ける
-                    st.info(progress_message)
-            else:
-                # 検索が完了したらスピナーなしで表示
-                st.info(progress_message)
+        progress_placeholder.info(st.session_state.current_progress)
 
     # 選択されたキャンプ場の詳細を表示
     if "selected_campsite" in st.session_state:
@@ -1160,8 +1102,8 @@ def main():
         if st.button("検索結果に戻る", key="back_to_results"):
             del st.session_state.selected_campsite
             st.rerun()
-    else:
-        # 検索結果を表示
+    elif not st.session_state.get("search_in_progress"):
+        # 検索結果を表示（検索中は途中経過のプレビューを表示しているので表示しない）
         display_search_results()
 
     # 入力欄を最下層に固定表示するためのスタイル
@@ -1193,7 +1135,7 @@ def main():
     with st.container():
         st.markdown("<div class='fixed-input'>", unsafe_allow_html=True)
         # ユーザー入力
-        user_input = st.chat_input("キャンプ場について質問してください...")
+        user_input = st.chat_input("キャンプ場について質問してください...", on_submit=cancel_running_search)
         st.markdown("</div>", unsafe_allow_html=True)
 
         # ユーザーからの入力があった場合の処理
@@ -1223,20 +1165,16 @@ def main():
             # 進捗状況の初期化
             st.session_state.current_progress = start_message
 
-            # 進捗キューをクリア
-            try:
-                while not global_progress_queue.empty():
-                    global_progress_queue.get()
-                if DEBUG:
-                    print("進捗キューをクリアしました")
-            except Exception as e:
-                if DEBUG:
-                    print(f"進捗キュークリアエラー: {str(e)}")
-
             # 画面を更新して検索開始メッセージを表示
             st.rerun()
 
+    return progress_placeholder
+
 
 # アプリケーションの実行
 if __name__ == "__main__":
-    main()
+    progress_placeholder = main()
+
+    # 検索ジョブの実行中は、画面と入力欄を描画し終えてから次のイベントが届くまで待ち、届いたときだけ再実行する
+    if st.session_state.get("search_job_id"):
+        wait_for_search_updates(st.session_state.search_job_id, progress_placeholder)
@@ -1,7 +1,176 @@
+import os
+import json
+import hashlib
 import streamlit as st
+import streamlit.components.v1 as components
 import folium
+from folium.plugins import FastMarkerCluster
 from streamlit_folium import folium_static
 import pandas as pd
+from dotenv import load_dotenv
+
+# 環境変数の読み込み
+load_dotenv()
+
+# この件数を超える場合は、1つのデータレイヤーにまとめてブラウザ側でクラスタリングする
+MAP_CLUSTER_THRESHOLD = int(os.getenv("MAP_CLUSTER_THRESHOLD", "200"))
+
+# 地図の表示サイズ
+MAP_WIDTH = 800
+MAP_HEIGHT = 500
+
+# 描画済みの地図のHTMLを保存するセッションのキー
+MAP_HTML_CACHE_KEY = "map_display_html_cache"
+
+# 大量表示用のマーカーを作成するJavaScriptの関数式
+# FastMarkerClusterは "var callback = <関数式>;" として埋め込むため、1つの式（即時関数が返す関数）にする
+# 各行は [緯度, 経度, 色, 半径, 名前, 評価, 住所, おすすめ度, 施設, 特徴, Google MapsのURL, 公式サイトのURL]
+# ポップアップの内容はクリックされたときに行のデータから作成する
+LAZY_MARKER_CALLBACK = """(function () {
+    var escapeHtml = function (value) {
+        return String(value === null || value === undefined ? "" : value).replace(/[&<>"']/g, function (c) {
+            return {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}[c];
+        });
+    };
+    var buildPopup = function (row) {
+        var rating = row[5] || 0;
+        var html = '<div style="width: 250px;">'
+            + '<h4>' + escapeHtml(row[4]) + '</h4>'
+            + '<p><b>評価:</b> ' + '⭐'.repeat(Math.floor(rating)) + ' (' + escapeHtml(rating) + ')</p>'
+            + '<p><b>住所:</b> ' + escapeHtml(row[6]) + '</p>';
+        if (row[7] !== null) {
+            html += '<p><b>おすすめ度:</b> ' + escapeHtml(row[7]) + '点</p>';
+        }
+        if (row[8]) {
+            html += '<p><b>施設:</b> ' + escapeHtml(row[8]) + '</p>';
+        }
+        if (row[9]) {
+            html += '<p><b>特徴:</b> ' + escapeHtml(row[9]) + '</p>';
+        }
+        html += '<p><a href="' + escapeHtml(row[10]) + '" target="_blank">Google Mapsで見る</a></p>';
+        if (row[11]) {
+            html += '<p><a href="' + escapeHtml(row[11]) + '" target="_blank">公式サイトを見る</a></p>';
+        }
+        return html + '</div>';
+    };
+    return function (row) {
+        var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+            radius: row[3],
+            color: row[2],
+            fill: true,
+            fillOpacity: 0.7
+        });
+        marker.bindTooltip(escapeHtml(row[4]));
+        marker.bindPopup(function () { return buildPopup(row); }, {maxWidth: 300});
+        return marker;
+    };
+})()"""
+
+def _marker_style(site):
+    """
+    評価とおすすめスコアからマーカーの色と半径を決める関数
+
+    Args:
+        site (dict): キャンプ場データ
+
+    Returns:
+        tuple: (色, 半径)
+    """
+    # 評価に基づいてマーカーの色を決定
+    rating = site.get("rating", 0)
+    if rating >= 4.5:
+        color = "darkgreen"  # 最高評価
+    elif rating >= 4.0:
+        color = "green"  # 高評価
+    elif rating >= 3.5:
+        color = "orange"  # 中評価
+    elif rating >= 3.0:
+        color = "lightred"  # やや低評価
+    else:
+        color = "lightgray"  # 低評価または評価なし
+
+    # おすすめスコアがある場合は、マーカーサイズを調整
+    if "score" in site:
+        score = site.get("score", 0)
+        radius = min(10 + (score / 2), 20)  # スコアに基づいてサイズを調整（最大20）
+    else:
+        radius = 10  # デフォルトサイズ
+
+    return color, radius
+
+
+def _maps_url(site):
+    """キャンプ場のGoogle MapsのURL（place_idがない場合は座標で検索する）"""
+    if site.get("place_id"):
+        return f"https://www.google.com/maps/place/?q=place_id:{site['place_id']}"
+    return f"https://www.google.com/maps/search/?api=1&query={site['location']['lat']},{site['location']['lng']}"
+
+
+def _marker_row(site):
+    """
+    大量表示用のデータレイヤーの1行を作成する関数（ポップアップのHTMLは作らず、元になる値だけを持つ）
+
+    Args:
+        site (dict): キャンプ場データ
+
+    Returns:
+        list: LAZY_MARKER_CALLBACK の行の形式のリスト
+    """
+    color, radius = _marker_style(site)
+    return [
+        round(float(site["location"]["lat"]), 6),
+        round(float(site["location"]["lng"]), 6),
+        color,
+        radius,
+        site.get("name", "不明"),
+        site.get("rating", 0),
+        site.get("address", "不明"),
+        site.get("score", 0) if "score" in site else None,
+        ", ".join(site.get("facilities") or [])[:100],
+        ", ".join(site.get("features") or [])[:100],
+        _maps_url(site),
+        site.get("website") or "",
+    ]
+
+
+def build_clustered_map_html(rows, center):
+    """
+    大量表示用のデータレイヤーの行から、クラスタリングする地図のHTMLを作成する関数
+
+    Args:
+        rows (list): _marker_row で作成した行のリスト
+        center (list): 地図の中心位置 [緯度, 経度]
+
+    Returns:
+        str: 地図のHTML
+    """
+    m = folium.Map(location=center, zoom_start=10)
+    FastMarkerCluster(rows, callback=LAZY_MARKER_CALLBACK, name="キャンプ場").add_to(m)
+    return folium.Figure().add_child(m).render()
+
+
+def _display_clustered_map(valid_locations, center):
+    """
+    大量のキャンプ場を1つのデータレイヤーとして地図に表示する関数
+    マーカーはブラウザ側でクラスタリングし、ポップアップはクリックされたときに作成する
+    同じデータの地図は描画済みのHTMLを再利用する
+
+    Args:
+        valid_locations (list): 位置情報のあるキャンプ場データのリスト
+        center (list): 地図の中心位置 [緯度, 経度]
+    """
+    rows = [_marker_row(site) for site in valid_locations]
+    data_hash = hashlib.sha256(json.dumps(rows, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    cached = st.session_state.get(MAP_HTML_CACHE_KEY)
+    if cached and cached[0] == data_hash:
+        html = cached[1]
+    else:
+        html = build_clustered_map_html(rows, center)
+        # 直近の1件だけを保存する
+        st.session_state[MAP_HTML_CACHE_KEY] = (data_hash, html)
+
+    components.html(html, height=MAP_HEIGHT + 10, width=MAP_WIDTH)
 
 
 def display_map(campsites):
@@ -58,30 +227,19 @@ def display_map(campsites):
     avg_lat = sum(site["location"]["lat"] for site in valid_locations) / len(valid_locations)
     avg_lng = sum(site["location"]["lng"] for site in valid_locations) / len(valid_locations)
 
+    # 件数が多い場合はクラスタリングして表示
+    if len(valid_locations) > MAP_CLUSTER_THRESHOLD:
+        if DEBUG:
+            print(f"クラスタリング表示: {len(valid_locations)}件")
+        _display_clustered_map(valid_locations, [avg_lat, avg_lng])
+        return
+
     # 地図を作成
     m = folium.Map(location=[avg_lat, avg_lng], zoom_start=10)
 
     # キャンプ場ごとにマーカーを追加
     for site in valid_locations:
-        # 評価に基づいてマーカーの色を決定
-        rating = site.get("rating", 0)
-        if rating >= 4.5:
-            color = "darkgreen"  # 最高評価
-        elif rating >= 4.0:
-            color = "green"  # 高評価
-        elif rating >= 3.5:
-            color = "orange"  # 中評価
-        elif rating >= 3.0:
-            color = "lightred"  # やや低評価
-        else:
-            color = "lightgray"  # 低評価または評価なし
-
-        # おすすめスコアがある場合は、マーカーサイズを調整
-        if "score" in site:
-            score = site.get("score", 0)
-            radius = min(10 + (score / 2), 20)  # スコアに基づいてサイズを調整（最大20）
-        else:
-            radius = 10  # デフォルトサイズ
+        color, radius = _marker_style(site)
 
         # ポップアップ内容を作成
         popup_html = f"""
@@ -104,14 +262,7 @@ def display_map(campsites):
             popup_html += f"<p><b>特徴:</b> {', '.join(site.get('features', []))[:100]}</p>"
 
         # Google Mapsリンク
-        if site.get("place_id"):
-            maps_url = f"https://www.google.com/maps/place/?q=place_id:{site['place_id']}"
-            popup_html += f'<p><a href="{maps_url}" target="_blank">Google Mapsで見る</a></p>'
-        else:
-            maps_url = (
-                f"https://www.google.com/maps/search/?api=1&query={site['location']['lat']},{site['location']['lng']}"
-            )
-            popup_html += f'<p><a href="{maps_url}" target="_blank">Google Mapsで見る</a></p>'
+        popup_html += f'<p><a href="{_maps_url(site)}" target="_blank">Google Mapsで見る</a></p>'
 
         # 公式サイトリンク
         if site.get("website"):
@@ -131,4 +282,4 @@ def display_map(campsites):
         ).add_to(m)
 
     # 地図を表示
-    folium_static(m, width=800, height=500)
+    folium_static(m, width=MAP_WIDTH, height=MAP_HEIGHT)
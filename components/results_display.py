@@ -193,6 +193,73 @@ def render_results(campsites):
                 show_detailed_info(site)
 
 
+def render_streaming_summary(summary, streaming=True):
+    """
+    生成中の要約を表示する関数
+    要約の一部が届くたびに呼び出し、届いた部分までを表示する
+
+    Args:
+        summary (str): 届いた部分までの要約テキスト
+        streaming (bool, optional): 生成中の場合はTrue（末尾にカーソルを表示する）
+    """
+    if not summary:
+        return
+
+    st.subheader("🔍 検索結果の要約")
+    st.markdown(summary + (" ▌" if streaming else ""))
+
+
+def render_search_preview(campsites, summary="", max_cards=6):
+    """
+    検索中の結果を簡易カードで表示する関数
+    検索結果が届いた時点で基本情報を表示し、写真や口コミ分析は取得できたものから表示する
+
+    Args:
+        campsites (list): キャンプ場データのリスト
+        summary (str, optional): 生成済みの要約テキスト
+        max_cards (int, optional): 表示する最大件数
+    """
+    render_streaming_summary(summary, streaming=False)
+
+    if not campsites:
+        st.info("キャンプ場を検索しています...")
+        return
+
+    st.subheader(f"🏕️ {len(campsites)}件のキャンプ場が見つかりました")
+
+    for site in campsites[:max_cards]:
+        cols = st.columns([1, 2])
+
+        with cols[0]:
+            # 写真は取得できたキャンプ場のみ表示
+            image_url = site.get("image_url", "")
+            if image_url:
+                try:
+                    st.image(image_url, use_column_width=True)
+                except Exception as e:
+                    pass
+
+        with cols[1]:
+            st.markdown(f"**{site.get('name', 'キャンプ場')}**")
+            st.write(f"⭐ {site.get('rating', 0)}/5.0 ({site.get('reviews_count', 0)}件の口コミ)")
+
+            # 地域と住所
+            location_text = " ".join(text for text in [site.get("region", ""), site.get("address", "")] if text)
+            if location_text:
+                st.write(f"📍 {location_text}")
+
+            # AIのおすすめポイントと口コミ分析（分析済みの場合のみ）
+            ai_recommendation = site.get("ai_recommendation", "")
+            if ai_recommendation:
+                st.markdown(f"**🤖 AIのおすすめポイント:** {ai_recommendation}")
+
+            review_summary = site.get("review_summary", "")
+            if review_summary:
+                st.markdown(f"**👥 口コミの分析:** {review_summary}")
+
+        st.markdown("---")
+
+
 def show_detailed_info(site):
     """
     キャンプ場の詳細情報を表示する関数
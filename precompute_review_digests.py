@@ -0,0 +1,56 @@
+"""
+口コミ分析結果を事前に作成して保存するスクリプト
+検索クエリごとにPlaces APIでキャンプ場を検索し、口コミが変わったキャンプ場と
+まだ分析結果がないキャンプ場だけをGemini APIでまとめて分析して保存します
+
+使い方:
+    python precompute_review_digests.py "富士山 キャンプ場" "長野 キャンプ場"
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+
+# 環境変数の読み込み
+load_dotenv()
+
+from utils.gemini_client import configure_gemini
+from utils.parallel_search import search_places_api
+from utils.review_analyzer import precompute_review_digests
+from utils.review_digest_store import get_review_digest_stats
+
+# 検索クエリを指定しない場合に分析するクエリ
+DEFAULT_QUERIES = [
+    "関東 キャンプ場",
+    "富士山 キャンプ場",
+    "長野 キャンプ場",
+    "北海道 キャンプ場",
+    "関西 キャンプ場",
+    "九州 キャンプ場",
+]
+
+
+def main():
+    """
+    メイン関数
+    """
+    if not os.getenv("GEMINI_API_KEY"):
+        print("警告: GEMINI_API_KEYが設定されていません。.envファイルに追加してください。")
+        return
+    configure_gemini(os.getenv("GEMINI_API_KEY"))
+
+    queries = sys.argv[1:] or DEFAULT_QUERIES
+    for query in queries:
+        campsites = search_places_api(query)
+        if not isinstance(campsites, list):
+            print(f"「{query}」の検索エラー: {campsites.get('error', '') if isinstance(campsites, dict) else campsites}")
+            continue
+
+        saved = precompute_review_digests(campsites)
+        print(f"「{query}」: {len(campsites)}件中 {saved}件の分析結果を保存済み")
+
+    print(f"統計: {get_review_digest_stats()}")
+
+
+if __name__ == "__main__":
+    main()
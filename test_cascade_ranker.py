@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+import utils.cascade_ranker as cascade_ranker
+from utils.cascade_ranker import heuristic_scores, is_decisive, plan_rerank, rank_by_heuristic, record_rerank_latency
+
+ORIGIN = {"lat": 35.4, "lng": 138.7}
+
+
+@pytest.fixture(autouse=True)
+def reset_round_seconds(monkeypatch):
+    """1巡にかかる時間の推定値と採点の設定を初期値に戻す（他のテストの記録を持ち込まない）"""
+    monkeypatch.setattr(cascade_ranker, "RERANK_ROUND_SECONDS", 8.0)
+    monkeypatch.setattr(cascade_ranker, "_round_seconds", 8.0)
+    monkeypatch.setattr(cascade_ranker, "RANKING_WEIGHTS", np.array([0.45, 0.2, 0.15, 0.2]))
+    monkeypatch.setattr(cascade_ranker, "RANKING_LATENCY_BUDGET", 25.0)
+    monkeypatch.setattr(cascade_ranker, "RERANK_MIN_K", 5)
+    monkeypatch.setattr(cascade_ranker, "RERANK_MAX_K", 24)
+
+
+def _ranked(scores):
+    """1段階目の点数が付いたテスト用の候補リストを作成する"""
+    return [{"name": f"キャンプ場{i}", "heuristic_score": score} for i, score in enumerate(scores)]
+
+
+def test_missing_features_are_excluded_from_weights():
+    """
+    値がない項目は、その候補では重みから除いて採点されることをテストする関数
+    """
+    campsites = [
+        # 評価だけがある候補は評価だけで採点される
+        {"name": "評価だけ", "rating": 4.0},
+        # テキストの一致と評価がある候補（座標がないので距離は除く）
+        {"name": "川沿いのキャンプ場", "rating": 5.0},
+        # 何も分からない候補は0点
+        {"name": "不明"},
+    ]
+
+    scores = heuristic_scores(campsites, {"features": []})
+    assert scores == pytest.approx([0.8, 1.0, 0.0])
+
+    scores = heuristic_scores(campsites, {"features": ["川"]}, location=ORIGIN)
+    assert scores[0] == pytest.approx(0.2 * 0.8 / (0.45 + 0.2))
+    assert scores[1] == pytest.approx((0.45 * 1.0 + 0.2 * 1.0) / (0.45 + 0.2))
+    assert scores[2] == 0.0
+
+
+def test_distance_is_scored_only_for_campsites_with_coordinates():
+    """
+    検索地点からの距離は座標のある候補だけに使われ、近い候補ほど点数が高いことをテストする関数
+    """
+    campsites = [
+        {"name": "遠い", "rating": 4.0, "location": {"lat": 36.4, "lng": 138.7}},
+        {"name": "近い", "rating": 4.0, "location": {"latitude": 35.41, "longitude": 138.7}},
+        {"name": "座標なし", "rating": 4.0},
+    ]
+
+    scores = heuristic_scores(campsites, None, location=ORIGIN)
+
+    assert scores[1] > scores[0]
+    # 座標のない候補は評価だけで採点され、距離0kmの扱いにはならない
+    assert scores[2] == pytest.approx(0.8)
+
+    ranked = rank_by_heuristic(campsites, None, location=ORIGIN)
+    assert ranked[0]["name"] == "近い"
+    assert ranked[0]["score"] == round(ranked[0]["heuristic_score"], 2)
+
+
+def test_decisive_margin_skips_rerank():
+    """
+    上位の点数の差がすべてmargin以上の場合だけ2段階目を省くことをテストする関数
+    """
+    assert is_decisive(_ranked([0.9, 0.7, 0.5, 0.3, 0.29]))
+    # 上位4件（上位3件とその次）の隣り合う差のうち1つでもmargin未満なら確定しない
+    assert not is_decisive(_ranked([0.9, 0.7, 0.5, 0.4]))
+    assert is_decisive(_ranked([0.5]))
+    assert is_decisive([])
+
+    assert plan_rerank(_ranked([0.9, 0.7, 0.5, 0.3] + [0.1] * 10), elapsed=0, workers=2, chunk_size=3) == (
+        0,
+        "上位の差が十分",
+    )
+    assert plan_rerank([], elapsed=0, workers=2, chunk_size=3) == (0, "候補なし")
+
+
+def test_budget_determines_k():
+    """
+    残り時間で実行できる巡数 × 1巡で評価できる件数から、2段階目で評価する候補数が決まることをテストする関数
+    """
+    candidates = _ranked([0.5] * 30)
+
+    # 残り20秒・1巡8秒 → 2巡 × 2並列 × 3件 = 12件
+    assert plan_rerank(candidates, elapsed=5, workers=2, chunk_size=3)[0] == 12
+    # 上限を超える場合は上限まで
+    assert plan_rerank(candidates, elapsed=0, workers=4, chunk_size=8)[0] == 24
+    # 候補数を超えない
+    assert plan_rerank(candidates[:7], elapsed=0, workers=4, chunk_size=8)[0] == 7
+    # 1巡も実行できない場合は評価しない
+    k, reason = plan_rerank(candidates, elapsed=20, workers=2, chunk_size=3)
+    assert k == 0
+    assert reason.startswith("残り時間不足")
+    # 下限に届かない場合も評価しない
+    assert plan_rerank(candidates, elapsed=15, workers=1, chunk_size=3)[0] == 0
+
+
+def test_recorded_latency_updates_k():
+    """
+    2段階目にかかった時間の記録で1巡の推定値が更新され、評価する候補数に反映されることをテストする関数
+    """
+    record_rerank_latency(2.0, rounds=2)
+    assert cascade_ranker.get_rerank_round_seconds() == pytest.approx(0.7 * 8.0 + 0.3 * 1.0)
+
+    # 不正な値は記録しない
+    record_rerank_latency(0, rounds=1)
+    record_rerank_latency(5.0, rounds=0)
+    assert cascade_ranker.get_rerank_round_seconds() == pytest.approx(5.9)
+
+    # 残り20秒・1巡5.9秒 → 3巡 × 2並列 × 3件 = 18件
+    assert plan_rerank(_ranked([0.5] * 30), elapsed=5, workers=2, chunk_size=3)[0] == 18
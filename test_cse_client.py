@@ -0,0 +1,159 @@
+import time
+import threading
+import pytest
+
+import utils.cse_client as cse_client
+
+
+class FakeResponse:
+    """requests.getの応答"""
+
+    def __init__(self, status_code=200, data=None, headers=None):
+        self.status_code = status_code
+        self._data = data if data is not None else {}
+        self.headers = headers or {}
+
+    def json(self):
+        return self._data
+
+
+class FakeApi:
+    """
+    requests.getの代わりに検索結果を返し、呼び出しを記録するスタブ
+    responseを設定した場合はその応答を返す
+    """
+
+    def __init__(self, total_results=100):
+        self.total_results = total_results
+        self.response = None
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None):
+        with self._lock:
+            self.calls.append(params)
+        if self.response is not None:
+            return self.response
+
+        start, num = params["start"], params["num"]
+        items = [
+            {"title": f"{params['q']}-{position}", "link": f"https://example.com/{position}"}
+            for position in range(start, min(start + num, self.total_results + 1))
+        ]
+        data = {"items": items, "searchInformation": {"totalResults": str(self.total_results)}, "queries": {}}
+        if start + num <= self.total_results:
+            data["queries"]["nextPage"] = [{"startIndex": start + num}]
+        return FakeResponse(data=data)
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """一時ディレクトリのキャッシュに切り替え、呼び出し間隔の調整と統計を初期化し、requests.getをスタブに置き換える"""
+    monkeypatch.setattr(cse_client, "CSE_CACHE_PATH", str(tmp_path / "cse_cache.sqlite3"))
+    monkeypatch.setattr(cse_client, "CSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(cse_client, "GOOGLE_API_KEY", "test-key")
+    monkeypatch.setattr(cse_client, "GOOGLE_CSE_ID", "test-cse")
+    monkeypatch.setattr(cse_client, "CSE_MAX_QPS", 0)
+    monkeypatch.setattr(cse_client, "CSE_DAILY_QUOTA", 100)
+    monkeypatch.setattr(cse_client, "_connection", None)
+    monkeypatch.setattr(cse_client, "_stats", {"hits": 0, "misses": 0, "requests": 0, "throttled": 0, "errors": 0})
+    monkeypatch.setattr(cse_client, "_next_request_at", 0.0)
+    monkeypatch.setattr(cse_client, "_cooldown_until", 0.0)
+
+    fake_api = FakeApi()
+    monkeypatch.setattr(cse_client.requests, "get", fake_api.get)
+    yield fake_api
+    if cse_client._connection is not None:
+        cse_client._connection.close()
+
+
+def test_cache_hit(api):
+    """
+    全角・半角や空白の違いだけのクエリは保存済みの応答を使い、APIを呼ばないことをテストする関数
+    """
+    first = cse_client.search_items("富士山　キャンプ場", 5)
+    second = cse_client.search_items(" 富士山 キャンプ場 ", 5)
+
+    assert second == first
+    assert len(api.calls) == 1
+    # 件数が違う場合は別の応答
+    cse_client.search_items("富士山 キャンプ場", 3)
+    assert len(api.calls) == 2
+
+    stats = cse_client.get_cse_stats()
+    assert stats["hits"] == 1 and stats["requests"] == 2
+
+
+def test_throttling(api, monkeypatch):
+    """
+    1秒あたりの呼び出し数の上限に収まるように、呼び出しの間隔を空けることをテストする関数
+    """
+    waits = []
+    monkeypatch.setattr(cse_client, "CSE_MAX_QPS", 10)
+    monkeypatch.setattr(cse_client.time, "sleep", waits.append)
+
+    for query in ("湖畔 キャンプ場", "高原 キャンプ場", "海 キャンプ場"):
+        cse_client.fetch_page(query)
+
+    assert len(api.calls) == 3
+    assert waits == [pytest.approx(0.1, abs=0.05), pytest.approx(0.2, abs=0.05)]
+
+
+def test_daily_quota_is_kept_in_sqlite(api, monkeypatch):
+    """
+    1日の呼び出し数の上限に達した後は、接続し直してもAPIを呼ばず、保存済みの応答だけを使うことをテストする関数
+    """
+    monkeypatch.setattr(cse_client, "CSE_DAILY_QUOTA", 2)
+
+    cse_client.fetch_page("湖畔 キャンプ場")
+    cse_client.fetch_page("高原 キャンプ場")
+    with pytest.raises(cse_client.CustomSearchQuotaError):
+        cse_client.fetch_page("海 キャンプ場")
+
+    # 呼び出し数はSQLiteに保存されているので、接続し直しても上限に達したまま
+    cse_client._connection.close()
+    monkeypatch.setattr(cse_client, "_connection", None)
+    with pytest.raises(cse_client.CustomSearchQuotaError):
+        cse_client.fetch_page("海 キャンプ場")
+
+    assert cse_client.fetch_page("湖畔 キャンプ場")["items"]
+    assert len(api.calls) == 2
+    assert cse_client.get_cse_stats()["throttled"] == 2
+
+
+def test_rate_limit_response_starts_cooldown(api):
+    """
+    呼び出し数の上限のエラー（429）を受けた後は、Retry-Afterの間APIを呼ばないことをテストする関数
+    """
+    api.response = FakeResponse(status_code=429, headers={"Retry-After": "30"})
+    with pytest.raises(cse_client.CustomSearchQuotaError):
+        cse_client.fetch_page("湖畔 キャンプ場")
+
+    assert cse_client._cooldown_until - time.time() == pytest.approx(30, abs=1)
+
+    api.response = None
+    with pytest.raises(cse_client.CustomSearchQuotaError):
+        cse_client.fetch_page("高原 キャンプ場")
+    assert len(api.calls) == 1
+
+    # 控える時間が過ぎた後は呼び出す
+    cse_client._cooldown_until = 0.0
+    assert cse_client.fetch_page("高原 キャンプ場")["items"]
+    assert len(api.calls) == 2
+
+
+def test_pages_are_merged_in_order(api):
+    """
+    10件を超える場合は残りのページを取得して順番通りにつなげ、総数を超えるページは取得しないことをテストする関数
+    """
+    items = cse_client.search_items("キャンプ場", 25)
+
+    assert [item["title"] for item in items] == [f"キャンプ場-{position}" for position in range(1, 26)]
+    assert sorted((params["start"], params["num"]) for params in api.calls) == [(1, 10), (11, 10), (21, 5)]
+
+    api.calls.clear()
+    api.total_results = 15
+    items = cse_client.search_items("静かな キャンプ場", 30)
+
+    assert len(items) == 15
+    assert sorted(params["start"] for params in api.calls) == [1, 11]
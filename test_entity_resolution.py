@@ -0,0 +1,93 @@
+from utils.entity_resolution import CampsiteResolver, name_similarity, normalize_campsite_name, resolve_campsites
+
+
+def _campsite(name, lat, lng, place_id=None, **fields):
+    """テスト用のキャンプ場データを作成する"""
+    campsite = {"name": name, "location": {"lat": lat, "lng": lng}, **fields}
+    if place_id:
+        campsite["place_id"] = place_id
+    return campsite
+
+
+def test_different_place_ids_are_not_merged_by_name():
+    """
+    正規化名が同じでも、異なるplace_idを持つキャンプ場はまとめないことをテストする関数
+    """
+    results = resolve_campsites(
+        ("places_api", [_campsite("森のキャンプ場", 35.50, 138.70, "place-a")]),
+        ("nearby", [_campsite("森のオートキャンプ場", 35.51, 138.70, "place-b")]),
+    )
+
+    assert sorted(site["place_id"] for site in results) == ["place-a", "place-b"]
+
+
+def test_contained_name_is_not_merged():
+    """
+    一方の名前が他方に含まれるだけの近くのキャンプ場はまとめないことをテストする関数
+    """
+    assert name_similarity(normalize_campsite_name("富士キャンプ場"), normalize_campsite_name("富士見高原キャンプ場")) < 0.5
+
+    results = resolve_campsites(
+        ("places_api", [_campsite("富士キャンプ場", 35.400, 138.700, "place-a")]),
+        ("nearby", [_campsite("富士見高原キャンプ場", 35.405, 138.700, "place-b")]),
+    )
+    assert len(results) == 2
+
+    # place_idがない場合も名前だけでまとめない
+    results = resolve_campsites(
+        ("places_api", [_campsite("富士キャンプ場", 35.400, 138.700)]),
+        ("web", [_campsite("富士見高原キャンプ場", 35.405, 138.700)]),
+    )
+    assert len(results) == 2
+
+
+def test_record_without_place_id_does_not_bridge_conflicting_place_ids():
+    """
+    place_idのないレコードを介して、異なるplace_idのキャンプ場がまとめられないことをテストする関数
+    """
+    resolver = CampsiteResolver()
+    resolver.add("places_api", [_campsite("森のキャンプ場", 35.50, 138.70, "place-a")])
+    resolver.add("web", [_campsite("森のキャンプ場", 35.505, 138.70)])
+    resolver.add("nearby", [_campsite("森のキャンプ場", 35.51, 138.70, "place-b")])
+
+    results = resolver.campsites()
+    assert resolver.entity_count == 2
+    assert sorted(site["place_id"] for site in results) == ["place-a", "place-b"]
+    assert results[0]["occurrence_count"] == 2
+
+
+def test_same_campsite_is_merged_across_sources():
+    """
+    同じplace_id・同じ名前のキャンプ場は優先順位の高いソースの値でまとめることをテストする関数
+    """
+    results = resolve_campsites(
+        ("gemini", [_campsite("ふもとっぱら", 35.40, 138.57, features=["富士山が見える"])]),
+        ("places_api", [_campsite("ふもとっぱらキャンプ場", 35.401, 138.571, "place-a", rating=4.5, features=["広い"])]),
+        ("nearby", [_campsite("ふもとっぱら オートキャンプ場", 35.401, 138.571, "place-a")]),
+    )
+
+    assert len(results) == 1
+    assert results[0]["name"] == "ふもとっぱらキャンプ場"
+    assert results[0]["rating"] == 4.5
+    assert results[0]["features"] == ["広い", "富士山が見える"]
+    assert results[0]["sources"] == ["places_api", "nearby", "gemini"]
+
+
+def test_record_without_coordinates_does_not_bridge_distant_campsites():
+    """
+    座標のないレコードを介して、同じ名前の離れたキャンプ場がまとめられないことをテストする関数
+    """
+    results = resolve_campsites(
+        ("web", [{"name": "大山キャンプ場"}]),
+        (
+            "gemini",
+            [
+                {"name": "大山キャンプ場", "location": {"lat": 35.4, "lng": 133.5}},
+                {"name": "大山キャンプ場", "location": {"lat": 35.43, "lng": 139.23}},
+            ],
+        ),
+    )
+
+    assert len(results) == 2
+    assert sorted(site["occurrence_count"] for site in results) == [1, 2]
+    assert {site["location"]["lng"] for site in results} == {133.5, 139.23}
@@ -0,0 +1,147 @@
+import threading
+import types
+import pytest
+
+import utils.gemini_client as gemini_client
+
+# 前置きの最小トークン数をテスト用に下げたときに、登録の対象になる前置き
+LONG_PREFIX = "キャンプ場の口コミを分析してください。" * 10
+
+
+class FakeCachedContent:
+    """コンテキストキャッシュの代わりに使うクラス（登録と削除の回数を数える）"""
+
+    created = []
+    deleted = []
+    fail = False
+    before_create = None
+
+    def __init__(self, contents):
+        self.contents = contents
+
+    @classmethod
+    def create(cls, model, contents, ttl):
+        if cls.before_create is not None:
+            cls.before_create()
+        if cls.fail:
+            raise RuntimeError("登録エラー")
+        cached_content = cls(contents)
+        cls.created.append(cached_content)
+        return cached_content
+
+    def delete(self):
+        FakeCachedContent.deleted.append(self)
+
+
+class FakeGenerativeModel:
+    """GenerativeModelの代わりに使うクラス"""
+
+    def __init__(self, model_name=None, generation_config=None, cached_content=None):
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.cached_content = cached_content
+
+    @classmethod
+    def from_cached_content(cls, cached_content, generation_config=None):
+        return cls(generation_config=generation_config, cached_content=cached_content)
+
+
+@pytest.fixture
+def stub_sdk(monkeypatch):
+    """google-generativeaiをコンテキストキャッシュに対応したスタブに置き換える"""
+    FakeCachedContent.created = []
+    FakeCachedContent.deleted = []
+    FakeCachedContent.fail = False
+    FakeCachedContent.before_create = None
+
+    fake_genai = types.SimpleNamespace(GenerativeModel=FakeGenerativeModel, configure=lambda api_key: None)
+    monkeypatch.setattr(gemini_client, "genai", fake_genai)
+    monkeypatch.setattr(gemini_client, "caching", types.SimpleNamespace(CachedContent=FakeCachedContent))
+    monkeypatch.setattr(gemini_client, "GEMINI_CONTEXT_CACHE_ENABLED", True)
+    monkeypatch.setattr(gemini_client, "GEMINI_CONTEXT_CACHE_MIN_TOKENS", 50)
+    monkeypatch.setattr(gemini_client, "_configured_api_key", None)
+    monkeypatch.setattr(gemini_client, "_models", {})
+    monkeypatch.setattr(gemini_client, "_context_caches", {})
+    monkeypatch.setattr(gemini_client, "_context_cache_stats", {"created": 0, "reused": 0, "local": 0, "errors": 0})
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    return fake_genai
+
+
+def test_prefix_is_registered_once_and_reused(stub_sdk):
+    """
+    前置きは一度だけ登録され、生成設定ごとのモデルで再利用されることをテストする関数
+    """
+    model = gemini_client.get_prefix_cached_model(LONG_PREFIX, temperature=0.2)
+    again = gemini_client.get_prefix_cached_model(LONG_PREFIX, temperature=0.2)
+    other = gemini_client.get_prefix_cached_model(LONG_PREFIX, temperature=0.7)
+
+    assert model is again
+    assert other is not model
+    assert other.cached_content is model.cached_content
+    assert len(FakeCachedContent.created) == 1
+
+    stats = gemini_client.get_context_cache_stats()
+    assert stats["created"] == 1
+    assert stats["reused"] == 2
+    assert stats["entries"] == 1
+
+
+def test_short_prefix_and_unsupported_sdk_fall_back(stub_sdk, monkeypatch):
+    """
+    短い前置きや、コンテキストキャッシュに対応していないSDKでは登録せずNoneを返すことをテストする関数
+    """
+    assert gemini_client.get_prefix_cached_model("短い前置き") is None
+
+    monkeypatch.setattr(gemini_client, "caching", None)
+    assert not gemini_client.context_cache_supported()
+    assert gemini_client.get_prefix_cached_model(LONG_PREFIX) is None
+
+    assert FakeCachedContent.created == []
+    assert gemini_client.get_context_cache_stats()["local"] == 2
+
+
+def test_failed_registration_falls_back_to_local_prefix(stub_sdk):
+    """
+    登録に失敗した前置きは、有効期限まで再登録せずにNoneを返すことをテストする関数
+    """
+    FakeCachedContent.fail = True
+
+    assert gemini_client.get_prefix_cached_model(LONG_PREFIX) is None
+    assert gemini_client.get_prefix_cached_model(LONG_PREFIX) is None
+
+    stats = gemini_client.get_context_cache_stats()
+    assert stats["errors"] == 1
+    assert stats["local"] == 2
+
+
+def test_registration_does_not_hold_the_lock(stub_sdk):
+    """
+    登録の通信中も他のモデルを取得でき、同時に登録された場合は1つのキャッシュだけを使うことをテストする関数
+    """
+    started = threading.Event()
+    release = threading.Event()
+
+    def before_create():
+        started.set()
+        release.wait(5)
+
+    FakeCachedContent.before_create = before_create
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(gemini_client.get_prefix_cached_model(LONG_PREFIX)))
+        for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+
+    assert started.wait(5)
+    # 登録の途中でも、ロックを待たずに通常のモデルを取得できる
+    assert gemini_client.get_gemini_model(temperature=0.1) is not None
+
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(results) == 2
+    assert results[0].cached_content is results[1].cached_content
+    assert len(FakeCachedContent.created) - len(FakeCachedContent.deleted) == 1
@@ -0,0 +1,68 @@
+import pytest
+
+from utils.geocoding import find_location_in_query, LANDMARK_COORDINATES, LANDMARK_PREFECTURES, GAZETTEER
+
+
+def _name(query):
+    """クエリから見つかった地名（見つからない場合はNone）"""
+    location = find_location_in_query(query)
+    return location["name"] if location else None
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        # 名所は都道府県より優先する
+        ("静岡 富士山 キャンプ場", "富士山"),
+        ("長野 白馬 キャンプ場", "白馬"),
+        # クエリの都道府県と食い違う名所は使わない
+        ("神奈川の大山 キャンプ場", "神奈川県"),
+        ("宮城 伊豆沼 キャンプ場", "宮城県"),
+        ("大山 キャンプ場", "大山"),
+        # 省略形の都道府県と、先に出現する地名
+        ("静岡 キャンプ場", "静岡県"),
+        ("群馬か栃木 キャンプ場", "群馬県"),
+        ("丹沢大山 キャンプ場", "丹沢"),
+    ],
+)
+def test_landmark_and_prefecture_priority(query, expected):
+    """
+    名所を優先し、クエリに含まれる都道府県と食い違う名所は使わないことをテストする関数
+    """
+    assert _name(query) == expected
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        # 別の語の一部になっている名所は使わない
+        ("関西湖畔 キャンプ場", None),
+        # 「東京都府中」の「京都」「京都府」は別の都道府県として扱わない
+        ("東京都府中市 キャンプ場", "東京都"),
+        # 方角などの接頭辞が付いた名所と、地名に続く名所は使う
+        ("南伊豆 キャンプ場", "伊豆"),
+        ("奥日光 キャンプ場", "日光"),
+        ("山梨西湖 キャンプ場", "西湖"),
+    ],
+)
+def test_landmark_inside_other_words(query, expected):
+    """
+    短い名所や都道府県が別の語の一部として含まれている場合は使わないことをテストする関数
+    """
+    assert _name(query) == expected
+
+
+def test_gazetteer_entries():
+    """
+    地名辞書の名所にはすべて都道府県が設定され、見つけた位置情報の検索半径が名所と都道府県で異なることをテストする関数
+    """
+    assert set(LANDMARK_PREFECTURES) == set(LANDMARK_COORDINATES)
+    prefectures = {entry["name"] for name, entry in GAZETTEER.items() if name not in LANDMARK_COORDINATES}
+    for name, landmark_prefectures in LANDMARK_PREFECTURES.items():
+        assert set(landmark_prefectures) <= prefectures, name
+
+    landmark = find_location_in_query("河口湖 キャンプ場")
+    assert (landmark["lat"], landmark["lng"]) == LANDMARK_COORDINATES["河口湖"]
+    assert find_location_in_query("山梨 キャンプ場")["radius"] > landmark["radius"]
+    assert find_location_in_query("") is None
+    assert find_location_in_query("キャンプ場") is None
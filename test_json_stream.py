@@ -0,0 +1,124 @@
+import json
+import pytest
+
+from utils.json_stream import JSONArrayStreamParser, extract_json, iter_json_array, loads_tolerant, parse_json_array
+
+# Geminiの応答によくある形式（説明文・コードブロック・末尾のカンマ・文字列中の括弧やエスケープを含む）
+RESPONSE = """[注] 以下が分析結果です。
+```json
+[
+  {"name": "森の\\"キャンプ\\"場", "summary": "区画は広め[オート]で{静か}", "score": 4.5,},
+  {"name": "湖畔キャンプ場", "tags": ["釣り", "カヌー"], "note": "末尾に\\\\"},
+]
+```
+以上です。"""
+
+EXPECTED = [
+    {"name": '森の"キャンプ"場', "summary": "区画は広め[オート]で{静か}", "score": 4.5},
+    {"name": "湖畔キャンプ場", "tags": ["釣り", "カヌー"], "note": "末尾に\\"},
+]
+
+
+def _feed(chunks):
+    """パーサーに断片を順に渡し、要素が取り出された断片の番号と要素を返す"""
+    parser = JSONArrayStreamParser()
+    items = []
+    for index, chunk in enumerate(chunks):
+        items.extend((index, item) for item in parser.feed(chunk))
+    return parser, items
+
+
+def test_stream_parser_whole_response():
+    """
+    説明文・コードブロック・末尾のカンマ・文字列中の括弧やエスケープを含む応答から要素を取り出すことをテストする関数
+    """
+    parser, items = _feed([RESPONSE])
+
+    assert [item for _, item in items] == EXPECTED
+    assert parser.done
+    assert (parser.item_count, parser.error_count) == (2, 0)
+
+
+def test_stream_parser_char_by_char():
+    """
+    1文字ずつ届く応答でも、要素が閉じた時点で取り出されることをテストする関数
+    """
+    parser, items = _feed(list(RESPONSE))
+
+    assert [item for _, item in items] == EXPECTED
+    # 1つ目の要素は、閉じ括弧が届いた時点で取り出される
+    first_close = RESPONSE.index("4.5,}") + len("4.5,")
+    assert items[0][0] == first_close
+    assert parser.done
+
+
+def test_stream_parser_waits_for_character_after_bracket():
+    """
+    [ の次の文字が届くまで、配列か説明文中の括弧かの判定を待つことをテストする関数
+    """
+    parser = JSONArrayStreamParser()
+
+    assert parser.feed("[注] 結果は次の通り: [") == []
+    assert parser.feed("  ") == []
+    assert parser.feed('{"a": 1}') == [{"a": 1}]
+    assert parser.feed("]") == []
+    assert parser.done
+    # 配列が閉じた後のテキストは無視する
+    assert parser.feed('{"b": 2}') == []
+
+
+def test_stream_parser_top_level_object_and_broken_item():
+    """
+    配列がない場合は最上位のオブジェクトを要素として扱い、解析できない要素は読み飛ばすことをテストする関数
+    """
+    assert parse_json_array('結果: {"a": 1} と {"b": 2}') == [{"a": 1}, {"b": 2}]
+
+    parser, items = _feed(['[{"a": 1}, {"b": }, {"c": 3}]'])
+    assert [item for _, item in items] == [{"a": 1}, {"c": 3}]
+    assert parser.error_count == 1
+
+
+def test_stream_parser_truncated_response():
+    """
+    途中で途切れた応答からは、閉じている要素だけを取り出すことをテストする関数
+    """
+    assert list(iter_json_array(['[{"a": 1}, {"b": "途中'])) == [{"a": 1}]
+    assert parse_json_array("") == []
+    assert parse_json_array(None) == []
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('```json\n{"a": [1, 2,],}\n```', {"a": [1, 2]}),
+        ('説明です。{"a": "閉じ括弧}を含む"} 以上', {"a": "閉じ括弧}を含む"}),
+        ('[注] 結果: {"a": "\\"引用\\""}', {"a": '"引用"'}),
+        ('[注] [参考] 結果: [{"a": 1}]', [{"a": 1}]),
+        ('```json\n{"a": 1}\n', {"a": 1}),
+    ],
+)
+def test_extract_json(text, expected):
+    """
+    コードブロック・説明文・文字列中の括弧・末尾のカンマを含む応答からJSONを取り出すことをテストする関数
+    """
+    assert extract_json(text) == expected
+
+
+def test_extract_json_default():
+    """
+    JSONを取り出せない場合は既定値を返すことをテストする関数
+    """
+    assert extract_json("JSONはありません", default={}) == {}
+    assert extract_json(None) is None
+    assert extract_json('{"a": }', default="fallback") == "fallback"
+
+
+def test_loads_tolerant():
+    """
+    末尾のカンマだけを許容し、それ以外の誤りは例外にすることをテストする関数
+    """
+    assert loads_tolerant('{"a": [1, 2, ], }') == {"a": [1, 2]}
+    assert loads_tolerant('[{"a": 1},\n]') == [{"a": 1}]
+
+    with pytest.raises(json.JSONDecodeError):
+        loads_tolerant("{'a': 1}")
@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import pytest
+
+import utils.llm_cache as llm_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """一時ディレクトリのキャッシュに切り替え、統計を初期化する"""
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_PATH", str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_cache, "_connection", None)
+    monkeypatch.setattr(llm_cache, "_stats", {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "errors": 0})
+    yield llm_cache
+    if llm_cache._connection is not None:
+        llm_cache._connection.close()
+
+
+def test_hit_and_miss(cache, monkeypatch):
+    """
+    保存した応答はキャッシュから返り、ない応答・期限切れの応答は返らないことをテストする関数
+    """
+    key = cache.make_cache_key("gemini", {"temperature": 0.2}, "富士山が見える キャンプ場")
+    cache.set_cached_response(key, "gemini", "応答")
+
+    # インデントや改行の違いは同じプロンプトとして扱う
+    assert cache.make_cache_key("gemini", {"temperature": 0.2}, "  富士山が見える\nキャンプ場 ") == key
+    assert cache.get_cached_response(key) == "応答"
+    assert cache.get_cached_response(cache.make_cache_key("gemini", {"temperature": 0.7}, "富士山が見える キャンプ場")) is None
+
+    monkeypatch.setattr(cache, "LLM_CACHE_TTL", -1)
+    assert cache.get_cached_response(key) is None
+
+    stats = cache.get_llm_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["writes"]) == (1, 2, 1)
+
+
+def test_eviction_by_size_keeps_recently_used(cache, monkeypatch):
+    """
+    合計サイズの上限を超えた場合に、最近使われていない応答から上限の少し下まで削除することをテストする関数
+    """
+    monkeypatch.setattr(cache, "LLM_CACHE_MAX_BYTES", 10_000)
+    response = "x" * 3000
+
+    cache.set_cached_response("a", "gemini", response)
+    cache.set_cached_response("b", "gemini", response)
+    cache.set_cached_response("c", "gemini", response)
+    # aを最近使ったことにする
+    assert cache.get_cached_response("a") == response
+
+    cache.set_cached_response("d", "gemini", response)
+
+    assert cache.get_cached_response("b") is None
+    assert cache.get_cached_response("a") == response
+    assert cache.get_cached_response("d") == response
+
+    stats = cache.get_llm_cache_stats()
+    assert stats["bytes"] <= 10_000 * (1 - cache.EVICTION_MARGIN)
+    assert stats["evictions"] >= 1
+
+
+def test_eviction_by_count(cache, monkeypatch):
+    """
+    件数の上限を超えた場合も古い応答から削除することをテストする関数
+    """
+    monkeypatch.setattr(cache, "LLM_CACHE_MAX_ENTRIES", 10)
+    for index in range(11):
+        cache.set_cached_response(f"key-{index}", "gemini", f"応答{index}")
+
+    stats = cache.get_llm_cache_stats()
+    assert stats["entries"] <= 9
+    assert cache.get_cached_response("key-0") is None
+    assert cache.get_cached_response("key-10") == "応答10"
+
+
+def test_old_table_gets_size_column(cache):
+    """
+    サイズの列がない古いテーブルに列が追加され、保存済みの応答のサイズが計算されることをテストする関数
+    """
+    connection = sqlite3.connect(cache.LLM_CACHE_PATH)
+    connection.execute(
+        "CREATE TABLE llm_cache (key TEXT PRIMARY KEY, model TEXT, response TEXT, created_at REAL, accessed_at REAL)"
+    )
+    connection.execute("INSERT INTO llm_cache VALUES ('old', 'gemini', 'あいう', 0, 0)")
+    connection.commit()
+    connection.close()
+
+    assert cache.get_llm_cache_stats()["bytes"] == len("あいう".encode("utf-8"))
+    assert os.path.exists(cache.LLM_CACHE_PATH)
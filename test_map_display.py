@@ -0,0 +1,52 @@
+import re
+import shutil
+import subprocess
+import pytest
+
+from components.map_display import MAP_CLUSTER_THRESHOLD, _marker_row, build_clustered_map_html
+
+
+def _campsites(count):
+    """テスト用のキャンプ場データを作成する"""
+    return [
+        {
+            "name": f"テスト<キャンプ場>'{i}'",
+            "rating": 4.2,
+            "score": 12,
+            "address": "山梨県南都留郡",
+            "facilities": ["トイレ", "炊事場"],
+            "location": {"lat": 35.3 + i * 0.001, "lng": 138.7 + i * 0.001},
+            "place_id": f"place-{i}",
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="nodeがインストールされていません")
+def test_clustered_map_script_is_valid(tmp_path):
+    """
+    しきい値を超える件数で作成した地図のスクリプトが、JavaScriptとして構文エラーにならないことをテストする関数
+    """
+    rows = [_marker_row(site) for site in _campsites(MAP_CLUSTER_THRESHOLD + 1)]
+    html = build_clustered_map_html(rows, [35.3, 138.7])
+
+    scripts = re.findall(r"<script>(.*?)</script>", html, flags=re.DOTALL)
+    script = next(script for script in scripts if "markerClusterGroup" in script)
+    assert "var callback = (function" in script
+
+    path = tmp_path / "map.js"
+    path.write_text(script, encoding="utf-8")
+    result = subprocess.run(["node", "--check", str(path)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_marker_row_keeps_popup_values():
+    """
+    データレイヤーの行にポップアップの元になる値が入り、HTMLは作られていないことをテストする関数
+    """
+    row = _marker_row(_campsites(1)[0])
+
+    assert row[:2] == [35.3, 138.7]
+    assert row[4] == "テスト<キャンプ場>'0'"
+    assert row[10] == "https://www.google.com/maps/place/?q=place_id:place-0"
+    assert not any("<div" in str(value) for value in row)
@@ -0,0 +1,67 @@
+import utils.parallel_search as parallel_search
+from utils.cancellation import CancellationToken
+
+
+def _stub_sources(monkeypatch):
+    """検索ソースを外部APIを呼ばないスタブに置き換える"""
+    location = {"lat": 35.4, "lng": 138.7}
+    monkeypatch.setattr(parallel_search, "find_location_in_query", lambda query: None)
+    monkeypatch.setattr(
+        parallel_search,
+        "search_places_api",
+        lambda query, location=None: [{"name": "森のキャンプ場", "place_id": "place-a", "location": location}],
+    )
+    monkeypatch.setattr(parallel_search, "resolve_query_location", lambda query, future=None: (location, None))
+    monkeypatch.setattr(
+        parallel_search,
+        "search_nearby_places",
+        lambda location: [{"name": "湖畔キャンプ場", "place_id": "place-b", "location": location}],
+    )
+
+
+def test_callbacks_are_removed_after_search(monkeypatch):
+    """
+    同じキャンセルトークンで検索を繰り返しても、中止時のコールバックが残らないことをテストする関数
+    """
+    _stub_sources(monkeypatch)
+    token = CancellationToken()
+
+    for _ in range(3):
+        snapshots = list(parallel_search.iter_parallel_search("富士山 キャンプ場", cancel_token=token))
+        assert snapshots[-1]["done"]
+
+    assert token._callbacks == []
+
+
+def test_only_implemented_sources_are_started(monkeypatch):
+    """
+    結果を返すソースだけが実行され、完了したソースとして報告されることをテストする関数
+    """
+    _stub_sources(monkeypatch)
+
+    snapshots = list(parallel_search.iter_parallel_search("富士山 キャンプ場"))
+
+    assert sorted(snapshot["completed"] for snapshot in snapshots) == ["location", "nearby", "places_api"]
+    assert sorted(snapshots[-1]["sources"]) == ["nearby", "places_api"]
+    assert len(snapshots[-1]["campsites"]) == 2
+
+
+def test_campsite_links_are_applied_by_place_id_or_name():
+    """
+    公式サイト・口コミサイトの検索結果が、place_id（ない場合は名前）で対応するキャンプ場に反映されることをテストする関数
+    """
+    official = {"title": "森のキャンプ場 公式", "link": "https://example.com/mori"}
+    reviews = [{"title": "湖畔キャンプ場の口コミ", "link": "https://example.com/kohan"}]
+    campsites = [{"place_id": "place-a", "name": "森のキャンプ場"}, {"name": "湖畔キャンプ場"}, {"name": "高原キャンプ場"}]
+
+    parallel_search.apply_campsite_links(
+        campsites,
+        {
+            "place-a": {"official": official, "reviews": []},
+            "湖畔キャンプ場": {"official": None, "reviews": reviews},
+        },
+    )
+
+    assert campsites[0]["official_site"] == official and "review_sites" not in campsites[0]
+    assert campsites[1]["review_sites"] == reviews and "official_site" not in campsites[1]
+    assert "official_site" not in campsites[2] and "review_sites" not in campsites[2]
@@ -0,0 +1,57 @@
+import sys
+import pytest
+
+import precompute_review_digests as script
+
+
+def test_precompute_for_each_query(monkeypatch, capsys):
+    """
+    指定した検索クエリごとにキャンプ場を検索して分析結果を作成し、検索エラーのクエリは飛ばすことをテストする関数
+    """
+    results = {
+        "富士山 キャンプ場": [{"place_id": "p1", "name": "富士山キャンプ場"}],
+        "長野 キャンプ場": {"error": "検索エラー"},
+    }
+    precomputed = []
+
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(script, "configure_gemini", lambda api_key: None)
+    monkeypatch.setattr(script, "search_places_api", lambda query: results[query])
+    monkeypatch.setattr(script, "precompute_review_digests", lambda campsites: precomputed.append(campsites) or len(campsites))
+    monkeypatch.setattr(sys, "argv", ["precompute_review_digests.py", "富士山 キャンプ場", "長野 キャンプ場"])
+
+    script.main()
+
+    assert precomputed == [results["富士山 キャンプ場"]]
+    output = capsys.readouterr().out
+    assert "「富士山 キャンプ場」: 1件中 1件の分析結果を保存済み" in output
+    assert "「長野 キャンプ場」の検索エラー: 検索エラー" in output
+
+
+def test_default_queries(monkeypatch):
+    """
+    検索クエリを指定しない場合は既定のクエリで分析結果を作成することをテストする関数
+    """
+    searched = []
+
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(script, "configure_gemini", lambda api_key: None)
+    monkeypatch.setattr(script, "search_places_api", lambda query: searched.append(query) or [])
+    monkeypatch.setattr(script, "precompute_review_digests", lambda campsites: 0)
+    monkeypatch.setattr(sys, "argv", ["precompute_review_digests.py"])
+
+    script.main()
+
+    assert searched == script.DEFAULT_QUERIES
+
+
+def test_requires_api_key(monkeypatch):
+    """
+    GEMINI_API_KEYがない場合は検索も分析もしないことをテストする関数
+    """
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    monkeypatch.setattr(script, "search_places_api", lambda query: pytest.fail("検索した"))
+    monkeypatch.setattr(sys, "argv", ["precompute_review_digests.py", "富士山 キャンプ場"])
+
+    script.main()
+
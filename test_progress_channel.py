@@ -0,0 +1,92 @@
+from collections import OrderedDict
+import pytest
+
+import utils.progress_channel as progress_channel
+from utils.progress_channel import ProgressChannel
+
+
+@pytest.fixture(autouse=True)
+def channels(monkeypatch):
+    """開いているチャネルを空にする"""
+    monkeypatch.setattr(progress_channel, "_channels", OrderedDict())
+    return progress_channel._channels
+
+
+def test_same_key_is_coalesced():
+    """
+    同じキーの未読メッセージが連続した場合は最新のものだけを残し、別のキーやキーのないメッセージは残すことをテストする関数
+    """
+    channel = ProgressChannel("session", "search")
+    channel.publish("写真を取得しています（1/3）", key="photos")
+    channel.publish("写真を取得しています（2/3）", key="photos")
+    channel.publish("口コミを分析しています", key="reviews")
+    channel.publish("写真を取得しています（3/3）", key="photos")
+    channel.publish("要約を生成しています")
+    channel.publish("要約を生成しています")
+
+    assert [event["message"] for event in channel.drain()] == [
+        "写真を取得しています（2/3）",
+        "口コミを分析しています",
+        "写真を取得しています（3/3）",
+        "要約を生成しています",
+        "要約を生成しています",
+    ]
+    assert channel.drain() == []
+
+    # 取り出した後の同じキーのメッセージは新しい未読メッセージになる
+    channel.publish("写真を取得しています（3/3）", key="photos")
+    assert len(channel.drain()) == 1
+    assert channel.latest["message"] == "写真を取得しています（3/3）"
+
+
+def test_buffer_drops_oldest_messages():
+    """
+    未読メッセージが上限を超えた場合は古いものから破棄し、破棄した数を数えることをテストする関数
+    """
+    channel = ProgressChannel("session", "search", maxlen=3)
+    for index in range(5):
+        channel.publish(f"進捗{index}")
+
+    assert [event["message"] for event in channel.drain()] == ["進捗2", "進捗3", "進捗4"]
+    assert channel.dropped == 2
+
+
+def test_channels_are_isolated_by_session_and_search():
+    """
+    チャネルはセッションIDと検索IDごとに独立し、同じセッションの新しい検索は以前の検索のチャネルを閉じることをテストする関数
+    """
+    first = progress_channel.open_progress_channel("session-a", "search-1")
+    other_session = progress_channel.open_progress_channel("session-b", "search-1")
+
+    first.publish("セッションAの進捗")
+    other_session.publish("セッションBの進捗")
+    assert [event["message"] for event in first.drain()] == ["セッションAの進捗"]
+    assert progress_channel.get_progress_channel("session-b", "search-1") is other_session
+
+    # 同じセッションの新しい検索
+    second = progress_channel.open_progress_channel("session-a", "search-2")
+    assert first.closed
+    assert progress_channel.get_progress_channel("session-a", "search-1") is None
+    first.publish("古い検索の進捗")
+    assert first.drain() == []
+    assert progress_channel.get_progress_channel("session-a", "search-2") is second
+    assert not other_session.closed
+
+    progress_channel.close_progress_channel("session-a", "search-2")
+    assert second.closed
+    assert progress_channel.get_progress_channel("session-a", "search-2") is None
+
+
+def test_channel_count_is_capped(channels, monkeypatch):
+    """
+    開いているチャネルが上限（1000件）を超えた場合は、古いチャネルから閉じることをテストする関数
+    """
+    monkeypatch.setattr(progress_channel, "MAX_PROGRESS_CHANNELS", 1000)
+
+    opened = [progress_channel.open_progress_channel(f"session-{index}", "search") for index in range(1001)]
+
+    assert len(channels) == 1000
+    assert opened[0].closed
+    assert progress_channel.get_progress_channel("session-0", "search") is None
+    assert not any(channel.closed for channel in opened[1:])
+    assert progress_channel.get_progress_channel("session-1000", "search") is opened[-1]
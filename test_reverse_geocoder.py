@@ -0,0 +1,77 @@
+import pytest
+
+from utils.reverse_geocoder import assign_regions, get_address_prefecture, reverse_geocode, reverse_geocode_batch
+
+
+@pytest.mark.parametrize(
+    "latitude, longitude, expected",
+    [
+        (35.6812, 139.7671, ("東京都", "関東")),
+        (43.0640, 141.3470, ("北海道", "北海道")),
+        (35.0116, 135.7681, ("京都府", "関西")),
+        (35.3710, 133.5460, ("鳥取県", "中国")),
+        (26.2124, 127.6809, ("沖縄県", "九州・沖縄")),
+        # 代表地点から離れた海上と、格子の範囲外
+        (30.0, 140.0, ("", "")),
+        (50.0, 150.0, ("", "")),
+    ],
+)
+def test_grid_lookup(latitude, longitude, expected):
+    """
+    格子インデックスから座標の都道府県と地方を判定し、海上・範囲外は空文字になることをテストする関数
+    """
+    assert reverse_geocode(latitude, longitude) == expected
+
+
+def test_batch_lookup_keeps_order():
+    """
+    複数の座標をまとめて判定した結果が、引数と同じ順番になることをテストする関数
+    """
+    assert reverse_geocode_batch([43.0640, 30.0, 35.6812], [141.3470, 140.0, 139.7671]) == [
+        ("北海道", "北海道"),
+        ("", ""),
+        ("東京都", "関東"),
+    ]
+    assert reverse_geocode_batch([], []) == []
+
+
+@pytest.mark.parametrize(
+    "address, expected",
+    [
+        ("東京都府中市宮町1丁目", "東京都"),
+        ("日本、〒183-0023 東京都府中市宮町1丁目", "東京都"),
+        ("〒600-8216 京都府京都市下京区", "京都府"),
+        ("日本、〒401-0301 山梨県南都留郡富士河口湖町", "山梨県"),
+        ("北海道札幌市中央区", "北海道"),
+        ("富士河口湖町", ""),
+        ("", ""),
+        (None, ""),
+    ],
+)
+def test_address_prefecture(address, expected):
+    """
+    住所の先頭の国名・郵便番号を除き、最も先に出現する都道府県名を取り出すことをテストする関数
+    """
+    assert get_address_prefecture(address) == expected
+
+
+def test_assign_regions():
+    """
+    住所の都道府県を優先し、住所で判定できないキャンプ場は座標から判定し、設定済みの地域は変えないことをテストする関数
+    """
+    campsites = [
+        # 座標は神奈川県だが、住所の都道府県を優先する
+        {"address": "日本、〒183-0023 東京都府中市", "location": {"lat": 35.4, "lng": 139.3}},
+        {"address": "", "location": {"latitude": 43.0640, "longitude": 141.3470}},
+        {"address": "不明", "location": {"lat": 30.0, "lng": 140.0}},
+        {"prefecture": "長野県", "region": "中部", "address": "東京都府中市"},
+        {"name": "座標も住所もないキャンプ場"},
+    ]
+
+    assign_regions(campsites)
+
+    assert (campsites[0]["prefecture"], campsites[0]["region"]) == ("東京都", "関東")
+    assert (campsites[1]["prefecture"], campsites[1]["region"]) == ("北海道", "北海道")
+    assert "prefecture" not in campsites[2]
+    assert (campsites[3]["prefecture"], campsites[3]["region"]) == ("長野県", "中部")
+    assert "prefecture" not in campsites[4]
@@ -0,0 +1,131 @@
+import threading
+import pytest
+
+import utils.review_digest_store as review_digest_store
+import utils.review_analyzer as review_analyzer
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """一時ディレクトリの保存先に切り替え、統計を初期化する"""
+    monkeypatch.setattr(review_digest_store, "REVIEW_DIGEST_PATH", str(tmp_path / "review_digests.sqlite3"))
+    monkeypatch.setattr(review_digest_store, "REVIEW_DIGEST_ENABLED", True)
+    monkeypatch.setattr(review_digest_store, "_connection", None)
+    monkeypatch.setattr(review_digest_store, "_stats", {"hits": 0, "misses": 0, "stale": 0, "writes": 0, "errors": 0})
+    yield review_digest_store
+    if review_digest_store._connection is not None:
+        review_digest_store._connection.close()
+
+
+def _campsite(place_id, review="景色が良い"):
+    """口コミ付きのキャンプ場データ"""
+    return {
+        "place_id": place_id,
+        "name": f"{place_id}キャンプ場",
+        "rating": 4.2,
+        "facilities": ["トイレ", "炊事場"],
+        "reviews": [{"text": review, "rating": 5}, {"text": "トイレがきれい", "rating": 4}],
+    }
+
+
+DIGEST = {"summary": "要約", "features": ["特徴"], "trends": ["傾向"], "recommendation": "おすすめ"}
+
+
+def test_hash_invalidation(store, monkeypatch):
+    """
+    口コミ・プロンプトが変わった場合と期限切れの場合は、保存した分析結果を返さないことをテストする関数
+    """
+    campsite = _campsite("p1")
+    review_hash = store.compute_review_hash(campsite, "v1")
+    store.save_review_digests([("p1", review_hash, DIGEST)], "review_batch")
+
+    # 口コミの並び順や空白の違いは同じ口コミとして扱う
+    reordered = dict(campsite, reviews=[campsite["reviews"][1], {"text": " 景色が良い ", "rating": 5}])
+    assert store.compute_review_hash(reordered, "v1") == review_hash
+    assert store.get_review_digests({"p1": review_hash}, "review_batch") == {"p1": DIGEST}
+
+    # 口コミが変わった場合・分析の指示が変わった場合
+    changed_hash = store.compute_review_hash(_campsite("p1", review="虫が多い"), "v1")
+    assert changed_hash != review_hash
+    assert store.get_review_digests({"p1": changed_hash}, "review_batch") == {}
+    assert store.get_review_digests({"p1": store.compute_review_hash(campsite, "v2")}, "review_batch") == {}
+
+    # 別のプロンプトで作成した分析結果は使わない
+    assert store.get_review_digests({"p1": review_hash}, "review_other") == {}
+
+    # 期限切れ
+    monkeypatch.setattr(store, "REVIEW_DIGEST_TTL", -1)
+    assert store.get_review_digests({"p1": review_hash}, "review_batch") == {}
+
+    stats = store.get_review_digest_stats()
+    assert stats["hits"] == 1
+    assert stats["stale"] == 3
+
+
+def test_miss_falls_back_to_local_analysis(store, monkeypatch):
+    """
+    保存されていないキャンプ場はGemini APIを呼ばずにローカル分析の結果を返し、バックグラウンドの分析を予定することをテストする関数
+    """
+    scheduled = []
+    monkeypatch.setattr(review_analyzer, "REVIEW_DIGEST_BACKGROUND", True)
+    monkeypatch.setattr(review_analyzer, "schedule_review_digests", lambda campsites: scheduled.extend(campsites))
+    monkeypatch.setattr(review_analyzer, "analyze_review_chunk", lambda *args, **kwargs: pytest.fail("Gemini APIを呼んだ"))
+
+    stored, missing = _campsite("p1"), _campsite("p2")
+    store.save_review_digests([("p1", review_analyzer.review_digest_hash(stored), DIGEST)], review_analyzer.REVIEW_BATCH_PROMPT.name)
+
+    results = list(review_analyzer.iter_campsite_review_analyses([stored, missing], generate_missing=False))
+
+    assert results == [(stored, DIGEST), (missing, review_analyzer.local_review_analysis(missing))]
+    assert scheduled == [missing]
+
+
+def test_background_scheduling(store, monkeypatch):
+    """
+    バックグラウンドの分析は検索を待たせず、分析中のキャンプ場とplace_idのないキャンプ場を重ねて予定しないことをテストする関数
+    """
+    started, release, finished = threading.Event(), threading.Event(), threading.Event()
+    analyzed = []
+
+    def precompute(campsites):
+        analyzed.append([campsite["place_id"] for campsite in campsites])
+        started.set()
+        release.wait(5)
+        finished.set()
+
+    monkeypatch.setattr(review_analyzer, "precompute_review_digests", precompute)
+    monkeypatch.setattr(review_analyzer, "_background_place_ids", set())
+
+    assert review_analyzer.schedule_review_digests([_campsite("p1"), {"name": "place_idなし"}]) == 1
+    assert started.wait(5)
+
+    # 分析中のキャンプ場は予定しない
+    assert review_analyzer.schedule_review_digests([_campsite("p1")]) == 0
+
+    release.set()
+    assert finished.wait(5)
+    review_analyzer._background_executor.submit(lambda: None).result(5)
+    assert review_analyzer._background_place_ids == set()
+    assert analyzed == [["p1"]]
+
+
+def test_precompute_review_digests(store, monkeypatch):
+    """
+    事前の分析では、分析結果がないキャンプ場と口コミが変わったキャンプ場だけをGemini APIで分析することをテストする関数
+    """
+    analyzed = []
+
+    def analyze_review_chunk(chunk, cancel_token=None):
+        analyzed.extend(review_input["name"] for review_input in chunk)
+        return {review_input["id"]: DIGEST for review_input in chunk}
+
+    monkeypatch.setattr(review_analyzer, "analyze_review_chunk", analyze_review_chunk)
+
+    campsites = [_campsite("p1"), _campsite("p2"), {"name": "place_idなし"}]
+    assert review_analyzer.precompute_review_digests(campsites) == 2
+    assert sorted(analyzed) == ["p1キャンプ場", "p2キャンプ場"]
+
+    # 2回目は口コミが変わったキャンプ場だけを分析する
+    analyzed.clear()
+    assert review_analyzer.precompute_review_digests([_campsite("p1"), _campsite("p2", review="虫が多い")]) == 2
+    assert analyzed == ["p2キャンプ場"]
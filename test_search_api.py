@@ -0,0 +1,75 @@
+import threading
+import pytest
+
+import utils.search_api as search_api
+
+
+def _item(title):
+    """Custom Search APIの検索結果の1件"""
+    return {"title": title, "link": f"https://example.com/{title}", "snippet": "", "displayLink": "example.com"}
+
+
+@pytest.fixture
+def searched(monkeypatch):
+    """search_itemsをスタブに置き換え、検索したクエリを記録する"""
+    queries = []
+    lock = threading.Lock()
+
+    def search_items(query, num_results):
+        with lock:
+            queries.append(query)
+        if "エラー" in query:
+            raise RuntimeError("429 Too Many Requests")
+        return [_item(f"{query}-{rank}") for rank in range(num_results)]
+
+    monkeypatch.setattr(search_api, "GOOGLE_API_KEY", "test-key")
+    monkeypatch.setattr(search_api, "GOOGLE_CSE_ID", "test-cse")
+    monkeypatch.setattr(search_api, "search_items", search_items)
+    return queries
+
+
+def test_same_query_is_searched_once(searched):
+    """
+    同じ検索クエリになるキャンプ場は1回だけ検索し、結果をそれぞれのキャンプ場に返すことをテストする関数
+    """
+    campsites = [{"place_id": "p1", "name": "森のキャンプ場"}, "森のキャンプ場", {"name": "森のキャンプ場　"}, {"name": ""}]
+
+    results = search_api.search_campsites_info_batch(campsites)
+
+    assert sorted(searched) == ["森のキャンプ場 公式サイト キャンプ場", "森のキャンプ場 口コミ レビュー キャンプ場"]
+    assert sorted(results) == ["p1", "森のキャンプ場", "森のキャンプ場　"]
+    assert results["p1"] == results["森のキャンプ場"] == results["森のキャンプ場　"]
+
+
+def test_official_is_first_result_and_others_are_lists(searched):
+    """
+    公式サイトは先頭の1件、口コミサイトとその他の情報は検索結果のリストになることをテストする関数
+    """
+    results = search_api.search_campsites_info_batch([{"place_id": "p1", "name": "湖畔キャンプ場"}], ("official", "reviews", "料金"))
+
+    links = results["p1"]
+    assert links["official"]["title"] == "湖畔キャンプ場 公式サイト キャンプ場-0"
+    assert [site["title"] for site in links["reviews"]] == [f"湖畔キャンプ場 口コミ レビュー キャンプ場-{rank}" for rank in range(3)]
+    assert len(links["料金"]) == 3
+    assert set(links["official"]) == {"title", "link", "snippet", "displayLink"}
+
+
+def test_failed_search_becomes_empty(searched):
+    """
+    失敗した検索は結果を空にし、他のキャンプ場の検索結果には影響しないことをテストする関数
+    """
+    results = search_api.search_campsites_info_batch(["エラーキャンプ場", "高原キャンプ場"])
+
+    assert results["エラーキャンプ場"] == {"official": None, "reviews": []}
+    assert results["高原キャンプ場"]["official"]["title"] == "高原キャンプ場 公式サイト キャンプ場-0"
+    assert len(results["高原キャンプ場"]["reviews"]) == 3
+
+
+def test_missing_api_key_returns_empty_results(searched, monkeypatch):
+    """
+    APIキーが設定されていない場合は検索せず、すべてのキャンプ場の結果を空にすることをテストする関数
+    """
+    monkeypatch.setattr(search_api, "GOOGLE_API_KEY", None)
+
+    assert search_api.search_campsites_info_batch(["森のキャンプ場"]) == {"森のキャンプ場": {"official": None, "reviews": []}}
+    assert searched == []
@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+import pytest
+
+import utils.search_evaluator as search_evaluator
+from utils.cancellation import CancellationToken
+from utils.parallel_search import select_featured_campsites
+
+# 応答が届かないまとまりに含めるキャンプ場の名前
+HUNG_NAME = "応答が届かないキャンプ場"
+
+
+@pytest.fixture
+def stub_gemini(monkeypatch):
+    """
+    Geminiのストリーミング呼び出しをスタブに置き換える
+    HUNG_NAMEを含むまとまりの応答は、releaseが設定されるまで届かない
+    """
+    release = threading.Event()
+
+    def iter_text(prompt, **kwargs):
+        if HUNG_NAME in prompt:
+            release.wait(5)
+            return
+        yield json.dumps([{"index": index, "match_score": 8, "recommendation_reason": "合う"} for index in range(4)])
+
+    monkeypatch.setattr(search_evaluator, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(search_evaluator, "EVALUATION_CHUNK_MAX_CAMPSITES", 2)
+    monkeypatch.setattr(search_evaluator, "iter_text", iter_text)
+    yield release
+    release.set()
+
+
+def _campsites():
+    """4件のキャンプ場（1番目と3番目が応答の届かないまとまりになる）"""
+    names = ["森のキャンプ場", HUNG_NAME, "湖畔キャンプ場", "高原キャンプ場"]
+    return [{"name": name, "score": 0.5 - index * 0.1} for index, name in enumerate(names)]
+
+
+def test_deadline_keeps_unfinished_chunks_in_original_order(stub_gemini):
+    """
+    応答が届かないまとまりがあっても制限時間で待つのをやめ、そのキャンプ場は元の点数のまま残すことをテストする関数
+    """
+    campsites = _campsites()
+
+    started = time.monotonic()
+    evaluated = list(search_evaluator.iter_evaluate_search_results("キャンプ場", {}, campsites, timeout=0.3))
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 2
+    assert [site["name"] for site in evaluated] == ["森のキャンプ場", "湖畔キャンプ場"]
+    assert "match_score" not in campsites[1] and "match_score" not in campsites[3]
+    assert [site["score"] for site in (campsites[1], campsites[3])] == [0.4, pytest.approx(0.2)]
+
+
+def test_cancel_wakes_the_wait(stub_gemini):
+    """
+    応答を待っている間に検索が中止された場合、次の評価結果を待たずに終了することをテストする関数
+    """
+    token = CancellationToken()
+    threading.Timer(0.2, token.cancel).start()
+
+    started = time.monotonic()
+    evaluated = list(
+        search_evaluator.iter_evaluate_search_results("キャンプ場", {}, _campsites(), cancel_token=token, timeout=5)
+    )
+
+    assert time.monotonic() - started < 2
+    assert len(evaluated) == 2
+    assert token._callbacks == []
+
+
+def test_evaluated_and_unevaluated_scores_share_one_scale(monkeypatch):
+    """
+    2段階目で評価したキャンプ場のスコアも0-1の範囲になり、評価しなかったキャンプ場と同じ基準で特集キャンプ場を選ぶことをテストする関数
+    """
+    match_scores = {0: 9, 1: 2}
+
+    def iter_text(prompt, **kwargs):
+        yield json.dumps([{"index": index, "match_score": score} for index, score in match_scores.items()])
+
+    monkeypatch.setattr(search_evaluator, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(search_evaluator, "iter_text", iter_text)
+
+    head = [{"name": "合うキャンプ場", "heuristic_score": 0.6}, {"name": "合わないキャンプ場", "heuristic_score": 0.55}]
+    tail = [{"name": "未評価キャンプ場", "heuristic_score": 0.5}, {"name": "遠いキャンプ場", "heuristic_score": 0.3}]
+    for site in head + tail:
+        site["score"] = site["heuristic_score"]
+
+    list(search_evaluator.iter_evaluate_search_results("キャンプ場", {}, head, max_results=2))
+
+    assert [site["score"] for site in head] == [pytest.approx(0.75), pytest.approx(0.38)]
+
+    sorted_campsites = sorted(head + tail, key=lambda site: site["score"], reverse=True)
+    assert [site["name"] for site in sorted_campsites] == ["合うキャンプ場", "未評価キャンプ場", "合わないキャンプ場", "遠いキャンプ場"]
+    assert select_featured_campsites(sorted_campsites) == [head[0]]
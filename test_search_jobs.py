@@ -0,0 +1,187 @@
+import time
+import threading
+import pytest
+
+import utils.search_jobs as search_jobs
+from utils.search_jobs import JOB_CANCELLED, JOB_DONE, JOB_RUNNING, JobRejectedError, SearchJobExecutor
+
+
+def _controlled_job(release, cancel_token=None):
+    """1つ目のイベントを返した後、releaseが設定されるまで待ってから2つ目のイベントを返すジョブ"""
+    yield {"type": "raw_results", "campsites": [{"name": "森のキャンプ場"}]}
+    release.wait(5)
+    yield {"type": "complete", "result": {"results": []}}
+
+
+def _first_event(executor, job_id):
+    """ジョブの状態が変わるたびに描画し直し、最初のイベントを取り込むまで進める"""
+    status = None
+    while True:
+        events, status = executor.wait_for_update(job_id, 0, status, timeout=0.05)
+        if events:
+            return events, status
+
+
+def test_no_rerun_without_new_event():
+    """
+    新しいイベントが届くまではon_idle（進捗表示の書き換え）だけが呼ばれ、再実行の契機にならないことをテストする関数
+    """
+    executor = SearchJobExecutor(max_workers=1, max_pending=1)
+    release = threading.Event()
+    job_id = executor.submit(_controlled_job, release)
+
+    # 最初のイベントを取り込む
+    events, status = _first_event(executor, job_id)
+    assert [event["type"] for event in events] == ["raw_results"]
+    assert status == JOB_RUNNING
+
+    # 2回目の描画の後: イベントが届かない間は戻らず、on_idleだけが呼ばれる
+    idle_calls = []
+    reruns = []
+
+    def on_idle():
+        idle_calls.append(True)
+        if len(idle_calls) == 3:
+            release.set()
+
+    events, status = executor.wait_for_update(job_id, 1, JOB_RUNNING, timeout=0.05, on_idle=on_idle)
+    reruns.append((events, status))
+
+    assert len(idle_calls) >= 3
+    assert len(reruns) == 1
+    assert events and events[-1]["type"] == "complete"
+
+
+def test_status_change_without_event_triggers_update():
+    """
+    新しいイベントがなくても、ジョブの状態が変わった場合（完了など）は待つのをやめることをテストする関数
+    """
+    executor = SearchJobExecutor(max_workers=1, max_pending=1)
+    release = threading.Event()
+    job_id = executor.submit(_controlled_job, release)
+
+    _first_event(executor, job_id)
+    release.set()
+    executor.wait_for_update(job_id, 1, JOB_RUNNING, timeout=0.05)
+    events, status = executor.wait_for_update(job_id, 2, JOB_RUNNING, timeout=1.0)
+    assert events == []
+    assert status == JOB_DONE
+
+    # 存在しないジョブはすぐに戻る
+    assert executor.wait_for_update("missing", 0, JOB_RUNNING, timeout=0.05) == ([], None)
+
+
+def _blocking_job(release, started=None, cancel_token=None):
+    """releaseが設定されるか中止されるまで待ってから終了するジョブ"""
+    if started is not None:
+        started.set()
+    while not release.wait(0.01):
+        if cancel_token.cancelled:
+            return
+    yield {"type": "complete", "result": {"results": []}}
+
+
+def test_rejects_jobs_over_the_limit():
+    """
+    実行中と実行待ちのジョブが上限に達した場合は、新しいジョブを受け付けないことをテストする関数
+    """
+    executor = SearchJobExecutor(max_workers=1, max_pending=1)
+    release = threading.Event()
+    job_ids = [executor.submit(_blocking_job, release) for _ in range(2)]
+
+    with pytest.raises(JobRejectedError):
+        executor.submit(_blocking_job, release)
+    assert executor.get_stats()["rejected"] == 1
+
+    # 完了したジョブの分だけ再び受け付ける
+    release.set()
+    for job_id in job_ids:
+        executor.wait_for_events(job_id, 1, timeout=5)
+    assert executor.submit(_blocking_job, release)
+
+
+def test_cancel_running_and_queued_jobs():
+    """
+    実行中のジョブは次の確認時点で、実行待ちのジョブはすぐに中止されることをテストする関数
+    """
+    executor = SearchJobExecutor(max_workers=1, max_pending=1)
+    release = threading.Event()
+    started = threading.Event()
+    running_id = executor.submit(_blocking_job, release, started)
+    queued_id = executor.submit(_blocking_job, release)
+    assert started.wait(5)
+
+    assert executor.cancel(queued_id)
+    assert executor.get_status(queued_id)["status"] == JOB_CANCELLED
+
+    assert executor.cancel(running_id)
+    events, status = executor.wait_for_events(running_id, 0, timeout=5)
+    assert (events, status) == ([], JOB_CANCELLED)
+    assert executor.get_result(running_id) is None
+
+    # 完了済み・存在しないジョブは中止できない
+    assert not executor.cancel(running_id)
+    assert not executor.cancel("missing")
+
+
+def _finished_job(executor, job_id, finished_at, events=()):
+    """完了済みのジョブを直接登録する"""
+    executor._jobs[job_id] = {
+        "job_id": job_id,
+        "status": JOB_DONE,
+        "events": list(events),
+        "event_offset": 0,
+        "result": events[-1] if events else None,
+        "error": None,
+        "created_at": finished_at,
+        "started_at": finished_at,
+        "finished_at": finished_at,
+        "cancel_token": None,
+    }
+
+
+def test_prune_finished_jobs(monkeypatch):
+    """
+    完了済みのジョブは保持期間と件数の上限で削除され、取得されないイベントは結果だけを残して破棄されることをテストする関数
+    """
+    monkeypatch.setattr(search_jobs, "SEARCH_JOB_RESULT_TTL", 600)
+    monkeypatch.setattr(search_jobs, "SEARCH_JOB_MAX_FINISHED", 2)
+    monkeypatch.setattr(search_jobs, "SEARCH_JOB_EVENT_TTL", 60)
+    executor = SearchJobExecutor(max_workers=1, max_pending=1)
+    now = time.time()
+    events = [{"type": "raw_results", "campsites": []}, {"type": "complete", "result": {"results": []}}]
+
+    _finished_job(executor, "expired", now - 700, events)
+    _finished_job(executor, "oldest", now - 300, events)
+    _finished_job(executor, "old", now - 120, events)
+    _finished_job(executor, "recent", now - 1, events)
+
+    with executor._condition:
+        executor._prune()
+
+    assert list(executor._jobs) == ["old", "recent"]
+    # イベントの保持期間を過ぎたジョブは結果だけを残す
+    assert executor.get_events("old") == ([], JOB_DONE)
+    assert executor.get_status("old")["event_count"] == 2
+    assert executor.get_result("old")["type"] == "complete"
+    assert len(executor.get_events("recent")[0]) == 2
+
+
+def test_consumed_events_are_dropped():
+    """
+    取得済みのイベント（cursorより前）は破棄され、イベントの番号は通し番号のまま変わらないことをテストする関数
+    """
+    executor = SearchJobExecutor(max_workers=1, max_pending=1)
+    release = threading.Event()
+    job_id = executor.submit(_controlled_job, release)
+
+    events, _ = _first_event(executor, job_id)
+    release.set()
+    events, status = executor.wait_for_events(job_id, len(events), timeout=5)
+    assert [event["type"] for event in events] == ["complete"]
+    assert len(executor._jobs[job_id]["events"]) == 1
+
+    executor.wait_for_update(job_id, 2, status, timeout=1.0)
+    assert executor._jobs[job_id]["events"] == []
+    assert executor.get_status(job_id)["event_count"] == 2
+    assert executor.get_events(job_id, 2) == ([], JOB_DONE)
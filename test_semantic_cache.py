@@ -0,0 +1,155 @@
+import pytest
+
+import utils.semantic_cache as semantic_cache
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch):
+    """キャッシュを空にし、閾値などの設定を既定値に固定する"""
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE_THRESHOLD", 0.8)
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE_TTL", 1800)
+    monkeypatch.setattr(semantic_cache, "_stats", {"hits": 0, "misses": 0, "stores": 0})
+    semantic_cache.clear_semantic_cache()
+    yield semantic_cache
+    semantic_cache.clear_semantic_cache()
+
+
+def _result(name):
+    """テスト用の検索結果を作成する"""
+    return {"results": [{"name": name, "score": 0.9}], "summary": f"{name}の要約", "featured_campsites": []}
+
+
+def _similarity(a, b):
+    """2つのクエリのコサイン類似度"""
+    return float(semantic_cache.vectorize_query(a) @ semantic_cache.vectorize_query(b))
+
+
+@pytest.mark.parametrize(
+    "stored, query",
+    [
+        # 同じ意味の語（見える・眺め・絶景）と意図に影響しない語の違いだけのクエリ
+        ("富士山が見える キャンプ場", "富士山 眺め キャンプ"),
+        ("富士山が見えるキャンプ場", "富士山の絶景キャンプ場"),
+        ("ペット可のキャンプ場 長野", "長野 犬連れ キャンプ"),
+        ("静かなキャンプ場 千葉", "千葉 静か キャンプ"),
+    ],
+)
+def test_same_intent_hits(stored, query):
+    """
+    言い回しだけが違う同じ意図のクエリでは、保存した検索結果を再利用することをテストする関数
+    """
+    semantic_cache.store_search_result(stored, _result(stored))
+
+    result = semantic_cache.lookup_search_result(query)
+
+    assert result is not None
+    assert result["cached_query"] == stored
+    assert result["results"][0]["name"] == stored
+    assert result["similarity"] >= semantic_cache.SEMANTIC_CACHE_THRESHOLD
+
+
+@pytest.mark.parametrize(
+    "stored, query",
+    [
+        # 同じ地名でも求めるものが違うクエリ
+        ("富士山が見える キャンプ場", "富士山 温泉 キャンプ場"),
+        ("富士山が見える キャンプ場", "富士山 ペット可 キャンプ場"),
+        ("富士山が見える キャンプ場", "富士山 キャンプ場"),
+        ("長野 ペット キャンプ場", "長野 子供 キャンプ場"),
+        ("長野 ソロキャンプ", "長野 ファミリー キャンプ"),
+    ],
+)
+def test_different_intent_misses(stored, query):
+    """
+    地名が同じでも意図が違うクエリでは、検索結果を再利用しないことをテストする関数
+    """
+    semantic_cache.store_search_result(stored, _result(stored))
+
+    assert _similarity(stored, query) < semantic_cache.SEMANTIC_CACHE_THRESHOLD
+    assert semantic_cache.lookup_search_result(query) is None
+
+
+def test_different_location_misses_even_when_similar():
+    """
+    類似度が閾値以上でも、地名が違うクエリでは検索結果を再利用しないことをテストする関数
+    """
+    stored = "長野 ペット可 温泉 バーベキュー 子ども キャンプ場"
+    query = "山梨 ペット可 温泉 バーベキュー 子ども キャンプ場"
+    semantic_cache.store_search_result(stored, _result(stored))
+
+    assert _similarity(stored, query) >= semantic_cache.SEMANTIC_CACHE_THRESHOLD
+    assert semantic_cache.lookup_search_result(query) is None
+    assert semantic_cache.lookup_search_result("ペット可 温泉 バーベキュー 子ども キャンプ場") is None
+    assert semantic_cache.lookup_search_result(stored) is not None
+
+
+def test_context_key_and_threshold(monkeypatch):
+    """
+    検索条件（好み設定・必須施設）が違う場合は再利用せず、閾値を上げると類似したクエリも再利用しないことをテストする関数
+    """
+    stored = "温泉 近い キャンプ場 箱根"
+    semantic_cache.store_search_result(stored, _result(stored), {"budget": "low"}, ["トイレ", "シャワー"])
+
+    # 必須施設の順番の違いは同じ検索条件として扱う
+    assert semantic_cache.lookup_search_result(stored, {"budget": "low"}, ["シャワー", "トイレ"]) is not None
+    assert semantic_cache.lookup_search_result(stored, {"budget": "high"}, ["トイレ", "シャワー"]) is None
+    assert semantic_cache.lookup_search_result(stored, {"budget": "low"}, ["トイレ"]) is None
+    assert semantic_cache.lookup_search_result(stored) is None
+
+    query = "箱根 温泉 キャンプ"
+    similarity = _similarity(stored, query)
+    assert semantic_cache.lookup_search_result(query, {"budget": "low"}, ["トイレ", "シャワー"]) is not None
+
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE_THRESHOLD", similarity + 0.01)
+    assert semantic_cache.lookup_search_result(query, {"budget": "low"}, ["トイレ", "シャワー"]) is None
+
+
+def test_expired_and_copied_results(monkeypatch):
+    """
+    再利用した検索結果の変更は保存した結果に影響せず、有効期限を過ぎた結果は再利用しないことをテストする関数
+    """
+    stored = "富士山が見える キャンプ場"
+    semantic_cache.store_search_result(stored, _result(stored))
+
+    result = semantic_cache.lookup_search_result(stored)
+    result["results"][0]["name"] = "変更"
+    assert semantic_cache.lookup_search_result(stored)["results"][0]["name"] == stored
+
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE_TTL", -1)
+    assert semantic_cache.lookup_search_result(stored) is None
+
+    stats = semantic_cache.get_semantic_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["stores"]) == (2, 1, 1)
+
+
+@pytest.mark.parametrize(
+    "stored, query",
+    [
+        ("富士山が見える 温泉がある 静かな キャンプ場", "富士山が見える 温泉がない 静かな キャンプ場"),
+        ("富士山が見える ペット可 静かな キャンプ場", "富士山が見える ペット不可 静かな キャンプ場"),
+        ("長野 ペット不可 温泉 キャンプ場", "長野 ペット可 温泉 キャンプ場"),
+    ],
+)
+def test_negated_query_misses(stored, query):
+    """
+    類似度が閾値以上でも、否定されている語が違う（逆の条件の）クエリでは検索結果を再利用しないことをテストする関数
+    """
+    semantic_cache.store_search_result(stored, _result(stored))
+
+    assert _similarity(stored, query) >= semantic_cache.SEMANTIC_CACHE_THRESHOLD
+    assert semantic_cache.lookup_search_result(query) is None
+    assert semantic_cache.lookup_search_result(stored) is not None
+
+
+def test_negated_terms():
+    """
+    否定されている語を取り出し、同じ意味の語はまとめ、否定ではない「少ない」などは取り出さないことをテストする関数
+    """
+    assert semantic_cache.negated_terms("富士山が見える 温泉がない 静かな キャンプ場") == ("温泉",)
+    assert semantic_cache.negated_terms("ペット不可 キャンプ場") == ("ペット",)
+    assert semantic_cache.negated_terms("犬NG 花火禁止 キャンプ") == ("ペット", "花火")
+    assert semantic_cache.negated_terms("温泉なし キャンプ場") == ("温泉",)
+    assert semantic_cache.negated_terms("ペット可 キャンプ場") == ()
+    assert semantic_cache.negated_terms("人が少ない キャンプ場") == ()
+    assert semantic_cache.negated_terms("glamping キャンプ場") == ()
@@ -46,13 +46,14 @@ def summarize_reviews_with_gemini(reviews, max_reviews=5):
         return "有効な口コミがありません。"
 
     # プロンプトの作成
+    joined_reviews = "\n\n".join(review_texts)
     prompt = f"""
     あなたは日本のキャンプ場に詳しい専門家です。
     以下のキャンプ場の口コミを分析して、簡潔に要約してください。
     良い点と改善点を明確にし、このキャンプ場の特徴を3〜5つのポイントにまとめてください。
     
     口コミ:
-    {"\n\n".join(review_texts)}
+    {joined_reviews}
     
     要約形式:
     【良い点】
@@ -109,13 +110,14 @@ def summarize_reviews_with_openai(reviews, max_reviews=5):
         return "有効な口コミがありません。"
 
     # プロンプトの作成
+    joined_reviews = "\n\n".join(review_texts)
     prompt = f"""
     あなたは日本のキャンプ場に詳しい専門家です。
     以下のキャンプ場の口コミを分析して、簡潔に要約してください。
     良い点と改善点を明確にし、このキャンプ場の特徴を3〜5つのポイントにまとめてください。
     
     口コミ:
-    {"\n\n".join(review_texts)}
+    {joined_reviews}
     
     要約形式:
     【良い点】
@@ -57,9 +57,9 @@ if DEBUG:
 # Gemini APIの初期化
 try:
     if "GEMINI_API_KEY" in os.environ and os.environ["GEMINI_API_KEY"]:
-        import google.generativeai as genai
+        from utils.gemini_client import configure_gemini
 
-        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+        configure_gemini(os.environ["GEMINI_API_KEY"])
         print("Gemini APIを初期化しました")
     else:
         print("Gemini APIキーが設定されていないため、初期化をスキップします")
@@ -0,0 +1,79 @@
+"""
+検索処理を途中で中止するためのキャンセルトークンを提供するモジュール
+新しい検索が始まったときに古い検索へ中止を伝え、
+各処理は外部APIを呼び出す前にトークンを確認して処理を打ち切ります
+"""
+
+import threading
+
+
+class CancellationToken:
+    """
+    検索の中止を伝えるトークン
+    複数のスレッドから参照でき、一度中止されると元に戻らない
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        """中止されたかどうか"""
+        return self._event.is_set()
+
+    def cancel(self):
+        """検索を中止し、登録されたコールバックを呼び出す"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def add_callback(self, callback):
+        """
+        中止されたときに呼び出す関数を登録する（すでに中止されている場合はすぐに呼び出す）
+
+        Args:
+            callback (callable): 引数なしの関数
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+
+        callback()
+
+    def remove_callback(self, callback):
+        """
+        登録した関数の登録を解除する（登録されていない場合は何もしない）
+
+        Args:
+            callback (callable): add_callbackで登録した関数
+        """
+        with self._lock:
+            try:
+                self._callbacks.remove(callback)
+            except ValueError:
+                pass
+
+
+def is_cancelled(cancel_token):
+    """
+    キャンセルトークンが中止されているかを確認する関数
+
+    Args:
+        cancel_token (CancellationToken): キャンセルトークン（Noneの場合は中止されない）
+
+    Returns:
+        bool: 中止されている場合はTrue
+    """
+    return cancel_token is not None and cancel_token.cancelled
@@ -0,0 +1,280 @@
+"""
+検索結果を2段階で順位付けするモジュール
+1段階目ですべての候補をクエリ解析結果との一致・評価・口コミ数・距離から機械的に採点し、
+2段階目のGeminiによる評価は上位の候補だけに絞ります（残り時間に応じて件数を決め、
+上位の差が十分に大きい場合は2段階目を省きます）
+"""
+
+import os
+import math
+import threading
+import unicodedata
+import numpy as np
+from dotenv import load_dotenv
+from utils.geocoding import get_coordinates
+
+# 環境変数の読み込み
+load_dotenv()
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# 1段階目の採点の重み（テキストの一致・評価・口コミ数・距離）
+RANKING_WEIGHTS = np.array(
+    [
+        float(os.getenv("RANKING_WEIGHT_TEXT", "0.45")),
+        float(os.getenv("RANKING_WEIGHT_RATING", "0.2")),
+        float(os.getenv("RANKING_WEIGHT_REVIEWS", "0.15")),
+        float(os.getenv("RANKING_WEIGHT_DISTANCE", "0.2")),
+    ]
+)
+
+# 距離による減衰の目安（km）。この距離で距離の点数が約0.37になる
+RANKING_DISTANCE_SCALE_KM = float(os.getenv("RANKING_DISTANCE_SCALE_KM", "30"))
+
+# 検索開始から順位付けの完了までに使える時間（秒）
+RANKING_LATENCY_BUDGET = float(os.getenv("RANKING_LATENCY_BUDGET", "25"))
+
+# 2段階目で評価する候補数の下限と上限
+RERANK_MIN_K = int(os.getenv("RERANK_MIN_K", "5"))
+RERANK_MAX_K = int(os.getenv("RERANK_MAX_K", "24"))
+
+# 上位の候補同士の点数の差がこの値以上なら、2段階目を省く（点数は0-1）
+RERANK_DECISIVE_MARGIN = float(os.getenv("RERANK_DECISIVE_MARGIN", "0.15"))
+
+# 差を確認する上位の件数（特集キャンプ場として表示する件数）
+RERANK_HEAD_SIZE = 3
+
+# 2段階目の1回分（同時に評価する1巡）にかかる時間の初期値（秒）と、実測値を反映する割合
+RERANK_ROUND_SECONDS = float(os.getenv("RERANK_ROUND_SECONDS", "8"))
+RERANK_LATENCY_SMOOTHING = 0.3
+
+# 地球の半径（km）
+EARTH_RADIUS_KM = 6371.0
+
+# 2段階目の1巡にかかる時間の推定値
+_round_seconds = RERANK_ROUND_SECONDS
+_lock = threading.Lock()
+
+
+def _normalize_text(text):
+    """照合用にテキストを正規化する"""
+    return unicodedata.normalize("NFKC", str(text)).lower()
+
+
+def _campsite_text(campsite):
+    """照合に使うキャンプ場のテキスト（名前・説明・特徴・設備・地域・住所）"""
+    parts = []
+    for key in ("name", "description", "region", "address"):
+        if campsite.get(key):
+            parts.append(str(campsite[key]))
+    for key in ("features", "facilities"):
+        values = campsite.get(key)
+        if isinstance(values, (list, tuple)):
+            parts.extend(str(value) for value in values if value)
+        elif values:
+            parts.append(str(values))
+    return _normalize_text(" ".join(parts))
+
+
+def _query_terms(query_analysis):
+    """クエリ解析結果の特徴要素・施設要素（重複を除く）"""
+    if not isinstance(query_analysis, dict):
+        return []
+
+    terms = []
+    for key in ("features", "facilities"):
+        for term in query_analysis.get(key) or []:
+            term = _normalize_text(term).strip()
+            if term and term not in terms:
+                terms.append(term)
+    return terms
+
+
+def haversine_km(lats, lngs, origin_lat, origin_lng):
+    """
+    複数の地点と基準地点との距離をまとめて計算する関数
+
+    Args:
+        lats (numpy.ndarray): 緯度の配列
+        lngs (numpy.ndarray): 経度の配列
+        origin_lat (float): 基準地点の緯度
+        origin_lng (float): 基準地点の経度
+
+    Returns:
+        numpy.ndarray: 距離（km）の配列
+    """
+    lats = np.radians(lats)
+    lngs = np.radians(lngs)
+    origin_lat = math.radians(origin_lat)
+    origin_lng = math.radians(origin_lng)
+
+    a = np.sin((lats - origin_lat) / 2) ** 2 + np.cos(lats) * math.cos(origin_lat) * np.sin((lngs - origin_lng) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def heuristic_scores(campsites, query_analysis, location=None):
+    """
+    すべての候補をまとめて機械的に採点する関数
+    値がない項目（評価のないキャンプ場、座標のないキャンプ場など）は、その候補では重みから除いて採点する
+
+    Args:
+        campsites (list): 検索結果のキャンプ場リスト
+        query_analysis (dict): クエリ解析結果
+        location (dict, optional): 検索地点の位置情報（lat, lng）
+
+    Returns:
+        numpy.ndarray: 候補ごとの点数（0-1）
+    """
+    count = len(campsites)
+    if not count:
+        return np.zeros(0)
+
+    values = np.zeros((count, len(RANKING_WEIGHTS)))
+    available = np.zeros((count, len(RANKING_WEIGHTS)), dtype=bool)
+
+    # テキストの一致（特徴要素・施設要素のうち、キャンプ場のテキストに含まれる割合）
+    terms = _query_terms(query_analysis)
+    if terms:
+        texts = [_campsite_text(site) for site in campsites]
+        matches = np.array([[term in text for term in terms] for text in texts], dtype=float)
+        values[:, 0] = matches.mean(axis=1)
+        available[:, 0] = True
+
+    # 評価（0-5）
+    ratings = np.array([float(site.get("rating") or 0) for site in campsites])
+    values[:, 1] = np.clip(ratings / 5.0, 0.0, 1.0)
+    available[:, 1] = ratings > 0
+
+    # 口コミ数（対数で抑え、候補の中の最大値で割る）
+    reviews = np.log1p(np.array([max(0.0, float(site.get("reviews_count") or 0)) for site in campsites]))
+    if reviews.max() > 0:
+        values[:, 2] = reviews / reviews.max()
+        available[:, 2] = True
+
+    # 検索地点からの距離
+    origin = get_coordinates(location)
+    if origin:
+        coordinates = [get_coordinates(site.get("location")) for site in campsites]
+        has_coordinates = np.array([coordinate is not None for coordinate in coordinates])
+        if has_coordinates.any():
+            points = np.array([coordinate or origin for coordinate in coordinates])
+            distances = haversine_km(points[:, 0], points[:, 1], origin[0], origin[1])
+            values[:, 3] = np.exp(-distances / RANKING_DISTANCE_SCALE_KM)
+            available[:, 3] = has_coordinates
+
+    weights = RANKING_WEIGHTS * available
+    totals = weights.sum(axis=1)
+    scores = np.divide((weights * values).sum(axis=1), totals, out=np.zeros(count), where=totals > 0)
+    return scores
+
+
+def rank_by_heuristic(campsites, query_analysis, location=None):
+    """
+    すべての候補を機械的に採点し、点数順に並べる関数
+    点数は heuristic_score に、2段階目で評価しない場合の順位に使えるように score にも設定する
+    （2段階目の評価後の score も0-1なので、評価したキャンプ場としないキャンプ場を同じ基準で並べられる）
+
+    Args:
+        campsites (list): 検索結果のキャンプ場リスト
+        query_analysis (dict): クエリ解析結果
+        location (dict, optional): 検索地点の位置情報（lat, lng）
+
+    Returns:
+        list: 点数順に並べたキャンプ場リスト
+    """
+    scores = heuristic_scores(campsites, query_analysis, location)
+
+    for campsite, score in zip(campsites, scores):
+        campsite["heuristic_score"] = round(float(score), 3)
+        campsite["score"] = round(float(score), 2)
+
+    # 同じ点数の場合は元の順番（検索ソースの優先順位）を保つ
+    order = np.argsort(-scores, kind="stable")
+    return [campsites[index] for index in order]
+
+
+def is_decisive(ranked_campsites, margin=RERANK_DECISIVE_MARGIN, head_size=RERANK_HEAD_SIZE):
+    """
+    上位の候補の順位が、2段階目で評価しなくても確定しているか判定する関数
+    上位head_size件とその次の候補について、隣り合う候補の点数の差がすべてmargin以上の場合に確定とみなす
+
+    Args:
+        ranked_campsites (list): 点数順に並べたキャンプ場リスト
+        margin (float, optional): 確定とみなす点数の差
+        head_size (int, optional): 差を確認する上位の件数
+
+    Returns:
+        bool: 確定している場合はTrue
+    """
+    scores = np.array([site.get("heuristic_score", 0) for site in ranked_campsites[: head_size + 1]], dtype=float)
+    if len(scores) < 2:
+        return True
+
+    return bool(np.all(scores[:-1] - scores[1:] >= margin))
+
+
+def plan_rerank(ranked_campsites, elapsed, workers, chunk_size):
+    """
+    2段階目で評価する候補数を決める関数
+    残り時間で実行できる巡数 × 1巡で同時に評価できる件数を上限とし、上位の順位が確定している場合や
+    下限の件数を評価する時間が残っていない場合は0を返す
+
+    Args:
+        ranked_campsites (list): 点数順に並べたキャンプ場リスト
+        elapsed (float): 検索開始からの経過時間（秒）
+        workers (int): 同時に評価する呼び出し数
+        chunk_size (int): 1回の呼び出しで評価する最大件数
+
+    Returns:
+        tuple: (評価する候補数, 理由)
+    """
+    if not ranked_campsites:
+        return 0, "候補なし"
+
+    if is_decisive(ranked_campsites):
+        return 0, "上位の差が十分"
+
+    with _lock:
+        round_seconds = _round_seconds
+
+    remaining = RANKING_LATENCY_BUDGET - elapsed
+    rounds = int(remaining // round_seconds) if round_seconds > 0 else 1
+    k = min(RERANK_MAX_K, len(ranked_campsites), rounds * max(1, workers) * max(1, chunk_size))
+
+    if k < min(RERANK_MIN_K, len(ranked_campsites)):
+        return 0, f"残り時間不足（残り{remaining:.1f}秒）"
+
+    return k, f"残り{remaining:.1f}秒で{k}件"
+
+
+def record_rerank_latency(seconds, rounds=1):
+    """
+    2段階目にかかった時間を記録し、1巡にかかる時間の推定値を更新する関数
+
+    Args:
+        seconds (float): 2段階目にかかった時間（秒）
+        rounds (int, optional): 実行した巡数
+    """
+    global _round_seconds
+
+    if rounds <= 0 or seconds <= 0:
+        return
+
+    with _lock:
+        observed = seconds / rounds
+        _round_seconds = (1 - RERANK_LATENCY_SMOOTHING) * _round_seconds + RERANK_LATENCY_SMOOTHING * observed
+
+    if DEBUG:
+        print(f"[CascadeRanker] 2段階目: {seconds:.2f}秒（1巡の推定: {_round_seconds:.2f}秒）")
+
+
+def get_rerank_round_seconds():
+    """
+    2段階目の1巡にかかる時間の推定値を取得する関数
+
+    Returns:
+        float: 推定値（秒）
+    """
+    with _lock:
+        return _round_seconds
@@ -0,0 +1,423 @@
+"""
+Google Custom Search APIを呼び出すモジュール
+正規化したクエリとパラメータをキーとして応答をSQLiteに保存して再利用し、
+10件を超える結果が必要な場合は複数のページ（start）を同時に取得します
+1秒あたりの呼び出し数と1日あたりの呼び出し数の上限を守り、上限に達した場合は保存済みの応答だけを使います
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+import requests
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# 環境変数の読み込み
+load_dotenv()
+
+# APIキーの取得
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID")
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# Google Custom Search APIのエンドポイント
+CSE_ENDPOINT = "https://www.googleapis.com/customsearch/v1"
+
+# 1ページあたりの最大件数と、取得できる結果の最大位置（APIの仕様）
+CSE_PAGE_SIZE = 10
+CSE_MAX_RESULTS = 100
+
+# 応答の保存先（LLMの応答キャッシュと同じディレクトリ）
+CSE_CACHE_PATH = os.getenv(
+    "CSE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "cse_cache.sqlite3"),
+)
+
+# 応答の有効期限（秒）と最大件数
+CSE_CACHE_TTL = float(os.getenv("CSE_CACHE_TTL", str(7 * 24 * 60 * 60)))
+CSE_CACHE_MAX_ENTRIES = int(os.getenv("CSE_CACHE_MAX_ENTRIES", "5000"))
+
+# キャッシュを無効にする場合は CSE_CACHE_ENABLED=false
+CSE_CACHE_ENABLED = os.getenv("CSE_CACHE_ENABLED", "True").lower() == "true"
+
+# 1秒あたりと1日あたりの呼び出し数の上限（無料枠は1日100回）
+CSE_MAX_QPS = float(os.getenv("CSE_MAX_QPS", "5"))
+CSE_DAILY_QUOTA = int(os.getenv("CSE_DAILY_QUOTA", "100"))
+
+# 呼び出し数の上限のエラー（429）を受けた後、呼び出しを控える時間（秒）
+CSE_BACKOFF_SECONDS = float(os.getenv("CSE_BACKOFF_SECONDS", "60"))
+
+# 1回の呼び出しの制限時間（秒）
+CSE_REQUEST_TIMEOUT = float(os.getenv("CSE_REQUEST_TIMEOUT", "10"))
+
+# 複数のページを同時に取得する数
+CSE_PAGE_WORKERS = 4
+
+# 1日の呼び出し数が切り替わるタイムゾーン（太平洋時間。夏時間は考慮しない）
+QUOTA_TIMEZONE = timezone(timedelta(hours=-8))
+
+# 件数の上限を超えたときに、上限より少し多めに削除して削除の頻度を抑える
+EVICTION_MARGIN = 0.1
+
+# ヒット率などの統計
+_stats = {"hits": 0, "misses": 0, "requests": 0, "throttled": 0, "errors": 0}
+
+_connection = None
+_lock = threading.Lock()
+
+# 呼び出し間隔の調整
+_throttle_lock = threading.Lock()
+_next_request_at = 0.0
+_cooldown_until = 0.0
+
+
+class CustomSearchError(Exception):
+    """Google Custom Search APIの呼び出しに失敗した場合の例外"""
+
+
+class CustomSearchQuotaError(CustomSearchError):
+    """呼び出し数の上限に達していて、APIを呼び出せない場合の例外"""
+
+
+def normalize_query(query):
+    """
+    キャッシュキー用に検索クエリを正規化する関数
+    全角・半角や空白の違いだけのクエリを同じものとして扱う
+
+    Args:
+        query (str): 検索クエリ
+
+    Returns:
+        str: 正規化したクエリ
+    """
+    return " ".join(unicodedata.normalize("NFKC", query or "").lower().split())
+
+
+def make_cache_key(query, params):
+    """
+    キャッシュキーを作成する関数（APIキーは含めない）
+
+    Args:
+        query (str): 検索クエリ
+        params (dict): 検索クエリ以外のパラメータ（num, start, lr, glなど）
+
+    Returns:
+        str: キャッシュキー（SHA-256）
+    """
+    payload = json.dumps(
+        {"cx": GOOGLE_CSE_ID, "q": normalize_query(query), "params": params or {}},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _get_connection():
+    """SQLiteの接続を取得する（初回のみテーブルを作成する。ロックを取得した状態で呼ぶ）"""
+    global _connection
+
+    if _connection is None:
+        os.makedirs(os.path.dirname(CSE_CACHE_PATH), exist_ok=True)
+        _connection = sqlite3.connect(CSE_CACHE_PATH, check_same_thread=False)
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cse_cache (
+                key TEXT PRIMARY KEY,
+                query TEXT,
+                response TEXT,
+                created_at REAL,
+                accessed_at REAL
+            )
+            """
+        )
+        _connection.execute("CREATE INDEX IF NOT EXISTS idx_cse_cache_accessed_at ON cse_cache (accessed_at)")
+        _connection.execute("CREATE TABLE IF NOT EXISTS cse_quota (day TEXT PRIMARY KEY, count INTEGER)")
+        _connection.commit()
+
+    return _connection
+
+
+def _get_cached_page(key):
+    """保存されている応答を取得する（ない場合・期限切れの場合はNone）"""
+    if not CSE_CACHE_ENABLED:
+        return None
+
+    try:
+        with _lock:
+            connection = _get_connection()
+            row = connection.execute("SELECT response, created_at FROM cse_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or time.time() - row[1] > CSE_CACHE_TTL:
+                _stats["misses"] += 1
+                return None
+
+            connection.execute("UPDATE cse_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            connection.commit()
+            _stats["hits"] += 1
+            return json.loads(row[0])
+
+    except Exception as e:
+        _stats["errors"] += 1
+        if DEBUG:
+            print(f"[CSE] キャッシュ読み込みエラー: {str(e)}")
+        return None
+
+
+def _set_cached_page(key, query, data):
+    """応答を保存する（件数の上限を超えた場合は最近使われていないものから削除する）"""
+    if not CSE_CACHE_ENABLED:
+        return
+
+    try:
+        with _lock:
+            connection = _get_connection()
+            now = time.time()
+            connection.execute(
+                "INSERT OR REPLACE INTO cse_cache (key, query, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, query, json.dumps(data, ensure_ascii=False), now, now),
+            )
+
+            count = connection.execute("SELECT COUNT(*) FROM cse_cache").fetchone()[0]
+            if count > CSE_CACHE_MAX_ENTRIES:
+                deleted = connection.execute("DELETE FROM cse_cache WHERE created_at < ?", (now - CSE_CACHE_TTL,)).rowcount
+                overflow = count - deleted - int(CSE_CACHE_MAX_ENTRIES * (1 - EVICTION_MARGIN))
+                if overflow > 0:
+                    connection.execute(
+                        "DELETE FROM cse_cache WHERE key IN (SELECT key FROM cse_cache ORDER BY accessed_at LIMIT ?)",
+                        (overflow,),
+                    )
+
+            connection.commit()
+
+    except Exception as e:
+        _stats["errors"] += 1
+        if DEBUG:
+            print(f"[CSE] キャッシュ書き込みエラー: {str(e)}")
+
+
+def _quota_day():
+    """1日の呼び出し数を数える日付"""
+    return datetime.now(QUOTA_TIMEZONE).strftime("%Y-%m-%d")
+
+
+def _consume_daily_quota():
+    """1日の呼び出し数を1つ使う（上限に達している場合はFalse）"""
+    try:
+        with _lock:
+            connection = _get_connection()
+            day = _quota_day()
+            row = connection.execute("SELECT count FROM cse_quota WHERE day = ?", (day,)).fetchone()
+            count = row[0] if row else 0
+            if count >= CSE_DAILY_QUOTA:
+                return False
+
+            connection.execute("INSERT OR REPLACE INTO cse_quota (day, count) VALUES (?, ?)", (day, count + 1))
+            connection.execute("DELETE FROM cse_quota WHERE day <> ?", (day,))
+            connection.commit()
+            return True
+
+    except Exception as e:
+        # 数えられない場合は呼び出しを止めない
+        if DEBUG:
+            print(f"[CSE] 呼び出し数の記録エラー: {str(e)}")
+        return True
+
+
+def _wait_for_request_slot():
+    """
+    1秒あたりの呼び出し数の上限に収まるまで待つ
+
+    Raises:
+        CustomSearchQuotaError: 呼び出し数の上限のエラーを受けた直後、または1日の上限に達している場合
+    """
+    global _next_request_at
+
+    with _throttle_lock:
+        now = time.time()
+        if now < _cooldown_until:
+            raise CustomSearchQuotaError(f"呼び出しを控えています（残り{_cooldown_until - now:.0f}秒）")
+
+        wait = _next_request_at - now
+        _next_request_at = max(now, _next_request_at) + (1.0 / CSE_MAX_QPS if CSE_MAX_QPS > 0 else 0.0)
+
+    if not _consume_daily_quota():
+        raise CustomSearchQuotaError(f"1日の呼び出し数の上限（{CSE_DAILY_QUOTA}回）に達しました")
+
+    if wait > 0:
+        time.sleep(wait)
+
+
+def _start_cooldown(retry_after=None):
+    """呼び出し数の上限のエラーを受けた後、しばらく呼び出しを控える"""
+    global _cooldown_until
+
+    try:
+        seconds = float(retry_after) if retry_after else CSE_BACKOFF_SECONDS
+    except ValueError:
+        seconds = CSE_BACKOFF_SECONDS
+
+    with _throttle_lock:
+        _cooldown_until = max(_cooldown_until, time.time() + seconds)
+
+
+def fetch_page(query, num=CSE_PAGE_SIZE, start=1, **params):
+    """
+    検索結果を1ページ取得する関数（保存済みの応答があればAPIを呼ばない）
+
+    Args:
+        query (str): 検索クエリ
+        num (int, optional): 取得する件数（最大10件）
+        start (int, optional): 取得する最初の結果の位置（1から）
+        **params: その他のパラメータ（lr, glなど）
+
+    Returns:
+        dict: APIの応答
+
+    Raises:
+        CustomSearchError: APIキーがない場合・APIがエラーを返した場合
+        CustomSearchQuotaError: 呼び出し数の上限に達している場合
+    """
+    if not GOOGLE_API_KEY or not GOOGLE_CSE_ID:
+        raise CustomSearchError("GOOGLE_API_KEYまたはGOOGLE_CSE_IDが設定されていません。")
+
+    request_params = dict(params, num=max(1, min(CSE_PAGE_SIZE, num)), start=start)
+    key = make_cache_key(query, request_params)
+
+    cached = _get_cached_page(key)
+    if cached is not None:
+        return cached
+
+    try:
+        _wait_for_request_slot()
+    except CustomSearchQuotaError:
+        _stats["throttled"] += 1
+        raise
+
+    _stats["requests"] += 1
+    if DEBUG:
+        print(f"[CSE] 検索: '{query}'（start={start}, num={request_params['num']}）")
+
+    try:
+        response = requests.get(
+            CSE_ENDPOINT,
+            params=dict(request_params, key=GOOGLE_API_KEY, cx=GOOGLE_CSE_ID, q=query),
+            timeout=CSE_REQUEST_TIMEOUT,
+        )
+    except requests.RequestException as e:
+        _stats["errors"] += 1
+        raise CustomSearchError(f"Google Custom Search APIに接続できませんでした: {str(e)}")
+
+    if response.status_code == 429:
+        _start_cooldown(response.headers.get("Retry-After"))
+        raise CustomSearchQuotaError("Google Custom Search APIの呼び出し数の上限に達しました")
+
+    try:
+        data = response.json()
+    except ValueError:
+        raise CustomSearchError(f"Google Custom Search APIエラー: {response.status_code}")
+
+    if response.status_code != 200 or "error" in data:
+        message = data.get("error", {}).get("message", response.status_code) if isinstance(data, dict) else response.status_code
+        raise CustomSearchError(f"Google Custom Search APIエラー: {message}")
+
+    _set_cached_page(key, query, data)
+    return data
+
+
+def search_items(query, num_results=CSE_PAGE_SIZE, **params):
+    """
+    検索結果の項目を取得する関数
+    最初のページを取得し、10件を超える場合は、検索結果の総数から必要と分かった残りのページだけを
+    同時に取得して順番通りにつなげる（結果のないページで呼び出し数の上限を使わない）
+
+    Args:
+        query (str): 検索クエリ
+        num_results (int, optional): 取得する件数（最大100件）
+        **params: その他のパラメータ（lr, glなど）
+
+    Returns:
+        list: 検索結果の項目（APIの応答のitems）のリスト
+            一部のページを取得できなかった場合は、取得できたページの項目だけを返す
+
+    Raises:
+        CustomSearchError: 最初のページを取得できなかった場合
+    """
+    num_results = max(1, min(CSE_MAX_RESULTS, num_results))
+    starts = list(range(1, num_results + 1, CSE_PAGE_SIZE))
+    sizes = [min(CSE_PAGE_SIZE, num_results - start + 1) for start in starts]
+
+    first_page = fetch_page(query, sizes[0], starts[0], **params)
+    items = list(first_page.get("items", []))
+
+    # 最初のページが1ページ分に満たない場合・次のページがない場合は、それ以降のページに結果はない
+    if len(starts) == 1 or len(items) < sizes[0] or not first_page.get("queries", {}).get("nextPage"):
+        return items
+
+    total_results = _total_results(first_page)
+    if total_results is not None:
+        remaining = [(start, size) for start, size in zip(starts[1:], sizes[1:]) if start <= total_results]
+    else:
+        remaining = list(zip(starts[1:], sizes[1:]))
+
+    if DEBUG:
+        print(f"[CSE] 検索結果の総数: {total_results}件、残り{len(remaining)}ページを取得します")
+
+    if not remaining:
+        return items
+
+    with ThreadPoolExecutor(max_workers=min(CSE_PAGE_WORKERS, len(remaining)), thread_name_prefix="cse") as executor:
+        futures = [executor.submit(fetch_page, query, size, start, **params) for start, size in remaining]
+
+        for (start, size), future in zip(remaining, futures):
+            try:
+                page_items = future.result().get("items", [])
+            except CustomSearchError as e:
+                if DEBUG:
+                    print(f"[CSE] {start}件目以降を取得できませんでした: {str(e)}")
+                break
+
+            items.extend(page_items)
+            # 結果が1ページ分に満たない場合は、それ以降のページに結果はない
+            if len(page_items) < size:
+                break
+
+    return items
+
+
+def _total_results(response):
+    """APIの応答から検索結果の総数を取得する（分からない場合はNone）"""
+    try:
+        return int(response["searchInformation"]["totalResults"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def get_cse_stats():
+    """
+    呼び出しとキャッシュの統計を取得する関数
+
+    Returns:
+        dict: hits, misses, requests, throttled, errors, hit_rate
+    """
+    stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+
+def clear_cse_cache():
+    """保存した応答をすべて削除する関数"""
+    try:
+        with _lock:
+            connection = _get_connection()
+            connection.execute("DELETE FROM cse_cache")
+            connection.commit()
+    except Exception as e:
+        if DEBUG:
+            print(f"[CSE] キャッシュ削除エラー: {str(e)}")
@@ -0,0 +1,437 @@
+"""
+複数の検索ソース（Places API・周辺検索・Web検索・Gemini）の結果から、同じキャンプ場をまとめるモジュール
+キャンプ場名を正規化したキーと、座標のジオハッシュで候補を絞り込んでから照合するため、
+件数にほぼ比例する時間でまとめられます。まとめたキャンプ場の各項目は、ソースの優先順位で決まります
+"""
+
+import os
+import re
+import math
+import unicodedata
+from dotenv import load_dotenv
+from utils.geocoding import get_coordinates
+
+# 環境変数の読み込み
+load_dotenv()
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# ソースの優先順位（小さい方の値を優先する。同じ優先順位の場合は先に届いた結果を優先する）
+SOURCE_PRECEDENCE = {
+    "places_api": 0,
+    "places_api_new": 0,
+    "nearby": 1,
+    "web": 2,
+    "web_search": 2,
+    "gemini": 3,
+    "gemini_analysis": 4,
+}
+
+# キャンプ場名から取り除く語（長いものから順に取り除く）
+NAME_NOISE_WORDS = ["オートキャンプ場", "キャンプ場", "公式サイト", "公式", "予約"]
+
+# キャンプ場名の照合時に取り除く記号・空白
+NAME_SYMBOL_PATTERN = re.compile(r"[\s\-‐―~〜・･|｜/\\()\[\]【】「」『』<>《》,.、。!?:;'\"]+")
+
+# ジオハッシュの精度（6桁で約1.2km×0.6km）
+GEOHASH_PRECISION = 6
+
+# 同じ名前のキャンプ場を同じとみなす最大距離（km）
+SAME_NAME_MAX_DISTANCE_KM = float(os.getenv("ENTITY_SAME_NAME_MAX_DISTANCE_KM", "5"))
+
+# 近くにある似た名前のキャンプ場を同じとみなす最大距離（km）と、名前の類似度の下限
+NEARBY_MAX_DISTANCE_KM = float(os.getenv("ENTITY_NEARBY_MAX_DISTANCE_KM", "1"))
+NEARBY_NAME_SIMILARITY = float(os.getenv("ENTITY_NEARBY_NAME_SIMILARITY", "0.5"))
+
+# 複数のソースの値をまとめる項目（リストの和集合を取る）
+LIST_FIELDS = ("features", "facilities")
+
+# ジオハッシュの文字
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# 地球の半径（km）
+EARTH_RADIUS_KM = 6371.0
+
+
+def normalize_campsite_name(name):
+    """
+    照合用にキャンプ場名を正規化する関数
+    全角・半角をそろえ、「キャンプ場」「オートキャンプ場」「公式」などの語と記号・空白を取り除く
+
+    Args:
+        name (str): キャンプ場名
+
+    Returns:
+        str: 正規化したキャンプ場名（取り除くと空になる場合は記号・空白だけを取り除いたもの）
+    """
+    text = unicodedata.normalize("NFKC", name or "").lower()
+    stripped = text
+    for word in NAME_NOISE_WORDS:
+        stripped = stripped.replace(word.lower(), " ")
+
+    key = NAME_SYMBOL_PATTERN.sub("", stripped)
+    return key or NAME_SYMBOL_PATTERN.sub("", text)
+
+
+def name_similarity(a, b):
+    """
+    正規化したキャンプ場名の類似度を計算する関数（文字バイグラムのDice係数）
+    一方が他方に含まれるだけでは似ているとみなさない（「富士」と「富士見高原」は別のキャンプ場）
+
+    Args:
+        a (str): 正規化したキャンプ場名
+        b (str): 正規化したキャンプ場名
+
+    Returns:
+        float: 類似度（0-1）
+    """
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+
+    bigrams_a = {a[i : i + 2] for i in range(len(a) - 1)} or {a}
+    bigrams_b = {b[i : i + 2] for i in range(len(b) - 1)} or {b}
+    return 2 * len(bigrams_a & bigrams_b) / (len(bigrams_a) + len(bigrams_b))
+
+
+def encode_geohash(lat, lng, precision=GEOHASH_PRECISION):
+    """
+    緯度経度をジオハッシュに変換する関数
+
+    Args:
+        lat (float): 緯度
+        lng (float): 経度
+        precision (int, optional): 桁数
+
+    Returns:
+        str: ジオハッシュ
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        value_range, value = (lng_range, lng) if even else (lat_range, lat)
+        middle = (value_range[0] + value_range[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            value_range[0] = middle
+        else:
+            bits = bits * 2
+            value_range[1] = middle
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(geohash)
+
+
+def geohash_neighbors(lat, lng, precision=GEOHASH_PRECISION):
+    """
+    緯度経度を含むジオハッシュのセルと、その周囲8セルのジオハッシュを返す関数
+
+    Args:
+        lat (float): 緯度
+        lng (float): 経度
+        precision (int, optional): 桁数
+
+    Returns:
+        set: ジオハッシュの集合
+    """
+    lng_bits = (precision * 5 + 1) // 2
+    lat_bits = precision * 5 // 2
+    lat_step = 180.0 / (2**lat_bits)
+    lng_step = 360.0 / (2**lng_bits)
+
+    return {
+        encode_geohash(max(-90.0, min(90.0, lat + dy * lat_step)), (lng + dx * lng_step + 180.0) % 360.0 - 180.0, precision)
+        for dy in (-1, 0, 1)
+        for dx in (-1, 0, 1)
+    }
+
+
+def distance_km(a, b):
+    """
+    2地点間の距離を計算する関数
+
+    Args:
+        a (tuple): (緯度, 経度)
+        b (tuple): (緯度, 経度)
+
+    Returns:
+        float: 距離（km）
+    """
+    lat_a, lng_a, lat_b, lng_b = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat_b - lat_a) / 2) ** 2 + math.cos(lat_a) * math.cos(lat_b) * math.sin((lng_b - lng_a) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, h)))
+
+
+def _is_empty(value):
+    """まとめるときに値がないとみなすか（0の評価・口コミ数も値がないとみなす）"""
+    return value is None or value == "" or value == 0 or (isinstance(value, (list, tuple, dict)) and not value)
+
+
+class CampsiteResolver:
+    """
+    検索ソースごとの結果から同じキャンプ場をまとめるクラス
+    同じplace_id、同じ正規化名（座標が近い場合）、同じまたは隣り合うジオハッシュのセルにある似た名前のキャンプ場を
+    同じキャンプ場とみなす。照合する候補はキーの辞書で絞り込むため、1件あたりの処理はほぼ定数時間
+    ただし、異なるplace_idを持つレコード同士や、座標がSAME_NAME_MAX_DISTANCE_KMより離れたレコード同士は、
+    座標のないレコードを介しても同じまとまりにしない
+    """
+
+    def __init__(self):
+        self._records = []
+        self._parent = []
+        self._by_place_id = {}
+        self._by_name = {}
+        self._by_geohash = {}
+        self._place_ids = {}
+        self._coordinates = {}
+        self.entity_count = 0
+        self.sources = []
+
+    def _find_root(self, record_id):
+        """まとまりの代表のレコードを返す（経路を圧縮する）"""
+        root = record_id
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[record_id] != root:
+            self._parent[record_id], record_id = root, self._parent[record_id]
+        return root
+
+    def _conflicts(self, root_a, root_b):
+        """
+        2つのまとまりが矛盾するか
+        異なるplace_idを持つ場合と、分かっている座標同士がSAME_NAME_MAX_DISTANCE_KMより離れている場合に矛盾する
+        （どちらかがplace_id・座標を持たない場合は、その項目では矛盾しない）
+        """
+        place_ids_a = self._place_ids.get(root_a)
+        place_ids_b = self._place_ids.get(root_b)
+        if place_ids_a and place_ids_b and place_ids_a != place_ids_b:
+            return True
+
+        return any(
+            distance_km(a, b) > SAME_NAME_MAX_DISTANCE_KM
+            for a in self._coordinates.get(root_a, ())
+            for b in self._coordinates.get(root_b, ())
+        )
+
+    def _union(self, a, b):
+        """
+        2つのレコードのまとまりを1つにする（先に登録したレコードを代表にする）
+        異なるplace_idを持つまとまり同士や、座標が離れすぎているまとまり同士はまとめない
+
+        Returns:
+            bool: 同じまとまりになった場合はTrue
+        """
+        root_a, root_b = self._find_root(a), self._find_root(b)
+        if root_a == root_b:
+            return True
+        if self._conflicts(root_a, root_b):
+            return False
+        if root_b < root_a:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        place_ids = self._place_ids.pop(root_b, None)
+        if place_ids:
+            self._place_ids.setdefault(root_a, set()).update(place_ids)
+        coordinates = self._coordinates.pop(root_b, None)
+        if coordinates:
+            self._coordinates.setdefault(root_a, []).extend(coordinates)
+        self.entity_count -= 1
+        return True
+
+    def _distance(self, coordinates, record_id):
+        """レコードとの距離（km。どちらかに座標がない場合はNone）"""
+        other = self._records[record_id]["coordinates"]
+        if coordinates is None or other is None:
+            return None
+        return distance_km(coordinates, other)
+
+    def find(self, campsite):
+        """
+        キャンプ場と同じとみなせる登録済みのレコードを返す
+
+        Args:
+            campsite (dict): キャンプ場データ
+
+        Returns:
+            list: 登録済みのレコードの番号（登録順）
+        """
+        name_key = normalize_campsite_name(campsite.get("name", ""))
+        coordinates = get_coordinates(campsite.get("location"))
+        matches = set()
+
+        place_id = campsite.get("place_id")
+        if place_id and place_id in self._by_place_id:
+            matches.update(self._by_place_id[place_id])
+
+        def conflicts(record_id):
+            """異なるplace_idを持つまとまりのレコードか"""
+            if not place_id:
+                return False
+            place_ids = self._place_ids.get(self._find_root(record_id))
+            return bool(place_ids) and place_id not in place_ids
+
+        # 同じ正規化名（座標が分かる場合は近くにあるものだけ）
+        for record_id in self._by_name.get(name_key, []) if name_key else []:
+            if conflicts(record_id):
+                continue
+            distance = self._distance(coordinates, record_id)
+            if distance is None or distance <= SAME_NAME_MAX_DISTANCE_KM:
+                matches.add(record_id)
+
+        # 同じまたは隣り合うセルにある似た名前のキャンプ場
+        if coordinates is not None and name_key:
+            for geohash in geohash_neighbors(*coordinates):
+                for record_id in self._by_geohash.get(geohash, []):
+                    if record_id in matches or conflicts(record_id):
+                        continue
+                    distance = self._distance(coordinates, record_id)
+                    if (
+                        distance is not None
+                        and distance <= NEARBY_MAX_DISTANCE_KM
+                        and name_similarity(name_key, self._records[record_id]["name_key"]) >= NEARBY_NAME_SIMILARITY
+                    ):
+                        matches.add(record_id)
+
+        return sorted(matches)
+
+    def add(self, source, campsites):
+        """
+        検索ソースの結果を登録する
+
+        Args:
+            source (str): 検索ソース名（Noneの場合はキャンプ場データのsourceを使う）
+            campsites (list): キャンプ場データのリスト
+
+        Returns:
+            int: 増えたキャンプ場の数（既存のキャンプ場とまとめたものは数えない）
+        """
+        before = self.entity_count
+
+        for index, campsite in enumerate(campsites or []):
+            if not isinstance(campsite, dict) or not (campsite.get("place_id") or campsite.get("name")):
+                continue
+
+            record_source = source or campsite.get("source", "")
+            matches = self.find(campsite)
+
+            record_id = len(self._records)
+            name_key = normalize_campsite_name(campsite.get("name", ""))
+            coordinates = get_coordinates(campsite.get("location"))
+            self._records.append(
+                {
+                    "campsite": campsite,
+                    "source": record_source,
+                    "rank": (SOURCE_PRECEDENCE.get(record_source, len(SOURCE_PRECEDENCE)), record_id),
+                    "name_key": name_key,
+                    "coordinates": coordinates,
+                }
+            )
+            self._parent.append(record_id)
+            self.entity_count += 1
+
+            if campsite.get("place_id"):
+                self._by_place_id.setdefault(campsite["place_id"], []).append(record_id)
+                self._place_ids[record_id] = {campsite["place_id"]}
+            if name_key:
+                self._by_name.setdefault(name_key, []).append(record_id)
+            if coordinates is not None:
+                self._by_geohash.setdefault(encode_geohash(*coordinates), []).append(record_id)
+                self._coordinates[record_id] = [coordinates]
+
+            for match in matches:
+                self._union(record_id, match)
+
+            if record_source and record_source not in self.sources:
+                self.sources.append(record_source)
+
+        return max(0, self.entity_count - before)
+
+    def groups(self):
+        """
+        同じキャンプ場のレコードのまとまりを返す（まとまりの中も、まとまり同士もソースの優先順位の順）
+
+        Returns:
+            list: レコードのリストのリスト
+        """
+        groups = {}
+        for record_id, record in enumerate(self._records):
+            groups.setdefault(self._find_root(record_id), []).append(record)
+
+        ordered = [sorted(records, key=lambda record: record["rank"]) for records in groups.values()]
+        return sorted(ordered, key=lambda records: records[0]["rank"])
+
+    def campsites(self):
+        """
+        同じキャンプ場をまとめたキャンプ場データのリストを返す
+        各項目は優先順位の高いソースの値を使い、値がない項目だけ次のソースの値で補う
+        特徴・設備はすべてのソースの値を優先順位の順につなげる
+
+        Returns:
+            list: キャンプ場データのリスト（sources, occurrence_count, multiple_sourcesを含む）
+        """
+        return [merge_campsite_records(records) for records in self.groups()]
+
+
+def merge_campsite_records(records):
+    """
+    同じキャンプ場のレコードを1つのキャンプ場データにまとめる関数
+
+    Args:
+        records (list): 優先順位の順に並べたレコードのリスト
+
+    Returns:
+        dict: まとめたキャンプ場データ
+    """
+    merged = dict(records[0]["campsite"])
+
+    for record in records[1:]:
+        for key, value in record["campsite"].items():
+            if key in LIST_FIELDS and isinstance(value, list) and isinstance(merged.get(key), list):
+                merged[key] = merged[key] + [item for item in value if item not in merged[key]]
+            elif _is_empty(merged.get(key)) and not _is_empty(value):
+                merged[key] = value
+
+    sources = []
+    for record in records:
+        if record["source"] and record["source"] not in sources:
+            sources.append(record["source"])
+
+    merged["sources"] = sources
+    merged["occurrence_count"] = len(records)
+    merged["multiple_sources"] = len(sources) > 1
+    return merged
+
+
+def resolve_campsites(*source_results):
+    """
+    複数の検索ソースの結果から同じキャンプ場をまとめる関数
+
+    Args:
+        *source_results: (検索ソース名, キャンプ場データのリスト) のタプル
+            ソース名がNoneの場合はキャンプ場データのsourceを使う
+
+    Returns:
+        list: まとめたキャンプ場データのリスト（ソースの優先順位、ソース内の順位の順）
+    """
+    resolver = CampsiteResolver()
+    for source, campsites in source_results:
+        resolver.add(source, campsites)
+
+    if DEBUG:
+        total = sum(len(campsites or []) for _, campsites in source_results)
+        print(f"[EntityResolution] {total}件を{resolver.entity_count}件のキャンプ場にまとめました")
+
+    return resolver.campsites()
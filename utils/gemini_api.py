@@ -1,8 +1,11 @@
 import os
-import google.generativeai as genai
 import json
 import requests
 from dotenv import load_dotenv
+from utils.gemini_client import generate_text, iter_text
+from utils.json_stream import iter_json_array, extract_json
+from utils.prompt_builder import review_excerpts
+from utils.prompt_templates import register_prompt_template
 
 # 環境変数の読み込み
 load_dotenv()
@@ -14,11 +17,50 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     print("警告: GEMINI_API_KEYが設定されていません。.envファイルまたはStreamlit Secretsを確認してください。")
 
-# Gemini APIの初期化
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-except Exception as e:
-    print(f"Gemini APIの初期化中にエラーが発生しました: {str(e)}")
+# キャンプ場検索のプロンプト
+CAMPSITE_SEARCH_PROMPT = register_prompt_template(
+    "campsite_search",
+    prefix="""
+    あなたは日本のキャンプ場に関する専門家です。検索条件に合うキャンプ場を5つ探して、JSON形式で詳細情報を提供してください。
+
+    各キャンプ場について、以下の情報を含めてください：
+    - name: キャンプ場の名前
+    - region: 地域（都道府県）
+    - address: 住所
+    - description: キャンプ場の特徴や魅力の説明（200文字程度）
+    - rating: 評価（0〜5の数値、小数点第一位まで）
+    - reviews_count: レビュー数（整数）
+    - price: 料金の目安（文字列、例: "¥3,000〜/泊"）
+    - facilities: 施設・設備のリスト（配列）
+    - features: 特徴のリスト（配列）
+    - location: 緯度・経度（lat, lngのオブジェクト）
+    - reviews: レビュー情報の配列（各レビューはname, rating, text, timeを含む）
+
+    回答は以下のJSON形式で返してください：
+    ```json
+    [
+      {
+        "name": "キャンプ場名",
+        "region": "地域",
+        "address": "住所",
+        "description": "説明",
+        "rating": 4.5,
+        "reviews_count": 100,
+        "price": "¥3,000〜/泊",
+        "facilities": ["トイレ", "シャワー", "電源"],
+        "features": ["湖畔", "ペット可"],
+        "location": {"lat": 35.123, "lng": 139.456},
+        "reviews": [
+          {"name": "レビュー投稿者名", "rating": 5, "text": "レビュー内容", "time": "2023年10月"}
+        ]
+      }
+    ]
+    ```
+    """,
+    body="""
+    検索条件: ${query}
+    """,
+)
 
 
 def get_gemini_response(prompt, temperature=0.7, max_output_tokens=2048):
@@ -41,18 +83,8 @@ def get_gemini_response(prompt, temperature=0.7, max_output_tokens=2048):
         if not GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEYが設定されていません。.envファイルに追加してください。")
 
-        # Geminiモデルの設定
-        model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash-lite",
-            generation_config={
-                "temperature": temperature,
-                "max_output_tokens": max_output_tokens,
-            },
-        )
-
-        # プロンプトを送信して応答を取得
-        response = model.generate_content(prompt)
-        return response.text
+        # プロンプトを送信して応答を取得（モデルは生成設定ごとに再利用される）
+        return generate_text(prompt, temperature=temperature, max_output_tokens=max_output_tokens)
 
     except Exception as e:
         raise Exception(f"Gemini API呼び出し中にエラーが発生しました: {str(e)}")
@@ -105,93 +137,33 @@ def search_campsites_gemini(query):
     if not GEMINI_API_KEY:
         raise ValueError("GEMINI_API_KEYが設定されていません。.envファイルに追加してください。")
 
-    # Gemini APIのエンドポイント
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-lite:generateContent?key={GEMINI_API_KEY}"
+    return list(iter_campsites_gemini(query))
 
-    # プロンプトの作成
-    prompt = f"""
-    あなたは日本のキャンプ場に関する専門家です。以下の条件に合うキャンプ場を5つ探して、JSON形式で詳細情報を提供してください。
 
-    検索条件: {query}
+def iter_campsites_gemini(query):
+    """
+    Gemini APIを使用してキャンプ場を検索し、応答の中でキャンプ場のデータが閉じた時点で順に返すジェネレータ
 
-    各キャンプ場について、以下の情報を含めてください：
-    - name: キャンプ場の名前
-    - region: 地域（都道府県）
-    - address: 住所
-    - description: キャンプ場の特徴や魅力の説明（200文字程度）
-    - rating: 評価（0〜5の数値、小数点第一位まで）
-    - reviews_count: レビュー数（整数）
-    - price: 料金の目安（文字列、例: "¥3,000〜/泊"）
-    - facilities: 施設・設備のリスト（配列）
-    - features: 特徴のリスト（配列）
-    - location: 緯度・経度（lat, lngのオブジェクト）
-    - reviews: レビュー情報の配列（各レビューはname, rating, text, timeを含む）
+    Args:
+        query (str): 検索クエリ
 
-    回答は以下のJSON形式で返してください：
-    ```json
-    [
-      {{
-        "name": "キャンプ場名",
-        "region": "地域",
-        "address": "住所",
-        "description": "説明",
-        "rating": 4.5,
-        "reviews_count": 100,
-        "price": "¥3,000〜/泊",
-        "facilities": ["トイレ", "シャワー", "電源"],
-        "features": ["湖畔", "ペット可"],
-        "location": {{"lat": 35.123, "lng": 139.456}},
-        "reviews": [
-          {{"name": "レビュー投稿者名", "rating": 5, "text": "レビュー内容", "time": "2023年10月"}}
-        ]
-      }}
-    ]
-    ```
+    Yields:
+        dict: キャンプ場データ
     """
+    if not GEMINI_API_KEY:
+        return
 
-    # リクエストヘッダー
-    headers = {"Content-Type": "application/json"}
-
-    # リクエストボディ
-    data = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"temperature": 0.7, "topP": 0.8, "topK": 40, "maxOutputTokens": 2048},
-    }
+    # プロンプトの作成（指示と回答形式は登録済みの前置きを使う）
+    prompt = CAMPSITE_SEARCH_PROMPT.render(query=query)
 
     try:
-        # APIリクエスト
-        response = requests.post(url, headers=headers, json=data)
-
-        # レスポンスのステータスコードを確認
-        if response.status_code != 200:
-            print(f"API Error: {response.status_code}")
-            print(f"Response: {response.text}")
-            return []
-
-        # JSONレスポンスを解析
-        response_data = response.json()
-
-        # テキスト応答を抽出
-        text = response_data["candidates"][0]["content"]["parts"][0]["text"]
-
-        # JSONデータを抽出
-        json_start = text.find("```json") + 7
-        json_end = text.find("```", json_start)
-
-        if json_start == -1 or json_end == -1:
-            # JSON形式でない場合は、テキスト全体を解析
-            json_text = text
-        else:
-            json_text = text[json_start:json_end].strip()
-
-        # JSONデータをパース
-        campsites = json.loads(json_text)
-
-        return campsites
+        # 応答をストリーミングで受け取り、キャンプ場のデータが閉じるたびに返す
+        yield from iter_json_array(iter_text(
+            prompt, temperature=0.7, max_output_tokens=2048, prefix=CAMPSITE_SEARCH_PROMPT.prefix
+        ))
 
     except Exception as e:
         print(f"Error in search_campsites_gemini: {str(e)}")
-        return []
 
 
 def analyze_campsite_reviews(campsite, user_preferences):
@@ -218,11 +190,8 @@ def analyze_campsite_reviews(campsite, user_preferences):
     features = campsite.get("features", [])
     facilities = campsite.get("facilities", [])
 
-    # レビューテキストを抽出
-    review_texts = []
-    for review in reviews:
-        if review.get("text"):
-            review_texts.append(review.get("text"))
+    # レビューテキストを抽出（重複を除いた抜粋のみ使う）
+    review_texts = review_excerpts(reviews)
 
     # ユーザーの好みを文字列に変換
     preferences_text = ""
@@ -244,7 +213,7 @@ def analyze_campsite_reviews(campsite, user_preferences):
     設備: {', '.join(facilities)}
     
     口コミ:
-    {' '.join(review_texts[:5])}
+    {' / '.join(review_texts)}
     
     ユーザーの好み:
     {preferences_text}
@@ -287,18 +256,10 @@ def analyze_campsite_reviews(campsite, user_preferences):
         # テキスト応答を抽出
         text = response_data["candidates"][0]["content"]["parts"][0]["text"]
 
-        # JSONデータを抽出
-        json_start = text.find("```json") + 7
-        json_end = text.find("```", json_start)
-
-        if json_start == -1 or json_end == -1:
-            # JSON形式でない場合は、テキスト全体を解析
-            json_text = text
-        else:
-            json_text = text[json_start:json_end].strip()
-
-        # JSONデータをパース
-        analysis_result = json.loads(json_text)
+        # JSONデータを抽出（コードブロックがない応答にも対応する）
+        analysis_result = extract_json(text)
+        if not isinstance(analysis_result, dict):
+            raise ValueError(f"JSONを解析できませんでした: {text[:100]}")
 
         return analysis_result
 
@@ -0,0 +1,409 @@
+"""
+Gemini APIのクライアントを管理するモジュール
+APIキーの設定はプロセスで一度だけ行い、生成設定ごとにモデルを再利用します
+プロンプトは静的な前置きと本文に分けて受け取り、前置きをつなげて送ります
+（Gemini APIのコンテキストキャッシュへの前置きの登録は、対応するSDKと十分に長い前置きがそろった場合だけ行います。
+requirements.txtで固定しているgoogle-generativeai 0.3.2にはcachingモジュールがなく、
+現在の前置きはいずれも登録の下限より短いため、実際に使われているのは前置きと本文の分割だけです）
+"""
+
+import os
+import time
+import hashlib
+import datetime
+import threading
+import google.generativeai as genai
+from dotenv import load_dotenv
+from utils.llm_cache import make_cache_key, get_cached_response, set_cached_response
+from utils.prompt_builder import estimate_tokens
+from utils.prompt_templates import join_prompt
+
+# コンテキストキャッシュはgoogle-generativeaiの新しいバージョンでのみ使える（固定している0.3.2では使えない）
+try:
+    from google.generativeai import caching
+except ImportError:
+    caching = None
+
+# 環境変数の読み込み
+load_dotenv()
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# 既定のモデル
+DEFAULT_GEMINI_MODEL = "gemini-2.0-flash-lite"
+
+# コンテキストキャッシュを使うかどうか（使えない場合は前置きを毎回プロンプトにつなげて送る）
+GEMINI_CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE_ENABLED", "True").lower() == "true"
+
+# コンテキストキャッシュに登録する前置きの最小トークン数（Gemini APIの下限より短い前置きは登録しない）
+# 現在の前置きは推定300-400トークン程度なので、どれも登録されない
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "4096"))
+
+# コンテキストキャッシュの有効期限（秒）
+GEMINI_CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
+# 設定済みのAPIキーと、生成設定ごとのモデル
+_configured_api_key = None
+_models = {}
+_lock = threading.Lock()
+
+# 前置きごとのコンテキストキャッシュと統計
+_context_caches = {}
+_context_cache_stats = {"created": 0, "reused": 0, "local": 0, "errors": 0}
+
+
+def configure_gemini(api_key=None):
+    """
+    Gemini APIを初期化する関数
+    同じAPIキーで設定済みの場合は何もしない
+
+    Args:
+        api_key (str, optional): APIキー（省略時は環境変数GEMINI_API_KEY）
+
+    Returns:
+        bool: 初期化済みの場合はTrue（APIキーがない場合はFalse）
+    """
+    global _configured_api_key
+
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return False
+
+    with _lock:
+        if api_key != _configured_api_key:
+            genai.configure(api_key=api_key)
+            _configured_api_key = api_key
+            # APIキーが変わった場合は作成済みのモデルとコンテキストキャッシュを使わない
+            _models.clear()
+            _context_caches.clear()
+            if DEBUG:
+                print("[GeminiClient] Gemini APIを初期化しました")
+
+    return True
+
+
+def get_gemini_model(temperature=None, max_output_tokens=None, model_name=DEFAULT_GEMINI_MODEL):
+    """
+    生成設定に対応するGeminiモデルを取得する関数
+    同じ設定のモデルは一度だけ作成し、以降は再利用する
+
+    Args:
+        temperature (float, optional): 生成の多様性を制御するパラメータ
+        max_output_tokens (int, optional): 生成するトークンの最大数
+        model_name (str, optional): モデル名
+
+    Returns:
+        GenerativeModel: Geminiモデル
+
+    Raises:
+        ValueError: APIキーが設定されていない場合
+    """
+    if not configure_gemini():
+        raise ValueError("GEMINI_API_KEYが設定されていません。.envファイルに追加してください。")
+
+    key = (model_name, temperature, max_output_tokens)
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            generation_config = {}
+            if temperature is not None:
+                generation_config["temperature"] = temperature
+            if max_output_tokens is not None:
+                generation_config["max_output_tokens"] = max_output_tokens
+
+            model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config or None)
+            _models[key] = model
+
+    return model
+
+
+def context_cache_supported():
+    """
+    インストールされているgoogle-generativeaiがコンテキストキャッシュに対応しているか確認する関数
+
+    Returns:
+        bool: 対応している場合はTrue
+    """
+    return caching is not None and hasattr(genai.GenerativeModel, "from_cached_content")
+
+
+def _create_cached_content(prefix, model_name):
+    """前置きをコンテキストキャッシュに登録する（通信するのでロックを取得せずに呼ぶ。失敗した場合はNone）"""
+    try:
+        cached_content = caching.CachedContent.create(
+            model=f"models/{model_name}",
+            contents=[prefix],
+            ttl=datetime.timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL),
+        )
+        if DEBUG:
+            print(f"[GeminiClient] 前置きをコンテキストキャッシュに登録しました（推定{estimate_tokens(prefix)}トークン）")
+        return cached_content
+    except Exception as e:
+        if DEBUG:
+            print(f"[GeminiClient] コンテキストキャッシュの登録エラー: {str(e)}")
+        return None
+
+
+def _delete_cached_content(cached_content):
+    """使わなくなったコンテキストキャッシュを削除する（失敗しても有効期限で消えるので無視する）"""
+    try:
+        cached_content.delete()
+    except Exception:
+        pass
+
+
+def get_prefix_cached_model(prefix, temperature=None, max_output_tokens=None, model_name=DEFAULT_GEMINI_MODEL):
+    """
+    前置きをコンテキストキャッシュに登録したGeminiモデルを取得する関数
+    前置きごとに一度だけ登録し、有効期限までは同じキャッシュを再利用する
+    登録は通信を伴うためロックの外で行い、同時に登録された場合は先に保存されたキャッシュを使う
+
+    固定しているgoogle-generativeai 0.3.2にはcachingモジュールがなく、現在の前置きはいずれも
+    GEMINI_CONTEXT_CACHE_MIN_TOKENSより短いため、現状では常にNoneを返す
+    （呼び出し側は前置きを本文につなげて送る。SDKを更新し、長い前置きを使う場合に有効になる）
+
+    Args:
+        prefix (str): プロンプトの静的な前置き
+        temperature (float, optional): 生成の多様性を制御するパラメータ
+        max_output_tokens (int, optional): 生成するトークンの最大数
+        model_name (str, optional): モデル名
+
+    Returns:
+        GenerativeModel: 前置きをキャッシュしたモデル
+            コンテキストキャッシュを使えない場合（SDKが対応していない・前置きが短い・登録に失敗した）はNone
+    """
+    if (
+        not prefix
+        or not GEMINI_CONTEXT_CACHE_ENABLED
+        or not context_cache_supported()
+        or estimate_tokens(prefix) < GEMINI_CONTEXT_CACHE_MIN_TOKENS
+        or not configure_gemini()
+    ):
+        with _lock:
+            _context_cache_stats["local"] += 1
+        return None
+
+    key = (model_name, hashlib.sha256(prefix.encode("utf-8")).hexdigest())
+
+    with _lock:
+        entry = _context_caches.get(key)
+        if entry is not None and entry["expires_at"] <= time.time():
+            entry = None
+
+    if entry is None:
+        cached_content = _create_cached_content(prefix, model_name)
+
+        # 期限切れの直前に使わないように、少し早めに再登録する
+        # （登録できない前置きは有効期限までローカルでつなげて送る）
+        now = time.time()
+        new_entry = {"cached_content": cached_content, "expires_at": now + GEMINI_CONTEXT_CACHE_TTL * 0.9, "models": {}}
+
+        with _lock:
+            entry = _context_caches.get(key)
+            if entry is None or entry["expires_at"] <= now:
+                entry = new_entry
+                _context_caches[key] = entry
+                _context_cache_stats["created" if cached_content is not None else "errors"] += 1
+                cached_content = None
+
+        # 他のスレッドが先に登録していた場合は、今回登録したキャッシュは使わない
+        if cached_content is not None:
+            _delete_cached_content(cached_content)
+    elif entry["cached_content"] is not None:
+        with _lock:
+            _context_cache_stats["reused"] += 1
+
+    with _lock:
+        if entry["cached_content"] is None:
+            _context_cache_stats["local"] += 1
+            return None
+
+        model_key = (temperature, max_output_tokens)
+        model = entry["models"].get(model_key)
+        if model is None:
+            generation_config = {}
+            if temperature is not None:
+                generation_config["temperature"] = temperature
+            if max_output_tokens is not None:
+                generation_config["max_output_tokens"] = max_output_tokens
+
+            model = genai.GenerativeModel.from_cached_content(
+                cached_content=entry["cached_content"], generation_config=generation_config or None
+            )
+            entry["models"][model_key] = model
+
+    return model
+
+
+def _prepare_request(prompt, prefix, temperature, max_output_tokens, model_name):
+    """前置きの扱いに応じて、使うモデルと送信するプロンプトを決める"""
+    model = get_prefix_cached_model(prefix, temperature, max_output_tokens, model_name) if prefix else None
+    if model is not None:
+        return model, prompt
+
+    return get_gemini_model(temperature, max_output_tokens, model_name), join_prompt(prefix, prompt)
+
+
+def generate_content(
+    prompt, temperature=None, max_output_tokens=None, model_name=DEFAULT_GEMINI_MODEL, stream=False, prefix=None
+):
+    """
+    Geminiで応答を生成する関数
+
+    Args:
+        prompt (str): 送信するプロンプト（前置きを指定する場合は前置きに続く本文）
+        temperature (float, optional): 生成の多様性を制御するパラメータ
+        max_output_tokens (int, optional): 生成するトークンの最大数
+        model_name (str, optional): モデル名
+        stream (bool, optional): 応答を少しずつ受け取る場合はTrue
+        prefix (str, optional): プロンプトの静的な前置き（コンテキストキャッシュで再利用する）
+
+    Returns:
+        GenerateContentResponse: Gemini APIの応答
+    """
+    model, contents = _prepare_request(prompt, prefix, temperature, max_output_tokens, model_name)
+    return model.generate_content(contents, stream=stream)
+
+
+async def generate_content_async(
+    prompt, temperature=None, max_output_tokens=None, model_name=DEFAULT_GEMINI_MODEL, prefix=None
+):
+    """
+    Geminiで応答を非同期に生成する関数
+
+    Args:
+        prompt (str): 送信するプロンプト（前置きを指定する場合は前置きに続く本文）
+        temperature (float, optional): 生成の多様性を制御するパラメータ
+        max_output_tokens (int, optional): 生成するトークンの最大数
+        model_name (str, optional): モデル名
+        prefix (str, optional): プロンプトの静的な前置き（コンテキストキャッシュで再利用する）
+
+    Returns:
+        GenerateContentResponse: Gemini APIの応答
+    """
+    model, contents = _prepare_request(prompt, prefix, temperature, max_output_tokens, model_name)
+    return await model.generate_content_async(contents)
+
+
+def generate_text(
+    prompt, temperature=None, max_output_tokens=None, model_name=DEFAULT_GEMINI_MODEL, use_cache=True, prefix=None
+):
+    """
+    Geminiで応答テキストを生成する関数
+    同じモデル・生成設定・プロンプトの応答はキャッシュから返す
+
+    Args:
+        prompt (str): 送信するプロンプト（前置きを指定する場合は前置きに続く本文）
+        temperature (float, optional): 生成の多様性を制御するパラメータ
+        max_output_tokens (int, optional): 生成するトークンの最大数
+        model_name (str, optional): モデル名
+        use_cache (bool, optional): キャッシュを使う場合はTrue
+        prefix (str, optional): プロンプトの静的な前置き（コンテキストキャッシュで再利用する）
+
+    Returns:
+        str: 応答テキスト
+    """
+    cache_key = _make_cache_key(join_prompt(prefix, prompt), temperature, max_output_tokens, model_name) if use_cache else None
+    if cache_key:
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            return cached
+
+    text = generate_content(prompt, temperature, max_output_tokens, model_name, prefix=prefix).text
+
+    if cache_key:
+        set_cached_response(cache_key, model_name, text)
+    return text
+
+
+async def generate_text_async(
+    prompt, temperature=None, max_output_tokens=None, model_name=DEFAULT_GEMINI_MODEL, use_cache=True, prefix=None
+):
+    """
+    Geminiで応答テキストを非同期に生成する関数
+    同じモデル・生成設定・プロンプトの応答はキャッシュから返す
+
+    Args:
+        prompt (str): 送信するプロンプト（前置きを指定する場合は前置きに続く本文）
+        temperature (float, optional): 生成の多様性を制御するパラメータ
+        max_output_tokens (int, optional): 生成するトークンの最大数
+        model_name (str, optional): モデル名
+        use_cache (bool, optional): キャッシュを使う場合はTrue
+        prefix (str, optional): プロンプトの静的な前置き（コンテキストキャッシュで再利用する）
+
+    Returns:
+        str: 応答テキスト
+    """
+    cache_key = _make_cache_key(join_prompt(prefix, prompt), temperature, max_output_tokens, model_name) if use_cache else None
+    if cache_key:
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            return cached
+
+    response = await generate_content_async(prompt, temperature, max_output_tokens, model_name, prefix=prefix)
+
+    if cache_key:
+        set_cached_response(cache_key, model_name, response.text)
+    return response.text
+
+
+def iter_text(
+    prompt, temperature=None, max_output_tokens=None, model_name=DEFAULT_GEMINI_MODEL, use_cache=True, prefix=None
+):
+    """
+    Geminiの応答テキストを生成された順に少しずつ返すジェネレータ
+    キャッシュにある応答は一度に返し、最後まで受け取った応答だけをキャッシュに保存する
+
+    Args:
+        prompt (str): 送信するプロンプト（前置きを指定する場合は前置きに続く本文）
+        temperature (float, optional): 生成の多様性を制御するパラメータ
+        max_output_tokens (int, optional): 生成するトークンの最大数
+        model_name (str, optional): モデル名
+        use_cache (bool, optional): キャッシュを使う場合はTrue
+        prefix (str, optional): プロンプトの静的な前置き（コンテキストキャッシュで再利用する）
+
+    Yields:
+        str: 応答テキストの一部
+    """
+    cache_key = _make_cache_key(join_prompt(prefix, prompt), temperature, max_output_tokens, model_name) if use_cache else None
+    if cache_key:
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    response = generate_content(prompt, temperature, max_output_tokens, model_name, stream=True, prefix=prefix)
+
+    chunks = []
+    for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            # 本文を含まないチャンク（安全性フィルタの情報のみなど）は読み飛ばす
+            continue
+        if text:
+            chunks.append(text)
+            yield text
+
+    if cache_key:
+        set_cached_response(cache_key, model_name, "".join(chunks))
+
+
+def _make_cache_key(prompt, temperature, max_output_tokens, model_name):
+    """生成設定を含めたキャッシュキーを作成する"""
+    generation_config = {"temperature": temperature, "max_output_tokens": max_output_tokens}
+    return make_cache_key(model_name, generation_config, prompt)
+
+
+def get_context_cache_stats():
+    """
+    コンテキストキャッシュの統計を取得する関数
+
+    Returns:
+        dict: created（登録数）, reused（再利用数）, local（前置きをつなげて送った数）, errors, entries
+    """
+    with _lock:
+        stats = dict(_context_cache_stats)
+        stats["entries"] = sum(1 for entry in _context_caches.values() if entry["cached_content"] is not None)
+    return stats
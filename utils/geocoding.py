@@ -1,6 +1,7 @@
 import os
 import requests
 from dotenv import load_dotenv
+from utils.reverse_geocoder import load_prefecture_seeds
 
 # 環境変数の読み込み
 load_dotenv()
@@ -11,26 +12,288 @@ GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 # デバッグモード
 DEBUG = os.getenv("DEBUG", "False").lower() in ("true", "1", "t")
 
+# デフォルトの位置情報（東京）
+DEFAULT_COORDINATES = {"latitude": 35.6812, "longitude": 139.7671}
 
-def get_location_coordinates(place_name):
+# キャンプ場検索でよく使われる地名・名所の座標（緯度, 経度）
+LANDMARK_COORDINATES = {
+    "富士山": (35.3606, 138.7274),
+    "富士五湖": (35.4900, 138.7600),
+    "河口湖": (35.5170, 138.7510),
+    "山中湖": (35.4170, 138.8750),
+    "本栖湖": (35.4660, 138.5830),
+    "西湖": (35.4980, 138.6830),
+    "朝霧高原": (35.4200, 138.5700),
+    "八ヶ岳": (35.9710, 138.3700),
+    "日本アルプス": (36.2900, 137.6500),
+    "北アルプス": (36.2900, 137.6500),
+    "南アルプス": (35.6700, 138.2400),
+    "上高地": (36.2490, 137.6380),
+    "白馬": (36.6980, 137.8620),
+    "蓼科": (36.1000, 138.2800),
+    "霧ヶ峰": (36.1000, 138.1900),
+    "清里": (35.9200, 138.4400),
+    "軽井沢": (36.3480, 138.5970),
+    "草津": (36.6200, 138.5960),
+    "嬬恋": (36.5000, 138.5300),
+    "尾瀬": (36.9300, 139.2400),
+    "那須": (37.0200, 140.1200),
+    "日光": (36.7200, 139.6980),
+    "裏磐梯": (37.6500, 140.0600),
+    "猪苗代湖": (37.4800, 140.1000),
+    "蔵王": (38.1400, 140.4400),
+    "十和田湖": (40.4600, 140.8800),
+    "奥入瀬": (40.5400, 140.9400),
+    "奥多摩": (35.8090, 139.0970),
+    "高尾山": (35.6250, 139.2440),
+    "秩父": (35.9910, 139.0850),
+    "長瀞": (36.1000, 139.1100),
+    "丹沢": (35.4700, 139.1600),
+    "道志": (35.5300, 139.0300),
+    "箱根": (35.2320, 139.1070),
+    "伊豆": (34.9760, 138.9470),
+    "房総": (35.2000, 140.1000),
+    "琵琶湖": (35.2500, 136.0800),
+    "六甲": (34.7780, 135.2640),
+    "大山": (35.3710, 133.5460),
+    "阿蘇": (32.9520, 131.1210),
+    "くじゅう": (33.0900, 131.2400),
+    "九重": (33.0900, 131.2400),
+    "屋久島": (30.3580, 130.5290),
+    "石垣島": (24.3400, 124.1560),
+    "宮古島": (24.8060, 125.2810),
+    "知床": (44.0700, 145.0000),
+    "富良野": (43.3420, 142.3830),
+    "美瑛": (43.5880, 142.4670),
+    "洞爺湖": (42.6000, 140.8500),
+    "支笏湖": (42.7700, 141.3600),
+    "札幌": (43.0640, 141.3470),
+    "仙台": (38.2690, 140.8720),
+    "横浜": (35.4480, 139.6420),
+    "名古屋": (35.1810, 136.9060),
+    "神戸": (34.6910, 135.1830),
+}
+
+# 名所のある都道府県（クエリに含まれる都道府県と食い違う名所は使わない）
+LANDMARK_PREFECTURES = {
+    "富士山": ("静岡県", "山梨県"),
+    "富士五湖": ("山梨県",),
+    "河口湖": ("山梨県",),
+    "山中湖": ("山梨県",),
+    "本栖湖": ("山梨県",),
+    "西湖": ("山梨県",),
+    "朝霧高原": ("静岡県",),
+    "八ヶ岳": ("長野県", "山梨県"),
+    "日本アルプス": ("長野県", "富山県", "岐阜県", "新潟県", "山梨県", "静岡県"),
+    "北アルプス": ("長野県", "富山県", "岐阜県", "新潟県"),
+    "南アルプス": ("長野県", "山梨県", "静岡県"),
+    "上高地": ("長野県",),
+    "白馬": ("長野県",),
+    "蓼科": ("長野県",),
+    "霧ヶ峰": ("長野県",),
+    "清里": ("山梨県",),
+    "軽井沢": ("長野県",),
+    "草津": ("群馬県",),
+    "嬬恋": ("群馬県",),
+    "尾瀬": ("群馬県", "福島県", "新潟県", "栃木県"),
+    "那須": ("栃木県",),
+    "日光": ("栃木県",),
+    "裏磐梯": ("福島県",),
+    "猪苗代湖": ("福島県",),
+    "蔵王": ("宮城県", "山形県"),
+    "十和田湖": ("青森県", "秋田県"),
+    "奥入瀬": ("青森県",),
+    "奥多摩": ("東京都",),
+    "高尾山": ("東京都",),
+    "秩父": ("埼玉県",),
+    "長瀞": ("埼玉県",),
+    "丹沢": ("神奈川県",),
+    "道志": ("山梨県", "神奈川県"),
+    "箱根": ("神奈川県",),
+    "伊豆": ("静岡県",),
+    "房総": ("千葉県",),
+    "琵琶湖": ("滋賀県",),
+    "六甲": ("兵庫県",),
+    "大山": ("鳥取県",),
+    "阿蘇": ("熊本県",),
+    "くじゅう": ("大分県",),
+    "九重": ("大分県",),
+    "屋久島": ("鹿児島県",),
+    "石垣島": ("沖縄県",),
+    "宮古島": ("沖縄県",),
+    "知床": ("北海道",),
+    "富良野": ("北海道",),
+    "美瑛": ("北海道",),
+    "洞爺湖": ("北海道",),
+    "支笏湖": ("北海道",),
+    "札幌": ("北海道",),
+    "仙台": ("宮城県",),
+    "横浜": ("神奈川県",),
+    "名古屋": ("愛知県",),
+    "神戸": ("兵庫県",),
+}
+
+# 名所の直前にあっても同じ名所を指す接頭辞（南伊豆・奥日光など）
+# これ以外の漢字が直前にある名所は別の語の一部とみなす（「関西湖畔」の「西湖」など）
+LANDMARK_PREFIXES = "奥北南東西中"
+
+# 名所の場合の検索半径（メートル）。都道府県はPlaces APIの上限を使う
+LANDMARK_RADIUS = 30000
+PREFECTURE_RADIUS = 50000
+
+
+def _build_gazetteer():
     """
-    場所の名前から緯度経度を取得する関数
+    地名辞書（地名 -> 位置情報）を作成する関数
+
+    Returns:
+        dict: 地名をキーとした位置情報（name, lat, lng, radius）の辞書
+    """
+    gazetteer = {}
+
+    # 都道府県（県庁所在地の座標）。「静岡」のような省略形でも引けるようにする
+    for seed in load_prefecture_seeds():
+        prefecture = seed["prefecture"]
+        lat, lng = seed["points"][0]
+        entry = {"name": prefecture, "lat": lat, "lng": lng, "radius": PREFECTURE_RADIUS}
+        gazetteer[prefecture] = entry
+        if prefecture != "北海道":
+            gazetteer[prefecture[:-1]] = entry
+
+    # 名所は都道府県より優先する
+    for name, (lat, lng) in LANDMARK_COORDINATES.items():
+        gazetteer[name] = {"name": name, "lat": lat, "lng": lng, "radius": LANDMARK_RADIUS}
+
+    return gazetteer
+
+
+GAZETTEER = _build_gazetteer()
+
+
+def _is_kanji(char):
+    """漢字（々を含む）かどうか"""
+    return "\u4e00" <= char <= "\u9fff" or char == "々"
+
+
+def _match_gazetteer(query):
+    """
+    クエリに含まれる地名辞書の地名を、左から順に重ならないように取り出す
+    同じ位置から始まる地名は長いものを優先する（「東京都府中」から「京都」「京都府」は取り出さない）
+
+    Args:
+        query (str): 検索クエリ
+
+    Returns:
+        list: (クエリ内の位置, 地名) のリスト（位置の順）
+    """
+    candidates = []
+    for name in GAZETTEER:
+        position = query.find(name)
+        while position != -1:
+            candidates.append((position, name))
+            position = query.find(name, position + 1)
+
+    matches = []
+    end = 0
+    for position, name in sorted(candidates, key=lambda candidate: (candidate[0], -len(candidate[1]))):
+        if position < end:
+            continue
+
+        # 直前が漢字の名所は別の語の一部とみなす（直前の地名に続く場合と、方角などの接頭辞は除く）
+        if name in LANDMARK_COORDINATES and position > 0:
+            previous = query[position - 1]
+            follows_match = bool(matches) and end == position
+            if _is_kanji(previous) and previous not in LANDMARK_PREFIXES and not follows_match:
+                continue
+
+        matches.append((position, name))
+        end = position + len(name)
+
+    return matches
+
+
+def find_location_in_query(query):
+    """
+    検索クエリに含まれる地名を地名辞書から探し、位置情報を返す関数
+    APIを呼び出さないため、検索開始と同時に即座に実行できる
+    名所は都道府県より優先するが、クエリに含まれる都道府県と食い違う名所は使わない
+    （「神奈川の大山」は鳥取県の大山ではなく神奈川県として扱う）
+
+    Args:
+        query (str): 検索クエリ
+
+    Returns:
+        dict: 位置情報 (name, lat, lng, radius)。見つからない場合はNone
+    """
+    if not query:
+        return None
+
+    matches = _match_gazetteer(query)
+    prefectures = {GAZETTEER[name]["name"] for _, name in matches if name not in LANDMARK_COORDINATES}
+
+    best = None
+    best_key = None
+    for position, name in matches:
+        if name in LANDMARK_COORDINATES and prefectures and prefectures.isdisjoint(LANDMARK_PREFECTURES.get(name, ())):
+            continue
+
+        # 名所を優先し、次にクエリ内で先に出現する地名を優先する
+        key = (name not in LANDMARK_COORDINATES, position)
+        if best_key is None or key < best_key:
+            best = GAZETTEER[name]
+            best_key = key
+
+    if DEBUG and best:
+        print(f"[Geocoding] 地名辞書でヒット: {best['name']}")
+
+    return dict(best) if best else None
+
+
+def geocode_place_name(place_name):
+    """
+    地名から位置情報を取得する関数
+    地名辞書を優先し、見つからない場合はGeocoding APIを使う
 
     Args:
         place_name (str): 場所の名前
 
     Returns:
-        dict: 緯度経度情報 (latitude, longitude)
+        dict: 位置情報 (name, lat, lng, radius)。取得できない場合はNone
     """
-    if DEBUG:
-        print(f"[Geocoding] 位置情報取得: {place_name}")
+    if not place_name:
+        return None
+
+    location = find_location_in_query(place_name)
+    if location:
+        return location
+
+    coordinates = _request_geocoding_api(place_name)
+    if not coordinates:
+        return None
+
+    return {
+        "name": place_name,
+        "lat": coordinates["latitude"],
+        "lng": coordinates["longitude"],
+        "radius": PREFECTURE_RADIUS,
+    }
+
+
+def _request_geocoding_api(place_name):
+    """
+    Google Maps Geocoding APIで場所の緯度経度を取得する関数
 
+    Args:
+        place_name (str): 場所の名前
+
+    Returns:
+        dict: 緯度経度情報 (latitude, longitude)。取得できない場合はNone
+    """
     # APIキーが設定されていない場合はエラー
     if not GOOGLE_MAPS_API_KEY:
         if DEBUG:
             print("[Geocoding] APIキーが設定されていません")
-        # デフォルトの位置情報（東京）を返す
-        return {"latitude": 35.6812, "longitude": 139.7671}
+        return None
 
     try:
         # Google Maps Geocoding APIのURL
@@ -47,18 +310,16 @@ def get_location_coordinates(place_name):
             if DEBUG:
                 print(f"[Geocoding] API Error: {response.status_code}")
                 print(f"[Geocoding] Response: {response.text}")
-            # デフォルトの位置情報（東京）を返す
-            return {"latitude": 35.6812, "longitude": 139.7671}
+            return None
 
         # JSONレスポンスを解析
         data = response.json()
 
-        # 結果がない場合はデフォルト値を返す
+        # 結果がない場合
         if data["status"] != "OK" or not data["results"]:
             if DEBUG:
                 print(f"[Geocoding] 結果なし: {data['status']}")
-            # デフォルトの位置情報（東京）を返す
-            return {"latitude": 35.6812, "longitude": 139.7671}
+            return None
 
         # 緯度経度を取得
         location = data["results"][0]["geometry"]["location"]
@@ -69,5 +330,47 @@ def get_location_coordinates(place_name):
     except Exception as e:
         if DEBUG:
             print(f"[Geocoding] エラー: {str(e)}")
+        return None
+
+
+def get_location_coordinates(place_name):
+    """
+    場所の名前から緯度経度を取得する関数
+
+    Args:
+        place_name (str): 場所の名前
+
+    Returns:
+        dict: 緯度経度情報 (latitude, longitude)
+    """
+    if DEBUG:
+        print(f"[Geocoding] 位置情報取得: {place_name}")
+
+    coordinates = _request_geocoding_api(place_name)
+    if not coordinates:
         # デフォルトの位置情報（東京）を返す
-        return {"latitude": 35.6812, "longitude": 139.7671}
+        return dict(DEFAULT_COORDINATES)
+
+    return coordinates
+
+
+def get_coordinates(location):
+    """
+    位置情報から緯度経度を取り出す関数
+    lat/lng（Geocoding API・Gemini）と latitude/longitude（Places API）のどちらの形式にも対応する
+
+    Args:
+        location (dict): 位置情報
+
+    Returns:
+        tuple: (緯度, 経度)。取り出せない場合はNone
+    """
+    if not isinstance(location, dict):
+        return None
+
+    lat = location.get("lat", location.get("latitude"))
+    lng = location.get("lng", location.get("longitude"))
+    try:
+        return float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
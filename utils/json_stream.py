@@ -0,0 +1,266 @@
+"""
+LLMの応答からJSONを取り出すモジュール
+コードブロックの有無や前後の説明文、末尾のカンマなどに左右されずにJSONを解析し、
+ストリーミング中の応答からは配列の要素（オブジェクト）を閉じた時点で順に取り出します
+"""
+
+import os
+import re
+import json
+from dotenv import load_dotenv
+
+# 環境変数の読み込み
+load_dotenv()
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# 閉じ括弧の直前の余分なカンマ
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+
+# JSONの開始位置の候補になる括弧
+OPENING_BRACKET_PATTERN = re.compile(r"[{\[]")
+
+# 配列の [ の次に来る文字（値の始まりか、空の配列の閉じ括弧）
+JSON_VALUE_START_CHARS = '{["]-0123456789tfn'
+
+
+def loads_tolerant(text):
+    """
+    JSON文字列を解析する関数
+    解析できない場合は、LLMが出力しがちな末尾のカンマを取り除いて再度解析する
+
+    Args:
+        text (str): JSON文字列
+
+    Returns:
+        any: 解析結果
+
+    Raises:
+        json.JSONDecodeError: 解析できない場合
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(TRAILING_COMMA_PATTERN.sub(r"\1", text))
+
+
+class JSONArrayStreamParser:
+    """
+    少しずつ届くテキストから、JSON配列の要素（オブジェクト）を閉じた時点で取り出すクラス
+    配列の前の説明文やコードブロックの記号は読み飛ばし、配列がない場合は最上位のオブジェクトを要素として扱う
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._in_array = False
+        self._item_start = -1
+        self.done = False
+        self.item_count = 0
+        self.error_count = 0
+
+    def feed(self, text):
+        """
+        テキストを追加し、新しく閉じた要素を返す
+
+        Args:
+            text (str): 追加するテキスト
+
+        Returns:
+            list: 新しく閉じた要素（辞書）のリスト
+        """
+        items = []
+        if self.done or not text:
+            return items
+
+        self._buffer += text
+        buffer = self._buffer
+
+        while self._position < len(buffer) and not self.done:
+            char = buffer[self._position]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+
+            elif self._depth == 0 and not self._in_array:
+                # 配列（またはオブジェクト）が始まるまでは説明文として読み飛ばす
+                # 「[注]」のような説明文中の括弧と区別するため、[ の次が { または ] の場合だけ配列とみなす
+                if char == "[":
+                    next_char = buffer[self._position + 1 :].lstrip()[:1]
+                    if not next_char:
+                        # 次の文字が届くまで判定を待つ
+                        break
+                    if next_char in "{]":
+                        self._in_array = True
+                        self._depth = 1
+                elif char == "{":
+                    self._item_start = self._position
+                    self._depth = 1
+
+            elif char == '"':
+                self._in_string = True
+
+            elif char in "{[":
+                if self._in_array and self._depth == 1 and char == "{":
+                    self._item_start = self._position
+                self._depth += 1
+
+            elif char in "}]":
+                self._depth -= 1
+                base_depth = 1 if self._in_array else 0
+
+                if self._depth == base_depth and self._item_start >= 0:
+                    item = self._parse_item(buffer[self._item_start : self._position + 1])
+                    if item is not None:
+                        items.append(item)
+                    self._item_start = -1
+                elif self._depth < base_depth or (self._in_array and self._depth == 0):
+                    # 配列の終わり
+                    self.done = True
+
+            self._position += 1
+
+        self._trim()
+        return items
+
+    def _parse_item(self, text):
+        """要素のテキストを解析する（辞書以外・解析できないものはNone）"""
+        try:
+            item = loads_tolerant(text)
+        except json.JSONDecodeError:
+            self.error_count += 1
+            if DEBUG:
+                print(f"[JSONStream] 要素を解析できませんでした: {text[:100]}")
+            return None
+
+        if not isinstance(item, dict):
+            return None
+
+        self.item_count += 1
+        return item
+
+    def _trim(self):
+        """解析済みのテキストを捨ててバッファを小さく保つ"""
+        keep_from = self._item_start if self._item_start >= 0 else self._position
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._position -= keep_from
+            if self._item_start >= 0:
+                self._item_start = 0
+
+
+def iter_json_array(chunks):
+    """
+    テキストの断片から、JSON配列の要素を閉じた時点で順に返すジェネレータ
+
+    Args:
+        chunks (iterable): 応答テキストの断片（ストリーミングの応答など）
+
+    Yields:
+        dict: 配列の要素
+    """
+    parser = JSONArrayStreamParser()
+    for chunk in chunks:
+        # 配列が閉じた後も最後まで受け取る（応答のキャッシュは最後まで受け取った場合のみ保存されるため）
+        yield from parser.feed(chunk)
+
+
+def parse_json_array(text):
+    """
+    応答テキストからJSON配列の要素を取り出す関数
+    途中で途切れた応答の場合は、閉じている要素だけを返す
+
+    Args:
+        text (str): 応答テキスト
+
+    Returns:
+        list: 配列の要素（辞書）のリスト
+    """
+    return list(iter_json_array([text or ""]))
+
+
+def extract_json(text, default=None):
+    """
+    応答テキストからJSONを取り出して解析する関数
+    ```json のコードブロックがあればその中身を、なければ最初の { または [ から対応する閉じ括弧までを解析する
+    （「[注]」のような説明文中の括弧は読み飛ばす）
+
+    Args:
+        text (str): 応答テキスト
+        default (any, optional): 解析できない場合に返す値
+
+    Returns:
+        any: 解析結果
+    """
+    text = text or ""
+
+    fence_start = text.find("```json")
+    if fence_start != -1:
+        body_start = fence_start + len("```json")
+        body_end = text.find("```", body_start)
+        text = text[body_start : body_end if body_end != -1 else len(text)]
+
+    start = _find_json_start(text)
+    if start == -1:
+        return default
+
+    end = _find_closing_bracket(text, start)
+    json_text = text[start : end + 1] if end != -1 else text[start:]
+
+    try:
+        return loads_tolerant(json_text)
+    except json.JSONDecodeError:
+        if DEBUG:
+            print(f"[JSONStream] JSONを解析できませんでした: {json_text[:200]}")
+        return default
+
+
+def _find_json_start(text):
+    """
+    JSONが始まる括弧の位置（見つからない場合は-1）
+    「[注]」のような説明文中の括弧と区別するため、[ は次の文字がJSONの値の始まりになる場合だけ対象にする
+    """
+    for match in OPENING_BRACKET_PATTERN.finditer(text):
+        if match.group() == "{":
+            return match.start()
+        next_char = text[match.end() :].lstrip()[:1]
+        if next_char and next_char in JSON_VALUE_START_CHARS:
+            return match.start()
+
+    return -1
+
+
+def _find_closing_bracket(text, start):
+    """start位置の括弧に対応する閉じ括弧の位置（見つからない場合は-1）"""
+    depth = 0
+    in_string = False
+    escape = False
+
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return index
+
+    return -1
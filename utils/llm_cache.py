@@ -0,0 +1,258 @@
+"""
+LLMの応答を保存して再利用するキャッシュモジュール
+モデル名・生成設定・正規化したプロンプトのハッシュをキーとしてSQLiteに保存し、
+有効期限と、件数・保存した応答の合計サイズの上限で古い応答を削除します
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+# 環境変数の読み込み
+load_dotenv()
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# キャッシュの保存先
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "llm_cache.sqlite3"),
+)
+
+# キャッシュの有効期限（秒）と最大件数
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(24 * 60 * 60)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+# 保存する応答の合計サイズの上限（バイト）
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# キャッシュを無効にする場合は LLM_CACHE_ENABLED=false
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "True").lower() == "true"
+
+# 件数・サイズの上限を超えたときに、上限より少し多めに削除して削除の頻度を抑える
+EVICTION_MARGIN = 0.1
+
+# ヒット率などの統計
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "errors": 0}
+
+_connection = None
+_lock = threading.Lock()
+
+
+def normalize_prompt(prompt):
+    """
+    キャッシュキー用にプロンプトを正規化する関数
+    インデントや改行の違いだけのプロンプトを同じものとして扱う
+
+    Args:
+        prompt (str): プロンプト
+
+    Returns:
+        str: 正規化したプロンプト
+    """
+    return re.sub(r"\s+", " ", prompt or "").strip()
+
+
+def make_cache_key(model_name, generation_config, prompt):
+    """
+    キャッシュキーを作成する関数
+
+    Args:
+        model_name (str): モデル名
+        generation_config (dict): 生成設定
+        prompt (str): プロンプト
+
+    Returns:
+        str: キャッシュキー（SHA-256）
+    """
+    payload = json.dumps(
+        {"model": model_name, "config": generation_config or {}, "prompt": normalize_prompt(prompt)},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _get_connection():
+    """SQLiteの接続を取得する（初回のみテーブルを作成する。ロックを取得した状態で呼ぶ）"""
+    global _connection
+
+    if _connection is None:
+        os.makedirs(os.path.dirname(LLM_CACHE_PATH), exist_ok=True)
+        _connection = sqlite3.connect(LLM_CACHE_PATH, check_same_thread=False)
+        # 削除した応答の領域をファイルから解放できるようにする（新しく作成するファイルのみ有効）
+        _connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                created_at REAL,
+                accessed_at REAL,
+                size INTEGER DEFAULT 0
+            )
+            """
+        )
+
+        # サイズの列がない古いテーブルには列を追加し、保存済みの応答のサイズを計算する
+        columns = [row[1] for row in _connection.execute("PRAGMA table_info(llm_cache)")]
+        if "size" not in columns:
+            _connection.execute("ALTER TABLE llm_cache ADD COLUMN size INTEGER DEFAULT 0")
+            _connection.execute("UPDATE llm_cache SET size = length(CAST(response AS BLOB))")
+
+        _connection.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed_at ON llm_cache (accessed_at)")
+        _connection.commit()
+
+    return _connection
+
+
+def get_cached_response(key):
+    """
+    キャッシュから応答を取得する関数
+
+    Args:
+        key (str): キャッシュキー
+
+    Returns:
+        str: 保存されている応答。ない場合・期限切れの場合はNone
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+
+    try:
+        with _lock:
+            connection = _get_connection()
+            row = connection.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+
+            if row is None or time.time() - row[1] > LLM_CACHE_TTL:
+                _stats["misses"] += 1
+                return None
+
+            connection.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            connection.commit()
+            _stats["hits"] += 1
+            return row[0]
+
+    except Exception as e:
+        _stats["errors"] += 1
+        if DEBUG:
+            print(f"[LLMCache] 読み込みエラー: {str(e)}")
+        return None
+
+
+def set_cached_response(key, model_name, response):
+    """
+    応答をキャッシュに保存する関数
+    件数または合計サイズの上限を超えた場合は、期限切れのものと最近使われていないものから削除する
+
+    Args:
+        key (str): キャッシュキー
+        model_name (str): モデル名
+        response (str): 応答テキスト
+    """
+    if not LLM_CACHE_ENABLED or not response:
+        return
+
+    try:
+        with _lock:
+            connection = _get_connection()
+            now = time.time()
+            connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, accessed_at, size) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, response, now, now, len(response.encode("utf-8"))),
+            )
+            _stats["writes"] += 1
+
+            count, total_bytes = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+            if count > LLM_CACHE_MAX_ENTRIES or total_bytes > LLM_CACHE_MAX_BYTES:
+                _stats["evictions"] += _evict(connection, now)
+
+            connection.commit()
+
+    except Exception as e:
+        _stats["errors"] += 1
+        if DEBUG:
+            print(f"[LLMCache] 書き込みエラー: {str(e)}")
+
+
+def _evict(connection, now):
+    """
+    期限切れの応答を削除し、件数・合計サイズが上限の少し下に収まるまで最近使われていない応答から削除する
+    （ロックを取得した状態で呼ぶ）
+
+    Args:
+        connection (sqlite3.Connection): SQLiteの接続
+        now (float): 現在時刻
+
+    Returns:
+        int: 削除した件数
+    """
+    deleted = connection.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - LLM_CACHE_TTL,)).rowcount
+
+    count, total_bytes = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+    max_count = int(LLM_CACHE_MAX_ENTRIES * (1 - EVICTION_MARGIN))
+    max_bytes = int(LLM_CACHE_MAX_BYTES * (1 - EVICTION_MARGIN))
+
+    keys = []
+    for key, size in connection.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at").fetchall():
+        if count <= max_count and total_bytes <= max_bytes:
+            break
+        keys.append((key,))
+        count -= 1
+        total_bytes -= size or 0
+
+    if keys:
+        connection.executemany("DELETE FROM llm_cache WHERE key = ?", keys)
+        deleted += len(keys)
+
+    # 削除した領域をファイルから解放する
+    connection.execute("PRAGMA incremental_vacuum")
+
+    if DEBUG:
+        print(f"[LLMCache] {deleted}件を削除しました（残り {count}件, {total_bytes}バイト）")
+
+    return deleted
+
+
+def get_llm_cache_stats():
+    """
+    キャッシュの統計を取得する関数
+
+    Returns:
+        dict: hits, misses, writes, evictions, errors, hit_rate, entries, bytes
+    """
+    stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+
+    stats["entries"], stats["bytes"] = 0, 0
+    if LLM_CACHE_ENABLED:
+        try:
+            with _lock:
+                stats["entries"], stats["bytes"] = (
+                    _get_connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+                )
+        except Exception as e:
+            if DEBUG:
+                print(f"[LLMCache] 統計の取得エラー: {str(e)}")
+
+    return stats
+
+
+def clear_llm_cache():
+    """キャッシュをすべて削除する関数"""
+    try:
+        with _lock:
+            connection = _get_connection()
+            connection.execute("DELETE FROM llm_cache")
+            connection.commit()
+    except Exception as e:
+        if DEBUG:
+            print(f"[LLMCache] 削除エラー: {str(e)}")
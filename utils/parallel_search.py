@@ -5,6 +5,7 @@
 
 import os
 import json
+import math
 import asyncio
 import aiohttp
 import requests
@@ -19,12 +20,29 @@ from utils.places_api_new import (
     get_place_photos_new,
     get_nearby_campsites_new,
 )
-from utils.web_search import search_campsites_web, combine_search_results
-from utils.query_analyzer import analyze_query
-from utils.search_evaluator import evaluate_search_results, generate_search_summary
+from utils.web_search import search_campsites_web, combine_search_results, search_related_articles
+from utils.search_api import search_campsites_info_batch
+from utils.query_analyzer import analyze_query, basic_query_analysis
+from utils.search_evaluator import (
+    EVALUATION_WORKERS,
+    EVALUATION_CHUNK_MAX_CAMPSITES,
+    iter_evaluate_search_results,
+    sort_evaluated_campsites,
+    generate_search_summary,
+    iter_search_summary,
+)
 from utils.search_analyzer import analyze_search_results
 from utils.gemini_api import get_gemini_response
-from utils.geocoding import get_location_coordinates
+from utils.geocoding import get_location_coordinates, find_location_in_query, geocode_place_name
+from utils.cancellation import is_cancelled
+from utils.review_analyzer import iter_campsite_review_analyses
+from utils.review_digest_store import get_review_digest_stats
+from utils.stage_scheduler import StageScheduler
+from utils.prompt_builder import get_prompt_stats
+from utils.gemini_client import get_context_cache_stats
+from utils.semantic_cache import lookup_search_result, store_search_result, get_semantic_cache_stats
+from utils.entity_resolution import CampsiteResolver
+from utils.cascade_ranker import rank_by_heuristic, plan_rerank, record_rerank_latency, RANKING_LATENCY_BUDGET
 import time
 from typing import List, Dict, Any, Tuple, Optional
 import concurrent.futures
@@ -37,39 +55,87 @@ load_dotenv()
 # デバッグモードの設定
 DEBUG = True  # デバッグモードを強制的に有効化
 
-# スレッド間通信用のグローバル変数
-if "global_progress_queue" not in globals():
-    global_progress_queue = queue.Queue()
+# 並列検索全体の制限時間（秒）
+PARALLEL_SEARCH_TIMEOUT = float(os.getenv("PARALLEL_SEARCH_TIMEOUT", "45"))
+
+# 特集キャンプ場として表示するスコア（0-1）の下限と件数
+FEATURED_MIN_SCORE = float(os.getenv("FEATURED_MIN_SCORE", "0.7"))
+FEATURED_MAX_CAMPSITES = 3
 
+# iter_search_and_analyzeが返すイベントの種別
+EVENT_RAW_RESULTS = "raw_results"
+EVENT_RANKED_RESULTS = "ranked_results"
+EVENT_PHOTOS = "photos"
+EVENT_REVIEW_ANALYSIS = "review_analysis"
+EVENT_SUMMARY_CHUNK = "summary_chunk"
+EVENT_COMPLETE = "complete"
 
 # 検索の進捗状況を報告する関数
-def report_progress(message):
+def report_progress(message, channel=None, key=None):
     """
     検索の進捗状況を報告する関数
-    グローバル変数のキューを使用してスレッドセーフに実装
+    検索ごとの進捗チャネルに追加するため、同時に実行される検索の進捗は混ざらない
 
     Args:
         message (str): 進捗状況メッセージ
+        channel (ProgressChannel, optional): 検索ごとの進捗チャネル
+        key (str, optional): まとめるためのキー（同じキーの未読メッセージは置き換える）
     """
     # デバッグ出力
     if DEBUG:
         print(f"\n===== 進捗状況の報告: '{message}' =====")
 
-    # グローバル変数のキューを使用
+    if channel is None:
+        return
+
     try:
-        global global_progress_queue
-        global_progress_queue.put(message)
+        channel.publish(message, key=key)
     except Exception as e:
         if DEBUG:
             print(f"進捗報告エラー: {str(e)}")
 
 
-def search_places_api(query):
+def has_coordinates(location):
+    """
+    位置情報に緯度経度が含まれているか確認する関数
+
+    Args:
+        location (dict): 位置情報
+
+    Returns:
+        bool: 緯度経度が含まれている場合はTrue
+    """
+    return bool(location) and "lat" in location and "lng" in location
+
+
+def resolve_query_location(query, query_analysis_future=None):
+    """
+    検索クエリから位置情報を取得する関数
+    地名辞書で見つからない場合はクエリ解析の場所要素をジオコーディングする
+
+    Args:
+        query (str): 検索クエリ
+        query_analysis_future (Future, optional): 並行して実行中のクエリ解析（あればその結果を使う）
+
+    Returns:
+        tuple: (位置情報またはNone, クエリ解析結果またはNone)
+    """
+    location = find_location_in_query(query)
+    if location:
+        return location, None
+
+    query_analysis = query_analysis_future.result() if query_analysis_future is not None else analyze_query(query)
+    place_name = query_analysis.get("location", "") if isinstance(query_analysis, dict) else ""
+    return geocode_place_name(place_name), query_analysis
+
+
+def search_places_api(query, location=None):
     """
     Places APIで検索する関数
 
     Args:
         query (str): 検索クエリ
+        location (dict, optional): 位置情報（緯度・経度）。指定時はlocationBiasに使う
 
     Returns:
         list: キャンプ場データのリスト、またはエラー情報を含む辞書
@@ -81,7 +147,10 @@ def search_places_api(query):
         # Places APIで検索を実行
         if DEBUG:
             print(f"search_campsites_new を実行します...")
-        places_data = search_campsites_new(query)
+        if has_coordinates(location):
+            places_data = search_campsites_new(query, location, radius=location.get("radius", 50000))
+        else:
+            places_data = search_campsites_new(query)
         if DEBUG:
             print(
                 f"search_campsites_new が完了しました: {len(places_data) if places_data and 'places' in places_data else 0}件"
@@ -107,132 +176,228 @@ def search_places_api(query):
         return {"error": f"検索中にエラーが発生しました: {str(e)}"}
 
 
-def search_web(query):
+def search_nearby_places(location):
     """
-    Web検索を実行する関数
+    指定された位置の近くのキャンプ場を検索する関数
 
     Args:
-        query (str): 検索クエリ
+        location (dict): 位置情報（lat, lng, radius）
 
     Returns:
         list: キャンプ場データのリスト
     """
     try:
         if DEBUG:
-            print(f"\n===== search_web: 検索クエリ: '{query}' =====")
+            print(f"\n===== search_nearby_places: 位置情報: {location} =====")
 
-        # Web検索の実装（現在は空のリストを返す）
-        return []
+        nearby_results = get_nearby_campsites_new(
+            location["lat"], location["lng"], radius=location.get("radius", 50000), keyword="キャンプ場"
+        )
+
+        # 近くのキャンプ場を変換
+        return convert_places_to_app_format_new(nearby_results)
     except Exception as e:
         if DEBUG:
-            print(f"Web検索エラー: {str(e)}")
+            print(f"近くのキャンプ場検索エラー: {str(e)}")
         return []
 
 
-def parallel_search(query, location=None):
+def report_places_error(places_results, progress_channel=None):
     """
-    複数のソースから並列検索を実行する関数
+    Places APIのエラーを進捗状況として報告する関数
+
+    Args:
+        places_results (dict): エラー情報を含む辞書
+        progress_channel (ProgressChannel, optional): 検索ごとの進捗チャネル
+    """
+    if DEBUG:
+        print(f"Places API検索エラー: {places_results}")
+
+    error_message = places_results.get("error", "")
+    if error_message:
+        if "503" in error_message or places_results.get("status_code") == 503:
+            report_progress(
+                "⚠️ Google Places APIが一時的に利用できません。しばらく時間をおいてから再度お試しください。",
+                progress_channel,
+            )
+        else:
+            report_progress(f"⚠️ 検索中にエラーが発生しました: {error_message}", progress_channel)
+
+
+def iter_parallel_search(
+    query,
+    location=None,
+    timeout=PARALLEL_SEARCH_TIMEOUT,
+    progress_channel=None,
+    cancel_token=None,
+    query_analysis_future=None,
+):
+    """
+    複数のソースから並列検索を実行し、ソースの結果が届くたびに途中経過を返すジェネレータ
+
+    テキスト検索と位置情報の取得を同時に開始し、位置情報が分かり次第
+    近くのキャンプ場の検索も開始する。全ソースで共通の制限時間を使い、
+    時間内に完了しなかったソースの結果は待たない。検索が中止された場合はその時点で終了する
 
     Args:
         query (str): 検索クエリ
         location (dict, optional): 位置情報（緯度・経度）
-
-    Returns:
-        dict: 検索結果
+        timeout (float, optional): 検索全体の制限時間（秒）
+        progress_channel (ProgressChannel, optional): 検索ごとの進捗チャネル
+        cancel_token (CancellationToken, optional): 検索を中止するためのトークン
+        query_analysis_future (Future, optional): 並行して実行中のクエリ解析（位置情報の取得に使う）
+
+    Yields:
+        dict: その時点の検索結果
+            - campsites (list): 統合・重複削除済みのキャンプ場データのリスト
+            - sources (list): 結果を返した検索ソース
+            - location (dict): 検索に使った位置情報（なければNone）
+            - query_analysis (dict): 位置情報の取得時に実行したクエリ解析結果（なければNone）
+            - completed (str): 今回完了したタスク名
+            - done (bool): すべてのタスクが完了（または制限時間に到達）したか
     """
+    # 地名辞書で即座に位置情報が分かる場合はテキスト検索にも使う
+    if not has_coordinates(location):
+        location = find_location_in_query(query)
+
     if DEBUG:
         print(f"\n===== parallel_search: クエリ: '{query}' =====")
         print(f"位置情報: {location}")
 
-    # 検索結果を格納する辞書
-    search_results = {
-        "campsites": [],
-        "sources": [],
-    }
+    deadline = time.monotonic() + timeout
+    merger = CampsiteResolver()
+    state = {"location": location, "query_analysis": None}
+
+    # 完了したタスクは (タスク名, 結果, 例外) をこのキューに入れる
+    completed_queue = queue.Queue()
+    executor = ThreadPoolExecutor(max_workers=3)
+    pending = set()
+
+    def start(name, func, *args):
+        def run():
+            # 中止された検索では外部APIを呼び出さない
+            if is_cancelled(cancel_token):
+                completed_queue.put((name, None, None))
+                return
+            try:
+                completed_queue.put((name, func(*args), None))
+            except Exception as e:
+                completed_queue.put((name, None, e))
 
-    try:
-        # Places APIで検索
-        places_results = search_places_api(query)
+        pending.add(name)
+        executor.submit(run)
 
-        # エラーチェック
-        if isinstance(places_results, list) and places_results:
-            search_results["campsites"].extend(places_results)
-            search_results["sources"].append("places_api")
-            if DEBUG:
-                print(f"Places API検索結果: {len(places_results)}件")
-        elif isinstance(places_results, list) and not places_results:
-            if DEBUG:
-                print(f"Places API検索結果: 0件")
+    def snapshot(completed, done):
+        return {
+            "campsites": merger.campsites(),
+            "sources": list(merger.sources),
+            "location": state["location"],
+            "query_analysis": state["query_analysis"],
+            "completed": completed,
+            "done": done,
+        }
+
+    # 中止されたら待機中のループをすぐに起こす（終了時に登録を解除する）
+    def wake():
+        completed_queue.put((None, None, None))
+
+    if cancel_token is not None:
+        cancel_token.add_callback(wake)
+
+    try:
+        # すべてのソースを同時に開始
+        start("places_api", search_places_api, query, location)
+        if has_coordinates(location):
+            start("nearby", search_nearby_places, location)
         else:
-            if DEBUG:
-                print(f"Places API検索エラー: {places_results}")
+            start("location", resolve_query_location, query, query_analysis_future)
 
-            # APIエラーがある場合は報告
-            error_message = places_results.get("error", "")
-            if error_message:
-                if "503" in error_message or places_results.get("status_code") == 503:
-                    report_progress(
-                        "⚠️ Google Places APIが一時的に利用できません。しばらく時間をおいてから再度お試しください。"
-                    )
-                else:
-                    report_progress(f"⚠️ 検索中にエラーが発生しました: {error_message}")
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
 
-        # 位置情報がある場合は近くのキャンプ場も検索
-        if location and "lat" in location and "lng" in location:
             try:
-                nearby_results = get_nearby_campsites_new(
-                    location["lat"], location["lng"], radius=50000, keyword="キャンプ場"
-                )
+                name, result, error = completed_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
 
-                # 近くのキャンプ場を変換
-                nearby_campsites = convert_places_to_app_format_new(nearby_results)
-
-                if nearby_campsites:
-                    # 重複を削除
-                    existing_ids = [campsite.get("place_id", "") for campsite in search_results["campsites"]]
-                    unique_nearby = [
-                        campsite for campsite in nearby_campsites if campsite.get("place_id", "") not in existing_ids
-                    ]
+            if is_cancelled(cancel_token):
+                if DEBUG:
+                    print(f"検索が中止されました（未完了: {sorted(pending)}）")
+                return
 
-                    if unique_nearby:
-                        search_results["campsites"].extend(unique_nearby)
-                        if "nearby" not in search_results["sources"]:
-                            search_results["sources"].append("nearby")
+            pending.discard(name)
 
-                        if DEBUG:
-                            print(f"近くのキャンプ場検索結果: {len(unique_nearby)}件（重複削除後）")
-            except Exception as e:
+            if error is not None:
+                if DEBUG:
+                    print(f"検索タスクエラー ({name}): {str(error)}")
+            elif name == "location":
+                # 位置情報が分かったら近くのキャンプ場の検索を開始
+                state["location"], state["query_analysis"] = result
                 if DEBUG:
-                    print(f"近くのキャンプ場検索エラー: {str(e)}")
+                    print(f"クエリから取得した位置情報: {state['location']}")
+                if has_coordinates(state["location"]):
+                    start("nearby", search_nearby_places, state["location"])
+            elif isinstance(result, dict):
+                report_places_error(result, progress_channel)
+            elif result:
+                added = merger.add(name, result)
+                if DEBUG:
+                    print(f"{name} 検索結果: {len(result)}件（新規 {added}件）")
 
-        # 重複を削除
-        unique_campsites = []
-        seen_ids = set()
+            yield snapshot(name, not pending)
 
-        for campsite in search_results["campsites"]:
-            place_id = campsite.get("place_id", "")
-            if place_id and place_id not in seen_ids:
-                seen_ids.add(place_id)
-                unique_campsites.append(campsite)
+        if pending:
+            if DEBUG:
+                print(f"制限時間内に完了しなかった検索: {sorted(pending)}")
+            yield snapshot(None, True)
 
-        search_results["campsites"] = unique_campsites
+    finally:
+        if cancel_token is not None:
+            cancel_token.remove_callback(wake)
+        executor.shutdown(wait=False, cancel_futures=True)
 
-        if DEBUG:
-            print(f"重複削除後のキャンプ場: {len(unique_campsites)}件")
-            print(f"検索ソース: {search_results['sources']}")
 
-        # 検索結果がない場合はWeb検索を試みる
-        if not search_results["campsites"]:
-            try:
-                web_results = search_web(query)
-                if web_results:
-                    search_results["campsites"].extend(web_results)
-                    search_results["sources"].append("web")
+def parallel_search(
+    query, location=None, on_partial=None, timeout=PARALLEL_SEARCH_TIMEOUT, progress_channel=None, cancel_token=None
+):
+    """
+    複数のソースから並列検索を実行する関数
+
+    Args:
+        query (str): 検索クエリ
+        location (dict, optional): 位置情報（緯度・経度）
+        on_partial (callable, optional): ソースの結果が届くたびに途中経過を受け取る関数
+        timeout (float, optional): 検索全体の制限時間（秒）
+        progress_channel (ProgressChannel, optional): 検索ごとの進捗チャネル
+        cancel_token (CancellationToken, optional): 検索を中止するためのトークン
+
+    Returns:
+        dict: 検索結果（iter_parallel_searchの最後の途中経過と同じ形式）
+    """
+    search_results = {
+        "campsites": [],
+        "sources": [],
+        "location": location,
+        "query_analysis": None,
+    }
+
+    try:
+        for partial in iter_parallel_search(
+            query, location, timeout=timeout, progress_channel=progress_channel, cancel_token=cancel_token
+        ):
+            search_results = partial
+            if on_partial is not None:
+                try:
+                    on_partial(partial)
+                except Exception as e:
                     if DEBUG:
-                        print(f"Web検索結果: {len(web_results)}件")
-            except Exception as e:
-                if DEBUG:
-                    print(f"Web検索エラー: {str(e)}")
+                        print(f"途中経過の通知エラー: {str(e)}")
+
+        if DEBUG:
+            print(f"重複削除後のキャンプ場: {len(search_results['campsites'])}件")
+            print(f"検索ソース: {search_results['sources']}")
 
         return search_results
 
@@ -245,23 +410,86 @@ def parallel_search(query, location=None):
         return search_results
 
 
-def search_and_analyze(query, user_preferences=None, facilities_required=None):
+def cancelled_search_result():
     """
-    検索とAI分析を実行する関数
+    中止された検索の結果を作成する関数
+
+    Returns:
+        dict: 空の検索結果（cancelled=True）
     """
-    if "current_progress" not in st.session_state:
-        st.session_state.current_progress = ""
+    return {
+        "results": [],
+        "summary": "",
+        "featured_campsites": [],
+        "popular_campsites": [],
+        "cancelled": True,
+    }
+
+
+def select_featured_campsites(sorted_campsites, min_score=FEATURED_MIN_SCORE):
+    """
+    スコア順に並べたキャンプ場から特集キャンプ場を選ぶ関数
+    スコアは2段階目で評価したキャンプ場もしないキャンプ場も0-1の範囲
+
+    Args:
+        sorted_campsites (list): スコア順に並べたキャンプ場リスト
+        min_score (float, optional): 特集キャンプ場とするスコアの下限（省略時はFEATURED_MIN_SCORE）
+
+    Returns:
+        list: 特集キャンプ場（最大FEATURED_MAX_CAMPSITES件）
+    """
+    return [site for site in sorted_campsites if site.get("score", 0) >= min_score][:FEATURED_MAX_CAMPSITES]
+
+
+def apply_campsite_links(campsites, campsite_links):
+    """
+    公式サイト・口コミサイトの検索結果をキャンプ場データに反映する関数
+
+    Args:
+        campsites (list): キャンプ場データのリスト
+        campsite_links (dict): search_campsites_info_batchの結果（キャンプ場のキー -> 情報の種類 -> 検索結果）
+    """
+    for campsite in campsites:
+        links = campsite_links.get(campsite.get("place_id") or campsite.get("name", "")) or {}
+        if links.get("official"):
+            campsite["official_site"] = links["official"]
+        if links.get("reviews"):
+            campsite["review_sites"] = links["reviews"]
+
+
+def iter_search_and_analyze(
+    query, user_preferences=None, facilities_required=None, progress_channel=None, cancel_token=None
+):
+    """
+    検索とAI分析を段階的に実行し、各段階の結果をイベントとして返すジェネレータ
+
+    Args:
+        query (str): 検索クエリ
+        user_preferences (dict, optional): ユーザーの好み設定
+        facilities_required (list, optional): 必須施設
+        progress_channel (ProgressChannel, optional): 検索ごとの進捗チャネル
+        cancel_token (CancellationToken, optional): 検索を中止するためのトークン
+            中止された場合は外部APIの呼び出しをやめ、cancelledを含むcompleteイベントで終了する
+
+    Yields:
+        dict: 段階ごとのイベント（typeキーで種別を判定する）
+            - raw_results: campsites（検索ソースの結果が届くたびの途中経過）
+            - ranked_results: campsites（スコア順）, featured_campsites, popular_campsites
+            - photos: place_id, campsite, photo_urls（キャンプ場ごと）
+            - review_analysis: place_id, campsite, analysis（キャンプ場ごと）
+            - summary_chunk: text（要約の一部）
+            - complete: result（search_and_analyzeの戻り値と同じ形式）
+    """
+    # 検索開始時刻（2段階目の評価に使える残り時間の計算に使う）
+    started_at = time.time()
 
     # 進捗状況の報告
-    report_progress("🔍 キャンプ場を検索しています...")
+    report_progress("🔍 キャンプ場を検索しています...", progress_channel)
 
-    # 検索クエリから位置情報を抽出
-    location = None
     if DEBUG:
         print(f"\n===== search_and_analyze: クエリ: '{query}' =====")
         print(f"ユーザー設定: {user_preferences}")
         print(f"必須施設: {facilities_required}")
-        print(f"位置情報: {location}")
 
         # 環境変数の確認
         print(f"環境変数の設定:")
@@ -270,62 +498,140 @@ def search_and_analyze(query, user_preferences=None, facilities_required=None):
         if "GOOGLE_PLACE_API_KEY" in os.environ:
             print(f"GOOGLE_PLACE_API_KEY長さ: {len(os.environ['GOOGLE_PLACE_API_KEY'])}")
 
+    # 意図の近いクエリの検索結果があれば、外部APIを呼ばずに再利用する
+    cached_result = lookup_search_result(query, user_preferences, facilities_required)
+    if cached_result:
+        report_progress(
+            f"♻️ 似た検索（{cached_result['cached_query']}）の結果を再利用しました。", progress_channel
+        )
+        yield {
+            "type": EVENT_RANKED_RESULTS,
+            "campsites": sorted(cached_result["results"], key=lambda x: x.get("score", 0), reverse=True),
+            "featured_campsites": cached_result.get("featured_campsites", []),
+            "popular_campsites": cached_result.get("popular_campsites", []),
+        }
+        if cached_result.get("summary"):
+            yield {"type": EVENT_SUMMARY_CHUNK, "text": cached_result["summary"]}
+        yield {"type": EVENT_COMPLETE, "result": cached_result}
+        return
+
+    # クエリ解析は検索と同時に開始し、検索結果の評価の直前で合流する
+    # 関連記事の検索と要約の改善も検索と同時に行い、結果に含めて返す（画面の再実行ごとに検索しないようにする）
+    scheduler = StageScheduler(max_workers=2, cancel_token=cancel_token)
+    query_analysis_future = scheduler.start("query_analysis", analyze_query, query)
+    scheduler.start("related_articles", search_related_articles, query, 5, True)
+
     try:
-        # 検索を実行
-        search_results = parallel_search(query, location)
+        # 検索を実行（位置情報はクエリから並行して取得する）。ソースの結果が届くたびに途中経過を返す
+        search_results = {"campsites": []}
+        for partial in iter_parallel_search(
+            query,
+            progress_channel=progress_channel,
+            cancel_token=cancel_token,
+            query_analysis_future=query_analysis_future,
+        ):
+            search_results = partial
+            if partial["campsites"]:
+                if not partial["done"]:
+                    report_progress(
+                        f"🔍 {len(partial['campsites'])}件のキャンプ場が見つかりました。検索を続けています...",
+                        progress_channel,
+                        key="partial_results",
+                    )
+                yield {"type": EVENT_RAW_RESULTS, "campsites": partial["campsites"]}
 
         if DEBUG:
+            print(f"位置情報: {search_results.get('location')}")
             print(f"検索結果: {search_results}")
 
-        # エラーチェック
-        if isinstance(search_results, dict) and "error" in search_results:
-            error_message = search_results.get("error", "不明なエラー")
-            report_progress(f"❌ 検索中にエラーが発生しました: {error_message}")
-            return {
-                "results": [],
-                "summary": f"検索中にエラーが発生しました: {error_message}",
-                "featured_campsites": [],
-                "popular_campsites": [],
-                "error": error_message,
-            }
+        if is_cancelled(cancel_token):
+            yield {"type": EVENT_COMPLETE, "result": cancelled_search_result()}
+            return
 
         # 検索結果がない場合
-        if not search_results or not search_results.get("campsites"):
+        if not search_results.get("campsites"):
             if DEBUG:
                 print("検索結果: 0件")
-            report_progress("ℹ️ 検索条件に合うキャンプ場が見つかりませんでした。")
-            return {
-                "results": [],
-                "summary": "検索条件に合うキャンプ場が見つかりませんでした。別のキーワードで検索してみてください。",
-                "featured_campsites": [],
-                "popular_campsites": [],
+            report_progress("ℹ️ 検索条件に合うキャンプ場が見つかりませんでした。", progress_channel)
+            yield {
+                "type": EVENT_COMPLETE,
+                "result": {
+                    "results": [],
+                    "summary": "検索条件に合うキャンプ場が見つかりませんでした。別のキーワードで検索してみてください。",
+                    "featured_campsites": [],
+                    "popular_campsites": [],
+                    "related_articles": [],
+                },
             }
+            return
 
         # 検索結果を取得
         campsites = search_results.get("campsites", [])
 
         if DEBUG:
             print(f"キャンプ場件数: {len(campsites)}")
-            if campsites:
-                print(f"最初のキャンプ場: {campsites[0].get('name', '不明')}")
+            print(f"最初のキャンプ場: {campsites[0].get('name', '不明')}")
 
         # 検索結果を評価
-        report_progress("⭐ 検索結果を評価しています...")
+        report_progress("⭐ 検索結果を評価しています...", progress_channel)
 
-        # クエリを解析
-        query_analysis = analyze_query(query)
+        # 検索と並行して実行していたクエリ解析と合流する
+        query_analysis = search_results.get("query_analysis") or scheduler.join(
+            "query_analysis", timeout=PARALLEL_SEARCH_TIMEOUT
+        )
+        if not query_analysis:
+            query_analysis = basic_query_analysis(query)
 
-        # 検索結果を評価
-        campsites_with_scores = evaluate_search_results(query, query_analysis, campsites)
+        # 1段階目: すべての候補を機械的に採点して並べる
+        ranked_campsites = rank_by_heuristic(campsites, query_analysis, search_results.get("location"))
+        yield {"type": EVENT_RAW_RESULTS, "campsites": ranked_campsites}
+
+        # 2段階目: 残り時間に応じた上位の候補だけをGeminiで評価する（上位の差が十分な場合は省く）
+        rerank_count, reason = plan_rerank(
+            ranked_campsites, time.time() - started_at, EVALUATION_WORKERS, EVALUATION_CHUNK_MAX_CAMPSITES
+        )
+        head_campsites = ranked_campsites[:rerank_count]
+        tail_campsites = ranked_campsites[rerank_count:]
+
+        if DEBUG:
+            print(f"2段階目の評価: {rerank_count}/{len(ranked_campsites)}件（{reason}）")
+
+        # 評価結果が届いたキャンプ場から順位に反映して途中経過を返す
+        # （残り時間を過ぎても評価が終わらないキャンプ場は、1段階目の点数のまま並べる）
+        evaluated_count = 0
+        if rerank_count:
+            rerank_started_at = time.time()
+            for _ in iter_evaluate_search_results(
+                query,
+                query_analysis,
+                head_campsites,
+                max_results=rerank_count,
+                cancel_token=cancel_token,
+                timeout=max(0.0, RANKING_LATENCY_BUDGET - (rerank_started_at - started_at)),
+            ):
+                evaluated_count += 1
+                yield {
+                    "type": EVENT_RAW_RESULTS,
+                    "campsites": sort_evaluated_campsites(head_campsites, rerank_count) + tail_campsites,
+                }
+
+            if evaluated_count:
+                rounds = math.ceil(rerank_count / (EVALUATION_WORKERS * EVALUATION_CHUNK_MAX_CAMPSITES))
+                record_rerank_latency(time.time() - rerank_started_at, rounds)
+
+        if evaluated_count:
+            campsites_with_scores = sort_evaluated_campsites(head_campsites, rerank_count) + tail_campsites
+        else:
+            campsites_with_scores = ranked_campsites
 
         # 検索結果を整理
-        report_progress("📊 検索結果を整理しています...")
+        report_progress("📊 検索結果を整理しています...", progress_channel)
 
         # スコアでソート
         sorted_campsites = sorted(campsites_with_scores, key=lambda x: x.get("score", 0), reverse=True)
 
         # 特集キャンプ場（スコアが高いもの）
-        featured_campsites = [c for c in sorted_campsites if c.get("score", 0) >= 0.7][:3]
+        featured_campsites = select_featured_campsites(sorted_campsites)
 
         # 人気キャンプ場（レビュー数が多いもの）
         popular_campsites = sorted(campsites_with_scores, key=lambda x: x.get("reviews_count", 0), reverse=True)[:3]
@@ -334,25 +640,40 @@ def search_and_analyze(query, user_preferences=None, facilities_required=None):
             print(f"特集キャンプ場: {len(featured_campsites)}件")
             print(f"人気キャンプ場: {len(popular_campsites)}件")
 
+        yield {
+            "type": EVENT_RANKED_RESULTS,
+            "campsites": sorted_campsites,
+            "featured_campsites": featured_campsites,
+            "popular_campsites": popular_campsites,
+        }
+
         # 写真を取得するキャンプ場のIDを特定（特集と人気のみ）
         display_ids = set()
         for camp in featured_campsites + popular_campsites:
             display_ids.add(camp.get("place_id"))
 
+        display_campsites = [camp for camp in campsites_with_scores if camp.get("place_id") in display_ids]
+
         if DEBUG:
             print(f"写真取得対象のキャンプ場: {len(display_ids)}件")
 
-        # 写真取得を並列処理で行う
-        with ThreadPoolExecutor(max_workers=min(10, len(display_ids))) as executor:
+        # 公式サイト・口コミサイトの検索は、写真の取得・口コミ分析と同時に行い、完了前に合流する
+        scheduler.start("campsite_links", search_campsites_info_batch, display_campsites)
+
+        # 写真取得を並列処理で行い、取得できたキャンプ場から順に返す
+        with ThreadPoolExecutor(max_workers=max(1, min(10, len(display_campsites)))) as executor:
             # キャンプ場ごとに写真取得処理を実行
             future_to_campsite = {
-                executor.submit(fetch_photos_for_campsite, camp): camp
-                for camp in campsites_with_scores
-                if camp.get("place_id") in display_ids
+                executor.submit(fetch_photos_for_campsite, camp, cancel_token): camp for camp in display_campsites
             }
 
             # 結果を取得
             for future in concurrent.futures.as_completed(future_to_campsite):
+                # 中止された場合は未着手の写真取得を取り消す
+                if is_cancelled(cancel_token):
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    break
+
                 campsite = future_to_campsite[future]
                 try:
                     photo_urls = future.result()
@@ -362,82 +683,148 @@ def search_and_analyze(query, user_preferences=None, facilities_required=None):
                         campsite["image_url"] = photo_urls[0] if photo_urls else ""
                         if DEBUG:
                             print(f"写真URL取得成功: {campsite.get('name')} - {len(photo_urls)}枚")
+                        yield {
+                            "type": EVENT_PHOTOS,
+                            "place_id": campsite.get("place_id"),
+                            "campsite": campsite,
+                            "photo_urls": photo_urls,
+                        }
                 except Exception as e:
                     if DEBUG:
                         print(f"写真取得エラー ({campsite.get('name')}): {str(e)}")
 
-        # 口コミ分析を行うキャンプ場を特定（特集と人気のみ）
-        report_progress("📊 口コミを分析しています...")
-        with ThreadPoolExecutor(max_workers=min(6, len(display_ids))) as executor:
-            # キャンプ場ごとに口コミ分析を実行
-            future_to_analysis = {
-                executor.submit(analyze_campsite_reviews, camp, user_preferences): camp
-                for camp in campsites_with_scores
-                if camp.get("place_id") in display_ids
-            }
-
-            # 結果を取得
-            for future in concurrent.futures.as_completed(future_to_analysis):
-                campsite = future_to_analysis[future]
-                try:
-                    analysis = future.result()
-                    # 分析結果をキャンプ場データに追加
-                    if analysis:
-                        campsite["review_summary"] = analysis.get("summary", "")
-                        campsite["ai_recommendation"] = analysis.get("recommendation", "")
-                        if DEBUG:
-                            print(f"口コミ分析成功: {campsite.get('name')}")
-                except Exception as e:
-                    if DEBUG:
-                        print(f"口コミ分析エラー ({campsite.get('name')}): {str(e)}")
-
-        # 検索結果の要約を生成
-        report_progress("📝 検索結果の要約を生成しています...")
-        summary = generate_search_summary(
+        if is_cancelled(cancel_token):
+            yield {"type": EVENT_COMPLETE, "result": cancelled_search_result()}
+            return
+
+        # 口コミ分析（特集と人気のみ）。複数のキャンプ場をまとめて分析し、バッチが完了するたびに返す
+        report_progress("📊 口コミを分析しています...", progress_channel)
+        for campsite, analysis in iter_campsite_review_analyses(display_campsites, user_preferences, cancel_token):
+            # 分析結果をキャンプ場データに追加
+            if analysis:
+                campsite["review_summary"] = analysis.get("summary", "")
+                campsite["ai_recommendation"] = analysis.get("recommendation", "")
+                if DEBUG:
+                    print(f"口コミ分析成功: {campsite.get('name')}")
+                yield {
+                    "type": EVENT_REVIEW_ANALYSIS,
+                    "place_id": campsite.get("place_id"),
+                    "campsite": campsite,
+                    "analysis": analysis,
+                }
+
+        if is_cancelled(cancel_token):
+            yield {"type": EVENT_COMPLETE, "result": cancelled_search_result()}
+            return
+
+        # 検索結果の要約を生成（生成された部分から順に返す）
+        report_progress("📝 検索結果の要約を生成しています...", progress_channel)
+        summary_chunks = []
+        for text in iter_search_summary(
             query,
             query_analysis,
             campsites_with_scores,
             max_results=5,
             perfect_match_campsites=featured_campsites,
             popular_campsites=popular_campsites,
+            cancel_token=cancel_token,
+        ):
+            summary_chunks.append(text)
+            yield {"type": EVENT_SUMMARY_CHUNK, "text": text}
+        summary = "".join(summary_chunks)
+
+        if is_cancelled(cancel_token):
+            yield {"type": EVENT_COMPLETE, "result": cancelled_search_result()}
+            return
+
+        # 公式サイト・口コミサイトの検索結果と合流する
+        apply_campsite_links(
+            display_campsites, scheduler.join("campsite_links", timeout=PARALLEL_SEARCH_TIMEOUT, default={})
         )
 
         # 検索完了
-        report_progress(f"✅ 検索が完了しました！{len(campsites_with_scores)}件のキャンプ場が見つかりました。")
+        report_progress(f"✅ 検索が完了しました！{len(campsites_with_scores)}件のキャンプ場が見つかりました。", progress_channel)
 
-        if DEBUG:
-            print(f"検索結果: {len(campsites_with_scores)}件")
-            print("検索が完了しました")
-
-        return {
+        result = {
             "results": campsites_with_scores,
             "summary": summary,
             "featured_campsites": featured_campsites,
             "popular_campsites": popular_campsites,
+            # 検索と同時に取得していた関連記事と合流する
+            "related_articles": scheduler.join("related_articles", timeout=PARALLEL_SEARCH_TIMEOUT, default=[]),
         }
 
+        # 意図の近いクエリで再利用できるように保存する
+        store_search_result(query, result, user_preferences, facilities_required)
+
+        if DEBUG:
+            print(f"検索結果: {len(campsites_with_scores)}件")
+            print("検索が完了しました")
+            print(f"セマンティックキャッシュ: {get_semantic_cache_stats()}")
+            print(f"プロンプトサイズ: {get_prompt_stats()}")
+            print(f"コンテキストキャッシュ: {get_context_cache_stats()}")
+            print(f"口コミ分析結果の保存: {get_review_digest_stats()}")
+
+        yield {"type": EVENT_COMPLETE, "result": result}
+
     except Exception as e:
         if DEBUG:
             print(f"search_and_analyze エラー: {str(e)}")
             import traceback
 
             print(traceback.format_exc())
-        report_progress(f"❌ 検索処理中にエラーが発生しました: {str(e)}")
-        return {
-            "results": [],
-            "summary": f"検索処理中にエラーが発生しました: {str(e)}",
-            "featured_campsites": [],
-            "popular_campsites": [],
-            "error": str(e),
+        report_progress(f"❌ 検索処理中にエラーが発生しました: {str(e)}", progress_channel)
+        yield {
+            "type": EVENT_COMPLETE,
+            "result": {
+                "results": [],
+                "summary": f"検索処理中にエラーが発生しました: {str(e)}",
+                "featured_campsites": [],
+                "popular_campsites": [],
+                "error": str(e),
+            },
         }
 
+    finally:
+        scheduler.shutdown()
+
+
+def search_and_analyze(
+    query, user_preferences=None, facilities_required=None, progress_channel=None, cancel_token=None
+):
+    """
+    検索とAI分析を実行する関数
+    iter_search_and_analyzeをすべての段階が終わるまで実行し、最終結果を返す
+
+    Args:
+        query (str): 検索クエリ
+        user_preferences (dict, optional): ユーザーの好み設定
+        facilities_required (list, optional): 必須施設
+        progress_channel (ProgressChannel, optional): 検索ごとの進捗チャネル
+        cancel_token (CancellationToken, optional): 検索を中止するためのトークン
 
-def fetch_photos_for_campsite(campsite):
-    """キャンプ場の写真を取得する関数"""
+    Returns:
+        dict: 検索結果（results, summary, featured_campsites, popular_campsites, related_articles, エラー時はerror, 中止時はcancelled）
+    """
+    result = None
+    for event in iter_search_and_analyze(
+        query, user_preferences, facilities_required, progress_channel, cancel_token
+    ):
+        if event["type"] == EVENT_COMPLETE:
+            result = event["result"]
+
+    return result
+
+
+def fetch_photos_for_campsite(campsite, cancel_token=None):
+    """キャンプ場の写真を取得する関数（検索が中止された場合は取得済みの写真だけを返す）"""
     photo_urls = []
     default_image = "https://placehold.jp/24/3d4070/ffffff/300x200.png?text=No%20Image"
 
     try:
+        if is_cancelled(cancel_token):
+            return []
+
         place_id = campsite.get("place_id", "")
 
         # 詳細情報を取得して写真名を取得
@@ -467,6 +854,8 @@ def fetch_photos_for_campsite(campsite):
 
             # 最大6枚まで取得
             for i, photo_name in enumerate(photo_names[:6]):
+                if is_cancelled(cancel_token):
+                    return photo_urls
                 try:
                     photo_url = get_place_photo_new(photo_name)
                     if photo_url:
@@ -481,6 +870,8 @@ def fetch_photos_for_campsite(campsite):
             if photo_names:
                 # 最大6枚まで取得
                 for i, photo_name in enumerate(photo_names[:6]):
+                    if is_cancelled(cancel_token):
+                        return photo_urls
                     try:
                         photo_url = get_place_photo_new(photo_name)
                         if photo_url:
@@ -497,284 +888,3 @@ def fetch_photos_for_campsite(campsite):
         if DEBUG:
             print(f"写真取得関数エラー: {str(e)}")
         return []
-
-
-def analyze_campsite_reviews(campsite, user_preferences=None):
-    """
-    キャンプ場の口コミを分析する関数
-
-    Args:
-        campsite (dict): キャンプ場データ
-        user_preferences (dict, optional): ユーザーの好み設定
-
-    Returns:
-        dict: 分析結果
-    """
-    if DEBUG:
-        print(f"\n===== analyze_campsite_reviews: {campsite.get('name', '不明')} =====")
-        print(f"ユーザー好み設定: {user_preferences}")
-
-    # 分析結果の初期化
-    analysis = {"summary": "", "features": [], "trends": [], "recommendation": ""}
-
-    try:
-        # ユーザー好みが指定されていない場合は空の辞書を使用
-        if user_preferences is None:
-            user_preferences = {}
-
-        # Gemini APIを使った分析を試みる
-        try:
-            from utils.gemini_api import get_gemini_response
-            import json
-
-            # キャンプ場の基本情報
-            name = campsite.get("name", "不明")
-            description = campsite.get("description", "")
-            rating = campsite.get("rating", 0)
-            reviews_count = campsite.get("reviews_count", 0)
-            facilities = campsite.get("facilities", [])
-            features = campsite.get("features", [])
-
-            # 口コミを取得
-            reviews = campsite.get("reviews", [])
-
-            # 口コミの内容を結合
-            review_texts = []
-            if reviews:
-                for review in reviews:
-                    review_text = review.get("text", "")
-                    if review_text:
-                        review_texts.append(review_text)
-
-            # Gemini APIへのプロンプト作成
-            prompt = f"""
-            あなたは日本のキャンプ場に関する専門家です。以下のキャンプ場について、情報を分析して特徴を要約し、
-            おすすめポイントを生成してください。
-
-            キャンプ場名: {name}
-            
-            説明文: {description}
-            
-            評価: {rating}（{reviews_count}件の口コミ）
-            
-            特徴: {', '.join(features)}
-            
-            設備: {', '.join(facilities)}
-            
-            口コミ:
-            {' '.join(review_texts[:5])}
-            
-            以下の情報を日本語で提供してください：
-            1. このキャンプ場の特徴や雰囲気の要約（150文字程度）
-            2. このキャンプ場の主な特徴（箇条書きで5つ）
-            3. 口コミから見る傾向（箇条書きで5つ）
-            4. おすすめポイント（150文字程度）
-            
-            回答は以下のJSON形式で返してください：
-            ```json
-            {{
-              "summary": "キャンプ場の特徴や雰囲気の要約",
-              "features": ["特徴1", "特徴2", "特徴3", "特徴4", "特徴5"],
-              "trends": ["傾向1", "傾向2", "傾向3", "傾向4", "傾向5"],
-              "recommendation": "おすすめポイント"
-            }}
-            ```
-            """
-
-            # Gemini APIを呼び出し
-            response = get_gemini_response(prompt, temperature=0.2, max_output_tokens=1024)
-
-            # JSONデータを抽出
-            json_start = response.find("```json") + 7
-            json_end = response.find("```", json_start)
-
-            if json_start != -1 and json_end != -1:
-                json_text = response[json_start:json_end].strip()
-                gemini_analysis = json.loads(json_text)
-
-                # 分析結果を設定
-                analysis["summary"] = gemini_analysis.get("summary", "")
-                analysis["features"] = gemini_analysis.get("features", [])
-                analysis["trends"] = gemini_analysis.get("trends", [])
-                analysis["recommendation"] = gemini_analysis.get("recommendation", "")
-
-                if DEBUG:
-                    print(f"Gemini APIによる分析結果:")
-                    print(f"要約: {analysis['summary']}")
-                    print(f"特徴: {analysis['features']}")
-                    print(f"傾向: {analysis['trends']}")
-                    print(f"おすすめ: {analysis['recommendation']}")
-
-                return analysis
-
-        except Exception as e:
-            if DEBUG:
-                print(f"Gemini API分析エラー: {str(e)}")
-                print("ローカル分析にフォールバックします")
-
-        # Gemini APIが使えない場合はローカル分析を実行
-        # キャンプ場の基本情報
-        name = campsite.get("name", "")
-        rating = campsite.get("rating", 0)
-        reviews_count = campsite.get("reviews_count", 0)
-        facilities = campsite.get("facilities", [])
-        features = campsite.get("features", [])
-        description = campsite.get("description", "")
-
-        # 口コミを取得
-        reviews = campsite.get("reviews", [])
-
-        # 口コミの内容を結合
-        review_texts = []
-        if reviews:
-            for review in reviews:
-                review_text = review.get("text", "")
-                if review_text:
-                    review_texts.append(review_text)
-
-        # 基本情報から特徴を抽出
-        extracted_features = []
-
-        # 施設から特徴を抽出
-        if facilities:
-            extracted_features.extend(facilities[:5])
-
-        # 特徴から特徴を抽出
-        if features:
-            extracted_features.extend(features[:5])
-
-        # 説明文からキーワードを抽出
-        if description:
-            keywords = [
-                "景色",
-                "自然",
-                "環境",
-                "立地",
-                "アクセス",
-                "設備",
-                "施設",
-                "清潔",
-                "きれい",
-                "広い",
-                "静か",
-                "家族",
-                "子供",
-                "ペット",
-                "テント",
-                "キャンピングカー",
-                "コテージ",
-                "バンガロー",
-                "温泉",
-                "川",
-                "海",
-                "山",
-                "湖",
-                "森",
-                "トイレ",
-                "シャワー",
-                "風呂",
-                "炊事場",
-                "売店",
-                "薪",
-                "焚き火",
-                "BBQ",
-                "バーベキュー",
-            ]
-            for keyword in keywords:
-                if keyword in description:
-                    extracted_features.append(keyword)
-
-        # 重複を削除して特徴リストを作成
-        unique_features = list(set(extracted_features))
-        analysis["features"] = unique_features[:10]  # 最大10件
-
-        # 口コミの傾向を生成
-        trends = []
-
-        # 評価に基づく傾向
-        if rating >= 4.5:
-            trends.append("評価が非常に高い")
-        elif rating >= 4.0:
-            trends.append("評価が高い")
-        elif rating >= 3.5:
-            trends.append("評価が良好")
-        elif rating >= 3.0:
-            trends.append("評価が平均的")
-        else:
-            trends.append("評価が平均以下")
-
-        # 口コミ数に基づく傾向
-        if reviews_count >= 1000:
-            trends.append("非常に人気がある")
-        elif reviews_count >= 500:
-            trends.append("人気がある")
-        elif reviews_count >= 100:
-            trends.append("ある程度知られている")
-        elif reviews_count >= 10:
-            trends.append("口コミが少ない")
-        else:
-            trends.append("あまり知られていない")
-
-        # 特徴に基づく傾向
-        if "湖" in " ".join(unique_features) or "湖畔" in " ".join(unique_features):
-            trends.append("湖畔の景色が魅力")
-        if "山" in " ".join(unique_features):
-            trends.append("山の景色が魅力")
-        if "森" in " ".join(unique_features):
-            trends.append("森の中の静かな環境")
-        if "海" in " ".join(unique_features) or "ビーチ" in " ".join(unique_features):
-            trends.append("海の近くの立地")
-        if "温泉" in " ".join(unique_features):
-            trends.append("温泉施設あり")
-        if "子供" in " ".join(unique_features) or "ファミリー" in " ".join(unique_features):
-            trends.append("家族連れに人気")
-        if "ペット" in " ".join(unique_features):
-            trends.append("ペット同伴可能")
-
-        analysis["trends"] = trends
-
-        # 口コミの要約を生成
-        summary = f"{name}は"
-
-        # 評価に基づく要約
-        if rating >= 4.5:
-            summary += "評価が非常に高く、多くの利用者から好評を得ています。"
-        elif rating >= 4.0:
-            summary += "評価が高く、利用者からの評判が良いキャンプ場です。"
-        elif rating >= 3.5:
-            summary += "一般的に良い評価を受けているキャンプ場です。"
-        elif rating >= 3.0:
-            summary += "平均的な評価を受けているキャンプ場です。"
-        else:
-            summary += "評価は平均以下ですが、"
-
-        # 特徴に基づく要約
-        if unique_features:
-            summary += f" {', '.join(unique_features[:3])}などの特徴があります。"
-
-        # 傾向に基づく要約
-        if len(trends) > 2:
-            summary += f" {trends[0]}で、{trends[1]}キャンプ場です。"
-
-        analysis["summary"] = summary
-
-        # おすすめポイントを生成
-        recommendation = ""
-        if rating >= 4.0 and unique_features:
-            recommendation = f"評価が高く、特に{', '.join(unique_features[:3])}が充実したおすすめのキャンプ場です。"
-        elif rating >= 3.5 and unique_features:
-            recommendation = f"{', '.join(unique_features[:3])}が特徴的な、一般的に良い評価を受けているキャンプ場です。"
-        else:
-            recommendation = f"基本的な設備が整ったキャンプ場で、{', '.join(unique_features[:3] if unique_features else ['自然環境'])}が楽しめます。"
-
-        analysis["recommendation"] = recommendation
-
-        return analysis
-
-    except Exception as e:
-        if DEBUG:
-            print(f"口コミ分析エラー: {str(e)}")
-            import traceback
-
-            print(traceback.format_exc())
-        return analysis
@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 from datetime import datetime
 import functools
 import time
+from utils.reverse_geocoder import assign_regions
 
 # 環境変数の読み込み
 load_dotenv()
@@ -528,6 +529,13 @@ def convert_places_to_app_format_new(places_data):
                 print(traceback.format_exc())
             continue
 
+    # 都道府県と地方を設定（住所・座標からオフラインで判定）
+    try:
+        assign_regions(campsites)
+    except Exception as e:
+        if DEBUG:
+            print(f"[Places API] 地域判定エラー: {str(e)}")
+
     if DEBUG:
         print(f"[Places API] 変換結果: {len(campsites)}件")
 
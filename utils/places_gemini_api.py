@@ -4,6 +4,8 @@ import requests
 from dotenv import load_dotenv
 from utils.places_api_new import search_campsites_new, get_place_details_new, convert_places_to_app_format_new
 from utils.gemini_api import search_campsites_gemini
+from utils.json_stream import extract_json
+from utils.entity_resolution import CampsiteResolver
 
 # 環境変数の読み込み
 load_dotenv()
@@ -42,18 +44,16 @@ def search_campsites_places_gemini(query):
             # Gemini APIで検索
             gemini_results = search_campsites_gemini(query)
 
-            # 重複を避けるために既存の結果のキャンプ場名をリストアップ
-            existing_names = [site.get("name", "").lower() for site in places_results]
-
-            # 重複しないGemini APIの結果を追加
+            # 同じキャンプ場はまとめ、重複しないGemini APIの結果を追加
+            resolver = CampsiteResolver()
+            resolver.add("places_api", places_results)
             for site in gemini_results:
-                if site.get("name", "").lower() not in existing_names:
-                    places_results.append(site)
-                    existing_names.append(site.get("name", "").lower())
+                # 最大10件まで
+                if resolver.entity_count >= 10:
+                    break
+                resolver.add("gemini", [site])
 
-                    # 最大10件まで
-                    if len(places_results) >= 10:
-                        break
+            places_results = resolver.campsites()
 
         # 検索結果を評価順にソート
         places_results = sorted(places_results, key=lambda x: x.get("rating", 0), reverse=True)
@@ -143,18 +143,10 @@ def enhance_search_results_with_gemini(campsites, query):
             # テキスト応答を抽出
             text = response_data["candidates"][0]["content"]["parts"][0]["text"]
 
-            # JSONデータを抽出
-            json_start = text.find("```json") + 7
-            json_end = text.find("```", json_start)
-
-            if json_start == -1 or json_end == -1:
-                # JSON形式でない場合は、テキスト全体を解析
-                json_text = text
-            else:
-                json_text = text[json_start:json_end].strip()
-
-            # JSONデータをパース
-            enhanced_data = json.loads(json_text)
+            # JSONデータを抽出（コードブロックがない応答にも対応する）
+            enhanced_data = extract_json(text, default={})
+            if not isinstance(enhanced_data, dict):
+                continue
 
             # キャンプ場データを強化
             if "description" in enhanced_data and not campsite.get("description"):
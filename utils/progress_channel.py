@@ -0,0 +1,145 @@
+"""
+検索ごとの進捗チャネルを管理するモジュール
+セッションIDと検索IDごとに独立した進捗バッファを持ち、
+同時に実行される検索の進捗メッセージが混ざらないようにします
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from dotenv import load_dotenv
+
+# 環境変数の読み込み
+load_dotenv()
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# チャネルごとに保持する未読メッセージの上限（古いものから破棄する）
+PROGRESS_BUFFER_SIZE = int(os.getenv("PROGRESS_BUFFER_SIZE", "20"))
+
+# 同時に保持するチャネル数の上限（古いものから閉じる）
+MAX_PROGRESS_CHANNELS = int(os.getenv("MAX_PROGRESS_CHANNELS", "1000"))
+
+
+class ProgressChannel:
+    """
+    1回の検索の進捗メッセージを保持するチャネル
+    同じkeyのメッセージが連続した場合は最新のものだけを残す
+    """
+
+    def __init__(self, session_id, search_id, maxlen=PROGRESS_BUFFER_SIZE):
+        self.session_id = session_id
+        self.search_id = search_id
+        self.latest = None
+        self.dropped = 0
+        self.closed = False
+        self._events = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def publish(self, message, key=None):
+        """
+        進捗メッセージを追加する
+
+        Args:
+            message (str): 進捗メッセージ
+            key (str, optional): まとめるためのキー（同じキーの未読メッセージは置き換える）
+        """
+        event = {"message": message, "key": key, "time": time.time()}
+        with self._lock:
+            if self.closed:
+                return
+
+            if key is not None and self._events and self._events[-1]["key"] == key:
+                self._events[-1] = event
+            else:
+                if len(self._events) == self._events.maxlen:
+                    self.dropped += 1
+                self._events.append(event)
+            self.latest = event
+
+    def drain(self):
+        """
+        未読の進捗メッセージをすべて取り出す
+
+        Returns:
+            list: 進捗イベント（message, key, time）のリスト
+        """
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+    def close(self):
+        """チャネルを閉じ、以降のメッセージを受け付けないようにする"""
+        with self._lock:
+            self.closed = True
+            self._events.clear()
+
+
+# 開いているチャネル（(session_id, search_id) -> ProgressChannel）
+_channels = OrderedDict()
+_channels_lock = threading.Lock()
+
+
+def open_progress_channel(session_id, search_id):
+    """
+    検索用の進捗チャネルを開く関数
+    同じセッションの以前の検索のチャネルは閉じる
+
+    Args:
+        session_id (str): セッションID
+        search_id (str): 検索ID
+
+    Returns:
+        ProgressChannel: 進捗チャネル
+    """
+    channel = ProgressChannel(session_id, search_id)
+
+    with _channels_lock:
+        # 同じセッションの以前の検索は新しい検索に置き換えられる
+        for key in [key for key in _channels if key[0] == session_id]:
+            _channels.pop(key).close()
+
+        _channels[(session_id, search_id)] = channel
+
+        # 上限を超えた場合は古いチャネルから閉じる
+        while len(_channels) > MAX_PROGRESS_CHANNELS:
+            _, oldest = _channels.popitem(last=False)
+            oldest.close()
+
+    if DEBUG:
+        print(f"[ProgressChannel] チャネルを開きました: {session_id}/{search_id}（{len(_channels)}件）")
+
+    return channel
+
+
+def get_progress_channel(session_id, search_id):
+    """
+    開いている進捗チャネルを取得する関数
+
+    Args:
+        session_id (str): セッションID
+        search_id (str): 検索ID
+
+    Returns:
+        ProgressChannel: 進捗チャネル。存在しない場合はNone
+    """
+    with _channels_lock:
+        return _channels.get((session_id, search_id))
+
+
+def close_progress_channel(session_id, search_id):
+    """
+    進捗チャネルを閉じる関数
+
+    Args:
+        session_id (str): セッションID
+        search_id (str): 検索ID
+    """
+    with _channels_lock:
+        channel = _channels.pop((session_id, search_id), None)
+
+    if channel is not None:
+        channel.close()
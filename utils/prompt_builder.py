@@ -0,0 +1,352 @@
+"""
+Gemini APIに送るプロンプトを組み立てるモジュール
+キャンプ場データの空の項目を取り除き、重複をまとめ、段階ごとのトークン数の上限に収まるように切り詰めます
+送信したプロンプトの推定トークン数は段階ごとに記録します
+"""
+
+import os
+import json
+import threading
+from dotenv import load_dotenv
+
+# 環境変数の読み込み
+load_dotenv()
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# 段階ごとの、プロンプトに埋め込むデータの推定トークン数の上限
+PROMPT_TOKEN_BUDGETS = {
+    "evaluate": int(os.getenv("PROMPT_BUDGET_EVALUATE", "1500")),
+    "summary": int(os.getenv("PROMPT_BUDGET_SUMMARY", "2000")),
+    "search_analysis": int(os.getenv("PROMPT_BUDGET_SEARCH_ANALYSIS", "2500")),
+    "review_analysis": int(os.getenv("PROMPT_BUDGET_REVIEW_ANALYSIS", "1200")),
+}
+
+# 上限が決まっていない段階の推定トークン数の上限
+DEFAULT_PROMPT_TOKEN_BUDGET = 2000
+
+# 文字列の項目の最大文字数
+MAX_FIELD_CHARS = 200
+
+# 口コミの抜粋の件数と1件あたりの最大文字数
+MAX_REVIEW_EXCERPTS = 3
+MAX_REVIEW_EXCERPT_CHARS = 160
+
+# 上限に収まらない場合に、文字列の項目を切り詰めていく最大文字数
+TRUNCATION_STEPS = (120, 80, 40)
+
+# 段階ごとのプロンプトサイズの統計
+_stats = {}
+_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """
+    テキストのトークン数を推定する関数
+    日本語などの全角文字は1文字1トークン、半角文字は4文字1トークンとして数える
+
+    Args:
+        text (str): テキスト
+
+    Returns:
+        int: 推定トークン数
+    """
+    if not text:
+        return 0
+
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return (len(text) - ascii_chars) + (ascii_chars + 3) // 4
+
+
+def truncate_text(text, max_chars=MAX_FIELD_CHARS):
+    """
+    テキストを最大文字数で切り詰める関数
+
+    Args:
+        text (str): テキスト
+        max_chars (int, optional): 最大文字数
+
+    Returns:
+        str: 切り詰めたテキスト（切り詰めた場合は末尾に…を付ける）
+    """
+    text = " ".join(str(text).split())
+    return text if len(text) <= max_chars else text[: max_chars - 1] + "…"
+
+
+def compact_value(value, max_chars=MAX_FIELD_CHARS):
+    """
+    プロンプトに埋め込む値を小さくする関数
+    空の項目（None・空文字・空のリストや辞書）を取り除き、リストの重複をまとめ、長い文字列を切り詰める
+
+    Args:
+        value (any): 値
+        max_chars (int, optional): 文字列の最大文字数
+
+    Returns:
+        any: 小さくした値（空の場合はNone）
+    """
+    if isinstance(value, dict):
+        compacted = {}
+        for key, item in value.items():
+            item = compact_value(item, max_chars)
+            if item is not None:
+                compacted[key] = item
+        return compacted or None
+
+    if isinstance(value, (list, tuple)):
+        compacted = []
+        for item in value:
+            item = compact_value(item, max_chars)
+            if item is not None and item not in compacted:
+                compacted.append(item)
+        return compacted or None
+
+    if isinstance(value, str):
+        value = truncate_text(value, max_chars)
+        return value or None
+
+    return value
+
+
+def review_excerpts(reviews, max_reviews=MAX_REVIEW_EXCERPTS, max_chars=MAX_REVIEW_EXCERPT_CHARS):
+    """
+    口コミから重複のない抜粋を作成する関数
+
+    Args:
+        reviews (list): 口コミ（辞書または文字列）のリスト
+        max_reviews (int, optional): 抜粋の最大件数
+        max_chars (int, optional): 1件あたりの最大文字数
+
+    Returns:
+        list: 口コミの抜粋のリスト
+    """
+    excerpts = []
+    for review in reviews or []:
+        text = review.get("text", "") if isinstance(review, dict) else review
+        if not text:
+            continue
+
+        excerpt = truncate_text(text, max_chars)
+        if excerpt not in excerpts:
+            excerpts.append(excerpt)
+        if len(excerpts) >= max_reviews:
+            break
+
+    return excerpts
+
+
+def compact_records(records, fields, stage=None, token_budget=None):
+    """
+    キャンプ場データのリストを、指定した項目だけの小さなJSON文字列に変換する関数
+    段階ごとの上限を超える場合は、文字列の項目を段階的に切り詰め、それでも超える場合は末尾のデータを省く
+
+    Args:
+        records (list): キャンプ場データのリスト
+        fields (dict): 出力する項目名 -> キャンプ場データのキー（または値を返す関数）
+        stage (str, optional): 段階の名前（上限の決定に使う）
+        token_budget (int, optional): 推定トークン数の上限（省略時は段階ごとの上限）
+
+    Returns:
+        str: JSON文字列
+    """
+    budget = token_budget or PROMPT_TOKEN_BUDGETS.get(stage, DEFAULT_PROMPT_TOKEN_BUDGET)
+
+    selected = []
+    for record in records or []:
+        if not isinstance(record, dict):
+            continue
+        selected.append(
+            {name: source(record) if callable(source) else record.get(source) for name, source in fields.items()}
+        )
+
+    text = "[]"
+    for max_chars in (MAX_FIELD_CHARS,) + TRUNCATION_STEPS:
+        compacted = [item for item in (compact_value(record, max_chars) for record in selected) if item]
+        text = dump_json(compacted)
+        if estimate_tokens(text) <= budget:
+            return text
+
+    # 最も短く切り詰めても収まらない場合は、末尾のデータから省く
+    while len(compacted) > 1 and estimate_tokens(text) > budget:
+        compacted.pop()
+        text = dump_json(compacted)
+
+    if DEBUG:
+        print(f"[PromptBuilder] {stage}: 上限に収めるため{len(selected) - len(compacted)}件を省きました")
+
+    return text
+
+
+def chunk_records(records, token_budget, max_records):
+    """
+    データのリストを、JSONにした推定トークン数の上限ごとに分割する関数
+    1件で上限を超える場合はその1件だけのまとまりにする
+
+    Args:
+        records (list): データ（辞書）のリスト
+        token_budget (int): 1まとまりあたりの推定トークン数の上限
+        max_records (int): 1まとまりあたりの最大件数
+
+    Returns:
+        list: データのリストのリスト
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for record in records:
+        tokens = estimate_tokens(dump_json(record))
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_records):
+            chunks.append(current)
+            current = []
+            current_tokens = 0
+
+        current.append(record)
+        current_tokens += tokens
+
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+
+def dump_json(value):
+    """
+    値を空白のないJSON文字列に変換する関数
+
+    Args:
+        value (any): 値
+
+    Returns:
+        str: JSON文字列
+    """
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def detect_usage_style(query, query_analysis=None):
+    """
+    検索クエリとクエリ解析結果から利用スタイルを判定する関数
+
+    Args:
+        query (str): ユーザーの入力テキスト
+        query_analysis (dict, optional): クエリ解析結果
+
+    Returns:
+        str: 利用スタイル（ソロキャンプ・カップル・ファミリー・グループ・指定なし）
+    """
+    features = query_analysis.get("features", []) if isinstance(query_analysis, dict) else []
+
+    # 利用スタイル -> (クエリに含まれる語, 特徴要素に含まれる語)
+    styles = [
+        ("ソロキャンプ", ["ソロキャンプ"], ["ソロ"]),
+        ("カップル", ["カップル"], ["カップル"]),
+        ("ファミリー", ["ファミリー"], ["家族", "子供"]),
+        ("グループ", ["グループ"], ["グループ"]),
+    ]
+    for style, query_words, feature_words in styles:
+        if any(word in query for word in query_words) or any(word in features for word in feature_words):
+            return style
+
+    return "指定なし"
+
+
+def format_query_analysis(query_analysis):
+    """
+    クエリ解析結果をプロンプト用の箇条書きに変換する関数（空の要素は省く）
+
+    Args:
+        query_analysis (dict): クエリ解析結果
+
+    Returns:
+        str: 箇条書きのテキスト
+    """
+    if not isinstance(query_analysis, dict):
+        return "- なし"
+
+    lines = []
+    if query_analysis.get("location"):
+        lines.append(f"- 場所要素: {query_analysis['location']}")
+    if query_analysis.get("features"):
+        lines.append(f"- 特徴要素: {', '.join(map(str, query_analysis['features']))}")
+    if query_analysis.get("facilities"):
+        lines.append(f"- 施設要素: {', '.join(map(str, query_analysis['facilities']))}")
+    if query_analysis.get("priorities"):
+        lines.append(f"- 優先度: {dump_json(query_analysis['priorities'])}")
+
+    return "\n".join(lines) or "- なし"
+
+
+def finalize_prompt(stage, prompt):
+    """
+    プロンプトの各行のインデントと空行を取り除き、推定トークン数を記録する関数
+
+    Args:
+        stage (str): 段階の名前
+        prompt (str): プロンプト
+
+    Returns:
+        str: 送信するプロンプト
+    """
+    compacted = compact_prompt_text(prompt)
+
+    record_prompt_size(stage, compacted, original=prompt)
+    return compacted
+
+
+def compact_prompt_text(prompt):
+    """
+    プロンプトの各行のインデントと空行を取り除く関数
+
+    Args:
+        prompt (str): プロンプト
+
+    Returns:
+        str: インデントと空行を取り除いたプロンプト
+    """
+    lines = [line.strip() for line in (prompt or "").strip().splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def record_prompt_size(stage, prompt, original=None):
+    """
+    送信するプロンプトの推定トークン数を記録する関数
+
+    Args:
+        stage (str): 段階の名前
+        prompt (str): 送信するプロンプト
+        original (str, optional): 小さくする前のプロンプト（削減量の記録に使う）
+    """
+    tokens = estimate_tokens(prompt)
+    original_tokens = estimate_tokens(original) if original is not None else tokens
+
+    with _lock:
+        stats = _stats.setdefault(stage, {"count": 0, "total_tokens": 0, "max_tokens": 0, "saved_tokens": 0})
+        stats["count"] += 1
+        stats["total_tokens"] += tokens
+        stats["max_tokens"] = max(stats["max_tokens"], tokens)
+        stats["saved_tokens"] += max(0, original_tokens - tokens)
+
+    if DEBUG:
+        print(f"[PromptBuilder] {stage}: 推定{tokens}トークン（削減 {max(0, original_tokens - tokens)}トークン）")
+
+
+def get_prompt_stats():
+    """
+    段階ごとのプロンプトサイズの統計を取得する関数
+
+    Returns:
+        dict: 段階の名前 -> count, total_tokens, max_tokens, saved_tokens, avg_tokens
+    """
+    with _lock:
+        stats = {stage: dict(values) for stage, values in _stats.items()}
+
+    for values in stats.values():
+        values["avg_tokens"] = values["total_tokens"] / values["count"] if values["count"] else 0.0
+    return stats
+
+
+def reset_prompt_stats():
+    """プロンプトサイズの統計を消去する関数"""
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,132 @@
+"""
+Gemini APIのプロンプトテンプレートを管理するモジュール
+プロンプトを毎回同じ指示・回答形式の部分（静的な前置き）と、検索ごとに変わる部分に分け、
+前置きは登録時に一度だけ整形します。前置きはGemini APIのコンテキストキャッシュで再利用されます
+"""
+
+import os
+import string
+import hashlib
+import threading
+from dotenv import load_dotenv
+from utils.prompt_builder import compact_prompt_text, estimate_tokens, record_prompt_size
+
+# 環境変数の読み込み
+load_dotenv()
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# 登録済みのテンプレート
+_templates = {}
+_lock = threading.Lock()
+
+
+class PromptTemplate:
+    """
+    静的な前置きと、値を埋め込む本文からなるプロンプトテンプレート
+    本文の ${name} の部分に値を埋め込む（前置きには値を埋め込まないため、JSONの例の括弧をそのまま書ける）
+    """
+
+    def __init__(self, name, prefix, body, stage=None):
+        self.name = name
+        self.stage = stage or name
+        self.prefix = compact_prompt_text(prefix)
+        self.prefix_hash = hashlib.sha256(self.prefix.encode("utf-8")).hexdigest()
+        self.prefix_tokens = estimate_tokens(self.prefix)
+        self._body = string.Template(compact_prompt_text(body))
+
+    def render(self, **values):
+        """
+        本文に値を埋め込む
+
+        Args:
+            **values: 埋め込む値
+
+        Returns:
+            str: 値を埋め込んだ本文（前置きは含まない）
+
+        Raises:
+            KeyError: 埋め込む値が足りない場合
+        """
+        body = self._body.substitute({key: "" if value is None else str(value) for key, value in values.items()})
+        record_prompt_size(self.stage, self.prefix + "\n" + body)
+        return body
+
+    def render_full(self, **values):
+        """
+        前置きと値を埋め込んだ本文をつなげたプロンプトを作成する
+
+        Args:
+            **values: 埋め込む値
+
+        Returns:
+            str: プロンプト全体
+        """
+        return join_prompt(self.prefix, self.render(**values))
+
+
+def join_prompt(prefix, body):
+    """
+    前置きと本文をつなげる関数（コンテキストキャッシュを使えない場合の送信内容）
+
+    Args:
+        prefix (str): 前置き
+        body (str): 本文
+
+    Returns:
+        str: プロンプト全体
+    """
+    return f"{prefix}\n{body}" if prefix else body
+
+
+def register_prompt_template(name, prefix, body, stage=None):
+    """
+    プロンプトテンプレートを登録する関数
+
+    Args:
+        name (str): テンプレート名
+        prefix (str): 静的な前置き（指示・回答形式など）
+        body (str): 値を埋め込む本文
+        stage (str, optional): プロンプトサイズの統計に使う段階の名前（省略時はテンプレート名）
+
+    Returns:
+        PromptTemplate: 登録したテンプレート
+    """
+    template = PromptTemplate(name, prefix, body, stage)
+
+    with _lock:
+        _templates[name] = template
+
+    if DEBUG:
+        print(f"[PromptTemplates] {name}: 前置き 推定{template.prefix_tokens}トークン")
+
+    return template
+
+
+def get_prompt_template(name):
+    """
+    登録済みのプロンプトテンプレートを取得する関数
+
+    Args:
+        name (str): テンプレート名
+
+    Returns:
+        PromptTemplate: テンプレート（登録されていない場合はNone）
+    """
+    with _lock:
+        return _templates.get(name)
+
+
+def list_prompt_templates():
+    """
+    登録済みのプロンプトテンプレートの一覧を取得する関数
+
+    Returns:
+        list: テンプレートごとの name, stage, prefix_tokens
+    """
+    with _lock:
+        return [
+            {"name": template.name, "stage": template.stage, "prefix_tokens": template.prefix_tokens}
+            for template in _templates.values()
+        ]
@@ -4,8 +4,10 @@
 
 import os
 import json
-import google.generativeai as genai
 from dotenv import load_dotenv
+from utils.gemini_client import generate_text
+from utils.json_stream import extract_json
+from utils.prompt_templates import register_prompt_template
 
 # 環境変数の読み込み
 load_dotenv()
@@ -16,12 +18,39 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # デバッグモードの設定
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 
-# Gemini APIの初期化
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-except Exception as e:
-    print(f"Gemini APIの初期化中にエラーが発生しました: {str(e)}")
-
+# クエリ解析のプロンプト
+QUERY_ANALYSIS_PROMPT = register_prompt_template(
+    "query_analysis",
+    prefix="""
+    あなたはキャンプ場検索の専門家です。ユーザーの入力から、キャンプ場検索に関する意図を抽出してください。
+
+    以下の情報を抽出し、JSON形式で返してください：
+
+    1. 場所要素（地名、山、川、湖など）
+    2. 特徴要素（景色、雰囲気、対象者など）
+    3. 施設要素（設備、アメニティなど）
+    4. 優先度（どの要素が最も重要か）
+    5. 構造化された検索クエリ（検索エンジンに最適化されたクエリ）
+
+    回答は以下のJSON形式で返してください：
+    ```json
+    {
+      "structured_query": "最適化された検索クエリ",
+      "location": "場所要素",
+      "features": ["特徴要素1", "特徴要素2", ...],
+      "facilities": ["施設要素1", "施設要素2", ...],
+      "priorities": {
+        "location": 0-10の数値,
+        "features": 0-10の数値,
+        "facilities": 0-10の数値
+      }
+    }
+    ```
+    """,
+    body="""
+    ユーザー入力: ${query}
+    """,
+)
 
 def analyze_query(query):
     """
@@ -43,80 +72,29 @@ def analyze_query(query):
         return basic_query_analysis(query)
 
     try:
-        # Geminiモデルの設定
-        model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash-lite",
-            generation_config={
-                "temperature": 0.2,
-                "max_output_tokens": 1024,
-            },
-        )
-
-        # プロンプトの作成
-        prompt = f"""
-        あなたはキャンプ場検索の専門家です。以下のユーザーの入力から、キャンプ場検索に関する意図を抽出してください。
-
-        ユーザー入力: {query}
-
-        以下の情報を抽出し、JSON形式で返してください：
-
-        1. 場所要素（地名、山、川、湖など）
-        2. 特徴要素（景色、雰囲気、対象者など）
-        3. 施設要素（設備、アメニティなど）
-        4. 優先度（どの要素が最も重要か）
-        5. 構造化された検索クエリ（検索エンジンに最適化されたクエリ）
-
-        回答は以下のJSON形式で返してください：
-        ```json
-        {{
-          "structured_query": "最適化された検索クエリ",
-          "location": "場所要素",
-          "features": ["特徴要素1", "特徴要素2", ...],
-          "facilities": ["施設要素1", "施設要素2", ...],
-          "priorities": {{
-            "location": 0-10の数値,
-            "features": 0-10の数値,
-            "facilities": 0-10の数値
-          }}
-        }}
-        ```
-        """
+        # プロンプトの作成（指示と回答形式は登録済みの前置きを使う）
+        prompt = QUERY_ANALYSIS_PROMPT.render(query=query)
 
         # Gemini APIを呼び出し
-        response = model.generate_content(prompt)
-        response_text = response.text
-
-        # JSONデータを抽出
-        json_start = response_text.find("```json") + 7 if "```json" in response_text else 0
-        json_end = response_text.find("```", json_start) if "```" in response_text[json_start:] else len(response_text)
+        response_text = generate_text(
+            prompt, temperature=0.2, max_output_tokens=1024, prefix=QUERY_ANALYSIS_PROMPT.prefix
+        )
 
-        if json_start > 0 and json_end > json_start:
-            json_text = response_text[json_start:json_end].strip()
-        else:
-            json_text = response_text
+        # JSONデータを抽出（コードブロックがない応答や末尾のカンマにも対応する）
+        analysis_result = extract_json(response_text)
 
-        # JSONデータをパース
-        try:
-            analysis_result = json.loads(json_text)
-            # 戻り値が辞書型であることを確認
-            if not isinstance(analysis_result, dict):
-                if DEBUG:
-                    print(f"解析結果が辞書型ではありません: {type(analysis_result)}")
-                if isinstance(analysis_result, list) and analysis_result:
-                    # リストの場合は最初の要素を使用（辞書型であれば）
-                    if isinstance(analysis_result[0], dict):
-                        analysis_result = analysis_result[0]
-                    else:
-                        # 辞書型に変換
-                        analysis_result = basic_query_analysis(query)
-                else:
-                    # 辞書型に変換
-                    analysis_result = basic_query_analysis(query)
-            return analysis_result
-        except json.JSONDecodeError:
+        # 戻り値が辞書型であることを確認
+        if not isinstance(analysis_result, dict):
             if DEBUG:
-                print(f"JSON解析エラー: {json_text}")
-            return basic_query_analysis(query)
+                print(f"解析結果が辞書型ではありません: {type(analysis_result)}")
+            if isinstance(analysis_result, list) and analysis_result and isinstance(analysis_result[0], dict):
+                # リストの場合は最初の要素を使用（辞書型であれば）
+                analysis_result = analysis_result[0]
+            else:
+                if DEBUG:
+                    print(f"JSON解析エラー: {response_text}")
+                analysis_result = basic_query_analysis(query)
+        return analysis_result
 
     except Exception as e:
         if DEBUG:
@@ -0,0 +1,257 @@
+"""
+緯度経度から都道府県・地方をオフラインで判定するモジュール
+都道府県ごとの代表地点から事前計算した格子インデックスを使い、
+大量の座標をまとめて一括判定します
+"""
+
+import os
+import re
+import json
+import functools
+import numpy as np
+from dotenv import load_dotenv
+
+# 環境変数の読み込み
+load_dotenv()
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# 都道府県の代表地点データ
+SEEDS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "prefecture_seeds.json")
+
+# 格子インデックスの範囲と解像度（度）
+GRID_LAT_MIN = 24.0
+GRID_LAT_MAX = 45.6
+GRID_LNG_MIN = 122.5
+GRID_LNG_MAX = 146.0
+GRID_RESOLUTION = 0.05
+
+# 最寄りの代表地点からこの距離（km）以上離れた格子は海上・国外とみなす
+MAX_SEED_DISTANCE_KM = 100.0
+
+# 緯度1度あたりの距離（km）
+KM_PER_DEGREE = 111.0
+
+# 住所の先頭の国名と郵便番号（「日本、〒401-0301 山梨県…」）
+ADDRESS_PREFIX_PATTERN = re.compile(r"^\s*(?:日本\s*[、,]?\s*)?(?:〒?\s*\d{3}-?\d{4}\s*)?")
+
+
+@functools.lru_cache(maxsize=1)
+def load_prefecture_seeds():
+    """
+    都道府県ごとの代表地点データを読み込む関数
+
+    Returns:
+        list: 都道府県ごとの代表地点（prefecture, region, points）のリスト
+            pointsの先頭は県庁所在地
+    """
+    with open(SEEDS_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@functools.lru_cache(maxsize=1)
+def load_prefecture_index():
+    """
+    都道府県判定用の格子インデックスを構築する関数
+    初回呼び出し時に一度だけ構築し、以降はキャッシュを返す
+
+    Returns:
+        dict: 格子インデックス
+            - grid (numpy.ndarray): 格子ごとの都道府県番号（該当なしは-1）
+            - prefectures (list): 都道府県名のリスト
+            - regions (list): 都道府県番号に対応する地方名のリスト
+    """
+    seeds = load_prefecture_seeds()
+    prefectures = [seed["prefecture"] for seed in seeds]
+    regions = [seed["region"] for seed in seeds]
+
+    # 代表地点を配列に展開
+    seed_lats = []
+    seed_lngs = []
+    seed_labels = []
+    for label, seed in enumerate(seeds):
+        for lat, lng in seed["points"]:
+            seed_lats.append(lat)
+            seed_lngs.append(lng)
+            seed_labels.append(label)
+    seed_lats = np.array(seed_lats)
+    seed_lngs = np.array(seed_lngs)
+    seed_labels = np.array(seed_labels, dtype=np.int16)
+
+    # 格子の中心座標
+    rows = int(round((GRID_LAT_MAX - GRID_LAT_MIN) / GRID_RESOLUTION))
+    cols = int(round((GRID_LNG_MAX - GRID_LNG_MIN) / GRID_RESOLUTION))
+    cell_lats = GRID_LAT_MIN + (np.arange(rows) + 0.5) * GRID_RESOLUTION
+    cell_lngs = GRID_LNG_MIN + (np.arange(cols) + 0.5) * GRID_RESOLUTION
+
+    # 行ごとに最寄りの代表地点を求める（メモリ使用量を抑えるため）
+    grid = np.full((rows, cols), -1, dtype=np.int16)
+    for row, lat in enumerate(cell_lats):
+        dlat = (seed_lats - lat)[np.newaxis, :]
+        dlng = (cell_lngs[:, np.newaxis] - seed_lngs[np.newaxis, :]) * np.cos(np.radians(lat))
+        dist_sq = dlat**2 + dlng**2
+        nearest = np.argmin(dist_sq, axis=1)
+        nearest_km = np.sqrt(dist_sq[np.arange(cols), nearest]) * KM_PER_DEGREE
+        grid[row] = np.where(nearest_km <= MAX_SEED_DISTANCE_KM, seed_labels[nearest], -1)
+
+    if DEBUG:
+        print(f"[ReverseGeocoder] 格子インデックスを構築しました: {rows}x{cols}")
+
+    return {"grid": grid, "prefectures": prefectures, "regions": regions}
+
+
+def reverse_geocode_batch(latitudes, longitudes):
+    """
+    複数の座標の都道府県と地方をまとめて判定する関数
+
+    Args:
+        latitudes (list): 緯度のリスト
+        longitudes (list): 経度のリスト
+
+    Returns:
+        list: (都道府県, 地方) のタプルのリスト（判定できない場合は空文字）
+    """
+    index = load_prefecture_index()
+    grid = index["grid"]
+
+    lats = np.asarray(latitudes, dtype=float)
+    lngs = np.asarray(longitudes, dtype=float)
+    if lats.size == 0:
+        return []
+
+    # 座標を格子番号に変換
+    rows = np.floor((lats - GRID_LAT_MIN) / GRID_RESOLUTION).astype(int)
+    cols = np.floor((lngs - GRID_LNG_MIN) / GRID_RESOLUTION).astype(int)
+    in_range = (rows >= 0) & (rows < grid.shape[0]) & (cols >= 0) & (cols < grid.shape[1])
+
+    labels = np.full(lats.shape, -1, dtype=np.int16)
+    labels[in_range] = grid[rows[in_range], cols[in_range]]
+
+    prefectures = index["prefectures"]
+    regions = index["regions"]
+    return [(prefectures[label], regions[label]) if label >= 0 else ("", "") for label in labels.tolist()]
+
+
+def reverse_geocode(latitude, longitude):
+    """
+    1件の座標の都道府県と地方を判定する関数
+
+    Args:
+        latitude (float): 緯度
+        longitude (float): 経度
+
+    Returns:
+        tuple: (都道府県, 地方)
+    """
+    return reverse_geocode_batch([latitude], [longitude])[0]
+
+
+def get_campsite_coordinates(campsite):
+    """
+    キャンプ場データから緯度経度を取り出す関数
+
+    Args:
+        campsite (dict): キャンプ場データ
+
+    Returns:
+        tuple: (緯度, 経度)、取得できない場合はNone
+    """
+    location = campsite.get("location")
+    if isinstance(location, dict):
+        lat = location.get("latitude", location.get("lat"))
+        lng = location.get("longitude", location.get("lng"))
+    else:
+        lat = campsite.get("latitude")
+        lng = campsite.get("longitude")
+
+    if lat is None or lng is None:
+        return None
+
+    try:
+        return float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_address_prefecture(address, prefectures=None):
+    """
+    住所から都道府県名を取り出す関数
+    国名と郵便番号を除いた住所の中で最も先に出現する都道府県名を使う
+    （「東京都府中市」の「京都府」のように、住所の途中に含まれる別の都道府県名は使わない）
+
+    Args:
+        address (str): 住所
+        prefectures (list, optional): 都道府県名のリスト（省略時は代表地点データの都道府県）
+
+    Returns:
+        str: 都道府県名。含まれない場合は空文字
+    """
+    if not address:
+        return ""
+
+    if prefectures is None:
+        prefectures = [seed["prefecture"] for seed in load_prefecture_seeds()]
+
+    address = ADDRESS_PREFIX_PATTERN.sub("", address)
+
+    best = ""
+    best_position = None
+    for name in prefectures:
+        position = address.find(name)
+        if position != -1 and (best_position is None or position < best_position):
+            best = name
+            best_position = position
+
+    return best
+
+
+def assign_regions(campsites):
+    """
+    キャンプ場データに都道府県（prefecture）と地方（region）を設定する関数
+    住所に都道府県名が含まれる場合はそれを優先し、残りは座標から一括判定する
+
+    Args:
+        campsites (list): キャンプ場データのリスト
+
+    Returns:
+        list: 引数のcampsitesリスト（直接更新）
+    """
+    if not campsites:
+        return campsites
+
+    index = load_prefecture_index()
+    region_by_prefecture = dict(zip(index["prefectures"], index["regions"]))
+
+    # 座標から判定するキャンプ場
+    pending = []
+    latitudes = []
+    longitudes = []
+
+    for campsite in campsites:
+        if campsite.get("prefecture") and campsite.get("region"):
+            continue
+
+        # 住所から都道府県を抽出
+        prefecture = get_address_prefecture(campsite.get("address", ""), index["prefectures"])
+        if prefecture:
+            campsite["prefecture"] = prefecture
+            campsite["region"] = campsite.get("region") or region_by_prefecture[prefecture]
+            continue
+
+        coordinates = get_campsite_coordinates(campsite)
+        if coordinates:
+            pending.append(campsite)
+            latitudes.append(coordinates[0])
+            longitudes.append(coordinates[1])
+
+    # 座標からまとめて判定
+    for campsite, (prefecture, region) in zip(pending, reverse_geocode_batch(latitudes, longitudes)):
+        if prefecture:
+            campsite["prefecture"] = campsite.get("prefecture") or prefecture
+            campsite["region"] = campsite.get("region") or region
+
+    if DEBUG:
+        print(f"[ReverseGeocoder] 地域を設定しました: {len(campsites)}件（座標判定: {len(pending)}件）")
+
+    return campsites
@@ -0,0 +1,556 @@
+"""
+キャンプ場の口コミを分析するモジュール
+複数のキャンプ場をまとめて1回のGemini API呼び出しで分析し、
+トークン数の上限に応じて自動的に分割します
+分析結果はplace_idごとに口コミの内容のハッシュと一緒に保存し、口コミが変わるまで再利用します
+"""
+
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from utils.gemini_client import generate_text
+from utils.json_stream import parse_json_array
+from utils.prompt_builder import estimate_tokens, compact_value, review_excerpts, dump_json, chunk_records
+from utils.prompt_templates import register_prompt_template
+from utils.cancellation import is_cancelled
+from utils.review_digest_store import compute_review_hash, get_review_digests, save_review_digests
+
+# 環境変数の読み込み
+load_dotenv()
+
+# Gemini APIの設定
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# 1回の呼び出しに含めるキャンプ場データの推定トークン数の上限
+REVIEW_BATCH_TOKEN_BUDGET = int(os.getenv("REVIEW_BATCH_TOKEN_BUDGET", "6000"))
+
+# 1回の呼び出しに含めるキャンプ場の最大数
+REVIEW_BATCH_MAX_CAMPSITES = int(os.getenv("REVIEW_BATCH_MAX_CAMPSITES", "8"))
+
+# キャンプ場1件あたりの出力トークン数の目安
+REVIEW_OUTPUT_TOKENS_PER_CAMPSITE = 512
+
+# 分析に使う口コミの件数と1件あたりの最大文字数
+REVIEW_TEXTS_PER_CAMPSITE = 5
+REVIEW_TEXT_MAX_CHARS = 200
+
+# 分割したバッチを同時に分析する数
+REVIEW_BATCH_WORKERS = 3
+
+# 検索中に、保存されていない口コミ分析結果をGemini APIで作成するか
+# falseの場合、検索中はローカル分析の結果を返し、分析結果は検索とは別にバックグラウンドで作成して保存する
+# （まとめて事前に作成する場合は precompute_review_digests.py を実行する）
+REVIEW_DIGEST_LIVE_GENERATION = os.getenv("REVIEW_DIGEST_LIVE_GENERATION", "False").lower() == "true"
+
+# 検索中に見つかった、分析結果のないキャンプ場をバックグラウンドで分析するか
+REVIEW_DIGEST_BACKGROUND = os.getenv("REVIEW_DIGEST_BACKGROUND", "True").lower() == "true"
+
+# バッチ分析のプロンプト（指示部分はキャンプ場の数によらず1回だけ送る）
+REVIEW_BATCH_PROMPT = register_prompt_template(
+    "review_batch",
+    prefix="""
+    あなたは日本のキャンプ場に関する専門家です。以下の各キャンプ場について、情報を分析して特徴を要約し、
+    おすすめポイントを生成してください。
+
+    各キャンプ場について以下の情報を日本語で提供してください：
+    1. summary: このキャンプ場の特徴や雰囲気の要約（150文字程度）
+    2. features: このキャンプ場の主な特徴（5つ）
+    3. trends: 口コミから見る傾向（5つ）
+    4. recommendation: おすすめポイント（150文字程度）
+
+    回答は入力と同じidを持つJSON配列で、すべてのキャンプ場について返してください：
+    ```json
+    [
+      {
+        "id": "入力のid",
+        "summary": "キャンプ場の特徴や雰囲気の要約",
+        "features": ["特徴1", "特徴2", "特徴3", "特徴4", "特徴5"],
+        "trends": ["傾向1", "傾向2", "傾向3", "傾向4", "傾向5"],
+        "recommendation": "おすすめポイント"
+      }
+    ]
+    ```
+    """,
+    body="""
+    キャンプ場:
+    ${campsites}
+    """,
+)
+
+
+# バックグラウンドで分析中のplace_id（同じキャンプ場を重ねて分析しない）
+_background_executor = None
+_background_place_ids = set()
+_background_lock = threading.Lock()
+
+
+def build_campsite_review_input(campsite, campsite_id):
+    """
+    バッチ分析用にキャンプ場1件分の入力データを作成する関数
+
+    Args:
+        campsite (dict): キャンプ場データ
+        campsite_id (str): 応答と対応付けるためのID
+
+    Returns:
+        dict: 入力データ
+    """
+    review_input = compact_value(
+        {
+            "id": campsite_id,
+            "name": campsite.get("name", "不明"),
+            "description": campsite.get("description", ""),
+            "rating": campsite.get("rating", 0),
+            "reviews_count": campsite.get("reviews_count", 0),
+            "features": campsite.get("features", []),
+            "facilities": campsite.get("facilities", []),
+            "reviews": review_excerpts(campsite.get("reviews"), REVIEW_TEXTS_PER_CAMPSITE, REVIEW_TEXT_MAX_CHARS),
+        }
+    )
+    return review_input
+
+
+def chunk_review_inputs(review_inputs, token_budget=REVIEW_BATCH_TOKEN_BUDGET, max_campsites=REVIEW_BATCH_MAX_CAMPSITES):
+    """
+    入力データを推定トークン数の上限ごとに分割する関数
+    1件で上限を超える場合はその1件だけのバッチにする
+
+    Args:
+        review_inputs (list): build_campsite_review_inputで作成した入力データのリスト
+        token_budget (int, optional): 1バッチあたりの推定トークン数の上限
+        max_campsites (int, optional): 1バッチあたりの最大件数
+
+    Returns:
+        list: 入力データのリストのリスト
+    """
+    return chunk_records(review_inputs, token_budget, max_campsites)
+
+
+def parse_review_batch_response(response_text):
+    """
+    バッチ分析の応答からIDごとの分析結果を取り出す関数
+
+    Args:
+        response_text (str): Gemini APIの応答テキスト
+
+    Returns:
+        dict: ID -> 分析結果（summary, features, trends, recommendation）
+    """
+    results = {}
+    # 途中で途切れた応答でも、閉じている要素は使う
+    for item in parse_json_array(response_text):
+        if "id" not in item:
+            continue
+        results[str(item["id"])] = {
+            "summary": item.get("summary", ""),
+            "features": item.get("features", []),
+            "trends": item.get("trends", []),
+            "recommendation": item.get("recommendation", ""),
+        }
+
+    return results
+
+
+def analyze_review_chunk(chunk, cancel_token=None):
+    """
+    分割した1バッチ分のキャンプ場をGemini APIで分析する関数
+
+    Args:
+        chunk (list): 入力データのリスト
+        cancel_token (CancellationToken, optional): 検索を中止するためのトークン
+
+    Returns:
+        dict: ID -> 分析結果（分析できなかったキャンプ場は含まない）
+    """
+    if not GEMINI_API_KEY or is_cancelled(cancel_token):
+        return {}
+
+    try:
+        prompt = REVIEW_BATCH_PROMPT.render(campsites="\n".join(dump_json(review_input) for review_input in chunk))
+        max_output_tokens = min(8192, REVIEW_OUTPUT_TOKENS_PER_CAMPSITE * len(chunk) + 256)
+
+        response_text = generate_text(
+            prompt, temperature=0.2, max_output_tokens=max_output_tokens, prefix=REVIEW_BATCH_PROMPT.prefix
+        )
+        results = parse_review_batch_response(response_text)
+
+        if DEBUG:
+            print(f"[ReviewAnalyzer] バッチ分析: {len(results)}/{len(chunk)}件（推定入力トークン: {REVIEW_BATCH_PROMPT.prefix_tokens + estimate_tokens(prompt)}）")
+
+        return results
+
+    except Exception as e:
+        if DEBUG:
+            print(f"[ReviewAnalyzer] バッチ分析エラー: {str(e)}")
+        return {}
+
+
+def iter_campsite_review_analyses(campsites, user_preferences=None, cancel_token=None, generate_missing=None):
+    """
+    複数のキャンプ場の口コミをまとめて分析し、バッチが完了するたびに結果を返すジェネレータ
+    口コミが変わっていないキャンプ場は保存済みの分析結果をすぐに返し、残りだけをGemini APIで分析して保存する
+    Gemini APIで分析できなかったキャンプ場はローカル分析の結果を返す
+
+    Args:
+        campsites (list): キャンプ場データのリスト
+        user_preferences (dict, optional): ユーザーの好み設定
+        cancel_token (CancellationToken, optional): 検索を中止するためのトークン
+        generate_missing (bool, optional): 保存されていない分析結果をGemini APIで作成するか
+            （省略時はREVIEW_DIGEST_LIVE_GENERATION）
+
+    Yields:
+        tuple: (キャンプ場データ, 分析結果)
+    """
+    if not campsites:
+        return
+
+    if generate_missing is None:
+        generate_missing = REVIEW_DIGEST_LIVE_GENERATION
+
+    campsites_by_id = {str(index): campsite for index, campsite in enumerate(campsites)}
+
+    # 保存済みの分析結果（place_idのあるキャンプ場のみ）
+    review_hashes = {}
+    for campsite_id, campsite in campsites_by_id.items():
+        if campsite.get("place_id"):
+            review_hashes[campsite_id] = review_digest_hash(campsite)
+    stored_digests = get_review_digests(
+        {campsites_by_id[campsite_id]["place_id"]: review_hash for campsite_id, review_hash in review_hashes.items()},
+        REVIEW_BATCH_PROMPT.name,
+    )
+
+    missing_ids = []
+    for campsite_id, campsite in campsites_by_id.items():
+        digest = stored_digests.get(campsite.get("place_id")) if campsite_id in review_hashes else None
+        if digest:
+            yield campsite, digest
+        else:
+            missing_ids.append(campsite_id)
+
+    if DEBUG:
+        print(f"[ReviewAnalyzer] 保存済みの分析結果: {len(campsites) - len(missing_ids)}/{len(campsites)}件")
+
+    if not missing_ids:
+        return
+
+    if not generate_missing:
+        # 検索中はローカル分析の結果を返し、Gemini APIでの分析は検索とは別に行う
+        if REVIEW_DIGEST_BACKGROUND:
+            schedule_review_digests([campsites_by_id[campsite_id] for campsite_id in missing_ids])
+        for campsite_id in missing_ids:
+            yield campsites_by_id[campsite_id], local_review_analysis(campsites_by_id[campsite_id])
+        return
+
+    review_inputs = [build_campsite_review_input(campsites_by_id[campsite_id], campsite_id) for campsite_id in missing_ids]
+    chunks = chunk_review_inputs(review_inputs)
+
+    if DEBUG:
+        print(f"[ReviewAnalyzer] {len(missing_ids)}件のキャンプ場を{len(chunks)}回の呼び出しで分析します")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(REVIEW_BATCH_WORKERS, len(chunks)))) as executor:
+        future_to_chunk = {executor.submit(analyze_review_chunk, chunk, cancel_token): chunk for chunk in chunks}
+
+        for future in as_completed(future_to_chunk):
+            if is_cancelled(cancel_token):
+                executor.shutdown(wait=False, cancel_futures=True)
+                return
+
+            results = future.result()
+
+            # Gemini APIで分析できた結果だけを保存する（ローカル分析の結果は保存しない）
+            save_review_digests(
+                [
+                    (campsites_by_id[campsite_id]["place_id"], review_hashes[campsite_id], analysis)
+                    for campsite_id, analysis in results.items()
+                    if campsite_id in review_hashes
+                ],
+                REVIEW_BATCH_PROMPT.name,
+            )
+
+            for review_input in future_to_chunk[future]:
+                campsite = campsites_by_id[review_input["id"]]
+                analysis = results.get(review_input["id"]) or local_review_analysis(campsite)
+                yield campsite, analysis
+
+
+def precompute_review_digests(campsites, cancel_token=None):
+    """
+    口コミ分析結果を事前に作成して保存する関数
+    口コミが変わったキャンプ場と、まだ分析結果がないキャンプ場だけをGemini APIで分析する
+
+    Args:
+        campsites (list): キャンプ場データのリスト（place_idのないキャンプ場は対象外）
+        cancel_token (CancellationToken, optional): 処理を中止するためのトークン
+
+    Returns:
+        int: 分析結果が保存されているキャンプ場の数
+    """
+    targets = [campsite for campsite in campsites if campsite.get("place_id")]
+    for _ in iter_campsite_review_analyses(targets, cancel_token=cancel_token, generate_missing=True):
+        pass
+
+    return len(
+        get_review_digests(
+            {campsite["place_id"]: review_digest_hash(campsite) for campsite in targets}, REVIEW_BATCH_PROMPT.name
+        )
+    )
+
+
+def schedule_review_digests(campsites):
+    """
+    口コミ分析結果をバックグラウンドで作成して保存する関数（検索の処理は待たない）
+    分析中のキャンプ場・place_idのないキャンプ場は対象外
+
+    Args:
+        campsites (list): キャンプ場データのリスト
+
+    Returns:
+        int: 分析を予定したキャンプ場の数
+    """
+    global _background_executor
+
+    with _background_lock:
+        targets = [
+            campsite
+            for campsite in campsites
+            if campsite.get("place_id") and campsite["place_id"] not in _background_place_ids
+        ]
+        if not targets:
+            return 0
+
+        place_ids = {campsite["place_id"] for campsite in targets}
+        _background_place_ids.update(place_ids)
+        if _background_executor is None:
+            _background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="review-digest")
+
+    def run():
+        try:
+            precompute_review_digests(targets)
+        except Exception as e:
+            if DEBUG:
+                print(f"[ReviewAnalyzer] バックグラウンド分析エラー: {str(e)}")
+        finally:
+            with _background_lock:
+                _background_place_ids.difference_update(place_ids)
+
+    _background_executor.submit(run)
+
+    if DEBUG:
+        print(f"[ReviewAnalyzer] {len(targets)}件の口コミ分析をバックグラウンドで行います")
+
+    return len(targets)
+
+
+def review_digest_hash(campsite, template=REVIEW_BATCH_PROMPT):
+    """
+    口コミ分析結果の保存に使う、キャンプ場の口コミの内容のハッシュを計算する関数
+    分析の指示が変わった場合も作り直すように、分析に使うプロンプトの前置きのハッシュを含める
+
+    Args:
+        campsite (dict): キャンプ場データ
+        template (PromptTemplate, optional): 分析に使うプロンプト（省略時はバッチ分析のプロンプト）
+
+    Returns:
+        str: ハッシュ
+    """
+    return compute_review_hash(campsite, template.prefix_hash)
+
+
+def analyze_campsite_reviews_batch(campsites, user_preferences=None, cancel_token=None):
+    """
+    複数のキャンプ場の口コミをまとめて分析する関数
+
+    Args:
+        campsites (list): キャンプ場データのリスト
+        user_preferences (dict, optional): ユーザーの好み設定
+        cancel_token (CancellationToken, optional): 検索を中止するためのトークン
+
+    Returns:
+        dict: place_id（ない場合は名前）-> 分析結果
+    """
+    results = {}
+    for campsite, analysis in iter_campsite_review_analyses(campsites, user_preferences, cancel_token):
+        results[campsite.get("place_id") or campsite.get("name", "")] = analysis
+    return results
+
+
+def local_review_analysis(campsite):
+    """
+    Gemini APIを使わずにキャンプ場の基本情報から口コミ分析の結果を作成する関数
+
+    Args:
+        campsite (dict): キャンプ場データ
+
+    Returns:
+        dict: 分析結果（summary, features, trends, recommendation）
+    """
+    analysis = {"summary": "", "features": [], "trends": [], "recommendation": ""}
+
+    try:
+        # キャンプ場の基本情報
+        name = campsite.get("name", "")
+        rating = campsite.get("rating", 0)
+        reviews_count = campsite.get("reviews_count", 0)
+        facilities = campsite.get("facilities", [])
+        features = campsite.get("features", [])
+        description = campsite.get("description", "")
+
+        # 口コミを取得
+        reviews = campsite.get("reviews", [])
+
+        # 口コミの内容を結合
+        review_texts = []
+        if reviews:
+            for review in reviews:
+                review_text = review.get("text", "")
+                if review_text:
+                    review_texts.append(review_text)
+
+        # 基本情報から特徴を抽出
+        extracted_features = []
+
+        # 施設から特徴を抽出
+        if facilities:
+            extracted_features.extend(facilities[:5])
+
+        # 特徴から特徴を抽出
+        if features:
+            extracted_features.extend(features[:5])
+
+        # 説明文からキーワードを抽出
+        if description:
+            keywords = [
+                "景色",
+                "自然",
+                "環境",
+                "立地",
+                "アクセス",
+                "設備",
+                "施設",
+                "清潔",
+                "きれい",
+                "広い",
+                "静か",
+                "家族",
+                "子供",
+                "ペット",
+                "テント",
+                "キャンピングカー",
+                "コテージ",
+                "バンガロー",
+                "温泉",
+                "川",
+                "海",
+                "山",
+                "湖",
+                "森",
+                "トイレ",
+                "シャワー",
+                "風呂",
+                "炊事場",
+                "売店",
+                "薪",
+                "焚き火",
+                "BBQ",
+                "バーベキュー",
+            ]
+            for keyword in keywords:
+                if keyword in description:
+                    extracted_features.append(keyword)
+
+        # 重複を削除して特徴リストを作成
+        unique_features = list(set(extracted_features))
+        analysis["features"] = unique_features[:10]  # 最大10件
+
+        # 口コミの傾向を生成
+        trends = []
+
+        # 評価に基づく傾向
+        if rating >= 4.5:
+            trends.append("評価が非常に高い")
+        elif rating >= 4.0:
+            trends.append("評価が高い")
+        elif rating >= 3.5:
+            trends.append("評価が良好")
+        elif rating >= 3.0:
+            trends.append("評価が平均的")
+        else:
+            trends.append("評価が平均以下")
+
+        # 口コミ数に基づく傾向
+        if reviews_count >= 1000:
+            trends.append("非常に人気がある")
+        elif reviews_count >= 500:
+            trends.append("人気がある")
+        elif reviews_count >= 100:
+            trends.append("ある程度知られている")
+        elif reviews_count >= 10:
+            trends.append("口コミが少ない")
+        else:
+            trends.append("あまり知られていない")
+
+        # 特徴に基づく傾向
+        if "湖" in " ".join(unique_features) or "湖畔" in " ".join(unique_features):
+            trends.append("湖畔の景色が魅力")
+        if "山" in " ".join(unique_features):
+            trends.append("山の景色が魅力")
+        if "森" in " ".join(unique_features):
+            trends.append("森の中の静かな環境")
+        if "海" in " ".join(unique_features) or "ビーチ" in " ".join(unique_features):
+            trends.append("海の近くの立地")
+        if "温泉" in " ".join(unique_features):
+            trends.append("温泉施設あり")
+        if "子供" in " ".join(unique_features) or "ファミリー" in " ".join(unique_features):
+            trends.append("家族連れに人気")
+        if "ペット" in " ".join(unique_features):
+            trends.append("ペット同伴可能")
+
+        analysis["trends"] = trends
+
+        # 口コミの要約を生成
+        summary = f"{name}は"
+
+        # 評価に基づく要約
+        if rating >= 4.5:
+            summary += "評価が非常に高く、多くの利用者から好評を得ています。"
+        elif rating >= 4.0:
+            summary += "評価が高く、利用者からの評判が良いキャンプ場です。"
+        elif rating >= 3.5:
+            summary += "一般的に良い評価を受けているキャンプ場です。"
+        elif rating >= 3.0:
+            summary += "平均的な評価を受けているキャンプ場です。"
+        else:
+            summary += "評価は平均以下ですが、"
+
+        # 特徴に基づく要約
+        if unique_features:
+            summary += f" {', '.join(unique_features[:3])}などの特徴があります。"
+
+        # 傾向に基づく要約
+        if len(trends) > 2:
+            summary += f" {trends[0]}で、{trends[1]}キャンプ場です。"
+
+        analysis["summary"] = summary
+
+        # おすすめポイントを生成
+        recommendation = ""
+        if rating >= 4.0 and unique_features:
+            recommendation = f"評価が高く、特に{', '.join(unique_features[:3])}が充実したおすすめのキャンプ場です。"
+        elif rating >= 3.5 and unique_features:
+            recommendation = f"{', '.join(unique_features[:3])}が特徴的な、一般的に良い評価を受けているキャンプ場です。"
+        else:
+            recommendation = f"基本的な設備が整ったキャンプ場で、{', '.join(unique_features[:3] if unique_features else ['自然環境'])}が楽しめます。"
+
+        analysis["recommendation"] = recommendation
+
+        return analysis
+
+    except Exception as e:
+        if DEBUG:
+            print(f"[ReviewAnalyzer] ローカル分析エラー: {str(e)}")
+        return analysis
@@ -0,0 +1,207 @@
+"""
+キャンプ場ごとの口コミ分析結果（要約・特徴・傾向・おすすめポイント）を保存するモジュール
+place_idと分析に使ったプロンプトごとに、口コミの内容のハッシュと一緒にSQLiteに保存し、
+口コミが変わっていない間は保存した分析結果を再利用します
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from dotenv import load_dotenv
+
+# 環境変数の読み込み
+load_dotenv()
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# 保存先（LLMの応答キャッシュと同じディレクトリ）
+REVIEW_DIGEST_PATH = os.getenv(
+    "REVIEW_DIGEST_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "review_digests.sqlite3"),
+)
+
+# 口コミが変わっていなくても作り直すまでの期間（秒）
+REVIEW_DIGEST_TTL = float(os.getenv("REVIEW_DIGEST_TTL", str(30 * 24 * 60 * 60)))
+
+# 保存を無効にする場合は REVIEW_DIGEST_ENABLED=false
+REVIEW_DIGEST_ENABLED = os.getenv("REVIEW_DIGEST_ENABLED", "True").lower() == "true"
+
+# 分析結果の項目
+DIGEST_FIELDS = ("summary", "features", "trends", "recommendation")
+
+# ヒット率などの統計
+_stats = {"hits": 0, "misses": 0, "stale": 0, "writes": 0, "errors": 0}
+
+_connection = None
+_lock = threading.Lock()
+
+
+def compute_review_hash(campsite, version=""):
+    """
+    キャンプ場の口コミの内容のハッシュを計算する関数
+    口コミの並び順や空白の違いには左右されない
+
+    Args:
+        campsite (dict): キャンプ場データ
+        version (str, optional): 分析方法の版（プロンプトのハッシュなど。変わると作り直す）
+
+    Returns:
+        str: ハッシュ（SHA-256）
+    """
+    reviews = []
+    for review in campsite.get("reviews") or []:
+        if isinstance(review, dict):
+            text, rating = review.get("text", ""), review.get("rating", 0)
+        else:
+            text, rating = review, 0
+        text = " ".join(unicodedata.normalize("NFKC", str(text or "")).split())
+        if text:
+            reviews.append([text, rating])
+
+    payload = json.dumps({"version": version, "reviews": sorted(reviews)}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _get_connection():
+    """SQLiteの接続を取得する（初回のみテーブルを作成する。ロックを取得した状態で呼ぶ）"""
+    global _connection
+
+    if _connection is None:
+        os.makedirs(os.path.dirname(REVIEW_DIGEST_PATH), exist_ok=True)
+        _connection = sqlite3.connect(REVIEW_DIGEST_PATH, check_same_thread=False)
+
+        # プロンプトの列がない古いテーブルは、どのプロンプトの分析結果か分からないので作り直す
+        columns = [row[1] for row in _connection.execute("PRAGMA table_info(review_digests)")]
+        if columns and "prompt" not in columns:
+            _connection.execute("DROP TABLE review_digests")
+
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS review_digests (
+                place_id TEXT,
+                prompt TEXT,
+                review_hash TEXT,
+                digest TEXT,
+                updated_at REAL,
+                PRIMARY KEY (place_id, prompt)
+            )
+            """
+        )
+        _connection.commit()
+
+    return _connection
+
+
+def get_review_digests(review_hashes, prompt):
+    """
+    保存されている口コミ分析結果をまとめて取得する関数
+    口コミのハッシュが一致しないもの・期限切れのもの・別のプロンプトで作成したものは返さない
+
+    Args:
+        review_hashes (dict): place_id -> 口コミのハッシュ
+        prompt (str): 分析に使うプロンプトの名前
+
+    Returns:
+        dict: place_id -> 分析結果（summary, features, trends, recommendation）
+    """
+    if not REVIEW_DIGEST_ENABLED or not review_hashes:
+        return {}
+
+    digests = {}
+    try:
+        place_ids = list(review_hashes)
+        placeholders = ",".join("?" for _ in place_ids)
+        with _lock:
+            rows = (
+                _get_connection()
+                .execute(
+                    f"SELECT place_id, review_hash, digest, updated_at FROM review_digests WHERE prompt = ? AND place_id IN ({placeholders})",
+                    [prompt] + place_ids,
+                )
+                .fetchall()
+            )
+
+        now = time.time()
+        for place_id, review_hash, digest, updated_at in rows:
+            if review_hash != review_hashes[place_id] or now - updated_at > REVIEW_DIGEST_TTL:
+                _stats["stale"] += 1
+                continue
+            digests[place_id] = json.loads(digest)
+
+        _stats["hits"] += len(digests)
+        _stats["misses"] += len(review_hashes) - len(digests)
+
+    except Exception as e:
+        _stats["errors"] += 1
+        if DEBUG:
+            print(f"[ReviewDigest] 読み込みエラー: {str(e)}")
+
+    return digests
+
+
+def save_review_digests(entries, prompt):
+    """
+    口コミ分析結果をまとめて保存する関数（同じplace_id・同じプロンプトの古い分析結果は置き換える）
+
+    Args:
+        entries (list): (place_id, 口コミのハッシュ, 分析結果) のリスト
+        prompt (str): 分析結果を作成したプロンプトの名前
+    """
+    if not REVIEW_DIGEST_ENABLED or not entries:
+        return
+
+    try:
+        now = time.time()
+        rows = [
+            (
+                place_id,
+                prompt,
+                review_hash,
+                json.dumps({field: digest.get(field) for field in DIGEST_FIELDS}, ensure_ascii=False),
+                now,
+            )
+            for place_id, review_hash, digest in entries
+        ]
+        with _lock:
+            connection = _get_connection()
+            connection.executemany(
+                "INSERT OR REPLACE INTO review_digests (place_id, prompt, review_hash, digest, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            connection.commit()
+            _stats["writes"] += len(rows)
+
+    except Exception as e:
+        _stats["errors"] += 1
+        if DEBUG:
+            print(f"[ReviewDigest] 書き込みエラー: {str(e)}")
+
+
+def get_review_digest_stats():
+    """
+    保存した口コミ分析結果の統計を取得する関数
+
+    Returns:
+        dict: hits, misses, stale, writes, errors, hit_rate
+    """
+    stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+
+def clear_review_digests():
+    """保存した口コミ分析結果をすべて削除する関数"""
+    try:
+        with _lock:
+            connection = _get_connection()
+            connection.execute("DELETE FROM review_digests")
+            connection.commit()
+    except Exception as e:
+        if DEBUG:
+            print(f"[ReviewDigest] 削除エラー: {str(e)}")
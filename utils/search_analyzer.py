@@ -4,8 +4,12 @@ Geminiを使用して検索結果を分析するモジュール
 
 import os
 import json
-import google.generativeai as genai
 from dotenv import load_dotenv
+from utils.gemini_client import generate_content
+from utils.json_stream import extract_json
+from utils.entity_resolution import CampsiteResolver
+from utils.prompt_builder import compact_records, review_excerpts
+from utils.prompt_templates import register_prompt_template
 
 # 環境変数の読み込み
 load_dotenv()
@@ -16,12 +20,60 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # デバッグモードの設定
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 
-# Gemini APIの初期化
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-except Exception as e:
-    print(f"Gemini APIの初期化中にエラーが発生しました: {str(e)}")
-
+# 分析のプロンプトに含めるキャンプ場の項目（写真URLなどの分析に使わない項目は送らない）
+SEARCH_ANALYSIS_FIELDS = {
+    "name": "name",
+    "region": "region",
+    "address": "address",
+    "description": "description",
+    "features": "features",
+    "facilities": "facilities",
+    "rating": "rating",
+    "reviews_count": "reviews_count",
+    "price": "price",
+    "reviews": lambda site: review_excerpts(site.get("reviews")),
+}
+
+# 検索結果の分析のプロンプト
+SEARCH_ANALYSIS_PROMPT = register_prompt_template(
+    "search_analysis",
+    prefix="""
+    あなたはキャンプ場検索の専門家です。検索クエリと検索結果を分析して、
+    より構造化された情報を提供してください。
+
+    以下の情報を抽出・分析してJSON形式で返してください：
+
+    1. 構造化された検索結果：各キャンプ場の情報を整理し、不足している情報があれば補完してください。
+    2. 特集されているキャンプ場：検索結果に含まれる有名または特集されているキャンプ場のリスト。
+    3. 検索結果の要約：ユーザーの検索意図に基づいた検索結果の要約。
+
+    回答は以下のJSON形式で返してください：
+    ```json
+    {
+      "structured_results": [
+        {
+          "name": "キャンプ場名",
+          "region": "地域",
+          "description": "説明（補完または改善されたもの）",
+          "features": ["特徴1", "特徴2", ...],
+          "facilities": ["施設1", "施設2", ...],
+          "highlights": "このキャンプ場の特筆すべき点",
+          "best_for": "このキャンプ場が最適な利用者層や目的"
+        },
+        ...
+      ],
+      "featured_campsites": ["有名キャンプ場1", "有名キャンプ場2", ...],
+      "summary": "検索結果の要約文"
+    }
+    ```
+    """,
+    body="""
+    検索クエリ: ${query}
+
+    検索結果:
+    ${results}
+    """,
+)
 
 def analyze_search_results(query, raw_results):
     """
@@ -46,85 +98,34 @@ def analyze_search_results(query, raw_results):
         return {"structured_results": raw_results, "featured_campsites": [], "summary": ""}
 
     try:
-        # Geminiモデルの設定
-        model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash-lite",
-            generation_config={
-                "temperature": 0.2,
-                "max_output_tokens": 2048,
-            },
-        )
+        # 検索結果をJSON文字列に変換（最大5件。空の項目は省き、段階ごとの上限に収める）
+        results_json = compact_records(raw_results[:5], SEARCH_ANALYSIS_FIELDS, stage="search_analysis")
 
-        # 検索結果をJSON文字列に変換（最大5件）
-        results_json = json.dumps(raw_results[:5], ensure_ascii=False)
-
-        # プロンプトの作成
-        prompt = f"""
-        あなたはキャンプ場検索の専門家です。以下の検索クエリと検索結果を分析して、
-        より構造化された情報を提供してください。
-
-        検索クエリ: {query}
-
-        検索結果:
-        {results_json}
-
-        以下の情報を抽出・分析してJSON形式で返してください：
-
-        1. 構造化された検索結果：各キャンプ場の情報を整理し、不足している情報があれば補完してください。
-        2. 特集されているキャンプ場：検索結果に含まれる有名または特集されているキャンプ場のリスト。
-        3. 検索結果の要約：ユーザーの検索意図に基づいた検索結果の要約。
-
-        回答は以下のJSON形式で返してください：
-        ```json
-        {{
-          "structured_results": [
-            {{
-              "name": "キャンプ場名",
-              "region": "地域",
-              "description": "説明（補完または改善されたもの）",
-              "features": ["特徴1", "特徴2", ...],
-              "facilities": ["施設1", "施設2", ...],
-              "highlights": "このキャンプ場の特筆すべき点",
-              "best_for": "このキャンプ場が最適な利用者層や目的"
-            }},
-            ...
-          ],
-          "featured_campsites": ["有名キャンプ場1", "有名キャンプ場2", ...],
-          "summary": "検索結果の要約文"
-        }}
-        ```
-        """
+        # プロンプトの作成（指示と回答形式は登録済みの前置きを使う）
+        prompt = SEARCH_ANALYSIS_PROMPT.render(query=query, results=results_json)
 
         # Gemini APIを呼び出し
-        response = model.generate_content(prompt)
+        response = generate_content(
+            prompt, temperature=0.2, max_output_tokens=2048, prefix=SEARCH_ANALYSIS_PROMPT.prefix
+        )
         response_text = response.text
 
-        # JSONデータを抽出
-        json_start = response_text.find("```json") + 7 if "```json" in response_text else 0
-        json_end = response_text.find("```", json_start) if "```" in response_text[json_start:] else len(response_text)
-
-        if json_start > 0 and json_end > json_start:
-            json_text = response_text[json_start:json_end].strip()
-        else:
-            json_text = response_text
-
-        # JSONデータをパース
-        try:
-            analysis_result = json.loads(json_text)
-
-            # 元の検索結果と分析結果をマージ
-            structured_results = merge_with_original_results(raw_results, analysis_result.get("structured_results", []))
-
-            return {
-                "structured_results": structured_results,
-                "featured_campsites": analysis_result.get("featured_campsites", []),
-                "summary": analysis_result.get("summary", ""),
-            }
-        except json.JSONDecodeError:
+        # JSONデータを抽出（コードブロックがない応答や末尾のカンマにも対応する）
+        analysis_result = extract_json(response_text)
+        if not isinstance(analysis_result, dict):
             if DEBUG:
-                print(f"JSON解析エラー: {json_text}")
+                print(f"JSON解析エラー: {response_text}")
             return {"structured_results": raw_results, "featured_campsites": [], "summary": ""}
 
+        # 元の検索結果と分析結果をマージ
+        structured_results = merge_with_original_results(raw_results, analysis_result.get("structured_results", []))
+
+        return {
+            "structured_results": structured_results,
+            "featured_campsites": analysis_result.get("featured_campsites", []),
+            "summary": analysis_result.get("summary", ""),
+        }
+
     except Exception as e:
         if DEBUG:
             print(f"検索結果分析エラー: {str(e)}")
@@ -146,19 +147,22 @@ def merge_with_original_results(original_results, analyzed_results):
     if not analyzed_results:
         return original_results
 
-    # 分析結果のキャンプ場名をキーとした辞書を作成
-    analyzed_dict = {result.get("name", "").lower(): result for result in analyzed_results if result.get("name")}
+    # 分析結果を登録し、名前の表記ゆれを含めて元の結果と照合できるようにする
+    analyzed_list = [result for result in analyzed_results if isinstance(result, dict) and result.get("name")]
+    resolver = CampsiteResolver()
+    resolver.add("gemini_analysis", analyzed_list)
+    merged_ids = set()
 
     # マージ結果を格納するリスト
     merged_results = []
 
     # 元の結果をループ
     for original in original_results:
-        name = original.get("name", "").lower()
+        matches = [record_id for record_id in resolver.find(original) if record_id not in merged_ids]
 
-        # 分析結果に同じ名前のキャンプ場がある場合
-        if name in analyzed_dict:
-            analyzed = analyzed_dict[name]
+        # 分析結果に同じキャンプ場がある場合
+        if matches:
+            analyzed = analyzed_list[matches[0]]
 
             # 元の結果をコピー
             merged = original.copy()
@@ -195,14 +199,17 @@ def merge_with_original_results(original_results, analyzed_results):
 
             merged_results.append(merged)
 
-            # 処理済みの分析結果を削除
-            del analyzed_dict[name]
+            # 処理済みの分析結果（同じキャンプ場の重複を含む）は新しいキャンプ場として追加しない
+            merged_ids.update(matches)
         else:
             # 分析結果に対応するキャンプ場がない場合はそのまま追加
             merged_results.append(original)
 
     # 残りの分析結果（元の結果にはなかった新しいキャンプ場）を追加
-    for name, analyzed in analyzed_dict.items():
+    for record_id, analyzed in enumerate(analyzed_list):
+        if record_id in merged_ids:
+            continue
+
         # 最低限必要なフィールドを持つ新しいキャンプ場データを作成
         new_campsite = {
             "name": analyzed.get("name", ""),
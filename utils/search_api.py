@@ -1,6 +1,7 @@
 import os
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from utils.cse_client import search_items, normalize_query
 
 # 環境変数の読み込み
 load_dotenv()
@@ -9,6 +10,22 @@ load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID")
 
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# まとめて検索するときに同時に実行する検索の数
+SEARCH_INFO_BATCH_WORKERS = int(os.getenv("SEARCH_INFO_BATCH_WORKERS", "4"))
+
+# 情報の種類 -> (検索クエリの形式, 取得する件数)
+# 公式サイトは最も関連性の高い1件、それ以外は検索結果のリストを返す
+INFO_TYPE_QUERIES = {
+    "official": ("{name} 公式サイト キャンプ場", 3),
+    "reviews": ("{name} 口コミ レビュー キャンプ場", 3),
+}
+
+# INFO_TYPE_QUERIESにない情報の種類（アクセス・設備・料金など）の検索クエリの形式と件数
+RELATED_INFO_QUERY = ("{name} {info_type} キャンプ場", 3)
+
 # APIキーが設定されていない場合のエラーメッセージ
 if not GOOGLE_API_KEY:
     print("警告: GOOGLE_API_KEYが設定されていません。.envファイルに追加してください。")
@@ -36,21 +53,12 @@ def search_campsite_info(query, num_results=5):
         if not GOOGLE_CSE_ID:
             raise ValueError("GOOGLE_CSE_IDが設定されていません。.envファイルに追加してください。")
 
-        # リクエストURLの構築
-        base_url = "https://www.googleapis.com/customsearch/v1"
-        params = {"q": query, "key": GOOGLE_API_KEY, "cx": GOOGLE_CSE_ID, "num": num_results}
-
-        # リクエストの送信
-        response = requests.get(base_url, params=params)
-        data = response.json()
-
-        # エラーチェック
-        if "error" in data:
-            raise Exception(f"Google Custom Search APIエラー: {data['error']['message']}")
+        # 検索結果の取得（同じクエリの応答は保存済みのものを使い、10件を超える場合は複数ページを同時に取得する）
+        items = search_items(query, num_results)
 
         # 検索結果の抽出
         search_results = []
-        for item in data.get("items", []):
+        for item in items:
             result = {
                 "title": item.get("title", ""),
                 "link": item.get("link", ""),
@@ -66,6 +74,28 @@ def search_campsite_info(query, num_results=5):
         raise Exception(f"情報の検索中にエラーが発生しました: {str(e)}")
 
 
+def build_info_query(campsite_name, info_type):
+    """
+    キャンプ場の情報を検索するクエリを作成する関数
+
+    Args:
+        campsite_name (str): キャンプ場の名前
+        info_type (str): 情報の種類（'official', 'reviews', またはアクセス・設備・料金など）
+
+    Returns:
+        tuple: (検索クエリ, 取得する件数)
+    """
+    query_format, num_results = INFO_TYPE_QUERIES.get(info_type, RELATED_INFO_QUERY)
+    return query_format.format(name=campsite_name, info_type=info_type), num_results
+
+
+def _info_result(info_type, results):
+    """検索結果を情報の種類ごとの形式にする（公式サイトは先頭の1件）"""
+    if info_type == "official":
+        return results[0] if results else None
+    return results
+
+
 def search_official_site(campsite_name):
     """
     キャンプ場の公式サイトを検索する関数
@@ -76,13 +106,8 @@ def search_official_site(campsite_name):
     Returns:
         dict: 公式サイトの情報
     """
-    query = f"{campsite_name} 公式サイト キャンプ場"
-    results = search_campsite_info(query, num_results=3)
-
-    if results:
-        return results[0]  # 最も関連性の高い結果を返す
-
-    return None
+    query, num_results = build_info_query(campsite_name, "official")
+    return _info_result("official", search_campsite_info(query, num_results=num_results))
 
 
 def search_review_sites(campsite_name):
@@ -95,8 +120,8 @@ def search_review_sites(campsite_name):
     Returns:
         list: 口コミサイトの情報のリスト
     """
-    query = f"{campsite_name} 口コミ レビュー キャンプ場"
-    return search_campsite_info(query, num_results=3)
+    query, num_results = build_info_query(campsite_name, "reviews")
+    return search_campsite_info(query, num_results=num_results)
 
 
 def search_related_info(campsite_name, info_type="アクセス"):
@@ -110,5 +135,66 @@ def search_related_info(campsite_name, info_type="アクセス"):
     Returns:
         list: 関連情報の検索結果
     """
-    query = f"{campsite_name} {info_type} キャンプ場"
-    return search_campsite_info(query, num_results=3)
+    query, num_results = build_info_query(campsite_name, info_type)
+    return search_campsite_info(query, num_results=num_results)
+
+
+def search_campsites_info_batch(campsites, info_types=("official", "reviews"), max_workers=SEARCH_INFO_BATCH_WORKERS):
+    """
+    複数のキャンプ場の情報（公式サイト・口コミサイトなど）をまとめて検索する関数
+    同じ検索クエリは1回だけ検索し、保存済みの応答があるものはAPIを呼ばずに使う
+    検索は同時に実行する数を制限して並行して行い、失敗した検索は結果を空にする
+
+    Args:
+        campsites (list): キャンプ場データ（nameを含む辞書）またはキャンプ場の名前のリスト
+        info_types (tuple, optional): 情報の種類（'official', 'reviews', またはアクセス・設備・料金など）
+        max_workers (int, optional): 同時に実行する検索の数
+
+    Returns:
+        dict: キャンプ場のキー（place_id、ない場合は名前）-> 情報の種類 -> 検索結果
+            公式サイトは1件（見つからない場合はNone）、それ以外はリスト
+    """
+    # 検索クエリごとに、結果を使うキャンプ場と情報の種類をまとめる
+    lookups = {}
+    results = {}
+    for campsite in campsites or []:
+        if isinstance(campsite, dict):
+            name = campsite.get("name", "")
+            key = campsite.get("place_id") or name
+        else:
+            name = key = campsite
+        if not name:
+            continue
+
+        results.setdefault(key, {})
+        for info_type in info_types:
+            query, num_results = build_info_query(name, info_type)
+            lookup_key = (normalize_query(query), num_results)
+            lookups.setdefault(lookup_key, {"query": query, "num_results": num_results, "targets": []})
+            lookups[lookup_key]["targets"].append((key, info_type))
+
+    if not lookups:
+        return results
+
+    if DEBUG:
+        print(f"[SearchAPI] {len(results)}件のキャンプ場の情報を{len(lookups)}回の検索でまとめて取得します")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(lookups))), thread_name_prefix="search-info") as executor:
+        future_to_lookup = {
+            executor.submit(search_campsite_info, lookup["query"], lookup["num_results"]): lookup
+            for lookup in lookups.values()
+        }
+
+        for future in as_completed(future_to_lookup):
+            lookup = future_to_lookup[future]
+            try:
+                search_results = future.result()
+            except Exception as e:
+                if DEBUG:
+                    print(f"[SearchAPI] 検索エラー（{lookup['query']}）: {str(e)}")
+                search_results = []
+
+            for key, info_type in lookup["targets"]:
+                results[key][info_type] = _info_result(info_type, search_results)
+
+    return results
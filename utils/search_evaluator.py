@@ -4,8 +4,23 @@
 
 import os
 import json
-import google.generativeai as genai
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from utils.gemini_client import iter_text
+from utils.json_stream import iter_json_array
+from utils.prompt_builder import (
+    PROMPT_TOKEN_BUDGETS,
+    compact_records,
+    compact_value,
+    chunk_records,
+    dump_json,
+    detect_usage_style,
+    format_query_analysis,
+)
+from utils.prompt_templates import register_prompt_template
+from utils.cancellation import CancellationToken, is_cancelled
 
 # 環境変数の読み込み
 load_dotenv()
@@ -16,14 +31,151 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # デバッグモードの設定
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 
-# Gemini APIの初期化
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-except Exception as e:
-    print(f"Gemini APIの初期化中にエラーが発生しました: {str(e)}")
-
-
-def evaluate_search_results(query, query_analysis, campsites, max_results=5):
+# 評価するキャンプ場の最大数
+EVALUATION_MAX_CANDIDATES = int(os.getenv("EVALUATION_MAX_CANDIDATES", "40"))
+
+# 1回の評価の呼び出しに含めるキャンプ場データの推定トークン数の上限と最大件数
+EVALUATION_CHUNK_TOKEN_BUDGET = PROMPT_TOKEN_BUDGETS["evaluate"]
+EVALUATION_CHUNK_MAX_CAMPSITES = int(os.getenv("EVALUATION_CHUNK_MAX_CAMPSITES", "8"))
+
+# 分けたまとまりを同時に評価する数
+EVALUATION_WORKERS = int(os.getenv("EVALUATION_WORKERS", "8"))
+
+# 評価結果を待つ最大時間（秒）。過ぎた場合は評価が終わっていないキャンプ場を元の点数のまま残す
+EVALUATION_TIMEOUT = float(os.getenv("EVALUATION_TIMEOUT", "20"))
+
+# キャンプ場1件あたりの出力トークン数の目安
+EVALUATION_OUTPUT_TOKENS_PER_CAMPSITE = 160
+
+# まとまりごとの採点の偏りを補正する割合と、補正に必要な件数
+EVALUATION_CALIBRATION_WEIGHT = 0.5
+EVALUATION_CALIBRATION_MIN_SCORES = 3
+
+# 評価のプロンプトに含めるキャンプ場の項目
+EVALUATION_FIELDS = {
+    "index": "index",
+    "name": "name",
+    "description": "description",
+    "features": "features",
+    "facilities": "facilities",
+    "region": "region",
+    "rating": "rating",
+}
+
+# 要約のプロンプトに含めるキャンプ場の項目
+SUMMARY_FIELDS = {
+    "name": "name",
+    "description": "description",
+    "features": "features",
+    "facilities": "facilities",
+    "region": "region",
+    "rating": "rating",
+    "reviews_count": "reviews_count",
+    "review_summary": "review_summary",
+    "ai_recommendation_reason": "ai_recommendation_reason",
+}
+
+# 要約のプロンプトに含める、ぴったりのキャンプ場の項目
+PERFECT_MATCH_FIELDS = {
+    "name": "name",
+    "region": "region",
+    "rating": "rating",
+    "score": "score",
+    "recommendation_reason": "recommendation_reason",
+}
+
+# 要約のプロンプトに含める、人気・評価の高いキャンプ場の項目
+GROUP_FIELDS = {
+    "name": "name",
+    "rating": "rating",
+    "reviews_count": "reviews_count",
+}
+
+# 検索結果の評価のプロンプト
+EVALUATION_PROMPT = register_prompt_template(
+    "evaluate",
+    prefix="""
+    あなたはキャンプ場検索の専門家です。ユーザーの検索意図と検索結果を評価し、
+    ユーザーの意図に最も合致するキャンプ場をランク付けしてください。
+
+    各キャンプ場について、以下の評価を行ってください：
+    1. ユーザーの検索意図との合致度（0-10）
+    2. 推薦理由（なぜこのキャンプ場がユーザーの意図に合致するか）
+    3. 合致しない場合の理由
+    4. 利用スタイルとの適合性も考慮してください
+
+    回答は以下のJSON形式で返してください：
+    ```json
+    [
+      {
+        "index": 0,
+        "name": "キャンプ場名",
+        "match_score": 8,
+        "recommendation_reason": "このキャンプ場をおすすめする理由",
+        "mismatch_reason": "意図に合致しない点（あれば）"
+      },
+      ...
+    ]
+    ```
+
+    インデックスは検索結果のキャンプ場のindexを示します。
+    """,
+    body="""
+    ユーザーの検索クエリ: ${query}
+
+    検索意図の分析:
+    ${query_analysis}
+
+    利用スタイル: ${usage_style}
+
+    検索結果のキャンプ場:
+    ${campsites}
+    """,
+)
+
+# 検索結果の要約のプロンプト
+SUMMARY_PROMPT = register_prompt_template(
+    "summary",
+    prefix="""
+    あなたはキャンプ場検索の専門家です。ユーザーの検索クエリと検索結果に基づいて、
+    検索結果の要約を生成してください。
+
+    以下の内容を含む要約を生成してください：
+    1. 検索結果の概要（何件見つかったか、どのような特徴があるかなど）
+    2. ユーザーにぴったりのキャンプ場3選とその理由（perfect_match_jsonに含まれるキャンプ場を必ず使用すること）
+    3. 人気のキャンプ場3選の紹介（popular_jsonに含まれるキャンプ場を必ず使用すること）
+    4. 利用スタイルに合わせたおすすめポイント
+    5. ユーザーの検索意図に対する回答
+
+    重要：おすすめキャンプ場と人気のキャンプ場は、それぞれperfect_match_jsonとpopular_jsonに含まれるキャンプ場の名前を正確に使用してください。
+    これらのリストが空の場合のみ「見つかりませんでした」と記載してください。
+
+    要約は日本語で、会話的な口調で作成してください。マークダウン形式で見やすく整形してください。
+    各セクションには適切な見出しを付けてください。
+    """,
+    body="""
+    ユーザーの検索クエリ: ${query}
+
+    検索意図の分析:
+    ${query_analysis}
+
+    利用スタイル: ${usage_style}
+
+    検索結果のキャンプ場:
+    ${campsites}
+
+    ユーザーにぴったりのキャンプ場3選（perfect_match_json）:
+    ${perfect_match_campsites}
+
+    人気のキャンプ場3選（popular_json）:
+    ${popular_campsites}
+
+    評価の高いキャンプ場3選:
+    ${top_rated_campsites}
+    """,
+)
+
+def evaluate_search_results(query, query_analysis, campsites, max_results=None, cancel_token=None):
     """
     検索結果を評価し、ユーザーの意図に合致する結果を優先する関数
 
@@ -31,146 +183,256 @@ def evaluate_search_results(query, query_analysis, campsites, max_results=5):
         query (str): ユーザーの入力テキスト
         query_analysis (dict): クエリ解析結果
         campsites (list): 検索結果のキャンプ場リスト
-        max_results (int, optional): 評価する最大結果数
+        max_results (int, optional): 評価する最大結果数（省略時はEVALUATION_MAX_CANDIDATES件まで）
+        cancel_token (CancellationToken, optional): 検索を中止するためのトークン
 
     Returns:
         list: 評価・ランク付けされたキャンプ場リスト
     """
-    if DEBUG:
-        print(
-            f"evaluate_search_results内: query型={type(query)}, query_analysis型={type(query_analysis)}, campsites型={type(campsites)}"
-        )
-        if isinstance(campsites, list) and campsites:
-            print(f"campsites[0]型={type(campsites[0])}")
-
-    if not GEMINI_API_KEY or not campsites:
+    evaluated = list(iter_evaluate_search_results(query, query_analysis, campsites, max_results, cancel_token))
+    if not evaluated:
         return campsites
 
-    try:
-        # 評価対象のキャンプ場を制限（処理時間短縮のため）
-        target_campsites = campsites[:max_results]
+    return sort_evaluated_campsites(campsites, max_results)
 
-        # Geminiモデルの設定
-        model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash-lite",
-            generation_config={
-                "temperature": 0.2,
-                "max_output_tokens": 1024,
-            },
-        )
 
-        # キャンプ場データをJSON文字列に変換
-        campsites_json = json.dumps(
-            [
-                {
-                    "name": site.get("name", ""),
-                    "description": site.get("description", ""),
-                    "features": site.get("features", []),
-                    "facilities": site.get("facilities", []),
-                    "region": site.get("region", ""),
-                    "rating": site.get("rating", 0),
-                }
-                for site in target_campsites
-            ],
-            ensure_ascii=False,
-        )
+def sort_evaluated_campsites(campsites, max_results=None):
+    """
+    評価したキャンプ場をスコア順に並べ、評価していないキャンプ場をその後ろに追加する関数
 
-        # プロンプトの作成
-        prompt = f"""
-        あなたはキャンプ場検索の専門家です。以下のユーザーの検索意図と検索結果を評価し、
-        ユーザーの意図に最も合致するキャンプ場をランク付けしてください。
-
-        ユーザーの検索クエリ: {query}
-
-        検索意図の分析:
-        - 場所要素: {query_analysis.get("location", "") if isinstance(query_analysis, dict) else ""}
-        - 特徴要素: {", ".join(query_analysis.get("features", []) if isinstance(query_analysis, dict) else [])}
-        - 施設要素: {", ".join(query_analysis.get("facilities", []) if isinstance(query_analysis, dict) else [])}
-        - 優先度: {json.dumps(query_analysis.get("priorities", {}) if isinstance(query_analysis, dict) else {}, ensure_ascii=False)}
-
-        # 利用スタイルのキーワードを抽出
-        利用スタイル: {"ソロキャンプ" if "ソロキャンプ" in query or ("ソロ" in query_analysis.get("features", []) if isinstance(query_analysis, dict) else False) else 
-                    "カップル" if "カップル" in query or ("カップル" in query_analysis.get("features", []) if isinstance(query_analysis, dict) else False) else
-                    "ファミリー" if "ファミリー" in query or ("家族" in query_analysis.get("features", []) if isinstance(query_analysis, dict) else False) or ("子供" in query_analysis.get("features", []) if isinstance(query_analysis, dict) else False) else
-                    "グループ" if "グループ" in query or ("グループ" in query_analysis.get("features", []) if isinstance(query_analysis, dict) else False) else "指定なし"}
-
-        検索結果のキャンプ場:
-        {campsites_json}
-
-        各キャンプ場について、以下の評価を行ってください：
-        1. ユーザーの検索意図との合致度（0-10）
-        2. 推薦理由（なぜこのキャンプ場がユーザーの意図に合致するか）
-        3. 合致しない場合の理由
-        4. 利用スタイルとの適合性も考慮してください
-
-        回答は以下のJSON形式で返してください：
-        ```json
-        [
-          {{
-            "index": 0,
-            "name": "キャンプ場名",
-            "match_score": 8,
-            "recommendation_reason": "このキャンプ場をおすすめする理由",
-            "mismatch_reason": "意図に合致しない点（あれば）"
-          }},
-          ...
-        ]
-        ```
-
-        インデックスは元の検索結果の順序（0から始まる）を示します。
-        """
+    Args:
+        campsites (list): 検索結果のキャンプ場リスト
+        max_results (int, optional): 評価した最大結果数（省略時はEVALUATION_MAX_CANDIDATES件）
 
-        # Gemini APIを呼び出し
-        response = model.generate_content(prompt)
-        response_text = response.text
+    Returns:
+        list: 並べ替えたキャンプ場リスト
+    """
+    max_results = max_results or EVALUATION_MAX_CANDIDATES
 
-        # JSONデータを抽出
-        json_start = response_text.find("```json") + 7 if "```json" in response_text else 0
-        json_end = response_text.find("```", json_start) if "```" in response_text[json_start:] else len(response_text)
+    # スコアでソート（match_scoreではなく）
+    sorted_campsites = sorted(campsites[:max_results], key=lambda x: x.get("score", 0), reverse=True)
 
-        if json_start > 0 and json_end > json_start:
-            json_text = response_text[json_start:json_end].strip()
-        else:
-            json_text = response_text
+    # 評価していないキャンプ場を追加
+    if len(campsites) > max_results:
+        sorted_campsites.extend(campsites[max_results:])
 
-        # JSONデータをパース
-        try:
-            evaluation_results = json.loads(json_text)
+    return sorted_campsites
+
+
+def build_evaluation_chunks(campsites):
+    """
+    評価するキャンプ場を、推定トークン数の上限に収まるまとまりに分ける関数
+    まとまりごとの採点の偏りをそろえやすいように、元の順位が偏らないよう順番に振り分ける
 
-            # 評価結果を元のキャンプ場データに追加
-            for eval_result in evaluation_results:
-                index = eval_result.get("index", 0)
-                if 0 <= index < len(target_campsites):
-                    # 元のスコアを保持
-                    original_score = target_campsites[index].get("score", 0)
-                    match_score = eval_result.get("match_score", 0)
+    Args:
+        campsites (list): 評価するキャンプ場のリスト
 
-                    # 両方のスコアを組み合わせる（元のスコアを優先）
-                    combined_score = original_score + (match_score / 10)  # match_scoreは0-10なので、0-1のスケールに調整
+    Returns:
+        list: 評価用データ（indexは元のリストでの位置）のリストのリスト
+    """
+    records = []
+    for index, site in enumerate(campsites):
+        record = compact_value({name: site.get(key) for name, key in EVALUATION_FIELDS.items() if name != "index"})
+        records.append(dict(index=index, **(record or {})))
 
-                    target_campsites[index]["match_score"] = match_score
-                    target_campsites[index]["score"] = round(combined_score, 1)  # 元のスコアフィールドを更新
-                    target_campsites[index]["recommendation_reason"] = eval_result.get("recommendation_reason", "")
-                    target_campsites[index]["mismatch_reason"] = eval_result.get("mismatch_reason", "")
+    chunk_count = len(chunk_records(records, EVALUATION_CHUNK_TOKEN_BUDGET, EVALUATION_CHUNK_MAX_CAMPSITES))
+    return [records[offset::chunk_count] for offset in range(chunk_count)] if chunk_count else []
 
-            # スコアでソート（match_scoreではなく）
-            sorted_campsites = sorted(target_campsites, key=lambda x: x.get("score", 0), reverse=True)
 
-            # 評価していないキャンプ場を追加
-            if len(campsites) > max_results:
-                sorted_campsites.extend(campsites[max_results:])
+def calibrate_chunk_scores(chunk_scores):
+    """
+    まとまりごとに採点した合致度を、1つの基準にそろえる関数
+    まとまりの平均と全体の平均の差の一部を補正する（まとまりには元の順位が偏らないように振り分けている）
 
-            return sorted_campsites
+    Args:
+        chunk_scores (list): まとまりごとの index -> 合致度（0-10）の辞書のリスト
 
-        except json.JSONDecodeError:
-            if DEBUG:
-                print(f"JSON解析エラー: {json_text}")
-            return campsites
+    Returns:
+        dict: index -> 補正した合致度（0-10）
+    """
+    all_scores = [score for scores in chunk_scores for score in scores.values()]
+    if not all_scores:
+        return {}
+
+    overall_mean = sum(all_scores) / len(all_scores)
+
+    calibrated = {}
+    for scores in chunk_scores:
+        if not scores:
+            continue
+
+        # 件数が少ないまとまりの平均は当てにならないので補正しない
+        shift = 0.0
+        if len(scores) >= EVALUATION_CALIBRATION_MIN_SCORES:
+            shift = (overall_mean - sum(scores.values()) / len(scores)) * EVALUATION_CALIBRATION_WEIGHT
+
+        for index, score in scores.items():
+            calibrated[index] = round(min(10.0, max(0.0, score + shift)), 1)
+
+    return calibrated
+
+
+def _apply_evaluation(campsite, heuristic_score, match_score, eval_result=None):
+    """
+    評価結果をキャンプ場データに反映する
+    scoreは評価していないキャンプ場（1段階目の点数のまま）と並べられるように0-1の範囲にそろえる
+    """
+    # match_scoreは0-10なので、0-1のスケールに調整して1段階目の点数と平均する
+    combined_score = match_score / 10
+    if heuristic_score is not None:
+        combined_score = (heuristic_score + combined_score) / 2
+
+    campsite["match_score"] = match_score
+    campsite["score"] = round(combined_score, 2)  # 元のスコアフィールドを更新
+    if eval_result is not None:
+        campsite["recommendation_reason"] = eval_result.get("recommendation_reason", "")
+        campsite["mismatch_reason"] = eval_result.get("mismatch_reason", "")
+
+
+def _evaluate_chunk(chunk_id, chunk, query, query_analysis_text, usage_style, results, cancel_token=None):
+    """
+    1まとまり分のキャンプ場を評価し、評価結果の要素が閉じるたびに結果のキューに入れる
+    cancel_tokenが中止された場合（検索の中止・待ち時間の超過）は、残りの応答を受け取らない
+    """
+    try:
+        if is_cancelled(cancel_token):
+            return
+
+        # プロンプトの作成（指示と回答形式は登録済みの前置きを使う）
+        prompt = EVALUATION_PROMPT.render(
+            query=query,
+            query_analysis=query_analysis_text,
+            usage_style=usage_style,
+            campsites=dump_json(chunk),
+        )
+        max_output_tokens = min(4096, EVALUATION_OUTPUT_TOKENS_PER_CAMPSITE * len(chunk) + 256)
+
+        response_chunks = iter_text(
+            prompt, temperature=0.2, max_output_tokens=max_output_tokens, prefix=EVALUATION_PROMPT.prefix
+        )
+        for eval_result in iter_json_array(response_chunks):
+            if is_cancelled(cancel_token):
+                return
+            results.put((chunk_id, eval_result))
 
     except Exception as e:
         if DEBUG:
-            print(f"検索結果評価エラー: {str(e)}")
-        return campsites
+            print(f"検索結果評価エラー（{chunk_id + 1}番目のまとまり）: {str(e)}")
+
+    finally:
+        # まとまりの評価が終わったことを知らせる
+        results.put((chunk_id, None))
+
+
+def iter_evaluate_search_results(query, query_analysis, campsites, max_results=None, cancel_token=None, timeout=None):
+    """
+    検索結果を評価し、評価できたキャンプ場から順に返すジェネレータ
+    キャンプ場を推定トークン数の上限に収まるまとまりに分けて同時に評価し、
+    Geminiの応答をストリーミングで受け取って、評価結果の要素が閉じた時点でキャンプ場データに反映する
+    すべてのまとまりの評価が終わった時点（または待ち時間を過ぎた時点）で、まとまりごとの採点の偏りをそろえる
+    待ち時間を過ぎても評価が終わっていないキャンプ場は、元の点数（1段階目の順位）のまま残す
+
+    Args:
+        query (str): ユーザーの入力テキスト
+        query_analysis (dict): クエリ解析結果
+        campsites (list): 検索結果のキャンプ場リスト
+        max_results (int, optional): 評価する最大結果数（省略時はEVALUATION_MAX_CANDIDATES件まで）
+        cancel_token (CancellationToken, optional): 検索を中止するためのトークン
+        timeout (float, optional): 評価結果を待つ最大時間（秒。省略時はEVALUATION_TIMEOUT）
+
+    Yields:
+        dict: 評価結果（match_score, score, recommendation_reason, mismatch_reason）を反映したキャンプ場データ
+    """
+    if DEBUG:
+        print(
+            f"evaluate_search_results内: query型={type(query)}, query_analysis型={type(query_analysis)}, campsites型={type(campsites)}"
+        )
+        if isinstance(campsites, list) and campsites:
+            print(f"campsites[0]型={type(campsites[0])}")
+
+    if not GEMINI_API_KEY or not campsites or is_cancelled(cancel_token):
+        return
+
+    # 評価対象のキャンプ場を制限（Gemini APIの呼び出し回数を抑えるため）
+    target_campsites = campsites[: max_results or EVALUATION_MAX_CANDIDATES]
+    heuristic_scores = [site.get("heuristic_score") for site in target_campsites]
+
+    chunks = build_evaluation_chunks(target_campsites)
+    chunk_indexes = [{record["index"] for record in chunk} for chunk in chunks]
+    chunk_scores = [{} for _ in chunks]
+
+    if DEBUG:
+        print(f"検索結果評価: {len(target_campsites)}件を{len(chunks)}回の呼び出しで同時に評価します")
+
+    query_analysis_text = format_query_analysis(query_analysis)
+    usage_style = detect_usage_style(query, query_analysis)
+
+    results = queue.Queue()
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, min(EVALUATION_WORKERS, len(chunks))), thread_name_prefix="search-evaluate"
+    )
+    deadline = time.monotonic() + (timeout if timeout is not None else EVALUATION_TIMEOUT)
+
+    # 評価を打ち切ったときに、応答を受け取っている途中のまとまりも止めるためのトークン
+    stop_token = CancellationToken()
+
+    # 中止されたら待機中のループをすぐに起こす（終了時に登録を解除する）
+    def wake():
+        results.put((None, None))
+
+    if cancel_token is not None:
+        cancel_token.add_callback(wake)
+
+    try:
+        for chunk_id, chunk in enumerate(chunks):
+            executor.submit(
+                _evaluate_chunk, chunk_id, chunk, query, query_analysis_text, usage_style, results, stop_token
+            )
+
+        # 評価結果が届いたキャンプ場から順に反映する
+        remaining = len(chunks)
+        while remaining:
+            try:
+                chunk_id, eval_result = results.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                if DEBUG:
+                    print(f"検索結果評価: 制限時間内に{remaining}個のまとまりの評価が終わりませんでした")
+                break
+
+            if is_cancelled(cancel_token):
+                return
+            if eval_result is None:
+                remaining -= 1
+                continue
+
+            index = eval_result.get("index")
+            if not isinstance(index, int) or index not in chunk_indexes[chunk_id] or index in chunk_scores[chunk_id]:
+                continue
+
+            try:
+                match_score = min(10.0, max(0.0, float(eval_result.get("match_score", 0))))
+            except (TypeError, ValueError):
+                match_score = 0.0
+
+            chunk_scores[chunk_id][index] = match_score
+            _apply_evaluation(target_campsites[index], heuristic_scores[index], match_score, eval_result)
+
+            yield target_campsites[index]
+
+    finally:
+        if cancel_token is not None:
+            cancel_token.remove_callback(wake)
+        stop_token.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # 複数のまとまりに分けて評価した場合は、採点の偏りをそろえる
+    if len(chunks) > 1:
+        for index, match_score in calibrate_chunk_scores(chunk_scores).items():
+            _apply_evaluation(target_campsites[index], heuristic_scores[index], match_score)
+
+    if DEBUG:
+        evaluated_count = sum(len(scores) for scores in chunk_scores)
+        print(f"検索結果評価: {evaluated_count}/{len(target_campsites)}件を評価しました")
 
 
 def generate_search_summary(
@@ -181,6 +443,7 @@ def generate_search_summary(
     perfect_match_campsites=None,
     popular_campsites=None,
     top_rated_campsites=None,
+    cancel_token=None,
 ):
     """
     検索結果の要約を生成する関数
@@ -193,144 +456,90 @@ def generate_search_summary(
         perfect_match_campsites (list, optional): ユーザーにぴったりのキャンプ場リスト
         popular_campsites (list, optional): 人気のキャンプ場リスト
         top_rated_campsites (list, optional): 評価の高いキャンプ場リスト
+        cancel_token (CancellationToken, optional): 検索を中止するためのトークン（中止時は空文字を返す）
 
     Returns:
         str: 検索結果の要約テキスト
     """
-    if not GEMINI_API_KEY or not campsites:
-        return ""
-
-    try:
-        # 要約対象のキャンプ場を制限（処理時間短縮のため）
-        target_campsites = campsites[:max_results]
-
-        # Geminiモデルの設定
-        model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash-lite",
-            generation_config={
-                "temperature": 0.4,
-                "max_output_tokens": 1024,
-            },
+    summary = "".join(
+        iter_search_summary(
+            query,
+            query_analysis,
+            campsites,
+            max_results=max_results,
+            perfect_match_campsites=perfect_match_campsites,
+            popular_campsites=popular_campsites,
+            top_rated_campsites=top_rated_campsites,
+            cancel_token=cancel_token,
         )
+    )
+    return "" if is_cancelled(cancel_token) else summary
 
-        # キャンプ場データをJSON文字列に変換
-        campsites_json = json.dumps(
-            [
-                {
-                    "name": site.get("name", ""),
-                    "description": site.get("description", ""),
-                    "features": site.get("features", []),
-                    "facilities": site.get("facilities", []),
-                    "region": site.get("region", ""),
-                    "rating": site.get("rating", 0),
-                    "reviews_count": site.get("reviews_count", 0),
-                    "review_summary": site.get("review_summary", ""),
-                    "ai_recommendation_reason": site.get("ai_recommendation_reason", ""),
-                }
-                for site in target_campsites
-            ],
-            ensure_ascii=False,
-        )
 
-        # グループ分けしたキャンプ場データも変換
-        perfect_match_json = "[]"
-        popular_json = "[]"
-        top_rated_json = "[]"
-
-        if perfect_match_campsites:
-            perfect_match_json = json.dumps(
-                [
-                    {
-                        "name": site.get("name", ""),
-                        "region": site.get("region", ""),
-                        "rating": site.get("rating", 0),
-                        "reviews_count": site.get("reviews_count", 0),
-                        "score": site.get("score", 0),
-                        "recommendation_reason": site.get("recommendation_reason", ""),
-                    }
-                    for site in perfect_match_campsites
-                ],
-                ensure_ascii=False,
-            )
+def iter_search_summary(
+    query,
+    query_analysis,
+    campsites,
+    max_results=3,
+    perfect_match_campsites=None,
+    popular_campsites=None,
+    top_rated_campsites=None,
+    cancel_token=None,
+):
+    """
+    検索結果の要約を生成された順に少しずつ返すジェネレータ
+    要約全体の完成を待たずに、最初の部分から表示できるようにする
 
-        if popular_campsites:
-            popular_json = json.dumps(
-                [
-                    {
-                        "name": site.get("name", ""),
-                        "region": site.get("region", ""),
-                        "rating": site.get("rating", 0),
-                        "reviews_count": site.get("reviews_count", 0),
-                    }
-                    for site in popular_campsites
-                ],
-                ensure_ascii=False,
-            )
+    Args:
+        query (str): ユーザーの入力テキスト
+        query_analysis (dict): クエリ解析結果
+        campsites (list): 検索結果のキャンプ場リスト
+        max_results (int, optional): 要約に含める最大結果数
+        perfect_match_campsites (list, optional): ユーザーにぴったりのキャンプ場リスト
+        popular_campsites (list, optional): 人気のキャンプ場リスト
+        top_rated_campsites (list, optional): 評価の高いキャンプ場リスト
+        cancel_token (CancellationToken, optional): 検索を中止するためのトークン（中止時は生成を打ち切る）
 
-        if top_rated_campsites:
-            top_rated_json = json.dumps(
-                [
-                    {
-                        "name": site.get("name", ""),
-                        "region": site.get("region", ""),
-                        "rating": site.get("rating", 0),
-                        "reviews_count": site.get("reviews_count", 0),
-                    }
-                    for site in top_rated_campsites
-                ],
-                ensure_ascii=False,
-            )
+    Yields:
+        str: 要約テキストの一部
+    """
+    if not GEMINI_API_KEY or not campsites or is_cancelled(cancel_token):
+        return
 
-        # プロンプトの作成
-        prompt = f"""
-        あなたはキャンプ場検索の専門家です。以下のユーザーの検索クエリと検索結果に基づいて、
-        検索結果の要約を生成してください。
-
-        ユーザーの検索クエリ: {query}
-
-        検索意図の分析:
-        - 場所要素: {query_analysis.get("location", "") if isinstance(query_analysis, dict) else ""}
-        - 特徴要素: {", ".join(query_analysis.get("features", []) if isinstance(query_analysis, dict) else [])}
-        - 施設要素: {", ".join(query_analysis.get("facilities", []) if isinstance(query_analysis, dict) else [])}
-        - 優先度: {json.dumps(query_analysis.get("priorities", {}) if isinstance(query_analysis, dict) else {}, ensure_ascii=False)}
-
-        # 利用スタイルのキーワードを抽出
-        利用スタイル: {"ソロキャンプ" if "ソロキャンプ" in query or ("ソロ" in query_analysis.get("features", []) if isinstance(query_analysis, dict) else False) else 
-                    "カップル" if "カップル" in query or ("カップル" in query_analysis.get("features", []) if isinstance(query_analysis, dict) else False) else
-                    "ファミリー" if "ファミリー" in query or ("家族" in query_analysis.get("features", []) if isinstance(query_analysis, dict) else False) or ("子供" in query_analysis.get("features", []) if isinstance(query_analysis, dict) else False) else
-                    "グループ" if "グループ" in query or ("グループ" in query_analysis.get("features", []) if isinstance(query_analysis, dict) else False) else "指定なし"}
-
-        検索結果のキャンプ場:
-        {campsites_json}
-        
-        ユーザーにぴったりのキャンプ場3選:
-        {perfect_match_json}
-        
-        人気のキャンプ場3選:
-        {popular_json}
-        
-        評価の高いキャンプ場3選:
-        {top_rated_json}
-
-        以下の内容を含む要約を生成してください：
-        1. 検索結果の概要（何件見つかったか、どのような特徴があるかなど）
-        2. ユーザーにぴったりのキャンプ場3選とその理由（perfect_match_jsonに含まれるキャンプ場を必ず使用すること）
-        3. 人気のキャンプ場3選の紹介（popular_jsonに含まれるキャンプ場を必ず使用すること）
-        4. 利用スタイルに合わせたおすすめポイント
-        5. ユーザーの検索意図に対する回答
-
-        重要：おすすめキャンプ場と人気のキャンプ場は、それぞれperfect_match_jsonとpopular_jsonに含まれるキャンプ場の名前を正確に使用してください。
-        これらのリストが空の場合のみ「見つかりませんでした」と記載してください。
-
-        要約は日本語で、会話的な口調で作成してください。マークダウン形式で見やすく整形してください。
-        各セクションには適切な見出しを付けてください。
-        """
+    try:
+        # 要約対象のキャンプ場を制限（処理時間短縮のため）
+        target_campsites = campsites[:max_results]
+
+        # キャンプ場データをJSON文字列に変換（空の項目は省き、段階ごとの上限に収める）
+        campsites_json = compact_records(target_campsites, SUMMARY_FIELDS, stage="summary")
+
+        # グループ分けしたキャンプ場データも変換（本文と同じキャンプ場の説明は繰り返さない）
+        perfect_match_json = compact_records(perfect_match_campsites, PERFECT_MATCH_FIELDS, stage="summary")
+        popular_json = compact_records(popular_campsites, GROUP_FIELDS, stage="summary")
+        top_rated_json = compact_records(top_rated_campsites, GROUP_FIELDS, stage="summary")
+
+        # プロンプトの作成（指示は登録済みの前置きを使う）
+        prompt = SUMMARY_PROMPT.render(
+            query=query,
+            query_analysis=format_query_analysis(query_analysis),
+            usage_style=detect_usage_style(query, query_analysis),
+            campsites=campsites_json,
+            perfect_match_campsites=perfect_match_json,
+            popular_campsites=popular_json,
+            top_rated_campsites=top_rated_json,
+        )
 
         # Gemini APIを呼び出し
-        response = model.generate_content(prompt)
-        return response.text
+        # 中止された検索ではGemini APIを呼び出さない
+        if is_cancelled(cancel_token):
+            return
+
+        for text in iter_text(prompt, temperature=0.4, max_output_tokens=1024, prefix=SUMMARY_PROMPT.prefix):
+            # 中止された場合は残りの生成を受け取らない
+            if is_cancelled(cancel_token):
+                return
+            yield text
 
     except Exception as e:
         if DEBUG:
             print(f"検索要約生成エラー: {str(e)}")
-        return ""
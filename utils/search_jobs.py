@@ -0,0 +1,369 @@
+"""
+検索ジョブをバックグラウンドで実行するモジュール
+プロセス全体で共有するワーカープールで検索を実行し、
+ジョブIDで状態の確認・途中経過・結果の取得ができるようにします
+"""
+
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from utils.cancellation import CancellationToken
+
+# 環境変数の読み込み
+load_dotenv()
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# 同時に実行する検索ジョブの数
+SEARCH_JOB_WORKERS = int(os.getenv("SEARCH_JOB_WORKERS", "4"))
+
+# 実行待ちにできる検索ジョブの数（これを超えた分は受け付けない）
+SEARCH_JOB_QUEUE_LIMIT = int(os.getenv("SEARCH_JOB_QUEUE_LIMIT", "16"))
+
+# 完了したジョブの結果を保持する時間（秒）と件数
+SEARCH_JOB_RESULT_TTL = float(os.getenv("SEARCH_JOB_RESULT_TTL", "600"))
+SEARCH_JOB_MAX_FINISHED = int(os.getenv("SEARCH_JOB_MAX_FINISHED", "200"))
+
+# 完了したジョブの未取得のイベントを保持する時間（秒）。過ぎた後は結果（最後のイベント）だけを保持する
+SEARCH_JOB_EVENT_TTL = float(os.getenv("SEARCH_JOB_EVENT_TTL", "60"))
+
+# ジョブの状態
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+
+class JobRejectedError(Exception):
+    """実行待ちのジョブが上限に達していて、新しいジョブを受け付けられない場合の例外"""
+
+
+class SearchJobExecutor:
+    """
+    検索ジョブを固定数のワーカーで実行するクラス
+    ジョブはイベントを返すジェネレータ関数で、返されたイベントは順に記録される
+    イベントの番号（cursor）はジョブの開始からの通し番号で、cursorより前のイベントは取得済みとして破棄する
+    ジョブごとにキャンセルトークンを作成し、cancel_tokenキーワード引数として関数に渡す
+    """
+
+    def __init__(self, max_workers=SEARCH_JOB_WORKERS, max_pending=SEARCH_JOB_QUEUE_LIMIT):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search-job")
+        self._jobs = OrderedDict()
+        self._condition = threading.Condition()
+        self.rejected_count = 0
+
+    def submit(self, func, *args, job_id=None, **kwargs):
+        """
+        ジョブを登録する
+
+        Args:
+            func (callable): イベントを返すジェネレータ関数
+            *args: funcに渡す引数
+            job_id (str, optional): ジョブID（省略時は自動生成）
+            **kwargs: funcに渡すキーワード引数（cancel_tokenは自動で追加される）
+
+        Returns:
+            str: ジョブID
+
+        Raises:
+            JobRejectedError: 実行中・実行待ちのジョブが上限に達している場合
+        """
+        job_id = job_id or uuid.uuid4().hex
+
+        with self._condition:
+            self._prune()
+
+            active = sum(1 for job in self._jobs.values() if job["status"] not in FINISHED_STATUSES)
+            if active >= self.max_workers + self.max_pending:
+                self.rejected_count += 1
+                if DEBUG:
+                    print(f"[SearchJobs] ジョブを受け付けられません（実行中・待機中: {active}件）")
+                raise JobRejectedError("検索が混み合っています。しばらくしてから再度お試しください。")
+
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": JOB_QUEUED,
+                "events": [],
+                "event_offset": 0,
+                "result": None,
+                "error": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "cancel_token": CancellationToken(),
+            }
+            kwargs["cancel_token"] = self._jobs[job_id]["cancel_token"]
+
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+
+        if DEBUG:
+            print(f"[SearchJobs] ジョブを登録しました: {job_id}")
+
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        """ワーカースレッドでジョブを実行する"""
+        cancel_token = kwargs["cancel_token"]
+
+        # 実行待ちの間に中止されたジョブは実行しない
+        if cancel_token.cancelled:
+            return
+        self._update(job_id, status=JOB_RUNNING, started_at=time.time())
+
+        try:
+            for event in func(*args, **kwargs):
+                with self._condition:
+                    job = self._jobs.get(job_id)
+                    if job is None:
+                        return
+                    job["events"].append(event)
+                    job["result"] = event
+                    self._condition.notify_all()
+
+            status = JOB_CANCELLED if cancel_token.cancelled else JOB_DONE
+            self._update(job_id, status=status, finished_at=time.time())
+
+        except Exception as e:
+            if DEBUG:
+                print(f"[SearchJobs] ジョブエラー ({job_id}): {str(e)}")
+            self._update(job_id, status=JOB_FAILED, error=str(e), finished_at=time.time())
+
+    def cancel(self, job_id):
+        """
+        ジョブを中止する
+        実行待ちのジョブはすぐに中止され、実行中のジョブは次の確認時点で処理を打ち切る
+
+        Args:
+            job_id (str): ジョブID
+
+        Returns:
+            bool: 中止を伝えた場合はTrue（存在しない・完了済みの場合はFalse）
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in FINISHED_STATUSES:
+                return False
+
+            job["cancel_token"].cancel()
+            if job["status"] == JOB_QUEUED:
+                job["status"] = JOB_CANCELLED
+                job["finished_at"] = time.time()
+            self._condition.notify_all()
+
+        if DEBUG:
+            print(f"[SearchJobs] ジョブを中止しました: {job_id}")
+
+        return True
+
+    def _update(self, job_id, **fields):
+        """ジョブの情報を更新し、待機中のスレッドに通知する"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+            self._condition.notify_all()
+
+    def _prune(self):
+        """
+        保持期間を過ぎた完了済みジョブを削除し、取得されないまま残ったイベントを破棄する
+        （ロックを取得した状態で呼ぶ）
+        """
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job["status"] in FINISHED_STATUSES]
+        expired = [job for job in finished if now - job["finished_at"] > SEARCH_JOB_RESULT_TTL]
+        overflow = finished[: max(0, len(finished) - SEARCH_JOB_MAX_FINISHED)]
+
+        for job in expired + overflow:
+            self._jobs.pop(job["job_id"], None)
+
+        # 画面が閉じられたセッションのジョブは、結果だけを残してイベントを破棄する
+        for job in finished:
+            if job["events"] and now - job["finished_at"] > SEARCH_JOB_EVENT_TTL:
+                job["event_offset"] += len(job["events"])
+                job["events"] = []
+
+    @staticmethod
+    def _take_events(job, cursor):
+        """
+        cursor以降のイベントを返し、cursorより前のイベントを取得済みとして破棄する（ロックを取得した状態で呼ぶ）
+        """
+        acknowledged = min(max(0, cursor - job["event_offset"]), len(job["events"]))
+        if acknowledged:
+            del job["events"][:acknowledged]
+            job["event_offset"] += acknowledged
+        return list(job["events"])
+
+    @staticmethod
+    def _event_count(job):
+        """ジョブの開始からのイベント数"""
+        return job["event_offset"] + len(job["events"])
+
+    def get_status(self, job_id):
+        """
+        ジョブの状態を取得する
+
+        Args:
+            job_id (str): ジョブID
+
+        Returns:
+            dict: ジョブの状態（job_id, status, event_count, error, created_at, started_at, finished_at）
+                存在しない場合はNone
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+
+            status = {key: value for key, value in job.items() if key not in ("events", "event_offset", "result", "cancel_token")}
+            status["event_count"] = self._event_count(job)
+            return status
+
+    def get_result(self, job_id):
+        """
+        完了したジョブの結果（最後のイベント）を取得する
+
+        Args:
+            job_id (str): ジョブID
+
+        Returns:
+            dict: 最後のイベント。未完了・存在しない場合はNone
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] not in FINISHED_STATUSES:
+                return None
+            return job["result"]
+
+    def get_events(self, job_id, cursor=0):
+        """
+        ジョブのイベントを待たずに取得する（cursorより前のイベントは破棄する）
+
+        Args:
+            job_id (str): ジョブID
+            cursor (int, optional): 取得済みのイベント数
+
+        Returns:
+            tuple: (新しいイベントのリスト, ジョブの状態)。ジョブが存在しない場合は ([], None)
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return [], None
+            return self._take_events(job, cursor), job["status"]
+
+    def wait_for_events(self, job_id, cursor=0, timeout=1.0):
+        """
+        ジョブの新しいイベントが届くか、ジョブが完了するまで待つ（cursorより前のイベントは破棄する）
+
+        Args:
+            job_id (str): ジョブID
+            cursor (int, optional): 取得済みのイベント数
+            timeout (float, optional): 最大待ち時間（秒）
+
+        Returns:
+            tuple: (新しいイベントのリスト, ジョブの状態)。ジョブが存在しない場合は ([], None)
+        """
+        deadline = time.time() + timeout
+
+        with self._condition:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return [], None
+
+                if self._event_count(job) > cursor or job["status"] in FINISHED_STATUSES:
+                    return self._take_events(job, cursor), job["status"]
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return [], job["status"]
+                self._condition.wait(remaining)
+
+    def wait_for_update(self, job_id, cursor=0, status=None, timeout=1.0, on_idle=None):
+        """
+        ジョブの新しいイベントが届くか、ジョブの状態がstatusから変わるまで待つ（cursorより前のイベントは破棄する）
+        待っている間はtimeout秒ごとにon_idleを呼び出す（進捗表示の書き換えなど、画面全体を更新しない処理に使う）
+
+        Args:
+            job_id (str): ジョブID
+            cursor (int, optional): 取得済みのイベント数
+            status (str, optional): 呼び出し側が把握しているジョブの状態
+            timeout (float, optional): on_idleを呼び出す間隔（秒）
+            on_idle (callable, optional): 新しいイベントも状態の変化もないまま時間が経過したときに呼び出す関数
+
+        Returns:
+            tuple: (新しいイベントのリスト, ジョブの状態)。ジョブが存在しない場合は ([], None)
+        """
+        while True:
+            deadline = time.time() + timeout
+
+            with self._condition:
+                while True:
+                    job = self._jobs.get(job_id)
+                    if job is None:
+                        return [], None
+
+                    if (
+                        self._event_count(job) > cursor
+                        or job["status"] != status
+                        or job["status"] in FINISHED_STATUSES
+                    ):
+                        return self._take_events(job, cursor), job["status"]
+
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+            # ロックを解放してから呼び出す（on_idleの中で例外が発生してもジョブの記録を妨げない）
+            if on_idle is not None:
+                on_idle()
+
+    def get_stats(self):
+        """
+        実行状況の統計を取得する
+
+        Returns:
+            dict: 状態ごとのジョブ数と受け付けなかったジョブ数
+        """
+        with self._condition:
+            stats = {status: 0 for status in (JOB_QUEUED, JOB_RUNNING) + FINISHED_STATUSES}
+            for job in self._jobs.values():
+                stats[job["status"]] += 1
+            stats["rejected"] = self.rejected_count
+            return stats
+
+
+# プロセス全体で共有するジョブ実行器
+_search_executor = None
+_search_executor_lock = threading.Lock()
+
+
+def get_search_executor():
+    """
+    プロセス全体で共有する検索ジョブ実行器を取得する関数
+
+    Returns:
+        SearchJobExecutor: 検索ジョブ実行器
+    """
+    global _search_executor
+
+    with _search_executor_lock:
+        if _search_executor is None:
+            _search_executor = SearchJobExecutor()
+            if DEBUG:
+                print(
+                    f"[SearchJobs] ジョブ実行器を作成しました（ワーカー: {SEARCH_JOB_WORKERS}, 待機上限: {SEARCH_JOB_QUEUE_LIMIT}）"
+                )
+
+    return _search_executor
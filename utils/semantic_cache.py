@@ -0,0 +1,320 @@
+"""
+言い回しの違う同じ意図の検索クエリに対して、以前の検索結果を再利用するモジュール
+クエリを文字n-gramのハッシュベクトルに変換し、コサイン類似度が閾値以上の
+過去のクエリの検索結果を返します（CPUのみで動作し、外部APIは使いません）
+"""
+
+import os
+import re
+import copy
+import json
+import time
+import zlib
+import threading
+import unicodedata
+import numpy as np
+from dotenv import load_dotenv
+from utils.geocoding import find_location_in_query
+
+# 環境変数の読み込み
+load_dotenv()
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# 同じ意図とみなすコサイン類似度の閾値
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8"))
+
+# 保持する検索結果の件数と有効期限（秒）
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "256"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "1800"))
+
+# キャッシュを無効にする場合は SEMANTIC_CACHE_ENABLED=false
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "True").lower() == "true"
+
+# ハッシュベクトルの次元数
+VECTOR_DIMENSIONS = 4096
+
+# 文字n-gramの長さ
+NGRAM_SIZES = (1, 2, 3)
+
+# 意図に影響しない語（検索クエリのほとんどに含まれる語や助詞）
+STOP_WORDS = [
+    "オートキャンプ場",
+    "キャンプ場",
+    "キャンプ",
+    "キャンプサイト",
+    "を教えて",
+    "教えて",
+    "ください",
+    "おすすめ",
+    "向け",
+    "ある",
+    "できる",
+    "の",
+    "が",
+    "で",
+    "に",
+    "を",
+    "は",
+    "と",
+    "な",
+]
+
+# 同じ意味の語をまとめる表（左の語を右の語に置き換える）
+SYNONYMS = {
+    "眺め": "眺望",
+    "見える": "眺望",
+    "見れる": "眺望",
+    "景色": "眺望",
+    "絶景": "眺望",
+    "ビュー": "眺望",
+    "ペット可": "ペット",
+    "犬連れ": "ペット",
+    "犬": "ペット",
+    "ワンちゃん": "ペット",
+    "子ども": "子供",
+    "こども": "子供",
+    "キッズ": "子供",
+    "家族": "ファミリー",
+    "ソロキャンプ": "ソロ",
+    "一人": "ソロ",
+    "バーベキュー": "BBQ",
+    "風呂": "温泉",
+    "静かな": "静か",
+    "閑静": "静か",
+}
+
+# 否定（「温泉がない」「ペット不可」「花火NG」など）と、否定される語
+# 否定の有無が違うクエリは逆の条件なので、否定される語の集合が一致する場合だけ再利用する
+NEGATION_PATTERN = re.compile(
+    r"([a-z0-9一-龥々ァ-ヶー]+?)(?:が|は|も)?(?:ない|無い|なし|無し|不可|禁止)"
+    r"|([0-9一-龥々ァ-ヶー]+)\s*ng(?![a-z])"
+)
+
+# 「ない」で終わるが否定ではない語（少ない・危ない）の語幹
+NEGATION_EXCLUDED_TERMS = {"少", "危"}
+
+# 検索結果と統計
+_entries = []
+_vectors = np.zeros((0, VECTOR_DIMENSIONS), dtype=np.float32)
+_stats = {"hits": 0, "misses": 0, "stores": 0}
+_lock = threading.Lock()
+
+
+def normalize_query(query):
+    """
+    類似度計算用に検索クエリを正規化する関数
+
+    Args:
+        query (str): 検索クエリ
+
+    Returns:
+        str: 正規化したクエリ
+    """
+    text = unicodedata.normalize("NFKC", query or "").lower()
+
+    for word, replacement in sorted(SYNONYMS.items(), key=lambda item: -len(item[0])):
+        text = text.replace(word.lower(), f" {replacement.lower()} ")
+
+    for word in STOP_WORDS:
+        text = text.replace(word.lower(), " ")
+
+    return re.sub(r"[\s、。,.!?！？「」]+", " ", text).strip()
+
+
+def vectorize_query(query):
+    """
+    検索クエリを文字n-gramのハッシュベクトルに変換する関数
+
+    Args:
+        query (str): 検索クエリ
+
+    Returns:
+        numpy.ndarray: L2正規化したベクトル
+    """
+    vector = np.zeros(VECTOR_DIMENSIONS, dtype=np.float32)
+
+    for token in normalize_query(query).split():
+        for size in NGRAM_SIZES:
+            for start in range(max(1, len(token) - size + 1)):
+                ngram = token[start : start + size]
+                index = zlib.crc32(f"{size}:{ngram}".encode("utf-8")) % VECTOR_DIMENSIONS
+                vector[index] += 1.0
+
+    # 出現回数は対数で抑える
+    vector = np.log1p(vector)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def make_context_key(user_preferences=None, facilities_required=None):
+    """
+    検索条件（好み設定・必須施設）のキーを作成する関数
+    検索条件が異なる結果は再利用しない
+
+    Args:
+        user_preferences (dict, optional): ユーザーの好み設定
+        facilities_required (list, optional): 必須施設
+
+    Returns:
+        str: 検索条件のキー
+    """
+    return json.dumps(
+        {"preferences": user_preferences or {}, "facilities": sorted(facilities_required or [])},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+
+
+def _location_name(query):
+    """クエリに含まれる地名（地名辞書で判定）"""
+    location = find_location_in_query(query)
+    return location["name"] if location else ""
+
+
+def negated_terms(query):
+    """
+    クエリの中で否定されている語を取り出す関数（「温泉がない」の「温泉」、「ペット不可」の「ペット」など）
+    同じ意味の語はまとめる（「犬NG」と「ペット不可」はどちらも「ペット」）
+
+    Args:
+        query (str): 検索クエリ
+
+    Returns:
+        tuple: 否定されている語（重複を除いて並べたもの）
+    """
+    text = unicodedata.normalize("NFKC", query or "").lower()
+    terms = set()
+    for match in NEGATION_PATTERN.finditer(text):
+        term = normalize_query(match.group(1) or match.group(2))
+        if term and term not in NEGATION_EXCLUDED_TERMS:
+            terms.add(term)
+    return tuple(sorted(terms))
+
+
+def lookup_search_result(query, user_preferences=None, facilities_required=None):
+    """
+    意図の近い過去のクエリの検索結果を取得する関数
+    地名が異なるクエリや、否定されている語（「温泉がない」「ペット不可」など）が異なるクエリは
+    類似度にかかわらず再利用しない
+
+    Args:
+        query (str): 検索クエリ
+        user_preferences (dict, optional): ユーザーの好み設定
+        facilities_required (list, optional): 必須施設
+
+    Returns:
+        dict: 検索結果（search_and_analyzeの戻り値と同じ形式で、cached_query, similarityを含む）
+            見つからない場合はNone
+    """
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+
+    vector = vectorize_query(query)
+    context_key = make_context_key(user_preferences, facilities_required)
+    location_name = _location_name(query)
+    negations = negated_terms(query)
+    now = time.time()
+
+    with _lock:
+        best_index = -1
+        best_similarity = 0.0
+        if len(_entries):
+            similarities = _vectors @ vector
+            for index in np.argsort(-similarities):
+                similarity = float(similarities[index])
+                if similarity < SEMANTIC_CACHE_THRESHOLD:
+                    break
+                entry = _entries[index]
+                if (
+                    entry["context_key"] == context_key
+                    and entry["location_name"] == location_name
+                    and entry["negated_terms"] == negations
+                    and now - entry["created_at"] <= SEMANTIC_CACHE_TTL
+                ):
+                    best_index = index
+                    best_similarity = similarity
+                    break
+
+        if best_index < 0:
+            _stats["misses"] += 1
+            if DEBUG:
+                print(f"[SemanticCache] ミス: '{query}'")
+            return None
+
+        _stats["hits"] += 1
+        entry = _entries[best_index]
+        result = copy.deepcopy(entry["result"])
+
+    result["cached_query"] = entry["query"]
+    result["similarity"] = best_similarity
+
+    if DEBUG:
+        print(f"[SemanticCache] ヒット: '{query}' -> '{entry['query']}'（類似度: {best_similarity:.3f}）")
+
+    return result
+
+
+def store_search_result(query, result, user_preferences=None, facilities_required=None):
+    """
+    検索結果を保存する関数
+    上限を超えた場合は古いものから削除する
+
+    Args:
+        query (str): 検索クエリ
+        result (dict): 検索結果（search_and_analyzeの戻り値と同じ形式）
+        user_preferences (dict, optional): ユーザーの好み設定
+        facilities_required (list, optional): 必須施設
+    """
+    global _vectors
+
+    if not SEMANTIC_CACHE_ENABLED or not result or not result.get("results"):
+        return
+
+    entry = {
+        "query": query,
+        "context_key": make_context_key(user_preferences, facilities_required),
+        "location_name": _location_name(query),
+        "negated_terms": negated_terms(query),
+        "created_at": time.time(),
+        "result": copy.deepcopy(result),
+    }
+    vector = vectorize_query(query)
+
+    with _lock:
+        _entries.append(entry)
+        _vectors = np.vstack([_vectors, vector[np.newaxis, :]])
+
+        overflow = len(_entries) - SEMANTIC_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            del _entries[:overflow]
+            _vectors = _vectors[overflow:]
+
+        _stats["stores"] += 1
+
+
+def get_semantic_cache_stats():
+    """
+    キャッシュの統計を取得する関数
+
+    Returns:
+        dict: hits, misses, stores, hit_rate, threshold, entries
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats["entries"] = len(_entries)
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    stats["threshold"] = SEMANTIC_CACHE_THRESHOLD
+    return stats
+
+
+def clear_semantic_cache():
+    """保存した検索結果をすべて削除する関数"""
+    global _vectors
+
+    with _lock:
+        _entries.clear()
+        _vectors = np.zeros((0, VECTOR_DIMENSIONS), dtype=np.float32)
@@ -0,0 +1,104 @@
+"""
+検索処理の各段階を並行して実行するモジュール
+依存関係のない段階は同時に開始し、結果が必要になった時点で合流します
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dotenv import load_dotenv
+from utils.cancellation import is_cancelled
+
+# 環境変数の読み込み
+load_dotenv()
+
+# デバッグモードの設定
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+
+class StageScheduler:
+    """
+    検索処理の段階を名前付きで開始し、必要な時点で結果を待つクラス
+    """
+
+    def __init__(self, max_workers=2, cancel_token=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search-stage")
+        self._futures = {}
+        self._started_at = {}
+        self._cancel_token = cancel_token
+
+    def start(self, name, func, *args, **kwargs):
+        """
+        段階を開始する（同じ名前の段階が開始済みの場合は何もしない）
+
+        Args:
+            name (str): 段階の名前
+            func (callable): 実行する関数
+            *args: funcに渡す引数
+            **kwargs: funcに渡すキーワード引数
+
+        Returns:
+            Future: 段階の実行結果（中止されている場合はNone）
+        """
+        if name in self._futures:
+            return self._futures[name]
+
+        if is_cancelled(self._cancel_token):
+            return None
+
+        self._started_at[name] = time.monotonic()
+        self._futures[name] = self._executor.submit(func, *args, **kwargs)
+        return self._futures[name]
+
+    def future(self, name):
+        """
+        開始済みの段階の実行結果を取得する
+
+        Args:
+            name (str): 段階の名前
+
+        Returns:
+            Future: 段階の実行結果（開始していない場合はNone）
+        """
+        return self._futures.get(name)
+
+    def join(self, name, timeout=None, default=None):
+        """
+        段階の完了を待って結果を返す
+
+        Args:
+            name (str): 段階の名前
+            timeout (float, optional): 最大待ち時間（秒）
+            default (any, optional): 開始していない・失敗・時間切れの場合に返す値
+
+        Returns:
+            any: 段階の結果
+        """
+        future = self._futures.get(name)
+        if future is None:
+            return default
+
+        waited_from = time.monotonic()
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if DEBUG:
+                print(f"[StageScheduler] {name}: 制限時間内に完了しませんでした")
+            return default
+        except Exception as e:
+            if DEBUG:
+                print(f"[StageScheduler] {name}: エラー: {str(e)}")
+            return default
+
+        if DEBUG:
+            now = time.monotonic()
+            print(
+                f"[StageScheduler] {name}: 実行 {now - self._started_at[name]:.2f}秒 / 合流時の待ち {now - waited_from:.2f}秒"
+            )
+
+        return result
+
+    def shutdown(self):
+        """未開始の段階を取り消し、ワーカーを解放する"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
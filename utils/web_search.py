@@ -4,9 +4,15 @@ Web検索を使用してキャンプ場情報を取得するモジュール
 
 import os
 import json
-import requests
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-import google.generativeai as genai
+from utils.gemini_client import generate_text
+from utils.cse_client import search_items, CustomSearchError
+from utils.entity_resolution import resolve_campsites
+from utils.prompt_builder import truncate_text
+from utils.prompt_templates import register_prompt_template
 
 # 環境変数の読み込み
 load_dotenv()
@@ -18,6 +24,42 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 # デバッグモードの設定
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 
+# Web検索で取得するキャンプ場の検索結果の件数（10件を超える場合は複数ページを同時に取得する）
+WEB_SEARCH_NUM_RESULTS = int(os.getenv("WEB_SEARCH_NUM_RESULTS", "10"))
+
+# 記事の要約を同時に改善する数
+ARTICLE_SUMMARY_WORKERS = int(os.getenv("ARTICLE_SUMMARY_WORKERS", "5"))
+
+# 改善した記事の要約を記事URLと検索クエリごとに保持する件数
+ARTICLE_SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("ARTICLE_SUMMARY_CACHE_MAX_ENTRIES", "512"))
+
+# 記事の要約を改善するプロンプト
+ARTICLE_SUMMARY_PROMPT = register_prompt_template(
+    "article_summary",
+    prefix="""
+    以下の記事タイトルと要約を、キャンプ場を探しているユーザーにとって有益な情報に焦点を当てて、
+    より詳細で魅力的な日本語の要約（200文字程度）に書き直してください。
+
+    以下の点に注意して要約を作成してください：
+    - キャンプ場の特徴や魅力を強調する
+    - 具体的な情報（設備、アクセス、周辺環境など）を含める
+    - 読みやすく、興味を引く文章にする
+    - 日本語で書く
+    - 200文字程度に収める
+
+    要約のみを出力してください。
+    """,
+    body="""
+    検索クエリ: ${query}
+    記事タイトル: ${title}
+    元の要約: ${summary}
+    """,
+)
+
+# 記事URLと検索クエリ -> 改善した要約
+_article_summaries = OrderedDict()
+_article_summaries_lock = threading.Lock()
+
 
 def search_campsites_web(query):
     """
@@ -37,34 +79,17 @@ def search_campsites_web(query):
     if "キャンプ場" not in query and "camp" not in query.lower():
         query = f"{query} キャンプ場"
 
-    # Google Custom Search APIのエンドポイント
-    url = "https://www.googleapis.com/customsearch/v1"
-
-    # リクエストパラメータ
-    params = {
-        "key": GOOGLE_API_KEY,
-        "cx": GOOGLE_CSE_ID,
-        "q": query,
-        "num": 10,  # 最大10件の結果を取得
-        "lr": "lang_ja",  # 日本語の結果のみ
-        "gl": "jp",  # 日本のコンテンツを優先
-    }
-
     try:
-        # APIリクエストを送信
-        response = requests.get(url, params=params)
-        response.raise_for_status()  # エラーチェック
-
-        # レスポンスをJSONとして解析
-        data = response.json()
+        # 検索結果を取得（同じクエリの応答は保存済みのものを使う）
+        items = search_items(query, WEB_SEARCH_NUM_RESULTS, lr="lang_ja", gl="jp")
 
         # 検索結果がない場合は空のリストを返す
-        if "items" not in data:
+        if not items:
             return []
 
         # 検索結果をアプリケーションのフォーマットに変換
         campsites = []
-        for item in data["items"]:
+        for item in items:
             # キャンプ場データを抽出（単一または複数）
             extracted_data = extract_campsite_data(item)
             if isinstance(extracted_data, list):
@@ -75,6 +100,8 @@ def search_campsites_web(query):
         return campsites
 
     except Exception as e:
+        if DEBUG:
+            print(f"Web検索エラー: {str(e)}")
         return []
 
 
@@ -347,6 +374,7 @@ def extract_features_from_text(text):
 def combine_search_results(existing_results, new_results, max_results=15):
     """
     既存の検索結果と新しい検索結果を結合する関数
+    名前の表記ゆれや座標から同じキャンプ場をまとめ、複数のソースで見つかったキャンプ場を上位にする
 
     Args:
         existing_results (list): 既存の検索結果
@@ -356,74 +384,16 @@ def combine_search_results(existing_results, new_results, max_results=15):
     Returns:
         list: 結合された検索結果
     """
-    # 既存の結果のキャンプ場名をリストアップ
-    existing_names = [site.get("name", "").lower() for site in existing_results]
-
-    # 重複検出用の辞書（キャンプ場名をキーとして、出現回数と元のインデックスを保存）
-    campsite_occurrences = {}
-
-    # 既存の結果を辞書に追加
-    for i, site in enumerate(existing_results):
-        name = site.get("name", "").lower()
-        if name:
-            if name in campsite_occurrences:
-                campsite_occurrences[name]["count"] += 1
-            else:
-                campsite_occurrences[name] = {
-                    "count": 1,
-                    "index": i,
-                    "source": site.get("source", ""),
-                    "popularity_score": 0,  # 人気度スコア初期値
-                }
-
-    # 結合結果を格納するリスト
-    combined_results = existing_results.copy()
-
-    # 新しい結果を処理
-    for site in new_results:
-        name = site.get("name", "").lower()
-        if not name:
-            continue
-
-        if name in campsite_occurrences:
-            # 既存の結果と名前が一致する場合（重複）
-            campsite_occurrences[name]["count"] += 1
-
-            # 重複したキャンプ場の人気度スコアを増加
-            campsite_occurrences[name]["popularity_score"] += 3
-
-            # 既存の結果のインデックスを取得
-            idx = campsite_occurrences[name]["index"]
-
-            # 既存の結果に情報を追加
-            combined_results[idx]["multiple_sources"] = True
-            combined_results[idx]["occurrence_count"] = campsite_occurrences[name]["count"]
-            combined_results[idx]["popularity_score"] = campsite_occurrences[name]["popularity_score"]
-
-            # ソース情報を更新
-            if "source" in combined_results[idx] and "source" in site:
-                if site["source"] not in combined_results[idx]["source"]:
-                    combined_results[idx]["source"] += f",{site['source']}"
-
-            # 不足情報を補完
-            for key, value in site.items():
-                if key not in combined_results[idx] or not combined_results[idx][key]:
-                    combined_results[idx][key] = value
-        else:
-            # 新しいキャンプ場の場合
-            campsite_occurrences[name] = {
-                "count": 1,
-                "index": len(combined_results),
-                "source": site.get("source", ""),
-                "popularity_score": 0,
-            }
-            combined_results.append(site)
-
-    # 人気度スコアに基づいてソート
-    for i, site in enumerate(combined_results):
-        name = site.get("name", "").lower()
-        if name in campsite_occurrences:
-            site["popularity_score"] = campsite_occurrences[name]["popularity_score"]
+    # 同じキャンプ場をまとめる（項目はソースの優先順位で決まる）
+    combined_results = resolve_campsites((None, existing_results), (None, new_results))
+
+    for site in combined_results:
+        # 重複したキャンプ場の人気度スコア（見つかった回数が多いほど高い）
+        site["popularity_score"] = 3 * (site["occurrence_count"] - 1)
+
+        # 複数のソースがある場合はカンマで区切る
+        if site["multiple_sources"]:
+            site["source"] = ",".join(site["sources"])
 
     # 人気度スコアでソート（降順）
     combined_results = sorted(combined_results, key=lambda x: x.get("popularity_score", 0), reverse=True)
@@ -432,9 +402,42 @@ def combine_search_results(existing_results, new_results, max_results=15):
     return combined_results[:max_results]
 
 
+def _article_summary_key(article, query):
+    """改善した要約を保持するキー（記事URLと検索クエリ）"""
+    return (article.get("url") or article.get("title", ""), " ".join((query or "").split()))
+
+
+def get_cached_article_summary(article, query):
+    """
+    改善済みの記事の要約を取得する関数
+
+    Args:
+        article (dict): 記事情報
+        query (str): 元の検索クエリ
+
+    Returns:
+        str: 改善済みの要約（ない場合はNone）
+    """
+    key = _article_summary_key(article, query)
+    with _article_summaries_lock:
+        summary = _article_summaries.get(key)
+        if summary is not None:
+            _article_summaries.move_to_end(key)
+        return summary
+
+
+def _store_article_summary(article, query, summary):
+    """改善した要約を保持する（上限を超えた場合は最近使われていないものから削除する）"""
+    with _article_summaries_lock:
+        _article_summaries[_article_summary_key(article, query)] = summary
+        while len(_article_summaries) > ARTICLE_SUMMARY_CACHE_MAX_ENTRIES:
+            _article_summaries.popitem(last=False)
+
+
 def enhance_article_summary(article, query):
     """
     Gemini APIを使用して記事の要約を改善する関数
+    同じ記事URLと検索クエリの要約は、改善済みのものを返す
 
     Args:
         article (dict): 記事情報
@@ -444,6 +447,10 @@ def enhance_article_summary(article, query):
         str: 改善された要約
     """
     try:
+        cached_summary = get_cached_article_summary(article, query)
+        if cached_summary is not None:
+            return cached_summary
+
         # Gemini APIキーを取得
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
@@ -451,43 +458,22 @@ def enhance_article_summary(article, query):
                 print("GEMINI_API_KEYが設定されていません")
             return article["summary"]
 
-        # Gemini APIの設定
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel("gemini-2.0-flash-lite")
-
         # 元の要約
         original_summary = article["summary"]
         title = article["title"]
 
-        # プロンプトを作成
-        prompt = f"""
-        以下の記事タイトルと要約を、キャンプ場を探しているユーザーにとって有益な情報に焦点を当てて、
-        より詳細で魅力的な日本語の要約（200文字程度）に書き直してください。
-        
-        検索クエリ: {query}
-        記事タイトル: {title}
-        元の要約: {original_summary}
-        
-        以下の点に注意して要約を作成してください：
-        - キャンプ場の特徴や魅力を強調する
-        - 具体的な情報（設備、アクセス、周辺環境など）を含める
-        - 読みやすく、興味を引く文章にする
-        - 日本語で書く
-        - 200文字程度に収める
-        
-        要約のみを出力してください。
-        """
+        # プロンプトを作成（指示は登録済みの前置きを使う）
+        prompt = ARTICLE_SUMMARY_PROMPT.render(query=query, title=title, summary=truncate_text(original_summary, 400))
 
         # Gemini APIを呼び出し
-        response = model.generate_content(prompt)
+        enhanced_summary = generate_text(prompt, prefix=ARTICLE_SUMMARY_PROMPT.prefix).strip()
 
         # レスポンスから要約を取得
-        if response and hasattr(response, "text"):
-            enhanced_summary = response.text.strip()
-            if enhanced_summary:
-                if DEBUG:
-                    print(f"要約の改善に成功: {len(enhanced_summary)}文字")
-                return enhanced_summary
+        if enhanced_summary:
+            if DEBUG:
+                print(f"要約の改善に成功: {len(enhanced_summary)}文字")
+            _store_article_summary(article, query, enhanced_summary)
+            return enhanced_summary
 
         # 要約の改善に失敗した場合は元の要約を返す
         return original_summary
@@ -498,6 +484,38 @@ def enhance_article_summary(article, query):
         return article["summary"]
 
 
+def iter_enhanced_article_summaries(articles, query):
+    """
+    複数の記事の要約を同時に改善し、改善できた記事から順に返すジェネレータ
+    改善済みの要約は、Gemini APIを呼ばずに最初に返す
+
+    Args:
+        articles (list): 記事情報のリスト
+        query (str): 元の検索クエリ
+
+    Yields:
+        tuple: (記事の位置, 改善された要約)
+    """
+    pending = []
+    for index, article in enumerate(articles):
+        cached_summary = get_cached_article_summary(article, query)
+        if cached_summary is not None:
+            yield index, cached_summary
+        else:
+            pending.append(index)
+
+    if not pending:
+        return
+
+    if DEBUG:
+        print(f"記事要約の改善: {len(pending)}件を同時に改善します（改善済み: {len(articles) - len(pending)}件）")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(ARTICLE_SUMMARY_WORKERS, len(pending)))) as executor:
+        future_to_index = {executor.submit(enhance_article_summary, articles[index], query): index for index in pending}
+        for future in as_completed(future_to_index):
+            yield future_to_index[future], future.result()
+
+
 def search_related_articles(query, max_results=5, enhance_summaries=True):
     """
     キャンプ場に関連する記事やブログを検索する関数
@@ -506,6 +524,7 @@ def search_related_articles(query, max_results=5, enhance_summaries=True):
         query (str): 検索クエリ
         max_results (int): 最大結果数
         enhance_summaries (bool): 要約を改善するかどうか
+            （Falseの場合は検索結果の抜粋をそのまま返す。改善はiter_enhanced_article_summariesで後から行える）
 
     Returns:
         list: 関連記事のリスト（タイトル、URL、要約、ソースを含む）
@@ -519,45 +538,27 @@ def search_related_articles(query, max_results=5, enhance_summaries=True):
     # クエリにキャンプ関連のキーワードを追加
     search_query = f"{query} キャンプ場 特集 おすすめ"
 
-    # Google Custom Search APIのエンドポイント
-    url = "https://www.googleapis.com/customsearch/v1"
-
-    # リクエストパラメータ
-    params = {
-        "key": GOOGLE_API_KEY,
-        "cx": GOOGLE_CSE_ID,
-        "q": search_query,
-        "num": max_results,  # 最大結果数
-        "lr": "lang_ja",  # 日本語の結果のみ
-        "gl": "jp",  # 日本のコンテンツを優先
-    }
-
     try:
         if DEBUG:
             print(f"関連記事検索: クエリ='{search_query}'")
 
-        # APIリクエスト
-        response = requests.get(url, params=params)
-
-        # レスポンスのステータスコードを確認
-        if response.status_code != 200:
+        # 検索結果を取得（同じクエリの応答は保存済みのものを使う）
+        try:
+            items = search_items(search_query, max_results, lr="lang_ja", gl="jp")
+        except CustomSearchError as e:
             if DEBUG:
-                print(f"API Error: {response.status_code}")
-                print(f"Response: {response.text}")
+                print(f"API Error: {str(e)}")
             return []
 
-        # JSONレスポンスを解析
-        data = response.json()
-
         # 検索結果がない場合
-        if "items" not in data:
+        if not items:
             if DEBUG:
                 print("検索結果がありません")
             return []
 
         # 検索結果を処理
         articles = []
-        for item in data["items"]:
+        for item in items:
             title = item.get("title", "")
             url = item.get("link", "")
             snippet = item.get("snippet", "")
@@ -582,17 +583,13 @@ def search_related_articles(query, max_results=5, enhance_summaries=True):
         if DEBUG:
             print(f"関連記事検索結果: {len(articles)}件")
 
-        # 要約の改善
+        # 要約の改善（記事ごとに同時に改善する）
         if enhance_summaries:
             if DEBUG:
                 print("記事要約の改善を開始")
 
-            for i, article in enumerate(articles):
-                if DEBUG:
-                    print(f"記事{i+1}の要約を改善中...")
-
-                # 要約を改善
-                article["summary"] = enhance_article_summary(article, query)
+            for index, summary in iter_enhanced_article_summaries(articles, query):
+                articles[index]["summary"] = summary
 
         return articles
 